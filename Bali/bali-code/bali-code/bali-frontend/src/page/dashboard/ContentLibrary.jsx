@@ -167,6 +167,18 @@ const SendModal = ({ item, onClose, onSent }) => {
     const [result, setResult] = useState(null);
     const [error, setError] = useState('');
 
+    // Broadcasts run in the background — poll the job until it completes
+    useEffect(() => {
+        if (!result?.job_id || result.status === 'completed') return;
+        const t = setTimeout(async () => {
+            try {
+                const res = await apiRequest(() => axios.get(`${API_BASE_URL}/content/broadcasts/${result.job_id}`, { headers: authHeader() }));
+                if (res.data.success) setResult(prev => ({ ...prev, ...res.data }));
+            } catch { /* keep last known progress */ }
+        }, 2000);
+        return () => clearTimeout(t);
+    }, [result]);
+
     const handleSend = async () => {
         setError('');
         if (target === 'villa' && !villaCode.trim()) return setError('Please enter a villa code.');
@@ -206,8 +218,8 @@ const SendModal = ({ item, onClose, onSent }) => {
                 {result ? (
                     <div className="text-center py-4 space-y-2">
                         <div className="text-4xl">✅</div>
-                        <p className="font-black text-neutral">Sent successfully</p>
-                        <p className="text-sm text-lightneutral">{result.sent} sent · {result.failed} failed · {result.total_recipients} total recipients</p>
+                        <p className="font-black text-neutral">{result.job_id && result.status !== 'completed' ? 'Sending…' : 'Sent successfully'}</p>
+                        <p className="text-sm text-lightneutral">{result.sent} sent · {result.failed} failed · {result.total_recipients ?? '…'} total recipients</p>
                         {result.note && <p className="text-xs text-orange-500 bg-orange-50 rounded-xl px-3 py-2">{result.note}</p>}
                         <button onClick={onClose} className="mt-4 px-6 py-2.5 rounded-xl bg-primary text-white text-sm font-black hover:opacity-90">Done</button>
                     </div>
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from app.settings.config import settings
+from app.models.order_summary import amount_idr_from_price
+import logging
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MIGRATION_ID = "orders_amount_idr"
+
+
+def order_amount_idr(order: dict):
+    """Web socket orders stored a numeric final_price next to the unit price; prefer it."""
+    if isinstance(order.get("final_price"), (int, float)):
+        return amount_idr_from_price(order["final_price"])
+    return amount_idr_from_price(order.get("price"))
+
+
+async def backfill_amount_idr(db, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Stream orders without amount_idr in _id order and set it in bulk batches.
+
+    Progress (the last _id written) is checkpointed in `migrations`, so an
+    interrupted run resumes where it stopped instead of rescanning. Orders
+    whose price has no digits get amount_idr = None so they are not revisited.
+    """
+    orders = db["orders-summary"]
+    migrations = db["migrations"]
+
+    state = await migrations.find_one({"_id": MIGRATION_ID}) or {}
+    query = {"amount_idr": {"$exists": False}}
+    if state.get("last_id") is not None:
+        query["_id"] = {"$gt": state["last_id"]}
+        logger.info(f"Resuming amount_idr backfill after {state['last_id']}")
+
+    cursor = orders.find(query, {"price": 1, "final_price": 1}).sort("_id", 1).batch_size(batch_size)
+    updated = 0
+    ops = []
+    last_id = None
+
+    async def flush():
+        nonlocal ops, updated
+        if not ops:
+            return
+        await orders.bulk_write(ops, ordered=False)
+        updated += len(ops)
+        ops = []
+        await migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"last_id": last_id, "updated": updated, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        logger.info(f"amount_idr backfill: {updated} orders updated")
+
+    async for order in cursor:
+        ops.append(UpdateOne({"_id": order["_id"]}, {"$set": {"amount_idr": order_amount_idr(order)}}))
+        last_id = order["_id"]
+        if len(ops) >= batch_size:
+            await flush()
+    await flush()
+
+    await migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.utcnow()}, "$unset": {"last_id": ""}},
+        upsert=True,
+    )
+    logger.info(f"✅ amount_idr backfill complete ({updated} orders)")
+    return updated
+
+
+async def main():
+    client = AsyncIOMotorClient(settings.MONGO_URII)
+    try:
+        await backfill_amount_idr(client.get_database('easybali'))
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,4 +1,6 @@
+import os
 import asyncio
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.settings.config import settings
 import logging
@@ -15,6 +17,16 @@ async def ensure_indexes():
         await db["orders-summary"].create_index("order_number", unique=True)
         await db["orders-summary"].create_index("sender_id")
         await db["orders-summary"].create_index("status")
+        await db["orders-summary"].create_index([("customer_id", 1), ("status", 1)])
+        await db["orders-summary"].create_index([("villa_code", 1), ("updated_at", -1)])
+        await db["orders-summary"].create_index([("created_at", 1), ("sender_id", 1)])
+        # Analytics windows: created_at range + status / villa / promo, summing amount_idr
+        await db["orders-summary"].create_index([("status", 1), ("created_at", 1), ("amount_idr", 1)])
+        await db["orders-summary"].create_index([("villa_code", 1), ("created_at", 1)])
+        await db["orders-summary"].create_index(
+            [("promo_code", 1), ("created_at", 1)],
+            partialFilterExpression={"promo_code": {"$type": "string"}},
+        )
 
         # 2. Villa Codes
         logger.info("Ensuring indexes for villa-codes...")
@@ -28,6 +40,9 @@ async def ensure_indexes():
         logger.info("Ensuring indexes for whatsapp_message_queue...")
         await db["whatsapp_message_queue"].create_index("status")
         await db["whatsapp_message_queue"].create_index("created_at")
+        await db["whatsapp_message_queue"].create_index([("status", 1), ("priority", 1), ("next_attempt_at", 1)])
+        await db["whatsapp_message_queue"].create_index([("recipient_id", 1), ("status", 1), ("created_at", 1)])
+        await db["whatsapp_message_queue"].create_index([("broadcast_job_id", 1), ("recipient_id", 1)], sparse=True)
 
         # 5. Latency Analytics
         logger.info("Ensuring indexes for analytics_latency...")
@@ -44,11 +59,13 @@ async def ensure_indexes():
         await db["issues"].create_index("status")
         await db["issues"].create_index("villa_code")
         await db["issues"].create_index("created_at")
+        await db["issues"].create_index("customer_id")
 
         # 8. Passports
         logger.info("Ensuring indexes for passports...")
         await db["passports"].create_index("order_number")
         await db["passports"].create_index("villa_code")
+        await db["passports"].create_index([("user_id", 1), ("uploaded_at", -1)])
 
         # 9. Refund Requests
         logger.info("Ensuring indexes for refund_requests...")
@@ -61,6 +78,47 @@ async def ensure_indexes():
         await db["content_library"].create_index("villa_code")
         await db["content_library"].create_index("category")
 
+        # 11. Broadcast jobs
+        logger.info("Ensuring indexes for broadcast_jobs / broadcast_recipients...")
+        await db["broadcast_jobs"].create_index([("status", 1), ("lease_expires_at", 1)])
+        await db["broadcast_recipients"].create_index([("job_id", 1), ("recipient_id", 1)], unique=True)
+        await db["broadcast_recipients"].create_index([("job_id", 1), ("status", 1)])
+
+        # 12. Customers (dashboard customer list joins feedback by customer_id)
+        logger.info("Ensuring indexes for customers / feedback...")
+        await db["customers"].create_index([("last_active", -1)])
+        await db["customers"].create_index([("villa_code", 1), ("last_active", -1)])
+        await db["feedback"].create_index([("customer_id", 1), ("timestamp", -1)])
+
+        # 13. Dashboard stats rollup (recomputed per villa from these)
+        logger.info("Ensuring indexes for inquiries...")
+        await db["inquiries"].create_index([("villa_code", 1), ("timestamp", -1)])
+
+        # 14. Guest cohorts (_id is the guest's sender_id)
+        logger.info("Ensuring indexes for guest_first_seen...")
+        await db["guest_first_seen"].create_index("first_seen_at")
+
+        # 15. Analytics daily rollups (_id is "day|villa|service")
+        logger.info("Ensuring indexes for analytics_daily...")
+        await db["analytics_daily"].create_index([("day", 1), ("villa_code", 1)])
+
+        # 16. Shared AI answer cache (_id is "namespace|prompt hash"); Mongo drops expired answers
+        logger.info("Ensuring indexes for ai_response_cache...")
+        await db["ai_response_cache"].create_index("expires_at", expireAfterSeconds=0)
+
+        # 17. RAG ingestion checkpoints (_id is "index|row id")
+        logger.info("Ensuring indexes for rag_ingested_rows...")
+        await db["rag_ingested_rows"].create_index([("index", 1), ("source", 1)])
+
+        # 18. Shared embedding cache (_id is the content hash); unused vectors expire
+        logger.info("Ensuring indexes for embedding_cache...")
+        await db["embedding_cache"].create_index("expires_at", expireAfterSeconds=0)
+        # Vectors cached before expires_at existed would otherwise never expire
+        await db["embedding_cache"].update_many(
+            {"expires_at": {"$exists": False}},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(days=float(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "30")))}},
+        )
+
         logger.info("✅ All indexes ensured successfully!")
     finally:
         client.close()
@@ -1,6 +1,38 @@
+import re
 import datetime
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+
+_NUMBER = re.compile(r'\d[\d.,\s]*\d|\d')
+
+
+def amount_idr_from_price(price: Any) -> Optional[int]:
+    """
+    Integer IDR amount for a stored price: numbers are rounded, formatted
+    strings ("1,500,000", "IDR 500 000", "Rp 1.500.000,00", "150000.50") are
+    read from their first number. The last of "." / "," is the decimal point
+    when both appear; a lone separator is one only if 1-2 digits follow it
+    (so "150.000" stays 150000). None when there are no digits at all.
+    """
+    if price is None or isinstance(price, bool):
+        return None
+    if isinstance(price, (int, float)):
+        return int(round(price))
+    match = _NUMBER.search(str(price))
+    if not match:
+        return None
+    number = re.sub(r'\s', '', match.group())
+    separators = [c for c in number if c in ".,"]
+    decimal = None
+    if separators and len(set(separators)) == 2:
+        decimal = separators[-1]
+    elif len(separators) == 1 and len(number) - number.index(separators[0]) - 1 in (1, 2):
+        decimal = separators[0]
+    whole, _, fraction = number.partition(decimal) if decimal else (number, "", "")
+    whole = re.sub(r'[.,]', '', whole)
+    return int(round(float(f"{whole}.{fraction or 0}")))
+
 
 class PaymentInfo(BaseModel):
     xendit_invoice_id: Optional[str] = None
@@ -26,6 +58,8 @@ class Order(BaseModel):
     date: Optional[datetime.datetime] = None
     time: Optional[str] = None
     price: Optional[str] = None
+    # Typed order total in IDR, derived from price; analytics aggregate on this
+    amount_idr: Optional[int] = None
     confirmation: bool = False
     status: str = "pending"
     payment: PaymentInfo = Field(default_factory=PaymentInfo)
@@ -46,6 +80,12 @@ class Order(BaseModel):
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
 
+    @model_validator(mode="after")
+    def _fill_amount_idr(self):
+        if self.amount_idr is None:
+            self.amount_idr = amount_idr_from_price(self.price)
+        return self
+
     class Config:
         extra = "allow"
 
@@ -9,12 +9,15 @@ from app.services.analytics_service import (
     get_guest_analytics,
     get_promo_analytics
 )
+from app.services.analytics_rollups import analytics_rollups
 from app.utils.auth import requires_role
+from app.utils.result_cache import cached
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 logger = logging.getLogger(__name__)
 
 @router.get("/villa-performance")
+@cached(ttl=15)
 async def get_villa_performance_endpoint(
     villa_code: Optional[str] = Query(None),
     days: int = Query(30, ge=1, le=365),
@@ -38,6 +41,7 @@ async def get_villa_performance_endpoint(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/service-analytics")
+@cached(ttl=15)
 async def get_service_analytics_endpoint(
     days: int = Query(30, ge=1, le=365),
     current_user: dict = Depends(requires_role("staff"))
@@ -59,6 +63,7 @@ async def get_service_analytics_endpoint(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/revenue")
+@cached(ttl=15)
 async def get_revenue_analytics_endpoint(
     days: int = Query(30, ge=1, le=365),
     group_by: str = Query("daily", regex="^(daily|weekly|monthly)$"),
@@ -82,6 +87,7 @@ async def get_revenue_analytics_endpoint(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/guest-analytics")
+@cached(ttl=15)
 async def get_guest_analytics_endpoint(
     days: int = Query(30, ge=1, le=365),
     current_user: dict = Depends(requires_role("admin"))
@@ -103,6 +109,7 @@ async def get_guest_analytics_endpoint(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/promo-analytics")
+@cached(ttl=15)
 async def get_promo_analytics_endpoint(
     days: int = Query(30, ge=1, le=365),
     current_user: dict = Depends(requires_role("admin"))
@@ -124,6 +131,7 @@ async def get_promo_analytics_endpoint(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/dashboard")
+@cached(ttl=15)
 async def get_analytics_dashboard(
     days: int = Query(30, ge=1, le=365),
     villa_code: Optional[str] = Query(None),
@@ -133,15 +141,15 @@ async def get_analytics_dashboard(
     Get comprehensive analytics dashboard (Staff+)
     """
     try:
-        # Get all analytics data
-        villa_performance = await get_villa_performance(villa_code, days)
-        service_analytics = await get_service_analytics(days)
+        # Booking/revenue figures are folded from the daily rollup buckets
+        villa_performance = await analytics_rollups.get_villa_performance(villa_code, days)
+        service_analytics = await analytics_rollups.get_service_analytics(days)
         guest_analytics = await get_guest_analytics(days)
         
         # Revenue analytics (admin only)
         revenue_analytics = []
         if current_user.get("role") == "admin":
-            revenue_analytics = await get_revenue_analytics(days, "daily")
+            revenue_analytics = await analytics_rollups.get_daily_revenue(days)
             promo_analytics = await get_promo_analytics(days)
         else:
             promo_analytics = []
@@ -178,6 +186,7 @@ async def get_analytics_dashboard(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/top-villas")
+@cached(ttl=15)
 async def get_top_villas(
     metric: str = Query("revenue", regex="^(revenue|bookings|completion_rate)$"),
     limit: int = Query(10, ge=1, le=50),
@@ -188,7 +197,7 @@ async def get_top_villas(
     Get top performing villas by metric (Staff+)
     """
     try:
-        performance = await get_villa_performance(days=days)
+        performance = await analytics_rollups.get_villa_performance(days=days)
         
         # Sort by selected metric
         if metric == "revenue":
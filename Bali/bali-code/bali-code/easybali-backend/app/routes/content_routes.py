@@ -166,7 +166,7 @@ async def send_content(
       villa_code: "V1"  (required when target == "villa")
       recipients: ["628...","628..."]  (required when target == "custom")
     """
-    from app.utils.whatsapp_func import send_whatsapp_message
+    from app.services.broadcast_service import broadcast_executor
 
     channel: str = payload.get("channel", "whatsapp")
     target: str = payload.get("target", "all")
@@ -198,63 +198,71 @@ async def send_content(
 
     message_body: str = doc["body"]
 
-    # ── Resolve recipient list ────────────────────────────────────────────
+    # ── Check there is someone to send to ─────────────────────────────────
+    # The full list is resolved (streamed + deduplicated) by the broadcast job
     recipient_ids: List[str] = []
     if target == "custom":
-        recipient_ids = [str(r).strip() for r in custom_recipients]
+        recipient_ids = list(dict.fromkeys(str(r).strip() for r in custom_recipients))
     else:
-        query = {}
+        query: Dict[str, Any] = {"sender_id": {"$nin": [None, ""]}}
         if target == "villa" and villa_code_filter:
             query["villa_code"] = villa_code_filter
-        vc_docs = await villa_code_collection.find(query, {"sender_id": 1}).to_list(1000)
-        # Deduplicate, exclude empty
-        seen = set()
-        for v in vc_docs:
-            sid = v.get("sender_id")
-            if sid and str(sid) not in seen:
-                seen.add(str(sid))
-                recipient_ids.append(str(sid))
-
-    if not recipient_ids:
-        return {"success": False, "error": "No recipients found for the given target"}
-
-    # ── Send via WhatsApp ─────────────────────────────────────────────────
-    wa_sent = 0
-    wa_failed = 0
-    email_note = None
-
-    if channel in ("whatsapp", "both"):
-        for rid in recipient_ids:
-            try:
-                await send_whatsapp_message(rid, message_body)
-                wa_sent += 1
-            except Exception:
-                wa_failed += 1
+        if not await villa_code_collection.find_one(query, {"_id": 1}):
+            return {"success": False, "error": "No recipients found for the given target"}
 
+    email_note = None
     if channel in ("email", "both"):
         # Email is not yet configured — log intent only
         email_note = "Email channel is not yet configured. WhatsApp was used instead."
 
-    # ── Record in send history ────────────────────────────────────────────
-    history_entry = {
-        "sent_at": datetime.utcnow(),
-        "sent_by": user.get("email", "admin"),
-        "channel": channel,
-        "target": target if target != "villa" else f"villa:{villa_code_filter}",
-        "recipient_count": wa_sent,
-        "failed_count": wa_failed,
-    }
-    await content_collection.update_one(
-        {"_id": ObjectId(item_id)},
-        {"$push": {"send_history": history_entry}}
+    if channel == "email":
+        await content_collection.update_one(
+            {"_id": ObjectId(item_id)},
+            {"$push": {"send_history": {
+                "sent_at": datetime.utcnow(),
+                "sent_by": user.get("email", "admin"),
+                "channel": channel,
+                "target": target if target != "villa" else f"villa:{villa_code_filter}",
+                "recipient_count": 0,
+                "failed_count": 0,
+            }}}
+        )
+        return {"success": True, "sent": 0, "failed": 0, "total_recipients": len(recipient_ids), "note": email_note}
+
+    # ── Hand off to a background broadcast job ────────────────────────────
+    # Sends go out through the outbound queue (bulk lane); the send history
+    # entry is written when the job completes. Poll /content/broadcasts/{job_id}.
+    job_id = await broadcast_executor.create_job(
+        content_id=item_id,
+        message_body=message_body,
+        target=target,
+        villa_code=villa_code_filter,
+        recipients=recipient_ids,
+        channel=channel,
+        created_by=user.get("email", "admin"),
     )
 
     result = {
         "success": True,
-        "sent": wa_sent,
-        "failed": wa_failed,
-        "total_recipients": len(recipient_ids),
+        "job_id": job_id,
+        "status": "resolving",
+        "sent": 0,
+        "failed": 0,
+        "total_recipients": len(recipient_ids) or None,
     }
     if email_note:
         result["note"] = email_note
     return result
+
+
+@router.get("/broadcasts/{job_id}")
+async def get_broadcast_progress(job_id: str) -> Dict[str, Any]:
+    """Progress of a broadcast started by POST /content/{item_id}/send."""
+    from app.services.broadcast_service import broadcast_executor
+    try:
+        progress = await broadcast_executor.get_progress(job_id)
+    except Exception:
+        return {"success": False, "error": "Invalid job ID"}
+    if not progress:
+        return {"success": False, "error": "Broadcast not found"}
+    return {"success": True, **progress}
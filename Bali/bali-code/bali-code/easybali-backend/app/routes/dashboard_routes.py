@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, Query, Response
 from app.db.session import db, order_collection, passport_collection, checkin_collection, inquiry_collection, issue_collection, feedback_collection, customer_collection
 from app.utils.auth import requires_role, get_current_user
+from app.services.dashboard_stats import dashboard_stats
+from app.utils.result_cache import cached
 from typing import Dict, Any, Optional, List, Annotated
 from datetime import datetime
 from bson import ObjectId
@@ -12,59 +14,38 @@ router = APIRouter(prefix="/dashboard-api", tags=["Dashboard"], dependencies=[De
 @router.get("/stats")
 async def get_dashboard_stats(user: Annotated[dict, Depends(requires_role("read_only"))]) -> Dict[str, Any]:
     try:
-        # Check if user is restricted to specific villas
-        villa_filter = {}
-        if "*" not in user.get("villa_codes", ["*"]):
-            villa_filter = {"villa_code": {"$in": user["villa_codes"]}}
+        # Counters and recent items come from the per-villa rollup
+        restricted = "*" not in user.get("villa_codes", ["*"])
+        rollup = await dashboard_stats.get(user["villa_codes"] if restricted else None)
+        active_guests = rollup["active_guests"]
+        total_bookings = rollup["bookings"]
+        revenue = rollup["revenue"]
+        pending_inquiries = rollup["pending_inquiries"]
+        reported_issues = rollup["open_issues"]
 
-        # Total bookings
-        total_bookings = await order_collection.count_documents(villa_filter)
-        
-        # Active Guests - count of distinct sender_ids
-        unique_guests = await order_collection.distinct("sender_id", villa_filter)
-        active_guests = len(unique_guests)
-        
-        # Revenue - Sum of "payment.paid_amount" for PAID orders
-        pipeline = [
-            {"$match": {"status": "PAID"}},
-            {"$match": villa_filter},
-            {"$group": {"_id": None, "total_revenue": {"$sum": "$payment.paid_amount"}}}
-        ]
-        revenue_result = await order_collection.aggregate(pipeline).to_list(1)
-        revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
-        
-        # Pending Inquiries and Issues
-        pending_inquiries = await inquiry_collection.count_documents({"intent": "support_request", **villa_filter})
-        reported_issues = await issue_collection.count_documents({"status": "open", **villa_filter})
-
-        # Recent activity slice
-        o_short = await order_collection.find(villa_filter).sort("updated_at", -1).limit(5).to_list(5)
-        inq_short = await inquiry_collection.find(villa_filter).sort("timestamp", -1).limit(5).to_list(5)
-        iss_short = await issue_collection.find(villa_filter).sort("timestamp", -1).limit(5).to_list(5)
-        
         combined_recent = []
-        for o in o_short:
+        for o in rollup["recent_orders"]:
             combined_recent.append({
-                "id": str(o["_id"]),
-                "guest": f"Guest {str(o.get('sender_id', ''))[-4:]}",
-                "action": f"Booked {o.get('service_name', 'Service')}",
-                "time": (o.get("updated_at") or o.get("created_at")),
+                "id": o["id"],
+                "guest": f"Guest {str(o.get('sender_id') or '')[-4:]}",
+                "action": f"Booked {o.get('service_name') or 'Service'}",
+                "time": o.get("time"),
                 "status": "confirmed" if o.get("status") == "PAID" else "pending"
             })
-        for i in inq_short:
+        for i in rollup["recent_inquiries"]:
             combined_recent.append({
-                "id": str(i["_id"]),
-                "guest": f"Guest {str(i.get('sender_id', ''))[-4:]}",
+                "id": i["id"],
+                "guest": f"Guest {str(i.get('sender_id') or '')[-4:]}",
                 "action": "Messaged AI",
-                "time": i.get("timestamp"),
+                "time": i.get("time"),
                 "status": "resolved"
             })
-        for s in iss_short:
+        for s in rollup["recent_issues"]:
             combined_recent.append({
-                "id": str(s["_id"]),
-                "guest": f"Guest {str(s.get('sender_id', ''))[-4:]}",
+                "id": s["id"],
+                "guest": f"Guest {str(s.get('sender_id') or '')[-4:]}",
                 "action": "Reported Issue",
-                "time": s.get("timestamp"),
+                "time": s.get("time"),
                 "status": "pending" if s.get("status") == "open" else "completed"
             })
             
@@ -95,6 +76,7 @@ async def get_dashboard_stats(user: Annotated[dict, Depends(requires_role("read_
         }
 
 @router.get("/activity")
+@cached(ttl=15, villa_scoped=True)
 async def get_guest_activity(user: Annotated[dict, Depends(requires_role("read_only"))]) -> Dict[str, Any]:
     try:
         villa_filter = {}
@@ -185,15 +167,18 @@ async def get_activity_detail(item_type: str, item_id: str, _user: Annotated[dic
 
 @router.get("/chats")
 async def get_concierge_chats() -> Dict[str, Any]:
-    from app.utils.chat_memory import chat_memory
+    from app.utils.chat_memory import conversation_store
     try:
         chat_sessions = []
-        for user_id, messages in chat_memory.items():
+        for doc in await conversation_store.list_conversations():
+            user_id = doc["_id"]
+            messages = doc.get("chat_history") or []
+            updated_at = doc.get("updated_at")
             chat_sessions.append({
                 "guest_id": user_id,
                 "guest_name": f"Guest {str(user_id)[-4:]}",
                 "message_count": len(messages),
-                "last_active": "Recently",
+                "last_active": updated_at.isoformat() if isinstance(updated_at, datetime) else "Recently",
                 "transcript": messages
             })
         return {"success": True, "sessions": chat_sessions}
@@ -549,6 +534,7 @@ async def update_issue_status_dashboard(
                 "$push": {"history": history_entry}
             }
         )
+        dashboard_stats.touch(issue.get("villa_code"))
         
         user_id = issue.get("sender_id")
         if user_id:
@@ -628,6 +614,7 @@ async def export_issues() -> Response:
     )
 
 @router.get("/buckets/customers")
+@cached(ttl=15)
 async def get_customer_bucket(start_date: Optional[str] = None, end_date: Optional[str] = None):
     try:
         match_query = {}
@@ -651,6 +638,7 @@ async def get_customer_bucket(start_date: Optional[str] = None, end_date: Option
         return {"success": False, "error": str(e)}
 
 @router.get("/buckets/villas")
+@cached(ttl=15)
 async def get_villa_bucket(start_date: Optional[str] = None, end_date: Optional[str] = None):
     try:
         match_query = {}
@@ -672,6 +660,7 @@ async def get_villa_bucket(start_date: Optional[str] = None, end_date: Optional[
         return {"success": False, "error": str(e)}
 
 @router.get("/buckets/payments")
+@cached(ttl=15)
 async def get_payment_bucket(start_date: Optional[str] = None, end_date: Optional[str] = None):
     try:
         match_query = {"$or": [{"status": "PAID"}, {"payment.payment_status": "completed"}]}
@@ -701,6 +690,7 @@ async def get_payment_bucket(start_date: Optional[str] = None, end_date: Optiona
         return {"success": False, "error": str(e)}
 
 @router.get("/buckets/services")
+@cached(ttl=15)
 async def get_service_bucket(start_date: Optional[str] = None, end_date: Optional[str] = None):
     try:
         match_query = {}
@@ -1054,6 +1044,7 @@ async def approve_refund(
         {"order_number": order_number},
         {"$set": {"status": "REFUNDED", "payment.refund_id": xendit_refund_id}}
     )
+    dashboard_stats.touch(doc.get("villa_code"))
 
     # Mark refund request as approved
     await refund_collection.update_one(
@@ -1235,7 +1226,91 @@ async def delete_partner_application(
 
 # ── Customers ─────────────────────────────────────────────────────────────────
 
+def _customer_rollup_pipeline(query: dict, limit: int) -> List[dict]:
+    """
+    Aggregation for the customer list page: the page of customers plus their
+    booking/issue counts, latest rating and passport name, joined via indexed
+    $lookup sub-pipelines instead of per-customer queries.
+    """
+    return [
+        {"$match": query},
+        {"$sort": {"last_active": -1}},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": order_collection.name,
+            "localField": "customer_id",
+            "foreignField": "customer_id",
+            "pipeline": [
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "paid": {"$sum": {"$cond": [{"$eq": ["$status", "PAID"]}, 1, 0]}},
+                }},
+            ],
+            "as": "order_counts",
+        }},
+        {"$lookup": {
+            "from": issue_collection.name,
+            "localField": "customer_id",
+            "foreignField": "customer_id",
+            "pipeline": [{"$count": "total"}],
+            "as": "issue_counts",
+        }},
+        {"$lookup": {
+            "from": feedback_collection.name,
+            "localField": "customer_id",
+            "foreignField": "customer_id",
+            "pipeline": [
+                {"$sort": {"timestamp": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "rating": 1}},
+            ],
+            "as": "latest_feedback",
+        }},
+        {"$lookup": {
+            "from": passport_collection.name,
+            "localField": "phone",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$sort": {"uploaded_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "guest_name": 1}},
+            ],
+            "as": "latest_passport",
+        }},
+        {"$sort": {"last_active": -1}},
+    ]
+
+
+def _customer_row(c: dict) -> dict:
+    """Shape one _customer_rollup_pipeline result for the dashboard."""
+    phone = c.get("phone", "")
+    order_counts = c.get("order_counts") or [{}]
+    issue_counts = c.get("issue_counts") or [{}]
+    feedback = c.get("latest_feedback") or [{}]
+    passport = c.get("latest_passport") or [{}]
+
+    # Passport name fallback
+    name = c.get("name") or passport[0].get("guest_name")
+
+    first_contact = c.get("first_contact")
+    last_active = c.get("last_active")
+    return {
+        "customer_id": c.get("customer_id"),
+        "phone": phone,
+        "name": name or f"Guest ...{phone[-4:]}",
+        "villa_code": c.get("villa_code"),
+        "total_bookings": order_counts[0].get("total", 0),
+        "paid_bookings": order_counts[0].get("paid", 0),
+        "open_issues": issue_counts[0].get("total", 0),
+        "last_rating": feedback[0].get("rating"),
+        "first_contact": first_contact.isoformat() if isinstance(first_contact, datetime) else None,
+        "last_active": last_active.isoformat() if isinstance(last_active, datetime) else None,
+    }
+
+
 @router.get("/customers")
+@cached(ttl=15, villa_scoped=True)
 async def get_customers(
     user: Annotated[dict, Depends(requires_role("read_only"))],
     search: Optional[str] = Query(None),
@@ -1258,45 +1333,9 @@ async def get_customers(
                 {"name": {"$regex": search, "$options": "i"}},
             ]
 
-        raw = await customer_collection.find(query).sort("last_active", -1).limit(limit).to_list(limit)
-
-        customers = []
-        for c in raw:
-            cid = c.get("customer_id")
-            phone = c.get("phone", "")
-
-            # Aggregate counts from each collection
-            orders = await order_collection.count_documents({"customer_id": cid})
-            paid = await order_collection.count_documents({"customer_id": cid, "status": "PAID"})
-            issues = await issue_collection.count_documents({"customer_id": cid})
-            feedbacks = await feedback_collection.find_one(
-                {"customer_id": cid}, sort=[("timestamp", -1)]
-            )
-            last_rating = feedbacks.get("rating") if feedbacks else None
-
-            # Passport name fallback
-            name = c.get("name")
-            if not name:
-                passport = await passport_collection.find_one(
-                    {"user_id": phone}, sort=[("uploaded_at", -1)]
-                )
-                name = passport.get("guest_name") if passport else None
-
-            first_contact = c.get("first_contact")
-            last_active = c.get("last_active")
-
-            customers.append({
-                "customer_id": cid,
-                "phone": phone,
-                "name": name or f"Guest ...{phone[-4:]}",
-                "villa_code": c.get("villa_code"),
-                "total_bookings": orders,
-                "paid_bookings": paid,
-                "open_issues": issues,
-                "last_rating": last_rating,
-                "first_contact": first_contact.isoformat() if isinstance(first_contact, datetime) else None,
-                "last_active": last_active.isoformat() if isinstance(last_active, datetime) else None,
-            })
+        # One round-trip: counts, latest rating and passport name are joined server-side
+        raw = await customer_collection.aggregate(_customer_rollup_pipeline(query, limit)).to_list(limit)
+        customers = [_customer_row(c) for c in raw]
 
         return {"success": True, "customers": customers, "total": len(customers)}
     except Exception as e:
@@ -3,7 +3,9 @@ from app.schemas.ai_response import ChatbotQuery
 from fastapi import HTTPException
 from app.services.openai_client import client
 from app.utils.chat_memory import get_conversation_history, trim_history, save_message
-from app.services.pinconeservice import get_index
+from app.services.prompt_packer import prompt_packer
+from app.services.rag_service import rag_service
+from app.services.embedding_service import embedding_service
 from app.settings.config import settings
 
 
@@ -17,27 +19,18 @@ async def chat_endpoint(request: ChatbotQuery, user_id: str):
     if not user_query:
         raise HTTPException(status_code=400, detail="No query provided.")
 
-    index = get_index(THINGS_TO_DO_INDEX)
-
-    chat_history = get_conversation_history(user_id)
+    chat_history = await get_conversation_history(user_id)
     conversation = trim_history(chat_history + [{"role": "user", "content": user_query}])
 
-    embed_response = await client.embeddings.create(
-        input=user_query,
-        model="text-embedding-ada-002"
-    )
-    query_vector = embed_response.data[0].embedding
-    query_response = index.query(
-        vector=query_vector,
-        top_k=5,
-        include_metadata=True
-    )
-    matches = query_response.get("matches", [])
+    query_vector = (await embedding_service.embed(user_query)).tolist()
+    matches = await rag_service.query_index(THINGS_TO_DO_INDEX, query_vector, top_k=5)
     if not matches:
         context = ""
     else:
         context_chunks = [match["metadata"].get("text", "") for match in matches]
         context = "\n\n".join(context_chunks)
+    packed = await prompt_packer.pack_for_user(user_id, conversation, context)
+    conversation, context = packed.history_text, packed.rag
     messages = [
         {
             "role": "system",
@@ -4,9 +4,12 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 from app.db.session import db
 from app.utils.auth import requires_role
-from app.services.openai_client import client
+from app.services.embedding_service import embedding_service
 from app.services.pinconeservice import get_index
+from app.services.local_vector_index import local_vector_store
+from app.services.semantic_cache import semantic_cache
 import uuid
+import asyncio
 
 router = APIRouter(prefix="/faq-admin", tags=["FAQ Admin"])
 faq_collection = db["villa_faqs"]
@@ -37,23 +40,23 @@ async def add_custom_faq(faq: FAQCreate, user: dict = Depends(requires_role("sta
 
     try:
         # Encode into Vector
-        embed = await client.embeddings.create(input=full_text, model="text-embedding-ada-002")
-        vector = embed.data[0].embedding
+        vector = (await embedding_service.embed(full_text)).tolist()
         
         # Upsert into Pinecone
-        index = get_index("villa-faqs")
+        record = {
+            "id": point_id,
+            "values": vector,
+            "metadata": {
+                "text": full_text,
+                "type": "custom_faq",
+                "villa_code": faq.villa_code
+            }
+        }
+        index = await asyncio.to_thread(get_index, "villa-faqs")
         if index:
-            index.upsert(
-                vectors=[{
-                    "id": point_id,
-                    "values": vector,
-                    "metadata": {
-                        "text": full_text,
-                        "type": "custom_faq",
-                        "villa_code": faq.villa_code
-                    }
-                }]
-            )
+            await asyncio.to_thread(index.upsert, vectors=[record])
+            if local_vector_store.enabled:
+                await asyncio.to_thread(local_vector_store.apply_writes, "villa-faqs", [record])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pinecone Vector Error: {str(e)}")
 
@@ -68,6 +71,7 @@ async def add_custom_faq(faq: FAQCreate, user: dict = Depends(requires_role("sta
     }
     
     res = await faq_collection.insert_one(doc)
+    semantic_cache.invalidate_villa(faq.villa_code)
     doc["id"] = str(res.inserted_id)
     doc.pop("_id", None)
     
@@ -106,12 +110,15 @@ async def delete_faq(faq_id: str, villa_code: str, user: dict = Depends(requires
         
         # Delete from Pinecone
         if pinecone_id:
-            index = get_index("villa-faqs")
+            index = await asyncio.to_thread(get_index, "villa-faqs")
             if index:
-                index.delete(ids=[pinecone_id])
+                await asyncio.to_thread(index.delete, ids=[pinecone_id])
+                if local_vector_store.enabled:
+                    await asyncio.to_thread(local_vector_store.apply_writes, "villa-faqs", [], [pinecone_id])
                 
         # Delete from MongoDB
         await faq_collection.delete_one({"_id": ObjectId(faq_id)})
+        semantic_cache.invalidate_villa(doc.get("villa_code") or villa_code)
         return {"message": "FAQ successfully removed from Chatbot memory."}
         
     except Exception as e:
@@ -16,7 +16,9 @@ async def health_check():
 
 @router.get("/health/ready")
 async def readiness_check():
-    """Readiness check - verifies database connectivity"""
+    """Readiness check - verifies database connectivity and reports catalog staleness"""
+    from app.services.menu_services import get_catalog_status
+    catalog = get_catalog_status()
     try:
         from app.db.session import db
         # Test database connection
@@ -24,6 +26,7 @@ async def readiness_check():
         return {
             "status": "ready",
             "database": "connected",
+            "catalog": catalog,
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -31,9 +34,64 @@ async def readiness_check():
             "status": "not_ready",
             "database": "disconnected",
             "error": str(e),
+            "catalog": catalog,
             "timestamp": datetime.utcnow().isoformat()
         }
 
+@router.get("/health/whatsapp")
+async def whatsapp_transport_metrics():
+    """Connection pool, outbound queue and rate limiter metrics for WhatsApp sends"""
+    from app.services.whatsapp_transport import whatsapp_transport
+    from app.services.whatsapp_queue import whatsapp_queue
+    try:
+        queue = await whatsapp_queue.metrics()
+    except Exception as e:
+        queue = {"error": str(e)}
+    return {
+        "transport": whatsapp_transport.metrics(),
+        "queue": queue,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/health/cache")
+async def result_cache_metrics():
+    """Hit rate and size of the dashboard/analytics result cache and the AI answer/embedding caches"""
+    from app.utils.result_cache import result_cache
+    from app.services.semantic_cache import semantic_cache
+    from app.utils.response_cache import language_lesson_cache
+    from app.services.embedding_service import embedding_service
+    return {
+        "result_cache": result_cache.metrics(),
+        "semantic_cache": semantic_cache.metrics(),
+        "language_lesson_cache": language_lesson_cache.metrics(),
+        "embedding_cache": embedding_service.metrics(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/health/intent")
+async def intent_engine_metrics():
+    """How many service-intent checks were decided locally vs escalated to the LLM"""
+    from app.services.ai_menu_generator import ai_menu_generator
+    return {
+        "intent": ai_menu_generator.intent_engine.metrics(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/health/rag")
+async def rag_metrics():
+    """Pinecone handle reuse, per-index query latency and sheet ingestion since startup"""
+    from app.services.pinconeservice import pinecone_gateway
+    from app.services.rag_service import rag_service
+    from app.services.rag_ingestion import rag_ingestion
+    from app.services.local_vector_index import local_vector_store
+    return {
+        "pinecone": pinecone_gateway.metrics(),
+        "query_latency": rag_service.metrics(),
+        "ingestion": rag_ingestion.metrics(),
+        "local_index": local_vector_store.metrics(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 @router.get("/health/live")
 async def liveness_check():
     """Liveness check - basic service health"""
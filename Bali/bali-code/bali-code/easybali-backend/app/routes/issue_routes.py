@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Form, UploadFile, File
 from app.services import issue_service
 from app.db.session import issue_collection   # canonical collection: db["issues"]
+from app.services.dashboard_stats import dashboard_stats
 from app.utils.bucket import upload_to_s3
 from typing import Optional
 from bson import ObjectId
@@ -78,6 +79,7 @@ async def update_issue_status(
 
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Issue not found")
+        dashboard_stats.touch()
 
         return {"status": "success", "message": f"Issue updated to {status}"}
     except HTTPException:
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
-from app.services.menu_services import get_main_menu, get_sub_menu, load_data_into_cache, cache, get_sub_category, get_service_items, get_service_overview, get_service_providers, get_order_service_sub_menu, get_restaurants_menu, get_villa_data, get_price_distribution
+from app.services.menu_services import get_main_menu, get_sub_menu, refresh_catalog, cache, get_sub_category, get_service_items, get_service_overview, get_service_providers, get_order_service_sub_menu, get_restaurants_menu, get_villa_data, get_price_distribution
+from app.services.sheet_versions import sheet_versions
 from app.models.villa_data import VillaData
 from app.services.google_sheets import get_workbook
 from app.utils.qrutils import generate_and_upload_qrcode
@@ -77,8 +78,13 @@ async def get_whatsapp_for_service_item(service_item_name: str):
 @router.post("/refresh", summary="Refresh Google Sheets data")
 async def refresh_data():
     try:
-        load_data_into_cache()
-        return {"message": "Data refreshed successfully", "last_updated": cache["last_updated"]}
+        changed = await refresh_catalog(force=True)
+        return {
+            "message": "Data refreshed successfully",
+            "last_updated": cache["last_updated"],
+            "changed_sheets": changed,
+            "versions": sheet_versions.describe(),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to refresh data: {e}")
 
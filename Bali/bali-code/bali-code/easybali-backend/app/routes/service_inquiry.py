@@ -10,9 +10,11 @@ from app.services.google_sheets_service import (
     get_categories
 )
 from app.services.payment_service import create_xendit_payment_with_distribution
-from app.models.order_summary import Order
+from app.models.order_summary import Order, amount_idr_from_price
 from app.utils.auth import get_current_user
 from app.db.session import order_collection
+from app.services.dashboard_stats import dashboard_stats
+from app.services.analytics_service import record_guest_order
 
 router = APIRouter(prefix="/services", tags=["Service Inquiry"])
 logger = logging.getLogger(__name__)
@@ -95,6 +97,7 @@ async def create_service_inquiry(
             "order_number": f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}",
             "service_name": service['service_name'],
             "price": service['price'],
+            "amount_idr": amount_idr_from_price(service['price']),
             "villa_code": service.get('villa_code', 'DEFAULT'),
             "service_provider_code": service.get('service_provider_code', 'DEFAULT'),
             "sender_id": inquiry_data['sender_id'],
@@ -109,6 +112,8 @@ async def create_service_inquiry(
         # Save order to database
         order = Order(**order_data)
         await order_collection.insert_one(order_data)
+        dashboard_stats.touch(order_data.get("villa_code"))
+        await record_guest_order(order_data)
         
         # 5. Notify Service Providers ONLY (No payment link yet)
         await notify_service_providers(service, order_data)
@@ -215,6 +220,7 @@ async def handle_provider_response(response_data: Dict[str, Any]):
                     "status": "provider_confirmed"
                 }}
             )
+            dashboard_stats.touch()
             
             # Send payment link to customer
             await send_payment_link_to_customer(order_number)
@@ -1,7 +1,9 @@
 from app.services.websocket_managerr import ConnectionManager
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status, BackgroundTasks
 from app.db.session import order_collection
-from app.models.order_summary import WebOrder, Order
+from app.services.dashboard_stats import dashboard_stats
+from app.services.analytics_service import record_guest_order
+from app.models.order_summary import WebOrder, Order, amount_idr_from_price
 from app.services.order_summary import get_next_order_id
 from app.services.payment_service import create_xendit_payment_with_distribution, update_order_with_payment_info
 import uuid
@@ -33,6 +35,7 @@ async def create_session(order_data: WebOrder, background_tasks: BackgroundTasks
         "price": order_data.price, 
         "original_price": original_price,
         "final_price": final_price, 
+        "amount_idr": amount_idr_from_price(final_price),
         "no_of_person": order_data.no_of_person,
         "phone_number": order_data.phone_number,
         "name": order_data.name,
@@ -42,6 +45,8 @@ async def create_session(order_data: WebOrder, background_tasks: BackgroundTasks
     }
 
     await order_collection.insert_one(order)
+    dashboard_stats.touch(order.get("villa_code"))
+    await record_guest_order(order)
     whatsapp_numbers = await fetch_whatsapp_numbers(order_data.service_name)
 
     for number in whatsapp_numbers:
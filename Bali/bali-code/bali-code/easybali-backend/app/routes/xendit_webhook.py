@@ -1,10 +1,12 @@
 import logging
 from app.db.session import order_collection
+from app.services.dashboard_stats import dashboard_stats
 from app.utils.whatsapp_func import notify_payment_completion, notify_payment_failure
 from app.services.payment_service import distribute_order_payments
 from app.services.invoice_generator import generate_and_upload_invoice
 from app.services.promo_service import increment_promo_usage
 from app.utils.whatsapp_func import send_invoice_and_handle_closure, send_whatsapp_message
+from app.services.whatsapp_queue import enqueue_whatsapp_message, PRIORITY_TRANSACTIONAL
 from app.services.websocket_managerr import ConnectionManager
 import datetime
 import asyncio
@@ -50,6 +52,7 @@ async def handle_xendit_webhook(webhook_data: dict):
                     }
                 }
             )
+            dashboard_stats.touch(order_data.get("villa_code"))
             logger.info(f"Order {order_number} payment status updated to completed")
 
             # Refresh order_data after payment update so confirmed_by_provider is guaranteed present
@@ -113,7 +116,7 @@ async def handle_xendit_webhook(webhook_data: dict):
                 # Primary: notify the SP who accepted the WhatsApp booking
                 sp_phone = order_data.get("confirmed_by_provider")
                 if sp_phone and str(sp_phone).isdigit():
-                    await send_whatsapp_message(sp_phone, sp_final_msg)
+                    await enqueue_whatsapp_message(sp_phone, sp_final_msg, priority=PRIORITY_TRANSACTIONAL)
                     logger.info(f"Post-payment SP notification sent to {sp_phone} for order {order_number}")
                 else:
                     # Fallback: look up SP phone numbers by service name (covers website orders)
@@ -122,7 +125,7 @@ async def handle_xendit_webhook(webhook_data: dict):
                         fallback_nums = await fetch_whatsapp_numbers(order_data.get("service_name", ""))
                         for _fnum in fallback_nums:
                             try:
-                                await send_whatsapp_message(_fnum, sp_final_msg)
+                                await enqueue_whatsapp_message(_fnum, sp_final_msg, priority=PRIORITY_TRANSACTIONAL)
                             except Exception:
                                 pass
                         if fallback_nums:
@@ -184,6 +187,7 @@ async def handle_xendit_webhook(webhook_data: dict):
                         }
                     }
                 )
+                dashboard_stats.touch()
                 
                 # ============ ENHANCED: Handle expired payments for both connections ============
                 order_data = await order_collection.find_one({"order_number": order_number})
@@ -216,6 +220,7 @@ async def handle_xendit_webhook(webhook_data: dict):
                         }
                     }
                 )
+                dashboard_stats.touch()
                 
                 # ============ ENHANCED: Handle failed payments for both connections ============
                 order_data = await order_collection.find_one({"order_number": order_number})
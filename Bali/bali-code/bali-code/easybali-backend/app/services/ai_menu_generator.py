@@ -2,8 +2,8 @@
 from typing import Dict, List, Optional, Any
 import re
 import json
-from app.services.menu_services import cache
 from app.services.openai_client import client
+from app.services.intent_engine import IntentEngine
 from app.settings.config import settings
 
 class AIMenuGenerator:
@@ -114,35 +114,15 @@ class AIMenuGenerator:
                 "keywords": ["laundry", "wash", "dry clean", "ironing"]
             }
         }
+        self.intent_engine = IntentEngine(self.service_categories)
     
     async def intelligent_service_check(self, query: str) -> Dict[str, Any]:
-        """Use AI to determine if user is requesting/discussing a specific service we offer."""
-        
-        our_services = []
-        try:
-            main_df = cache.get("main_menu_design")
-            design_df = cache.get("design_df")
-            
-            if main_df is not None and not main_df.empty and design_df is not None and not design_df.empty:
-                if "Menu Location" in main_df.columns and "Category" in design_df.columns:
-                    valid_sections = main_df[main_df["Menu Location"].isin(["Services", "Rental", "Rentals", "Discount & Promotions", "Recommendation"])]
-                    valid_cat_names = valid_sections["Title"].unique().tolist()
-                    
-                    if "Sub-category" in design_df.columns:
-                        mask = design_df["Category"].isin(valid_cat_names)
-                        relevant = design_df[mask]
-                        for _, row in relevant.drop_duplicates(subset=["Sub-category"]).iterrows():
-                            sub = row.get("Sub-category")
-                            if sub:
-                                our_services.append({"name": sub, "category": row.get("Category")})
-        except Exception as cache_err:
-            print(f"[intelligent_service_check] Cache read error (non-fatal): {cache_err}")
+        """Decide if user is requesting/discussing a specific service we offer (local tiers first, then AI)."""
+        local = await self.intent_engine.classify(query)
+        if local is not None:
+            return local
 
-        # Always include core hardcoded services to ensure reliability for Martial Arts, Photography, etc.
-        for _, info in self.service_categories.items():
-            if not any(s['name'].lower() == info["subcategory"].lower() for s in our_services):
-                our_services.append({"name": info["subcategory"], "category": info["category"]})
-        
+        our_services = self.intent_engine.offered_services()
         services_list = "\n".join([f"- {s['name']} ({s['category']})" for s in our_services])
         
         prompt = f"""You are a Concierge Service Matcher.
@@ -176,7 +156,7 @@ Return ONLY valid JSON:
                 temperature=0.1,
                 response_format={"type": "json_object"}
             )
-            return json.loads(response.choices[0].message.content)
+            return {**json.loads(response.choices[0].message.content), "source": "llm"}
         except Exception as e:
             print(f"[intelligent_service_check] Error: {e}")
             return {"is_service_request": False, "we_offer_it": False}
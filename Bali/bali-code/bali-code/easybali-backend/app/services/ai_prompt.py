@@ -1,16 +1,17 @@
 import json
 import logging
-import pandas as pd
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from fastapi import HTTPException
 from app.settings.config import settings
-from app.services.menu_services import cache
+from app.services.catalog_snapshot import context_terms, get_snapshot
 from app.services.openai_client import client
 from app.utils.chat_memory import get_conversation_history, trim_history, save_message
 from app.services.pinconeservice import get_index
 from app.utils.navigation_rules import rules
 from app.services.ai_menu_generator import ai_menu_generator
 from app.services.rag_service import rag_service
+from app.services.prompt_packer import prompt_packer
+from app.services.semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
@@ -134,51 +135,13 @@ class ConciergeAI:
         """Proxies to the unified RAG service"""
         return await rag_service.get_rag_context(query, chat_type, villa_code)
 
-    def get_sheet_context(self) -> str:
-        """INTERNAL DB FETCH (Priority 1)"""
-        context = ""
-        try:
-            # 1. AI Data Sheet (Core context)
-            if cache.get("ai_data_df") is not None and not cache["ai_data_df"].empty:
-                context += "--- ACTIVE SERVICES ---\n"
-                # Use all available active services for accuracy (usually < 200 items)
-                for _, row in cache["ai_data_df"].iterrows():
-                    context += f"- {row.get('Service Item')}: {row.get('Service Item Description')} Price: {row.get('Price (Service Item Button)')}\n"
-            
-            # 2. Archive Data Sheet (Deep context)
-            if cache.get("archive_df") is not None and not cache["archive_df"].empty:
-                context += "\n--- ARCHIVE DATA (Rentals & Legacy) ---\n"
-                arch_lines = []
-                # Increase visibility into archive for better rental identification
-                for _, row in cache["archive_df"].head(300).iterrows():
-                    valid = [f"{col}:{val}" for col, val in row.items() if pd.notna(val) and str(val).strip()]
-                    if valid: arch_lines.append(" | ".join(valid))
-                context += "\n".join(arch_lines) + "\n"
-
-            # 3. Price Diff / Pricing Tiers
-            for sheet_name, lbl in [("price_diff_df", "PRICE DIFF"), ("price_diff_sp_df", "PRICE DIFF SP")]:
-                if cache.get(sheet_name) is not None and not cache[sheet_name].empty:
-                    context += f"\n--- {lbl} ---\n"
-                    lines = []
-                    for _, row in cache[sheet_name].head(150).iterrows():
-                        valid = [f"{col}:{val}" for col, val in row.items() if pd.notna(val) and str(val).strip()]
-                        if valid: lines.append(" | ".join(valid))
-                    context += "\n".join(lines) + "\n"
-                    
-            # 4. Platform Design
-            if cache.get("platform_design_df") is not None and not cache["platform_design_df"].empty:
-                context += "\n--- PLATFORM DESIGN ---\n"
-                p_lines = []
-                for _, row in cache["platform_design_df"].head(50).iterrows():
-                    valid = [f"{col}:{val}" for col, val in row.items() if pd.notna(val) and str(val).strip()]
-                    if valid: p_lines.append(" | ".join(valid))
-                context += "\n".join(p_lines) + "\n"
-
-        except Exception as e:
-            logger.error(f"Sheet Context Compilation Error: {e}")
-            
-        # Ensure context doesn't explode in length (approx 12,000 chars safety cap)
-        return context[:14000]
+    def get_sheet_context(self, query: str = "") -> str:
+        """INTERNAL DB FETCH (Priority 1) — blocks pre-rendered per catalog version, filtered to the query."""
+        terms = context_terms(query)
+        intent = ai_menu_generator.detect_service_intent(query) if query else None
+        if intent:
+            terms |= context_terms(intent["subcategory"])
+        return get_snapshot().ai_context(terms)
 
     async def process_query(self, query: str, user_id: str, chat_type: str, language: str, villa_code: str = "WEB_VILLA_01") -> Dict[str, Any]:
         """
@@ -188,9 +151,8 @@ class ConciergeAI:
         """
         try:
             print(f"DEBUG: Processing query='{query}' chat_type='{chat_type}' user='{user_id}'")
-            history = get_conversation_history(user_id)
+            history = await get_conversation_history(user_id)
             conv = trim_history(history + [{"role": "user", "content": query}])
-            formatted_history = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in conv])
 
             # ─── SERVICE BOOKING INTERCEPT (Dynamic Mapping) ────────────────────────
             # Intercept service requests across all chat types for consistency
@@ -210,7 +172,7 @@ class ConciergeAI:
                 if query.lower() in ["hi", "hello", "hi there"]:
                     return self._passport_hi(user_id, language)
                 # Let general AI handle follow-up, but keep persona focused
-                resp = await self._call_openai(query, PERSONAS["passport-submission"], "", "", language, formatted_history, villa_code)
+                resp = await self._call_openai(query, PERSONAS["passport-submission"], "", "", language, conv, villa_code, user_id)
                 save_message(user_id, "user", query)
                 save_message(user_id, "assistant", resp)
                 return {"response": resp}
@@ -225,7 +187,7 @@ class ConciergeAI:
                     )
                     save_message(user_id, "assistant", txt)
                     return {"response": txt}
-                resp = await self._call_openai(query, PERSONAS["maintenance-issue"], "", "", language, formatted_history, villa_code)
+                resp = await self._call_openai(query, PERSONAS["maintenance-issue"], "", "", language, conv, villa_code, user_id)
                 save_message(user_id, "user", query)
                 save_message(user_id, "assistant", resp)
                 # Save to issues DB so it's visible in Maintenance Issues dashboard
@@ -247,6 +209,8 @@ class ConciergeAI:
                             "source": "web",
                             "timestamp": _dt.utcnow()
                         })
+                        from app.services.dashboard_stats import dashboard_stats
+                        dashboard_stats.touch(villa_code or "WEB_VILLA_01")
                     except Exception as _ie:
                         logger.error(f"Failed to save web maintenance issue to DB: {_ie}")
                 return {"response": resp}
@@ -255,14 +219,14 @@ class ConciergeAI:
             if chat_type == "voice-translator":
                 if query.lower() in ["hi", "hello", "hi there", "start"]:
                     return self._voice_translator_hi(user_id, language)
-                resp = await self._call_openai(query, PERSONAS["voice-translator"], "", "", language, formatted_history, villa_code)
+                resp = await self._call_openai(query, PERSONAS["voice-translator"], "", "", language, conv, villa_code, user_id)
                 save_message(user_id, "user", query)
                 save_message(user_id, "assistant", resp)
                 return {"response": resp}
 
             # ─── CURRENCY CONVERTER ────────────────────────────────────────────────
             if chat_type == "currency-converter":
-                resp = await self._call_openai(query, PERSONAS["currency-converter"], "", "", language, formatted_history, villa_code)
+                resp = await self._call_openai(query, PERSONAS["currency-converter"], "", "", language, conv, villa_code, user_id)
                 save_message(user_id, "user", query)
                 save_message(user_id, "assistant", resp)
                 return {"response": resp}
@@ -270,14 +234,19 @@ class ConciergeAI:
             # ─── PLAN MY TRIP ──────────────────────────────────────────────────────
             if chat_type == "plan-my-trip":
                 rag_ctx = await self.get_rag_context(query, chat_type, villa_code)
-                resp = await self._call_openai(query, PERSONAS["plan-my-trip"], "", rag_ctx, language, formatted_history, villa_code)
+                resp = await self._call_openai(query, PERSONAS["plan-my-trip"], "", rag_ctx, language, conv, villa_code, user_id)
                 save_message(user_id, "user", query)
                 save_message(user_id, "assistant", resp)
                 return {"response": resp}
 
             # ─── WHAT TO DO / EVENT CALENDAR / LOCAL GUIDE ────────────────────────
             if chat_type in ["what-to-do", "local-cuisine", "things-to-do-in-bali", "event-calender"]:
-                sheet_ctx = self.get_sheet_context()
+                cached, probe = await semantic_cache.lookup(query, chat_type, villa_code, language)
+                if cached:
+                    save_message(user_id, "user", query)
+                    save_message(user_id, "assistant", cached)
+                    return {"response": cached}
+                sheet_ctx = self.get_sheet_context(query)
                 # Inject real event calendar data from AI Material spreadsheet
                 if chat_type == "event-calender":
                     try:
@@ -288,16 +257,29 @@ class ConciergeAI:
                         logger.warning(f"Could not load event calendar context: {_ec_err}")
                 rag_ctx = await self.get_rag_context(query, chat_type, villa_code)
                 persona = PERSONAS.get(chat_type, PERSONAS["what-to-do"])
-                resp = await self._call_openai(query, persona, sheet_ctx, rag_ctx, language, formatted_history, villa_code)
+                # A cached answer must not depend on who asked: build it from the question alone
+                history, owner = (conv[-1:], None) if probe else (conv, user_id)
+                resp, tokens = await self._complete(query, persona, sheet_ctx, rag_ctx, language, history, villa_code, owner)
+                if tokens:
+                    semantic_cache.store(probe, resp, tokens)
                 save_message(user_id, "user", query)
                 save_message(user_id, "assistant", resp)
                 return {"response": resp}
 
             # General fallback with RAG
-            sheet_ctx = self.get_sheet_context()
+            cached, probe = await semantic_cache.lookup(query, chat_type, villa_code, language)
+            if cached:
+                save_message(user_id, "user", query)
+                save_message(user_id, "assistant", cached)
+                return {"response": cached}
+            sheet_ctx = self.get_sheet_context(query)
             rag_ctx = await self.get_rag_context(query, chat_type, villa_code)
             persona = PERSONAS.get(chat_type, PERSONAS["general"])
-            resp = await self._call_openai(query, persona, sheet_ctx, rag_ctx, language, formatted_history, villa_code)
+            # A cached answer must not depend on who asked: build it from the question alone
+            history, owner = (conv[-1:], None) if probe else (conv, user_id)
+            resp, tokens = await self._complete(query, persona, sheet_ctx, rag_ctx, language, history, villa_code, owner)
+            if tokens:
+                semantic_cache.store(probe, resp, tokens)
             save_message(user_id, "user", query)
             save_message(user_id, "assistant", resp)
             return {"response": resp}
@@ -309,8 +291,14 @@ class ConciergeAI:
                 fallback_text = "Halo! Saya pramutamu EASYBali Anda. Saat ini saya sedang mengalami sedikit masalah teknis, tetapi saya tetap di sini untuk membantu masa inap vila Anda. Apa yang bisa saya bantu?"
             return {"response": fallback_text}
 
-    async def _call_openai(self, query: str, persona: str, sheet_ctx: str, rag_ctx: str, language: str, history: str, villa_code: str) -> str:
-        """Centralised OpenAI call with a structured prompt."""
+    async def _call_openai(self, query: str, persona: str, sheet_ctx: str, rag_ctx: str, language: str, history: List[dict], villa_code: str, user_id: Optional[str] = None) -> str:
+        """Centralised OpenAI call with a structured prompt, packed into the context token budget."""
+        return (await self._complete(query, persona, sheet_ctx, rag_ctx, language, history, villa_code, user_id))[0]
+
+    async def _complete(self, query: str, persona: str, sheet_ctx: str, rag_ctx: str, language: str, history: List[dict], villa_code: str, user_id: Optional[str] = None) -> Tuple[str, int]:
+        """_call_openai returning (text, total tokens used); tokens is 0 when the call failed."""
+        packed = await prompt_packer.pack_for_user(user_id, history, rag_ctx, sheet_ctx)
+        sheet_ctx, rag_ctx = packed.sheet, packed.rag
         from app.services.menu_services import get_villa_info_by_code
         villa_info = await get_villa_info_by_code(villa_code)
         villa_context = ""
@@ -340,7 +328,7 @@ RULES:
 - Do NOT ask for information you already have.
 
 CONVERSATION HISTORY:
-{history}"""
+{packed.history_text}"""
         try:
             comp = await client.chat.completions.create(
                 model=settings.OPENAI_MODEL_NAME,
@@ -348,10 +336,11 @@ CONVERSATION HISTORY:
                 temperature=0.7,
                 max_tokens=600
             )
-            return comp.choices[0].message.content or "I'm here to help! How can I assist?"
+            usage = getattr(comp, "usage", None)
+            return comp.choices[0].message.content or "I'm here to help! How can I assist?", getattr(usage, "total_tokens", 0) or 0
         except Exception as e:
             logger.error(f"OpenAI call error: {e}")
-            return "I'm having a moment of difficulty. I'm still here — please go ahead and ask me anything!"
+            return "I'm having a moment of difficulty. I'm still here — please go ahead and ask me anything!", 0
 
     def _voice_translator_hi(self, user_id, lang):
         txt = "Halo! Saya mentor bahasa Anda. Mau belajar kata-kata keren dalam Bahasa Bali atau Indonesia hari ini? 🌴" if lang == "ID" else "Hi there! I'm your Language Mentor. Want to learn some cool Balinese or Indonesian phrases today? 🌴"
@@ -0,0 +1,324 @@
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo import ReplaceOne
+
+from app.db.session import db, order_collection
+from app.services.analytics_service import PAID_EXPR
+
+logger = logging.getLogger(__name__)
+
+ROLLING_REFRESH_SECONDS = 300
+RECOMPUTE_DEBOUNCE_SECONDS = 2.0
+RECONCILE_DAYS = 35
+RECONCILE_EVERY = timedelta(hours=24)
+META_ID = "_meta"
+DAY_FORMAT = "%Y-%m-%d"
+# Fields whose change moves an order between buckets or changes its contribution
+ROLLUP_FIELDS = {"status", "amount_idr", "villa_code", "service_name", "sender_id", "created_at"}
+
+# ── Guest sketches (HyperLogLog) ─────────────────────────────────────────────
+# Unique guests are not additive across days, so each bucket stores a 1 KiB
+# HyperLogLog sketch; merging is a register-wise max. p=10 gives ~3% error.
+
+HLL_P = 10
+HLL_M = 1 << HLL_P
+
+
+def hll_sketch(values: Iterable[Any]) -> bytes:
+    registers = bytearray(HLL_M)
+    for value in values:
+        if value is None or value == "":
+            continue
+        h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - HLL_P)
+        rest = h & ((1 << (64 - HLL_P)) - 1)
+        rank = (64 - HLL_P) - rest.bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+    return bytes(registers)
+
+
+def hll_merge(sketches: Iterable[Optional[bytes]]) -> bytes:
+    merged = bytearray(HLL_M)
+    for sketch in sketches:
+        if not sketch:
+            continue
+        for i, rank in enumerate(sketch):
+            if rank > merged[i]:
+                merged[i] = rank
+    return bytes(merged)
+
+
+def hll_count(sketch: bytes) -> int:
+    alpha = 0.7213 / (1 + 1.079 / HLL_M)
+    estimate = alpha * HLL_M * HLL_M / sum(2.0 ** -rank for rank in sketch)
+    zeros = sketch.count(0)
+    if estimate <= 2.5 * HLL_M and zeros:
+        # Small-range correction (linear counting)
+        estimate = HLL_M * math.log(HLL_M / zeros)
+    return int(round(estimate))
+
+
+def _day(dt: datetime) -> str:
+    return dt.strftime(DAY_FORMAT)
+
+
+class AnalyticsRollups:
+    """
+    Daily buckets behind the analytics dashboard.
+
+    `analytics_daily` holds one document per (day, villa_code, service_name)
+    with bookings, paid bookings, revenue (amount_idr), the amount sum/count for
+    average prices, the last booking time and a guest sketch. Date-range
+    queries read only the buckets in range and fold them in Python.
+
+    Buckets are recomputed from orders rather than $inc-ed, so duplicated
+    webhooks and replays cannot skew them:
+      - order inserts/status changes seen on a change stream mark their day dirty;
+      - today and yesterday are refreshed every ROLLING_REFRESH_SECONDS (covers
+        deployments without change streams);
+      - the trailing RECONCILE_DAYS are rebuilt, and empty buckets dropped,
+        once a day.
+    """
+
+    def __init__(self):
+        self.collection = db["analytics_daily"]
+        self.orders = order_collection
+        self._dirty: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = False
+        self._lock = asyncio.Lock()
+        self._maintained_at = time.monotonic()
+
+    # ── Recompute ─────────────────────────────────────────────────────────────
+
+    async def recompute(self, start_day: Optional[str] = None, end_day: Optional[str] = None):
+        """Rebuild buckets for [start_day, end_day] inclusive (whole history when both are None)."""
+        match: Dict[str, Any] = {"created_at": {"$type": "date"}}
+        if start_day:
+            match["created_at"]["$gte"] = datetime.strptime(start_day, DAY_FORMAT)
+        if end_day:
+            match["created_at"]["$lt"] = datetime.strptime(end_day, DAY_FORMAT) + timedelta(days=1)
+
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {
+                        "day": {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}},
+                        "villa": "$villa_code",
+                        "service": "$service_name",
+                    },
+                    "bookings": {"$sum": 1},
+                    "completed": {"$sum": {"$cond": [PAID_EXPR, 1, 0]}},
+                    "revenue": {"$sum": {"$cond": [PAID_EXPR, "$amount_idr", 0]}},
+                    "amount_sum": {"$sum": "$amount_idr"},
+                    "amount_count": {"$sum": {"$cond": [{"$isNumber": "$amount_idr"}, 1, 0]}},
+                    "guests": {"$addToSet": "$sender_id"},
+                    "last_booking": {"$max": "$created_at"},
+                }
+            },
+        ]
+
+        async with self._lock:
+            now = datetime.utcnow()
+            ops = []
+            ids = []
+            async for group in self.orders.aggregate(pipeline):
+                key = group["_id"]
+                bucket_id = f"{key['day']}|{key.get('villa')}|{key.get('service')}"
+                ids.append(bucket_id)
+                ops.append(ReplaceOne({"_id": bucket_id}, {
+                    "day": key["day"],
+                    "villa_code": key.get("villa"),
+                    "service_name": key.get("service"),
+                    "bookings": group["bookings"],
+                    "completed": group["completed"],
+                    "revenue": group["revenue"],
+                    "amount_sum": group["amount_sum"],
+                    "amount_count": group["amount_count"],
+                    "guests": hll_sketch(group["guests"]),
+                    "last_booking": group["last_booking"],
+                    "updated_at": now,
+                }, upsert=True))
+            if ops:
+                await self.collection.bulk_write(ops, ordered=False)
+
+            # Buckets in range with no orders left (e.g. after a correction)
+            stale: Dict[str, Any] = {"_id": {"$nin": ids}, "day": {"$exists": True}}
+            if start_day or end_day:
+                stale["day"] = {k: v for k, v in (("$gte", start_day), ("$lte", end_day)) if v}
+            await self.collection.delete_many(stale)
+        logger.info(f"📈 Analytics rollups rebuilt for {start_day or 'start'}..{end_day or 'today'} ({len(ops)} buckets)")
+
+    async def _reconcile_if_due(self):
+        """Full backfill on first run, trailing rebuild once a day, else refresh the last two days."""
+        self._maintained_at = time.monotonic()
+        meta = await self.collection.find_one({"_id": META_ID}) or {}
+        now = datetime.utcnow()
+        if not meta.get("backfilled_at"):
+            await self.recompute()
+            await self.collection.update_one(
+                {"_id": META_ID}, {"$set": {"backfilled_at": now, "reconciled_at": now}}, upsert=True
+            )
+        elif now - meta.get("reconciled_at", datetime.min) >= RECONCILE_EVERY:
+            await self.recompute(_day(now - timedelta(days=RECONCILE_DAYS)))
+            await self.collection.update_one({"_id": META_ID}, {"$set": {"reconciled_at": now}})
+        else:
+            await self.recompute(_day(now - timedelta(days=1)))
+
+    # ── Background maintenance ────────────────────────────────────────────────
+
+    def touch(self, created_at: Optional[datetime]):
+        """Mark the day an order belongs to as needing a rebuild."""
+        self._dirty.add(_day(created_at or datetime.utcnow()))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self.run())
+
+    async def _watch_orders(self):
+        """Mark days dirty from order inserts and rollup-relevant updates (needs a replica set; optional)."""
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        try:
+            async with self.orders.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    updated = change.get("updateDescription", {}).get("updatedFields", {})
+                    if change["operationType"] == "update" and not ROLLUP_FIELDS & {k.split(".")[0] for k in updated}:
+                        continue
+                    doc = change.get("fullDocument") or {}
+                    created_at = doc.get("created_at")
+                    if not isinstance(created_at, datetime) and doc.get("_id") is not None:
+                        created_at = doc["_id"].generation_time.replace(tzinfo=None)
+                    self.touch(created_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Orders change stream unavailable, relying on rolling refresh: {e}")
+
+    async def run(self):
+        watcher = asyncio.create_task(self._watch_orders())
+        try:
+            while True:
+                try:
+                    remaining = self._maintained_at + ROLLING_REFRESH_SECONDS - time.monotonic()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, remaining))
+                        await asyncio.sleep(RECOMPUTE_DEBOUNCE_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    days, self._dirty = self._dirty, set()
+                    if days:
+                        try:
+                            await self.recompute(min(days), max(days))
+                        except Exception:
+                            self._dirty |= days
+                            raise
+                    # By elapsed time, not on an idle timeout: steady order traffic
+                    # would otherwise postpone the daily reconcile forever
+                    if time.monotonic() - self._maintained_at >= ROLLING_REFRESH_SECONDS:
+                        await self._reconcile_if_due()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Analytics rollup refresh failed: {e}")
+        finally:
+            watcher.cancel()
+
+    async def _ensure_ready(self):
+        self._ensure_running()
+        if not self._ready:
+            await self._reconcile_if_due()
+            self._ready = True
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    async def _buckets(self, days: int, villa_code: Optional[str] = None) -> List[Dict[str, Any]]:
+        await self._ensure_ready()
+        query: Dict[str, Any] = {"day": {"$gte": _day(datetime.utcnow() - timedelta(days=days))}}
+        if villa_code:
+            query["villa_code"] = villa_code
+        return await self.collection.find(query).to_list(length=None)
+
+    @staticmethod
+    def _fold(buckets: List[Dict[str, Any]], key: str) -> Dict[Any, Dict[str, Any]]:
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for b in buckets:
+            g = groups.setdefault(b.get(key), {
+                "bookings": 0, "completed": 0, "revenue": 0, "amount_sum": 0, "amount_count": 0,
+                "sketches": [], "last_booking": None,
+            })
+            for field in ("bookings", "completed", "revenue", "amount_sum", "amount_count"):
+                g[field] += b.get(field) or 0
+            g["sketches"].append(b.get("guests"))
+            if b.get("last_booking") and (g["last_booking"] is None or b["last_booking"] > g["last_booking"]):
+                g["last_booking"] = b["last_booking"]
+        return groups
+
+    @staticmethod
+    def _rate(part: float, whole: float) -> float:
+        return round(part / whole * 100, 2) if whole else 0
+
+    async def get_villa_performance(self, villa_code: Optional[str] = None, days: int = 30) -> List[Dict[str, Any]]:
+        """Same shape as AnalyticsService.get_villa_performance, folded from daily buckets."""
+        results = []
+        for villa, g in self._fold(await self._buckets(days, villa_code), "villa_code").items():
+            results.append({
+                "villa_code": villa,
+                "total_bookings": g["bookings"],
+                "completed_bookings": g["completed"],
+                "total_revenue": g["revenue"],
+                "avg_booking_value": round(g["revenue"] / g["completed"], 2) if g["completed"] else 0,
+                "last_booking": g["last_booking"].isoformat() if g["last_booking"] else None,
+                "completion_rate": self._rate(g["completed"], g["bookings"]),
+                "unique_guest_count": hll_count(hll_merge(g["sketches"])),
+            })
+        return sorted(results, key=lambda r: r["total_revenue"], reverse=True)
+
+    async def get_service_analytics(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Same shape as AnalyticsService.get_service_analytics, folded from daily buckets."""
+        results = []
+        for service, g in self._fold(await self._buckets(days), "service_name").items():
+            results.append({
+                "service_name": service,
+                "total_bookings": g["bookings"],
+                "completed_bookings": g["completed"],
+                "total_revenue": g["revenue"],
+                "avg_price": round(g["amount_sum"] / g["amount_count"], 2) if g["amount_count"] else 0,
+                "completion_rate": self._rate(g["completed"], g["bookings"]),
+            })
+        return sorted(results, key=lambda r: r["total_revenue"], reverse=True)
+
+    async def get_daily_revenue(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Same shape as AnalyticsService.get_revenue_analytics(group_by="daily")."""
+        results = []
+        for day, g in sorted(self._fold(await self._buckets(days), "day").items()):
+            if not g["completed"]:
+                continue
+            results.append({
+                "date": day,
+                "revenue": g["revenue"],
+                "bookings": g["completed"],
+                "avg_booking_value": round(g["revenue"] / g["completed"], 2),
+            })
+        return results
+
+
+# Global instance
+analytics_rollups = AnalyticsRollups()
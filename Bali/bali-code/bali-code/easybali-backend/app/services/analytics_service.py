@@ -1,13 +1,25 @@
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-from app.db.session import db
+from app.db.session import db, order_collection
 
 logger = logging.getLogger(__name__)
 
+# Order statuses once the guest has paid (distribution runs after PAID)
+PAID_STATUSES = ["PAID", "funds_distributed", "distribution_failed"]
+PAID_EXPR = {"$in": ["$status", PAID_STATUSES]}
+# `migrations` doc marking the one-off guest_first_seen backfill as done
+FIRST_SEEN_MIGRATION_ID = "guest_first_seen_backfill"
+
 class AnalyticsService:
     """Service for generating analytics and reports"""
     
+    def __init__(self):
+        self.orders = order_collection
+        self.first_seen = db["guest_first_seen"]
+        self.migrations = db["migrations"]
+        self._first_seen_ready = False
+    
     async def get_villa_performance(
         self,
         villa_code: Optional[str] = None,
@@ -42,14 +54,14 @@ class AnalyticsService:
                         "total_bookings": {"$sum": 1},
                         "completed_bookings": {
                             "$sum": {
-                                "$cond": [{"$eq": ["$status", "payment_completed"]}, 1, 0]
+                                "$cond": [PAID_EXPR, 1, 0]
                             }
                         },
                         "total_revenue": {
                             "$sum": {
                                 "$cond": [
-                                    {"$eq": ["$status", "payment_completed"]},
-                                    {"$toInt": {"$arrayElemAt": [{"$split": ["$price", " "]}, 1]}},
+                                    PAID_EXPR,
+                                    "$amount_idr",
                                     0
                                 ]
                             }
@@ -58,8 +70,8 @@ class AnalyticsService:
                         "avg_booking_value": {
                             "$avg": {
                                 "$cond": [
-                                    {"$eq": ["$status", "payment_completed"]},
-                                    {"$toInt": {"$arrayElemAt": [{"$split": ["$price", " "]}, 1]}},
+                                    PAID_EXPR,
+                                    "$amount_idr",
                                     None
                                 ]
                             }
@@ -83,14 +95,14 @@ class AnalyticsService:
                 {"$sort": {"total_revenue": -1}}
             ]
             
-            results = await db["orders"].aggregate(pipeline).to_list(length=None)
+            results = await self.orders.aggregate(pipeline).to_list(length=None)
             
             # Format results
             for result in results:
                 result["villa_code"] = result.pop("_id")
                 if result.get("last_booking"):
                     result["last_booking"] = result["last_booking"].isoformat()
-                result["avg_booking_value"] = round(result.get("avg_booking_value", 0), 2)
+                result["avg_booking_value"] = round(result.get("avg_booking_value") or 0, 2)
             
             return results
             
@@ -122,22 +134,20 @@ class AnalyticsService:
                         "total_bookings": {"$sum": 1},
                         "completed_bookings": {
                             "$sum": {
-                                "$cond": [{"$eq": ["$status", "payment_completed"]}, 1, 0]
+                                "$cond": [PAID_EXPR, 1, 0]
                             }
                         },
                         "total_revenue": {
                             "$sum": {
                                 "$cond": [
-                                    {"$eq": ["$status", "payment_completed"]},
-                                    {"$toInt": {"$arrayElemAt": [{"$split": ["$price", " "]}, 1]}},
+                                    PAID_EXPR,
+                                    "$amount_idr",
                                     0
                                 ]
                             }
                         },
                         "avg_price": {
-                            "$avg": {
-                                "$toInt": {"$arrayElemAt": [{"$split": ["$price", " "]}, 1]}
-                            }
+                            "$avg": "$amount_idr"
                         }
                     }
                 },
@@ -157,10 +167,10 @@ class AnalyticsService:
                 {"$sort": {"total_revenue": -1}}
             ]
             
-            results = await db["orders"].aggregate(pipeline).to_list(length=None)
+            results = await self.orders.aggregate(pipeline).to_list(length=None)
             
             for result in results:
-                result["avg_price"] = round(result.get("avg_price", 0), 2)
+                result["avg_price"] = round(result.get("avg_price") or 0, 2)
             
             return results
             
@@ -198,7 +208,7 @@ class AnalyticsService:
                 {
                     "$match": {
                         "created_at": {"$gte": start_date},
-                        "status": "payment_completed"
+                        "status": {"$in": PAID_STATUSES}
                     }
                 },
                 {
@@ -209,9 +219,7 @@ class AnalyticsService:
                                 "date": "$created_at"
                             }
                         },
-                        "revenue": {
-                            "$toInt": {"$arrayElemAt": [{"$split": ["$price", " "]}, 1]}
-                        }
+                        "revenue": {"$ifNull": ["$amount_idr", 0]}
                     }
                 },
                 {
@@ -231,10 +239,10 @@ class AnalyticsService:
                 {"$sort": {"date": 1}}
             ]
             
-            results = await db["orders"].aggregate(pipeline).to_list(length=None)
+            results = await self.orders.aggregate(pipeline).to_list(length=None)
             
             for result in results:
-                result["avg_booking_value"] = round(result.get("avg_booking_value", 0), 2)
+                result["avg_booking_value"] = round(result.get("avg_booking_value") or 0, 2)
             
             return results
             
@@ -242,6 +250,70 @@ class AnalyticsService:
             logger.error(f"Failed to get revenue analytics: {str(e)}")
             return []
     
+    # ── Guest cohorts ─────────────────────────────────────────────────────────
+
+    async def record_guest_order(self, order: Dict[str, Any]):
+        """
+        Keep guest_first_seen current on order insert: one document per guest
+        holding the time of their first order ($min, so replays and out-of-order
+        inserts are harmless).
+        """
+        sender_id = order.get("sender_id")
+        if not sender_id:
+            return
+        try:
+            await self.first_seen.update_one(
+                {"_id": sender_id},
+                {"$min": {"first_seen_at": order.get("created_at") or datetime.utcnow()}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.error(f"Failed to record first_seen_at for {sender_id}: {str(e)}")
+
+    async def backfill_guest_first_seen(self):
+        """Rebuild guest_first_seen from order history entirely inside Mongo ($merge)."""
+        pipeline = [
+            {"$match": {"sender_id": {"$nin": [None, ""]}}},
+            {
+                "$group": {
+                    "_id": "$sender_id",
+                    # Orders without created_at fall back to the ObjectId timestamp
+                    "first_seen_at": {"$min": {"$ifNull": ["$created_at", {"$toDate": "$_id"}]}}
+                }
+            },
+            {
+                "$merge": {
+                    "into": self.first_seen.name,
+                    "on": "_id",
+                    "whenMatched": [
+                        {"$set": {"first_seen_at": {"$min": ["$first_seen_at", "$$new.first_seen_at"]}}}
+                    ],
+                    "whenNotMatched": "insert"
+                }
+            }
+        ]
+        await self.orders.aggregate(pipeline).to_list(length=None)
+        logger.info("Backfilled guest_first_seen from order history")
+
+    async def _ensure_first_seen(self):
+        """
+        Run the history backfill once per database. Gated on a `migrations`
+        marker rather than an empty collection: orders placed right after the
+        deploy already add rows, which must not stop the backfill. The $merge
+        takes the $min, so a concurrent run from another worker is harmless.
+        """
+        if self._first_seen_ready:
+            return
+        marker = await self.migrations.find_one({"_id": FIRST_SEEN_MIGRATION_ID})
+        if not (marker or {}).get("completed_at"):
+            await self.backfill_guest_first_seen()
+            await self.migrations.update_one(
+                {"_id": FIRST_SEEN_MIGRATION_ID},
+                {"$set": {"completed_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        self._first_seen_ready = True
+
     async def get_guest_analytics(
         self,
         days: int = 30
@@ -249,6 +321,10 @@ class AnalyticsService:
         """
         Get guest-related analytics
         
+        Guests active in the window are grouped server-side and joined to
+        guest_first_seen: a guest is new if their first order falls inside
+        the window, returning otherwise. Only the three counts leave Mongo.
+        
         Args:
             days: Number of days to analyze
             
@@ -257,58 +333,46 @@ class AnalyticsService:
         """
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
+            await self._ensure_first_seen()
             
-            # Total guests and new guests
             pipeline = [
-                {"$match": {"created_at": {"$gte": start_date}}},
+                {"$match": {"created_at": {"$gte": start_date}, "sender_id": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$sender_id", "first_in_window": {"$min": "$created_at"}}},
+                {
+                    "$lookup": {
+                        "from": self.first_seen.name,
+                        "localField": "_id",
+                        "foreignField": "_id",
+                        "as": "seen"
+                    }
+                },
+                {
+                    "$project": {
+                        # Guests not yet in guest_first_seen count as first seen in this window
+                        "is_new": {
+                            "$gte": [
+                                {"$ifNull": [{"$first": "$seen.first_seen_at"}, "$first_in_window"]},
+                                start_date
+                            ]
+                        }
+                    }
+                },
                 {
                     "$group": {
                         "_id": None,
-                        "total_guests": {"$addToSet": "$sender_id"},
-                        "returning_guests": {
-                            "$addToSet": {
-                                "$cond": [
-                                    {
-                                        "$gt": [
-                                            {
-                                                "$size": {
-                                                    "$filter": {
-                                                        "input": await db["orders"].find({
-                                                            "sender_id": "$sender_id",
-                                                            "created_at": {"$lt": start_date}
-                                                        }).to_list(length=None),
-                                                        "cond": {"$expr": True}
-                                                    }
-                                                }
-                                            },
-                                            0
-                                        ]
-                                    },
-                                    "$sender_id",
-                                    None
-                                ]
-                            }
-                        }
+                        "total_guest_count": {"$sum": 1},
+                        "new_guest_count": {"$sum": {"$cond": ["$is_new", 1, 0]}}
                     }
                 },
                 {
                     "$addFields": {
-                        "total_guest_count": {"$size": "$total_guests"},
-                        "new_guest_count": {
-                            "$size": {
-                                "$filter": {
-                                    "input": "$total_guests",
-                                    "cond": {"$not": {"$in": ["$$this", "$returning_guests"]}}
-                                }
-                            }
-                        },
-                        "returning_guest_count": {"$size": "$returning_guests"}
+                        "returning_guest_count": {"$subtract": ["$total_guest_count", "$new_guest_count"]}
                     }
                 },
-                {"$project": {"_id": 0, "total_guests": 0, "returning_guests": 0}}
+                {"$project": {"_id": 0}}
             ]
             
-            result = await db["orders"].aggregate(pipeline).to_list(length=1)
+            result = await self.orders.aggregate(pipeline).to_list(length=1)
             
             return result[0] if result else {
                 "total_guest_count": 0,
@@ -341,22 +405,21 @@ class AnalyticsService:
             start_date = datetime.utcnow() - timedelta(days=days)
             
             pipeline = [
-                {"$match": {"created_at": {"$gte": start_date}}},
-                {"$match": {"promo_code": {"$exists": True, "$ne": None}}},
+                {"$match": {"created_at": {"$gte": start_date}, "promo_code": {"$type": "string"}}},
                 {
                     "$group": {
                         "_id": "$promo_code",
                         "usage_count": {"$sum": 1},
                         "completed_usage": {
                             "$sum": {
-                                "$cond": [{"$eq": ["$status", "payment_completed"]}, 1, 0]
+                                "$cond": [PAID_EXPR, 1, 0]
                             }
                         },
                         "total_discount": {
                             "$sum": {
                                 "$cond": [
-                                    {"$eq": ["$status", "payment_completed"]},
-                                    {"$toInt": {"$arrayElemAt": [{"$split": ["$price", " "]}, 1]}},
+                                    PAID_EXPR,
+                                    "$discount_amount",
                                     0
                                 ]
                             }
@@ -379,7 +442,7 @@ class AnalyticsService:
                 {"$sort": {"usage_count": -1}}
             ]
             
-            results = await db["orders"].aggregate(pipeline).to_list(length=None)
+            results = await self.orders.aggregate(pipeline).to_list(length=None)
             
             return results
             
@@ -405,3 +468,6 @@ async def get_guest_analytics(days: int = 30):
 
 async def get_promo_analytics(days: int = 30):
     return await analytics_service.get_promo_analytics(days)
+
+async def record_guest_order(order: Dict[str, Any]):
+    await analytics_service.record_guest_order(order)
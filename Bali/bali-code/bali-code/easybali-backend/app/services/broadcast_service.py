@@ -0,0 +1,319 @@
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from app.db.session import db, villa_code_collection, content_collection
+from app.services.whatsapp_queue import whatsapp_queue, PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+RESOLVE_BATCH = 500
+JOB_LEASE_SECONDS = 120
+ACTIVE_STATUSES = ["resolving", "sending"]
+
+
+class BroadcastExecutor:
+    """
+    Background fan-out of content broadcasts.
+
+    A job moves resolving -> sending -> completed:
+      - resolving: recipients are streamed from villa-codes (or the custom list)
+        and upserted into broadcast_recipients; the unique (job_id, recipient_id)
+        index makes this deduplicating and safe to re-run after a restart.
+      - sending: pending recipients are handed to the outbound WhatsApp queue
+        (bulk lane) `concurrency` at a time.
+      - completed: once every recipient is settled, reported back by the queue.
+
+    Jobs hold a lease while a process works on them, so after a crash another
+    process (or the same one on restart) resumes where it stopped.
+    """
+
+    def __init__(self, concurrency: int = BROADCAST_CONCURRENCY):
+        self.jobs = db["broadcast_jobs"]
+        self.recipients = db["broadcast_recipients"]
+        self.contacts = villa_code_collection
+        self.queue = whatsapp_queue
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._running: Dict[str, asyncio.Task] = {}
+        self._listening = False
+
+    # ── Job lifecycle ─────────────────────────────────────────────────────────
+
+    async def create_job(self, content_id: str, message_body: str, target: str,
+                         villa_code: Optional[str] = None, recipients: Optional[List[str]] = None,
+                         channel: str = "whatsapp", created_by: str = "admin") -> str:
+        """Record a broadcast and start it in the background; returns the job id."""
+        now = datetime.utcnow()
+        job = {
+            "content_id": content_id,
+            "message_body": message_body,
+            "channel": channel,
+            "target": target,
+            "villa_code": villa_code,
+            "custom_recipients": recipients or [],
+            "status": "resolving",
+            "total": 0,
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+        }
+        result = await self.jobs.insert_one(job)
+        job_id = str(result.inserted_id)
+        self.start(job_id)
+        return job_id
+
+    def start(self, job_id: str):
+        self._listen()
+        task = self._running.get(job_id)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self.run_job(job_id))
+        self._running[job_id] = task
+        task.add_done_callback(lambda _: self._running.pop(job_id, None))
+
+    def _listen(self):
+        if not self._listening:
+            self.queue.on_settled(self._on_message_settled)
+            self._listening = True
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {
+                "_id": ObjectId(job_id),
+                "status": {"$in": ACTIVE_STATUSES},
+                "$or": [
+                    {"lease_owner": self.worker_id},
+                    {"lease_expires_at": None},
+                    {"lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {"$set": {
+                "lease_owner": self.worker_id,
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _renew(self, job_id: ObjectId):
+        await self.jobs.update_one(
+            {"_id": job_id, "lease_owner": self.worker_id},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}},
+        )
+
+    async def run_job(self, job_id: str):
+        job = await self._claim(job_id)
+        if job is None:
+            return
+        try:
+            if job["status"] == "resolving":
+                total = await self._resolve_recipients(job)
+                status = "sending" if total else "completed"
+                update = {"status": status, "total": total, "updated_at": datetime.utcnow()}
+                if not total:
+                    update["completed_at"] = datetime.utcnow()
+                await self.jobs.update_one({"_id": job["_id"]}, {"$set": update})
+                logger.info(f"📣 Broadcast {job_id}: {total} recipients resolved")
+                if not total:
+                    return
+                job.update(update)
+            await self._fan_out(job)
+            await self.jobs.update_one({"_id": job["_id"]}, {"$set": {"fanned_out_at": datetime.utcnow()}})
+            logger.info(f"📣 Broadcast {job_id}: all recipients queued")
+        except Exception as e:
+            # Lease runs out and the job is resumed later
+            logger.error(f"Broadcast {job_id} interrupted: {e}")
+        finally:
+            await self.jobs.update_one(
+                {"_id": job["_id"], "lease_owner": self.worker_id},
+                {"$unset": {"lease_owner": "", "lease_expires_at": ""}},
+            )
+
+    async def resume_pending(self, interval: float = JOB_LEASE_SECONDS):
+        """Restart jobs left unfinished by a restart or by another replica that died."""
+        # Any process draining the queue must report broadcast deliveries
+        self._listen()
+        while True:
+            try:
+                now = datetime.utcnow()
+                cursor = self.jobs.find(
+                    {
+                        "status": {"$in": ACTIVE_STATUSES},
+                        "fanned_out_at": None,
+                        "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+                    },
+                    {"_id": 1},
+                )
+                async for job in cursor:
+                    logger.info(f"📣 Resuming broadcast {job['_id']}")
+                    self.start(str(job["_id"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Broadcast resume scan failed: {e}")
+            await asyncio.sleep(interval)
+
+    # ── Resolving ─────────────────────────────────────────────────────────────
+
+    async def _recipient_ids(self, job: Dict[str, Any]) -> AsyncIterator[str]:
+        if job["target"] == "custom":
+            for rid in job.get("custom_recipients", []):
+                yield str(rid).strip()
+            return
+        query = {"villa_code": job["villa_code"]} if job["target"] == "villa" else {}
+        cursor = self.contacts.find(query, {"sender_id": 1}).batch_size(RESOLVE_BATCH)
+        async for doc in cursor:
+            sid = doc.get("sender_id")
+            if sid:
+                yield str(sid)
+
+    async def _resolve_recipients(self, job: Dict[str, Any]) -> int:
+        job_id = job["_id"]
+        now = datetime.utcnow()
+        ops = []
+        async for rid in self._recipient_ids(job):
+            ops.append(UpdateOne(
+                {"job_id": job_id, "recipient_id": rid},
+                {"$setOnInsert": {"status": "pending", "created_at": now}},
+                upsert=True,
+            ))
+            if len(ops) >= RESOLVE_BATCH:
+                await self.recipients.bulk_write(ops, ordered=False)
+                await self._renew(job_id)
+                ops = []
+        if ops:
+            await self.recipients.bulk_write(ops, ordered=False)
+        return await self.recipients.count_documents({"job_id": job_id})
+
+    # ── Sending ───────────────────────────────────────────────────────────────
+
+    async def _fan_out(self, job: Dict[str, Any]):
+        job_id = job["_id"]
+        # Recipients caught mid-enqueue by a crash: finish them without double-sending
+        async for rec in self.recipients.find({"job_id": job_id, "status": "enqueuing"}):
+            existing = await self.queue.collection.find_one(
+                {"broadcast_job_id": job_id, "recipient_id": rec["recipient_id"]}, {"_id": 1}
+            )
+            if existing:
+                await self._mark_queued(job_id, rec["recipient_id"], existing["_id"])
+            else:
+                await self._enqueue_one(job, rec["recipient_id"])
+
+        batch: List[str] = []
+        async for rec in self.recipients.find({"job_id": job_id, "status": "pending"}, {"recipient_id": 1}):
+            batch.append(rec["recipient_id"])
+            if len(batch) >= self.concurrency:
+                await self._enqueue_batch(job, batch)
+                batch = []
+        if batch:
+            await self._enqueue_batch(job, batch)
+
+    async def _enqueue_batch(self, job: Dict[str, Any], recipient_ids: List[str]):
+        claimed = await asyncio.gather(*(self._claim_recipient(job["_id"], rid) for rid in recipient_ids))
+        await asyncio.gather(*(self._enqueue_one(job, rid) for rid, ok in zip(recipient_ids, claimed) if ok))
+        await self._renew(job["_id"])
+
+    async def _claim_recipient(self, job_id: ObjectId, recipient_id: str) -> bool:
+        rec = await self.recipients.find_one_and_update(
+            {"job_id": job_id, "recipient_id": recipient_id, "status": "pending"},
+            {"$set": {"status": "enqueuing"}},
+        )
+        return rec is not None
+
+    async def _enqueue_one(self, job: Dict[str, Any], recipient_id: str):
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": recipient_id,
+            "type": "text",
+            "text": {"body": job["message_body"]},
+        }
+        message_id = await self.queue.enqueue(
+            recipient_id, payload, message_type="text", priority=PRIORITY_BULK,
+            extra={"broadcast_job_id": job["_id"]},
+        )
+        await self._mark_queued(job["_id"], recipient_id, message_id)
+
+    async def _mark_queued(self, job_id: ObjectId, recipient_id: str, message_id: Any):
+        await self.recipients.update_one(
+            {"job_id": job_id, "recipient_id": recipient_id},
+            {"$set": {"status": "queued", "queue_message_id": str(message_id), "queued_at": datetime.utcnow()}},
+        )
+        await self.jobs.update_one({"_id": job_id}, {"$inc": {"queued": 1}})
+
+    # ── Delivery results ──────────────────────────────────────────────────────
+
+    async def _on_message_settled(self, msg: Dict[str, Any], status: str):
+        job_id = msg.get("broadcast_job_id")
+        if not job_id:
+            return
+        now = datetime.utcnow()
+        await self.recipients.update_one(
+            {"job_id": job_id, "recipient_id": msg["recipient_id"]},
+            {"$set": {"status": status, "settled_at": now}},
+        )
+        job = await self.jobs.find_one_and_update(
+            {"_id": job_id},
+            {"$inc": {status: 1}, "$set": {"updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job and job["status"] == "sending" and job["sent"] + job["failed"] >= job["total"]:
+            done = await self.jobs.find_one_and_update(
+                {"_id": job_id, "status": "sending"},
+                {"$set": {"status": "completed", "completed_at": now}},
+            )
+            if done:
+                await self._record_history(job)
+
+    async def _record_history(self, job: Dict[str, Any]):
+        target = job["target"] if job["target"] != "villa" else f"villa:{job['villa_code']}"
+        await content_collection.update_one(
+            {"_id": ObjectId(job["content_id"])},
+            {"$push": {"send_history": {
+                "sent_at": job["created_at"],
+                "sent_by": job["created_by"],
+                "channel": job["channel"],
+                "target": target,
+                "recipient_count": job["sent"],
+                "failed_count": job["failed"],
+                "job_id": str(job["_id"]),
+            }}},
+        )
+        logger.info(f"📣 Broadcast {job['_id']} completed: {job['sent']} sent, {job['failed']} failed")
+
+    # ── Progress ──────────────────────────────────────────────────────────────
+
+    async def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.jobs.find_one({"_id": ObjectId(job_id)})
+        if not job:
+            return None
+        settled = job["sent"] + job["failed"]
+        return {
+            "job_id": str(job["_id"]),
+            "content_id": job["content_id"],
+            "status": job["status"],
+            "total_recipients": job["total"],
+            "queued": job["queued"],
+            "sent": job["sent"],
+            "failed": job["failed"],
+            "remaining": max(job["total"] - settled, 0),
+            "percent": round(100 * settled / job["total"], 1) if job["total"] else (100.0 if job["status"] == "completed" else 0.0),
+            "created_at": job["created_at"].isoformat(),
+            "completed_at": job["completed_at"].isoformat() if job.get("completed_at") else None,
+        }
+
+
+# Global instance
+broadcast_executor = BroadcastExecutor()
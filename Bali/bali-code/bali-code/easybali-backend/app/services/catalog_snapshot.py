@@ -0,0 +1,548 @@
+import re
+import logging
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from app.services.sheet_versions import catalog_version
+from app.utils.data_processing import clean_dataframe
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_NON_DIGIT = re.compile(r"[^\d]")
+_WORD = re.compile(r"[a-z0-9]{3,}")
+
+# Fields copied out of the QR Codes sheet for get_villa_info_by_code
+_VILLA_INFO_FIELDS = {
+    "name": "Name of Villa",
+    "location": "Location",
+    "address": "Address",
+    "directions": "Directions",
+    "manager_name": "Manager",
+    "manager_number": "Manager Number",
+    "wifi_name": "WiFi Name",
+    "wifi_password": "WiFi Password",
+    "house_rules": "Rules",
+    "map_link": "Map Link",
+}
+
+
+def normalize_service_name(name: Any) -> str:
+    """Lowercase and strip everything except a-z/0-9 (used for fuzzy service matching)."""
+    return _NON_ALNUM.sub("", str(name).lower())
+
+
+def clean_price_digits(price: Any) -> str:
+    """Strip non-breaking spaces, commas and other garbage from a sheet price cell."""
+    if price is None or (not isinstance(price, str) and pd.isna(price)):
+        return "0"
+    cleaned = _NON_DIGIT.sub("", str(price))
+    return cleaned if cleaned else "0"
+
+
+# Internal DB blocks for ConciergeAI prompts: (cache key, header, row limit)
+_AI_CONTEXT_SECTIONS = (
+    ("ai_data_df", "--- ACTIVE SERVICES ---", None),
+    ("archive_df", "--- ARCHIVE DATA (Rentals & Legacy) ---", 300),
+    ("price_diff_df", "--- PRICE DIFF ---", 150),
+    ("price_diff_sp_df", "--- PRICE DIFF SP ---", 150),
+    ("platform_design_df", "--- PLATFORM DESIGN ---", 50),
+)
+# Always sent in full (matching rows first); the other sections only send matching rows
+_AI_CONTEXT_CORE = "--- ACTIVE SERVICES ---"
+_STOPWORDS = frozenset(
+    "the and for with you your are can what where when which who how any some this that there "
+    "have has want need like get please about from into near best good more most our".split()
+)
+
+
+def context_terms(text: Any) -> frozenset:
+    """Lowercased words (3+ chars, no stopwords) used to match queries against context rows."""
+    return frozenset(_WORD.findall(str(text).lower())) - _STOPWORDS
+
+
+def _present(value: Any) -> bool:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return False
+    return bool(str(value).strip())
+
+
+def _records(df: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+    if df is None or df.empty:
+        return []
+    return df.to_dict(orient="records")
+
+
+def _dedupe(rows: List[Dict[str, Any]], column: str) -> List[Dict[str, Any]]:
+    """Equivalent of DataFrame.drop_duplicates(subset=[column]) — first row wins."""
+    seen = set()
+    out = []
+    for row in rows:
+        key = row.get(column)
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(row)
+    return out
+
+
+def fill_gaps(values: List[List[Any]]) -> List[List[Any]]:
+    """Pad ragged rows to a rectangle, like gspread's get_all_values() does."""
+    width = max((len(row) for row in values), default=0)
+    return [list(row) + [""] * (width - len(row)) for row in values]
+
+
+def _freeze(groups: Dict[str, List[Dict[str, Any]]]) -> Mapping[str, Tuple[Mapping[str, Any], ...]]:
+    return MappingProxyType({
+        key: tuple(MappingProxyType(item) for item in items)
+        for key, items in groups.items()
+    })
+
+
+class CatalogSnapshot:
+    """
+    Immutable, pre-indexed view of the Google Sheets catalog.
+
+    Built once per refresh by refresh_catalog() and published with a single
+    reference swap, so request handlers answer menu/villa/provider lookups from
+    dict indexes instead of filtering DataFrames on every guest tap.
+    """
+
+    __slots__ = (
+        "built_at",
+        "frames",
+        "versions",
+        "version",
+        "main_menu",
+        "categories",
+        "categories_only",
+        "category_sections",
+        "order_services_menu",
+        "sub_categories",
+        "service_items",
+        "service_items_whatsapp",
+        "price_by_service",
+        "price_by_normalized",
+        "normalized_prices",
+        "provider_by_whatsapp",
+        "villa_by_code",
+        "villa_code_by_lower_code",
+        "villa_code_by_lower_name",
+        "villa_codes",
+        "villa_names",
+        "villa_count",
+        "ai_context_blocks",
+        "event_calendar_context",
+    )
+
+    def __init__(
+        self,
+        frames: Dict[str, Optional[pd.DataFrame]],
+        versions: Optional[Dict[str, int]] = None,
+        built_at: Optional[datetime] = None,
+    ):
+        self.built_at = built_at or datetime.now()
+        self.frames = MappingProxyType(dict(frames))
+        # Per-tab versions (cache key -> int) and a combined catalog version string
+        self.versions = MappingProxyType(dict(versions or {}))
+        self.version = catalog_version(self.versions)
+        self._index_menu(frames.get("menu_df"))
+        self._index_design(frames.get("design_df"))
+        self._index_services(frames.get("services_df"))
+        self._index_providers(frames.get("service_providers"))
+        self._index_villas(frames.get("villas_data"))
+        self._render_ai_context(frames)
+        self._render_event_calendar(frames.get("event_calendar_df"))
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("CatalogSnapshot is immutable")
+        object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        # MappingProxyType can't be pickled; ship plain dicts and re-freeze on arrival
+        return _restore_snapshot, ({name: _thaw(getattr(self, name)) for name in self.__slots__},)
+
+    # ── Builders ─────────────────────────────────────────────────────────────
+
+    def _index_menu(self, df):
+        main_menu = None
+        if df is not None and "Main Menu" in df.columns:
+            main_menu = tuple(df["Main Menu"].dropna().unique().tolist())
+        self.main_menu = main_menu
+
+    def _index_design(self, df):
+        if df is None:
+            self.categories = None
+            self.categories_only = None
+            self.category_sections = None
+            self.order_services_menu = None
+            self.sub_categories = None
+            return
+
+        rows = _records(df)
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_category.setdefault(row.get("Category"), []).append(row)
+
+        categories = []
+        categories_only = []
+        sections: Dict[str, List[Dict[str, Any]]] = {}
+        sub_categories: Dict[str, List[Dict[str, Any]]] = {}
+        for row in _dedupe(rows, "Category"):
+            name = row.get("Category")
+            members = by_category[name]
+            seen_pairs = set()
+            section_rows = []
+            for m in members:
+                pair = (m.get("Sub-category"), m.get("Sub-category Description WA"))
+                if pair in seen_pairs:
+                    continue
+                seen_pairs.add(pair)
+                section_rows.append(pair)
+            categories.append({
+                "title": name,
+                "description": row.get("Category Description WA"),
+                "sections": [
+                    {
+                        "id": str(sub).lower().replace(" ", "_"),
+                        "service_title": sub,
+                        "service_description": desc,
+                    }
+                    for sub, desc in section_rows
+                ],
+            })
+            categories_only.append({
+                "id": row.get("Category ID"),
+                "title": name,
+                "description": row.get("Category Description WA"),
+            })
+            sections[name] = [
+                {
+                    "id": str(sub).lower().replace(" ", "_"),
+                    "title": sub,
+                    "description": desc,
+                }
+                for sub, desc in section_rows
+            ]
+            sub_categories[name] = [
+                {
+                    "subcategory": m.get("Sub-category"),
+                    "description": m.get("Sub-category Description"),
+                    "picture": m.get("Sub-category Picture"),
+                    "button": m.get("Sub-category Button"),
+                }
+                for m in _dedupe(members, "Sub-category")
+            ]
+
+        self.categories = tuple(categories)
+        self.categories_only = tuple(MappingProxyType(c) for c in categories_only)
+        self.category_sections = _freeze(sections)
+        self.sub_categories = _freeze(sub_categories)
+        self.order_services_menu = tuple(
+            MappingProxyType({
+                "category": row.get("Category"),
+                "description": row.get("Category Description"),
+                "picture": row.get("Category Picture"),
+                "button": row.get("Category Button"),
+            })
+            for row in _dedupe(rows, "Category")
+        )
+
+    def _index_services(self, df):
+        if df is None:
+            self.service_items = None
+            self.service_items_whatsapp = None
+            self.price_by_service = None
+            self.price_by_normalized = None
+            self.normalized_prices = None
+            return
+
+        rows = _records(df)
+        by_sub: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_sub.setdefault(row.get("Sub-category"), []).append(row)
+
+        items: Dict[str, List[Dict[str, Any]]] = {}
+        wa_items: Dict[str, List[Dict[str, Any]]] = {}
+        for sub, members in by_sub.items():
+            unique = _dedupe(members, "Service Item")
+            items[sub] = [
+                {
+                    "service_item": r.get("Service Item"),
+                    "description": r.get("Service Item Description"),
+                    "picture": r.get("Image URL"),
+                    "button": r.get("Final Price (Service Item Button)"),
+                    "service_provider_code": r.get("Service Provider Number"),
+                }
+                for r in unique
+            ]
+            wa_items[sub] = [
+                {
+                    "title": r.get("Service Item"),
+                    "description": r.get("Service Item Description"),
+                    "button": r.get("Final Price (Service Item Button)"),
+                }
+                for r in unique
+            ]
+
+        price_by_service: Dict[str, str] = {}
+        price_by_normalized: Dict[str, str] = {}
+        normalized_prices = []
+        for row in rows:
+            name = row.get("Service Item")
+            price = clean_price_digits(row.get("Final Price (Service Item Button)"))
+            norm = normalize_service_name(name)
+            price_by_service.setdefault(name, price)
+            price_by_normalized.setdefault(norm, price)
+            normalized_prices.append((norm, price))
+
+        self.service_items = _freeze(items)
+        self.service_items_whatsapp = _freeze(wa_items)
+        self.price_by_service = MappingProxyType(price_by_service)
+        self.price_by_normalized = MappingProxyType(price_by_normalized)
+        self.normalized_prices = tuple(normalized_prices)
+
+    def _index_providers(self, df):
+        by_whatsapp: Dict[str, Any] = {}
+        for row in _records(df):
+            wa = row.get("WhatsApp")
+            if not isinstance(wa, str) or not wa:
+                continue
+            # "+62..." and "62..." are the same number for lookup purposes
+            key = wa[1:] if wa.startswith("+") else wa
+            by_whatsapp.setdefault(key, row.get("Number"))
+        self.provider_by_whatsapp = MappingProxyType(by_whatsapp)
+
+    def _index_villas(self, df):
+        rows = _records(df)
+        by_code: Dict[str, Mapping[str, Any]] = {}
+        by_lower_code: Dict[str, str] = {}
+        by_lower_name: Dict[str, str] = {}
+        codes = []
+        names = []
+        for row in rows:
+            raw_code = row.get("Number")
+            code = str(raw_code if raw_code is not None else "").strip()
+            name = str(row.get("Name of Villa", "")).strip().lower()
+            by_code.setdefault(raw_code, MappingProxyType(row))
+            if code:
+                by_lower_code.setdefault(code.lower(), code)
+                codes.append((code.lower(), code))
+            if name:
+                by_lower_name.setdefault(name, code)
+                names.append((name, code))
+        self.villa_by_code = MappingProxyType(by_code)
+        self.villa_code_by_lower_code = MappingProxyType(by_lower_code)
+        self.villa_code_by_lower_name = MappingProxyType(by_lower_name)
+        self.villa_codes = tuple(codes)
+        self.villa_names = tuple(names)
+        self.villa_count = len(rows)
+
+    def _render_ai_context(self, frames):
+        """Pre-render the ConciergeAI internal DB blocks; each line keeps its match terms."""
+        blocks = []
+        for cache_key, header, limit in _AI_CONTEXT_SECTIONS:
+            rows = _records(frames.get(cache_key))
+            if limit is not None:
+                rows = rows[:limit]
+            entries = []
+            for row in rows:
+                valid = [f"{col}:{val}" for col, val in row.items() if _present(val)]
+                if not valid:
+                    continue
+                if cache_key == "ai_data_df":
+                    line = (f"- {row.get('Service Item')}: {row.get('Service Item Description')} "
+                            f"Price: {row.get('Price (Service Item Button)')}")
+                else:
+                    line = " | ".join(valid)
+                entries.append((line, context_terms(" ".join(str(v) for v in row.values() if _present(v)))))
+            if entries:
+                blocks.append((header, tuple(entries)))
+        self.ai_context_blocks = tuple(blocks)
+
+    def _render_event_calendar(self, df):
+        rows = _records(df)
+        if not rows:
+            self.event_calendar_context = "No upcoming event data is currently available."
+            return
+        lines = ["Here are the upcoming events in Bali:"]
+        for row in rows:
+            name = str(row.get("Event Name", "")).strip()
+            if not name:
+                continue
+            date = str(row.get("Date", "")).strip()
+            time = str(row.get("Time", "")).strip()
+            location = str(row.get("Location", "")).strip()
+            description = str(row.get("Description", "")).strip()
+            notes = str(row.get("Additional Notes", "")).strip()
+            url = str(row.get("For more details (URL)", row.get("For more details", ""))).strip()
+            line = f"- {name}"
+            if date:
+                line += f" | {date}"
+            if time:
+                line += f" at {time}"
+            if location:
+                line += f" | {location}"
+            if description:
+                line += f"\n  {description}"
+            if notes:
+                line += f"\n  Note: {notes}"
+            if url and url.startswith("http"):
+                line += f"\n  More info: {url}"
+            lines.append(line)
+        self.event_calendar_context = "\n".join(lines)
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+
+    def service_price(self, service_name: str) -> Optional[str]:
+        """Cleaned price for a service: exact name, then normalized name, then substring match."""
+        price = self.price_by_service.get(service_name)
+        if price is not None:
+            return price
+        norm_input = normalize_service_name(service_name)
+        price = self.price_by_normalized.get(norm_input)
+        if price is not None:
+            return price
+        for norm_item, price in self.normalized_prices:
+            if norm_input in norm_item or norm_item in norm_input:
+                return price
+        return None
+
+    def provider_number(self, whatsapp_number: str) -> Optional[Any]:
+        return self.provider_by_whatsapp.get(whatsapp_number.lstrip("+"))
+
+    def villa_code_for(self, villa_name: str) -> Optional[str]:
+        search_input = villa_name.strip().lower()
+
+        # 1. By code — exact first, then code appearing as a word in the input ('villa V2')
+        code = self.villa_code_by_lower_code.get(search_input)
+        if code:
+            return code
+        padded = f" {search_input}"
+        for lower_code, code in self.villa_codes:
+            if f" {lower_code}" in padded:
+                return code
+
+        # 2. By name — exact match
+        code = self.villa_code_by_lower_name.get(search_input)
+        if code is not None:
+            return code
+
+        # 3. Input contains the name ('Villa Hassan Umalas')
+        for lower_name, code in self.villa_names:
+            if lower_name in search_input:
+                return code
+
+        # 4. Name contains the input (partial match fallback)
+        needle = villa_name.lower()
+        for lower_name, code in self.villa_names:
+            if needle in lower_name:
+                return code
+        return None
+
+    def ai_context(self, terms: frozenset = frozenset()) -> str:
+        """
+        Internal DB context for a query's terms (see context_terms). When any row
+        matches, ACTIVE SERVICES lists matching rows first and the other sections
+        send only their matching rows; otherwise every block is sent in full.
+        """
+        matched = {
+            header: [line for line, words in entries if words & terms]
+            for header, entries in self.ai_context_blocks
+        } if terms else {}
+        relevant = any(matched.values())
+        parts = []
+        for header, entries in self.ai_context_blocks:
+            if not relevant:
+                lines = [line for line, _ in entries]
+            elif header == _AI_CONTEXT_CORE:
+                hits = set(matched[header])
+                lines = matched[header] + [line for line, _ in entries if line not in hits]
+            else:
+                lines = matched[header]
+            if lines:
+                parts.append(header + "\n" + "\n".join(lines))
+        return "\n\n".join(parts)
+
+    def villa_record(self, villa_code: str) -> Optional[Mapping[str, Any]]:
+        return self.villa_by_code.get(villa_code)
+
+    def villa_info(self, villa_code: str) -> Optional[Dict[str, Any]]:
+        row = self.villa_by_code.get(villa_code)
+        if row is None:
+            return None
+        return {key: row.get(column) for key, column in _VILLA_INFO_FIELDS.items()}
+
+
+class _Proxied(dict):
+    """Picklable stand-in for a MappingProxyType while a snapshot crosses a process boundary."""
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return _Proxied({k: _thaw(v) for k, v in value.items()})
+    if isinstance(value, tuple):
+        return tuple(_thaw(v) for v in value)
+    return value
+
+
+def _refreeze(value):
+    if isinstance(value, _Proxied):
+        return MappingProxyType({k: _refreeze(v) for k, v in value.items()})
+    if isinstance(value, tuple):
+        return tuple(_refreeze(v) for v in value)
+    return value
+
+
+def _restore_snapshot(state: Dict[str, Any]) -> "CatalogSnapshot":
+    snapshot = CatalogSnapshot.__new__(CatalogSnapshot)
+    for name, value in state.items():
+        object.__setattr__(snapshot, name, _refreeze(value))
+    return snapshot
+
+
+def compile_catalog(changed_tabs, frames, versions):
+    """
+    Parse changed tabs and build the next snapshot. Runs in the catalog parse
+    process pool, so clean_dataframe's regex passes and the index build never
+    compete with request handlers for the serving process's GIL.
+
+    changed_tabs: [(sheet_name, cache_key, values, use_clean, digest)]
+    Returns ({cache_key: {"sheet", "hash"}}, CatalogSnapshot).
+    """
+    frames = dict(frames)
+    versions = dict(versions)
+    changes = {}
+    for sheet_name, cache_key, values, use_clean, digest in changed_tabs:
+        if use_clean:
+            frames[cache_key] = clean_dataframe(values)
+        else:
+            frames[cache_key] = pd.DataFrame(values[1:], columns=values[0])
+        changes[cache_key] = {"sheet": sheet_name, "hash": digest}
+        versions[cache_key] = versions.get(cache_key, 0) + 1
+    return changes, CatalogSnapshot(frames, versions)
+
+
+_EMPTY = CatalogSnapshot({})
+_current: CatalogSnapshot = _EMPTY
+
+
+def get_snapshot() -> CatalogSnapshot:
+    """Return the currently published snapshot (never None; empty before the first load)."""
+    return _current
+
+
+def publish_snapshot(snapshot: CatalogSnapshot) -> None:
+    """Atomically replace the published snapshot (a single reference assignment)."""
+    global _current
+    _current = snapshot
+    logger.info(f"📦 Catalog snapshot {snapshot.version} published ({snapshot.built_at.isoformat()})")
+
+
+def copy_items(items) -> List[Dict[str, Any]]:
+    """Hand callers mutable copies so they can never alter the shared snapshot."""
+    return [dict(item) for item in items]
@@ -0,0 +1,110 @@
+import os
+import mmap
+import logging
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import msgpack
+import pandas as pd
+
+from app.services.catalog_snapshot import CatalogSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout or the set of loaded tabs changes; older files are
+# ignored, never migrated (their stored revisions would skip downloading new tabs).
+# 2: Villa FAQs and Local Cuisine tabs added to the catalog
+FORMAT_VERSION = 2
+CATALOG_CACHE_PATH = os.getenv(
+    "CATALOG_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "easybali-catalog.msgpack"),
+)
+
+
+def _encode_frame(df: pd.DataFrame) -> Dict[str, Any]:
+    return {"columns": [str(c) for c in df.columns], "rows": df.values.tolist()}
+
+
+def _decode_frame(tab: Dict[str, Any]) -> pd.DataFrame:
+    return pd.DataFrame(tab["rows"], columns=tab["columns"])
+
+
+def save_catalog(snapshot: CatalogSnapshot, tabs: Dict[str, Dict[str, Any]], revisions: Dict[str, str],
+                 path: Optional[str] = None) -> None:
+    """
+    Persist the last good catalog as msgpack (no pickle), along with the per-tab
+    hashes and spreadsheet revisions so a warm start can skip unchanged downloads.
+    Written to a temp file and renamed, so concurrent workers never read a torn file.
+    """
+    path = path or CATALOG_CACHE_PATH
+    payload = {
+        "format": FORMAT_VERSION,
+        "saved_at": datetime.now().isoformat(),
+        "built_at": snapshot.built_at.isoformat(),
+        "tabs": {
+            key: {**_encode_frame(df), **tabs.get(key, {})}
+            for key, df in snapshot.frames.items()
+            if df is not None
+        },
+        "revisions": revisions,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(msgpack.packb(payload, use_bin_type=True, default=str))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    logger.info(f"💾 Catalog {snapshot.version} saved to {path}")
+
+
+def touch_catalog(path: Optional[str] = None) -> None:
+    """Mark the stored catalog as confirmed-current without rewriting it."""
+    path = path or CATALOG_CACHE_PATH
+    if os.path.exists(path):
+        os.utime(path)
+
+
+def load_catalog(path: Optional[str] = None) -> Optional[Tuple[CatalogSnapshot, Dict[str, Any]]]:
+    """
+    Memory-map the stored catalog and rebuild a snapshot from it.
+
+    Returns (snapshot, meta) where meta holds "tabs" ({cache_key: {"sheet", "hash",
+    "version"}}), "revisions" and "confirmed_at" (last time the data was known to
+    match Google Sheets), or None when there is no usable file.
+    """
+    path = path or CATALOG_CACHE_PATH
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                payload = msgpack.unpackb(mm, raw=False)
+            confirmed_at = datetime.fromtimestamp(os.fstat(f.fileno()).st_mtime)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable catalog cache {path}: {e}")
+        return None
+
+    if payload.get("format") != FORMAT_VERSION:
+        logger.info(f"Ignoring catalog cache {path} with format {payload.get('format')}")
+        return None
+
+    tabs = payload.get("tabs", {})
+    frames = {key: _decode_frame(tab) for key, tab in tabs.items()}
+    versions = {key: tab["version"] for key, tab in tabs.items() if "version" in tab}
+    snapshot = CatalogSnapshot(frames, versions, datetime.fromisoformat(payload["built_at"]))
+    meta = {
+        "tabs": {
+            key: {k: tab[k] for k in ("sheet", "hash", "version") if k in tab}
+            for key, tab in tabs.items()
+        },
+        "revisions": payload.get("revisions", {}),
+        "confirmed_at": max(confirmed_at, datetime.fromisoformat(payload["saved_at"])),
+    }
+    return snapshot, meta
@@ -5,7 +5,7 @@ from app.utils.chat_memory import get_conversation_history, trim_history, save_m
 
 async def currency_ai(user_id: str, query: str, language: str = "EN") -> dict:
     try:
-        chat_history = get_conversation_history(user_id)
+        chat_history = await get_conversation_history(user_id)
         conversation = trim_history(chat_history)
         
         response = await client.chat.completions.create(
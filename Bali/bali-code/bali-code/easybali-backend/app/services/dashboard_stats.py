@@ -0,0 +1,275 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReplaceOne
+
+from app.db.session import db, order_collection, inquiry_collection, issue_collection
+from app.utils.result_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_STATS_CACHE_TTL", "10"))
+RECOMPUTE_DEBOUNCE_SECONDS = 2.0
+RECONCILE_INTERVAL_SECONDS = 600
+RECENT_ITEMS = 5
+# Rollup key for orders/inquiries/issues that carry no villa_code
+NO_VILLA = "_none"
+COUNTERS = ("bookings", "revenue", "active_guests", "pending_inquiries", "open_issues")
+
+
+def _villa_key(villa_code: Optional[str]) -> str:
+    return villa_code or NO_VILLA
+
+
+def _recent(sort_field: str, output: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$topN": {"n": RECENT_ITEMS, "sortBy": {sort_field: -1}, "output": output}}
+
+
+class DashboardStats:
+    """
+    Per-villa rollup behind the dashboard header cards.
+
+    One document per villa in `dashboard_stats` holds the booking/revenue/guest
+    counters, the pending inquiry and open issue counts and the latest few
+    orders/inquiries/issues. Write paths call `touch(villa_code)`; the touched
+    villas are recomputed (debounced) in the background, and everything is
+    reconciled from the source collections every RECONCILE_INTERVAL_SECONDS,
+    so a write path that forgets to touch only lags until the next reconcile.
+    Reads are a single find over the caller's villas behind a short TTL cache.
+
+    Recomputing a villa (rather than $inc-ing counters) keeps the rollup exact
+    even when the same payment webhook or status update is delivered twice.
+    """
+
+    def __init__(self):
+        self.collection = db["dashboard_stats"]
+        self._cache: Dict[Tuple[str, ...], Tuple[float, Dict[str, Any]]] = {}
+        self._dirty: Set[str] = set()
+        self._dirty_all = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reconciled = False
+        self._reconciled_at = time.monotonic()
+
+    # ── Write side ────────────────────────────────────────────────────────────
+
+    def touch(self, villa_code: Optional[str] = None):
+        """Mark a villa's stats stale; with no villa_code everything is recomputed."""
+        # Order/issue/inquiry writes all report here; drop cached endpoint results too
+        result_cache.invalidate_villa(villa_code)
+        if villa_code:
+            self._dirty.add(villa_code)
+        else:
+            self._dirty_all = True
+        self._ensure_running()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self.run())
+
+    async def run(self):
+        """Recompute touched villas as writes come in and reconcile periodically."""
+        while True:
+            remaining = self._reconciled_at + RECONCILE_INTERVAL_SECONDS - time.monotonic()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, remaining))
+                # Let a burst of writes (e.g. a payment plus its notifications) coalesce
+                await asyncio.sleep(RECOMPUTE_DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # By elapsed time, not on an idle timeout: steady writes would otherwise
+            # postpone the reconcile forever and untouched write paths never show up
+            if time.monotonic() - self._reconciled_at >= RECONCILE_INTERVAL_SECONDS:
+                self._dirty_all = True
+            villas, full = self._dirty, self._dirty_all
+            self._dirty, self._dirty_all = set(), False
+            if full:
+                self._reconciled_at = time.monotonic()
+            try:
+                await self.recompute(None if full else villas)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Dashboard stats recompute failed: {e}")
+                self._dirty |= villas
+                self._dirty_all = self._dirty_all or full
+
+    # ── Recompute ─────────────────────────────────────────────────────────────
+
+    async def _aggregate(self, villa_codes: Optional[Iterable[str]]) -> Dict[str, Dict[str, Any]]:
+        """Build rollup rows for the given villas (all villas when None) from the source collections."""
+        match = {"villa_code": {"$in": list(villa_codes)}} if villa_codes is not None else {}
+        orders, inquiries, issues = await asyncio.gather(
+            order_collection.aggregate([
+                {"$match": match},
+                {"$facet": {
+                    "counts": [
+                        {"$group": {
+                            "_id": {"villa": "$villa_code", "sender": "$sender_id"},
+                            "bookings": {"$sum": 1},
+                            "revenue": {"$sum": {"$cond": [
+                                {"$eq": ["$status", "PAID"]}, "$payment.paid_amount", 0,
+                            ]}},
+                        }},
+                        {"$group": {
+                            "_id": "$_id.villa",
+                            "bookings": {"$sum": "$bookings"},
+                            "revenue": {"$sum": "$revenue"},
+                            "guest_ids": {"$addToSet": "$_id.sender"},
+                        }},
+                    ],
+                    "recent": [
+                        {"$group": {"_id": "$villa_code", "items": _recent("updated_at", {
+                            "id": {"$toString": "$_id"},
+                            "sender_id": "$sender_id",
+                            "service_name": "$service_name",
+                            "status": "$status",
+                            "time": {"$ifNull": ["$updated_at", "$created_at"]},
+                        })}},
+                    ],
+                }},
+            ]).to_list(1),
+            inquiry_collection.aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": "$villa_code",
+                    "pending_inquiries": {"$sum": {"$cond": [{"$eq": ["$intent", "support_request"]}, 1, 0]}},
+                    "items": _recent("timestamp", {
+                        "id": {"$toString": "$_id"}, "sender_id": "$sender_id", "time": "$timestamp",
+                    }),
+                }},
+            ]).to_list(None),
+            issue_collection.aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": "$villa_code",
+                    "open_issues": {"$sum": {"$cond": [{"$eq": ["$status", "open"]}, 1, 0]}},
+                    "items": _recent("timestamp", {
+                        "id": {"$toString": "$_id"}, "sender_id": "$sender_id",
+                        "status": "$status", "time": "$timestamp",
+                    }),
+                }},
+            ]).to_list(None),
+        )
+
+        rows: Dict[str, Dict[str, Any]] = {}
+
+        def row(villa_code):
+            key = _villa_key(villa_code)
+            if key not in rows:
+                rows[key] = self._empty_row(villa_code)
+            return rows[key]
+
+        facet = orders[0] if orders else {"counts": [], "recent": []}
+        for c in facet["counts"]:
+            guest_ids = sorted(str(g) for g in c["guest_ids"] if g)
+            row(c["_id"]).update(bookings=c["bookings"], revenue=c["revenue"],
+                                 active_guests=len(guest_ids), guest_ids=guest_ids)
+        for r in facet["recent"]:
+            row(r["_id"])["recent_orders"] = r["items"]
+        for i in inquiries:
+            row(i["_id"]).update(pending_inquiries=i["pending_inquiries"], recent_inquiries=i["items"])
+        for s in issues:
+            row(s["_id"]).update(open_issues=s["open_issues"], recent_issues=s["items"])
+        return rows
+
+    @staticmethod
+    def _empty_row(villa_code: Optional[str]) -> Dict[str, Any]:
+        return {
+            "_id": _villa_key(villa_code),
+            "villa_code": villa_code,
+            **{name: 0 for name in COUNTERS},
+            # Distinct senders, so multi-villa totals can count each guest once
+            "guest_ids": [],
+            "recent_orders": [],
+            "recent_inquiries": [],
+            "recent_issues": [],
+        }
+
+    async def recompute(self, villa_codes: Optional[Iterable[str]] = None):
+        """Rebuild the rollup for the given villas, or for every villa when None."""
+        villa_codes = None if villa_codes is None else set(villa_codes)
+        if villa_codes is not None and not villa_codes:
+            return
+        rows = await self._aggregate(villa_codes)
+        # Villas that no longer have any documents drop back to zero
+        for code in villa_codes or ():
+            rows.setdefault(_villa_key(code), self._empty_row(code))
+
+        now = datetime.utcnow()
+        ops = [ReplaceOne({"_id": key}, {**doc, "updated_at": now}, upsert=True) for key, doc in rows.items()]
+        if ops:
+            await self.collection.bulk_write(ops, ordered=False)
+        if villa_codes is None:
+            await self.collection.delete_many({"_id": {"$nin": list(rows)}})
+            self._reconciled = True
+        self._cache.clear()
+        logger.info(f"📊 Dashboard stats recomputed for {'all villas' if villa_codes is None else len(rows)} ({len(rows)} rows)")
+
+    # ── Read side ─────────────────────────────────────────────────────────────
+
+    async def get(self, villa_codes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Combined stats for the given villas (None = every villa), served from
+        the rollup behind a TTL cache.
+        """
+        self._ensure_running()
+        key = ("*",) if villa_codes is None else tuple(sorted(villa_codes))
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < STATS_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        query = {} if villa_codes is None else {"_id": {"$in": list(villa_codes)}}
+        docs = await self.collection.find(query).to_list(None)
+        if not docs and not self._reconciled:
+            # First read on an empty rollup (fresh deploy): build it now
+            await self.recompute()
+            docs = await self.collection.find(query).to_list(None)
+
+        stats = self.combine(docs)
+        self._cache[key] = (time.monotonic(), stats)
+        return stats
+
+    @staticmethod
+    def combine(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Sum per-villa rows. active_guests is the size of the union of the rows'
+        guest_ids, so a guest who booked in several villas is counted once.
+        """
+        combined: Dict[str, Any] = {name: 0 for name in COUNTERS}
+        for field in ("recent_orders", "recent_inquiries", "recent_issues"):
+            combined[field] = []
+        guests: Set[str] = set()
+        for doc in docs:
+            for name in COUNTERS:
+                if name != "active_guests":
+                    combined[name] += doc.get(name) or 0
+            if "guest_ids" in doc:
+                guests.update(doc["guest_ids"])
+            else:
+                # Row written before guest_ids existed; exact again after the next reconcile
+                combined["active_guests"] += doc.get("active_guests") or 0
+            for field in ("recent_orders", "recent_inquiries", "recent_issues"):
+                combined[field].extend(doc.get(field) or [])
+        combined["active_guests"] += len(guests)
+        for field in ("recent_orders", "recent_inquiries", "recent_issues"):
+            combined[field].sort(key=lambda x: x["time"] if isinstance(x.get("time"), datetime) else datetime.min, reverse=True)
+            combined[field] = combined[field][:RECENT_ITEMS]
+        return combined
+
+
+# Global instance
+dashboard_stats = DashboardStats()
@@ -0,0 +1,164 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from bson import Binary
+from pymongo import UpdateOne
+
+from app.db.session import db
+from app.services.openai_client import client
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+COLLECTION_NAME = "embedding_cache"
+MAX_CACHED_VECTORS = int(os.getenv("EMBEDDING_CACHE_MAX_VECTORS", "5000"))
+# Inputs per embeddings.create call (the API accepts up to 2048)
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+# Shared vectors unused for this long are dropped by the TTL index on expires_at
+SHARED_TTL = timedelta(days=float(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "30")))
+
+
+def content_hash(text: str, model: str = EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode()).hexdigest()
+
+
+def cosine_top_k(query: np.ndarray, matrix: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (row indices, cosine scores) of the k rows of matrix most similar to
+    query, best first. Rows need not be normalized.
+    """
+    if matrix.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    scores = (matrix @ query) / np.where(norms == 0, 1, norms)
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+class EmbeddingService:
+    """
+    Embeddings keyed by a hash of (model, text), so identical text is only
+    ever sent to the API once.
+
+    Two tiers: an in-process LRU of MAX_CACHED_VECTORS float32 vectors in
+    front of the `embedding_cache` collection shared by every worker and by
+    ingestion (vectors stored as raw float32 bytes). Guest queries are mostly
+    one-offs, so shared vectors carry a sliding `expires_at` (SHARED_TTL,
+    pushed forward when a hit finds it past half-life) and a TTL index drops
+    the ones nobody reuses. Misses are embedded in batches of BATCH_SIZE
+    inputs per request.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self.collection = db[COLLECTION_NAME]
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.embedded = 0
+        self.api_calls = 0
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._vectors[key] = vector
+        self._vectors.move_to_end(key)
+        while len(self._vectors) > MAX_CACHED_VECTORS:
+            self._vectors.popitem(last=False)
+
+    async def _load_shared(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            cursor = self.collection.find({"_id": {"$in": keys}}, {"vector": 1, "expires_at": 1})
+            docs = await cursor.to_list(len(keys))
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return {}
+        now = datetime.utcnow()
+        # Only vectors past half their TTL are re-stamped, so a hot query costs a write at most once per TTL/2
+        stale = [
+            d["_id"] for d in docs
+            if not isinstance(d.get("expires_at"), datetime) or d["expires_at"] - now < SHARED_TTL / 2
+        ]
+        if stale:
+            try:
+                await self.collection.bulk_write([
+                    UpdateOne({"_id": key}, {"$set": {"expires_at": now + SHARED_TTL}}) for key in stale
+                ], ordered=False)
+            except Exception as e:
+                logger.warning(f"Embedding cache expiry refresh failed: {e}")
+        return {d["_id"]: np.frombuffer(bytes(d["vector"]), dtype=np.float32) for d in docs if d.get("vector")}
+
+    async def _store_shared(self, vectors: Dict[str, np.ndarray]):
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"_id": key},
+                {
+                    "$setOnInsert": {"vector": Binary(vector.tobytes()), "model": self.model, "created_at": now},
+                    "$set": {"expires_at": now + SHARED_TTL},
+                },
+                upsert=True,
+            )
+            for key, vector in vectors.items()
+        ]
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    async def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """float32 vectors for texts (same order); only unseen text reaches the API."""
+        keys = [content_hash(t, self.model) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        for key in keys:
+            if key in self._vectors:
+                self._vectors.move_to_end(key)
+                found[key] = self._vectors[key]
+                self.local_hits += 1
+
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            shared = await self._load_shared(missing)
+            for key, vector in shared.items():
+                self._remember(key, vector)
+            found.update(shared)
+            self.shared_hits += len(shared)
+
+        unseen = list({k: t for k, t in zip(keys, texts) if k not in found}.items())
+        fresh: Dict[str, np.ndarray] = {}
+        for start in range(0, len(unseen), BATCH_SIZE):
+            batch = unseen[start:start + BATCH_SIZE]
+            resp = await client.embeddings.create(input=[t for _, t in batch], model=self.model)
+            self.api_calls += 1
+            for (key, _), item in zip(batch, resp.data):
+                fresh[key] = np.array(item.embedding, dtype=np.float32)
+        if fresh:
+            self.embedded += len(fresh)
+            for key, vector in fresh.items():
+                self._remember(key, vector)
+            found.update(fresh)
+            await self._store_shared(fresh)
+        return [found[k] for k in keys]
+
+    async def embed(self, text: str) -> np.ndarray:
+        return (await self.embed_many([text]))[0]
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.shared_hits + self.embedded
+        return {
+            "cached_vectors": len(self._vectors),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "embedded": self.embedded,
+            "api_calls": self.api_calls,
+            "hit_rate": round((self.local_hits + self.shared_hits) / lookups, 3) if lookups else None,
+        }
+
+
+# Global instance
+embedding_service = EmbeddingService()
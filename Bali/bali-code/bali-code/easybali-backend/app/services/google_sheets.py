@@ -1,29 +1,130 @@
 import os
 import json
+import asyncio
 import gspread
+import httpx
 import logging
+from typing import Dict, List, Optional, Set
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request as GoogleAuthRequest
 from app.settings.config import settings
 
 logger = logging.getLogger(__name__)
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    # Lets the refresh loop read a spreadsheet's revision without downloading it
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets/{sheet_id}"
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files/{file_id}"
 CREDENTIALS_FILE = "easy-bali-b74b61110525.json"
 
+def get_credentials() -> Credentials:
+    if settings.GOOGLE_SERVICE_ACCOUNT_JSON:
+        logger.info("Using GOOGLE_SERVICE_ACCOUNT_JSON from settings")
+        service_account_info = json.loads(settings.GOOGLE_SERVICE_ACCOUNT_JSON)
+        return Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    if os.path.exists(CREDENTIALS_FILE):
+        logger.info(f"Using credentials file: {CREDENTIALS_FILE}")
+        return Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
+    logger.error("❌ No Google Service Account credentials found! Set GOOGLE_SERVICE_ACCOUNT_JSON env var or add the JSON file.")
+    raise FileNotFoundError("Google credentials missing.")
+
 def get_workbook(sheet_id: str):
     try:
-        if settings.GOOGLE_SERVICE_ACCOUNT_JSON:
-            logger.info("Using GOOGLE_SERVICE_ACCOUNT_JSON from settings")
-            service_account_info = json.loads(settings.GOOGLE_SERVICE_ACCOUNT_JSON)
-            creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
-        elif os.path.exists(CREDENTIALS_FILE):
-            logger.info(f"Using credentials file: {CREDENTIALS_FILE}")
-            creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPES)
-        else:
-            logger.error("❌ No Google Service Account credentials found! Set GOOGLE_SERVICE_ACCOUNT_JSON env var or add the JSON file.")
-            raise FileNotFoundError("Google credentials missing.")
-            
+        creds = get_credentials()
         client = gspread.authorize(creds)
         return client.open_by_key(sheet_id)
     except Exception as e:
         logger.error(f"Failed to load Google Sheet: {e}")
         raise e
+
+
+def _quote_sheet_name(name: str) -> str:
+    """A1-notation range for a whole tab ('Menu Structure' -> "'Menu Structure'")."""
+    return "'" + name.replace("'", "''") + "'"
+
+
+class AsyncSheetsClient:
+    """
+    Non-blocking client for the Sheets/Drive REST APIs.
+
+    Uses one pooled keep-alive httpx.AsyncClient for every call and the service
+    account's bearer token (refreshed off the event loop), so the catalog refresh
+    never holds the serving loop while waiting on Google.
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        self._creds: Optional[Credentials] = None
+        self._token_lock = asyncio.Lock()
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+
+    async def _headers(self) -> Dict[str, str]:
+        async with self._token_lock:
+            if self._creds is None:
+                self._creds = get_credentials()
+            if not self._creds.valid:
+                await asyncio.to_thread(self._creds.refresh, GoogleAuthRequest())
+        return {"Authorization": f"Bearer {self._creds.token}"}
+
+    async def _get(self, url: str, params) -> dict:
+        resp = await self._client.get(url, params=params, headers=await self._headers())
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_revision(self, sheet_id: str) -> Optional[str]:
+        """
+        Cheap revision marker for a spreadsheet (Drive `version`, falling back to
+        `modifiedTime`), or None if Drive metadata is unavailable.
+        """
+        try:
+            meta = await self._get(
+                DRIVE_FILES_URL.format(file_id=sheet_id),
+                {"fields": "version,modifiedTime", "supportsAllDrives": "true"},
+            )
+            return meta.get("version") or meta.get("modifiedTime")
+        except Exception as e:
+            logger.warning(f"Could not read Drive revision for {sheet_id}: {e}")
+            return None
+
+    async def get_sheet_titles(self, sheet_id: str) -> Set[str]:
+        meta = await self._get(
+            SHEETS_API_URL.format(sheet_id=sheet_id),
+            {"fields": "sheets.properties.title"},
+        )
+        return {s["properties"]["title"] for s in meta.get("sheets", [])}
+
+    async def batch_get_values(self, sheet_id: str, sheet_names: List[str]) -> Dict[str, List[List[str]]]:
+        """Fetch every named tab in a single values:batchGet call."""
+        if not sheet_names:
+            return {}
+        params = [("ranges", _quote_sheet_name(name)) for name in sheet_names]
+        params.append(("majorDimension", "ROWS"))
+        data = await self._get(SHEETS_API_URL.format(sheet_id=sheet_id) + "/values:batchGet", params)
+        value_ranges = data.get("valueRanges", [])
+        return {
+            name: value_range.get("values", [])
+            for name, value_range in zip(sheet_names, value_ranges)
+        }
+
+    async def get_hyperlinks(self, sheet_id: str, sheet_name: str) -> list:
+        """Per-row hyperlink cells for a tab (values() only returns display text)."""
+        data = await self._get(
+            SHEETS_API_URL.format(sheet_id=sheet_id),
+            {
+                "ranges": sheet_name,
+                "includeGridData": "true",
+                "fields": "sheets.data.rowData.values(hyperlink)",
+            },
+        )
+        return (
+            data.get("sheets", [{}])[0]
+            .get("data", [{}])[0]
+            .get("rowData", [])
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,208 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.catalog_snapshot import get_snapshot
+from app.services.embedding_service import embedding_service, cosine_top_k
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity to the nearest service name: above MATCH it is that service,
+# below REJECT it is not a service request, anything between goes to the LLM
+MATCH_SIMILARITY = float(os.getenv("INTENT_MATCH_SIMILARITY", "0.86"))
+REJECT_SIMILARITY = float(os.getenv("INTENT_REJECT_SIMILARITY", "0.78"))
+EMBEDDINGS_ENABLED = os.getenv("INTENT_EMBEDDINGS_ENABLED", "true").lower() == "true"
+# Design categories listed under these main-menu locations are bookable services
+SERVICE_MENU_LOCATIONS = ["Services", "Rental", "Rentals", "Discount & Promotions", "Recommendation"]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SMALL_TALK = {
+    "hi", "hello", "hey", "hallo", "halo", "hi there", "hello there", "good morning", "good afternoon",
+    "good evening", "good night", "thanks", "thank you", "thank you so much", "thanks a lot", "terima kasih",
+    "ok", "okay", "ok thanks", "okay thanks", "great", "cool", "nice", "perfect", "yes", "no", "sure",
+    "bye", "goodbye", "see you", "start", "menu", "help",
+}
+# "I don't need a massage" names a service without asking for it
+_NEGATIONS = {"no", "not", "don", "dont", "doesn", "didn", "never", "without"}
+
+
+def _tokens(text: str) -> List[str]:
+    # Crude singularisation so "massages"/"scooters" hit the same aliases
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+            for w in _WORD.findall(str(text).lower())]
+
+
+def _item_alias(name: str) -> str:
+    """'Balinese Massage - 60min (Villa)' -> 'Balinese Massage'"""
+    return re.split(r"\s+-\s+|\(", str(name))[0].strip()
+
+
+class IntentEngine:
+    """
+    Tiered service-request detection in front of the LLM matcher.
+
+      1. Small talk ("hi", "thanks") is answered as not-a-request.
+      2. A word trie over sub-category names and catalog item names matches
+         explicit service mentions. The loose service_categories keywords
+         ("dinner", "flight", "car") are left out: on their own they say
+         nothing about a booking.
+      3. The query embedding is compared with cached service-name vectors;
+         clear matches and clear misses are decided locally.
+      4. Only what is left escalates to the LLM (caller's fallback), as do
+         negated queries, which the local tiers cannot read.
+
+    The trie and vectors are rebuilt when the catalog snapshot version changes.
+    """
+
+    def __init__(self, service_categories: Dict[str, Dict[str, Any]]):
+        self.service_categories = service_categories
+        self._version: Optional[str] = None
+        self._services: List[Dict[str, str]] = []
+        self._trie: Dict[str, Any] = {}
+        self._vectors: Optional[Tuple[str, np.ndarray]] = None
+        self._vector_lock: Optional[asyncio.Lock] = None
+        self.counts = {"queries": 0, "small_talk": 0, "keyword": 0, "embedding_match": 0,
+                       "embedding_reject": 0, "escalated": 0}
+
+    # ── Index ─────────────────────────────────────────────────────────────────
+
+    def offered_services(self) -> List[Dict[str, str]]:
+        """[{"name", "category"}] for every bookable sub-category (catalog first, then the core list)."""
+        self._ensure_index()
+        return self._services
+
+    def _ensure_index(self):
+        snapshot = get_snapshot()
+        if snapshot.version == self._version:
+            return
+        services = self._catalog_services(snapshot.frames)
+        for info in self.service_categories.values():
+            if not any(s["name"].lower() == info["subcategory"].lower() for s in services):
+                services.append({"name": info["subcategory"], "category": info["category"]})
+
+        trie: Dict[str, Any] = {}
+        offered = {s["name"]: s for s in services}
+        aliases: List[Tuple[str, Dict[str, str]]] = [(s["name"], s) for s in services]
+        for sub, items in (snapshot.service_items or {}).items():
+            if sub in offered:
+                aliases.extend((_item_alias(item.get("service_item")), offered[sub]) for item in items)
+        for alias, service in aliases:
+            words = _tokens(alias)
+            if not words:
+                continue
+            node = trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node.setdefault("$", service)
+
+        self._services, self._trie, self._version = services, trie, snapshot.version
+        self._vectors = None
+
+    @staticmethod
+    def _catalog_services(frames) -> List[Dict[str, str]]:
+        services = []
+        try:
+            main_df, design_df = frames.get("main_menu_design"), frames.get("design_df")
+            if main_df is None or main_df.empty or design_df is None or design_df.empty:
+                return services
+            if not {"Menu Location", "Title"} <= set(main_df.columns) or not {"Category", "Sub-category"} <= set(design_df.columns):
+                return services
+            valid_cat_names = main_df[main_df["Menu Location"].isin(SERVICE_MENU_LOCATIONS)]["Title"].unique().tolist()
+            relevant = design_df[design_df["Category"].isin(valid_cat_names)].drop_duplicates(subset=["Sub-category"])
+            for row in relevant.to_dict(orient="records"):
+                if row.get("Sub-category"):
+                    services.append({"name": row["Sub-category"], "category": row.get("Category")})
+        except Exception as e:
+            logger.warning(f"Intent index: could not read catalog services: {e}")
+        return services
+
+    def match_keywords(self, query: str) -> Optional[Dict[str, str]]:
+        """Longest alias found in the query (earliest wins on ties)."""
+        self._ensure_index()
+        words = _tokens(query)
+        best, best_len = None, 0
+        for start in range(len(words)):
+            node = self._trie
+            for offset, word in enumerate(words[start:]):
+                node = node.get(word)
+                if node is None:
+                    break
+                if "$" in node and offset + 1 > best_len:
+                    best, best_len = node["$"], offset + 1
+        return best
+
+    async def _service_vectors(self) -> Tuple[List[Dict[str, str]], np.ndarray]:
+        if self._vector_lock is None:
+            self._vector_lock = asyncio.Lock()
+        async with self._vector_lock:
+            version = self._version
+            if self._vectors is None or self._vectors[0] != version:
+                services = self._services
+                vectors = await embedding_service.embed_many([f"{s['name']} ({s['category']})" for s in services])
+                self._vectors = (version, np.stack(vectors))
+                logger.info(f"🧭 Intent vectors built for {len(services)} services (catalog {version})")
+            return self._services, self._vectors[1]
+
+    # ── Classification ────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _result(is_request: bool, service: Optional[Dict[str, str]], confidence: float, source: str) -> Dict[str, Any]:
+        name = service["name"] if service else None
+        return {
+            "is_service_request": is_request,
+            "requested_service": name,
+            "we_offer_it": service is not None,
+            "matched_service": name,
+            "confidence": round(confidence, 3),
+            "source": source,
+        }
+
+    async def classify(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Same shape as the LLM matcher's answer, or None when the query is
+        ambiguous and should be escalated.
+        """
+        self.counts["queries"] += 1
+        text = " ".join(_WORD.findall(str(query).lower()))
+        if not text or text in _SMALL_TALK:
+            self.counts["small_talk"] += 1
+            return self._result(False, None, 1.0, "small_talk")
+
+        if _NEGATIONS & set(text.split()):
+            self.counts["escalated"] += 1
+            return None
+
+        service = self.match_keywords(query)
+        if service:
+            self.counts["keyword"] += 1
+            return self._result(True, service, 0.9, "keyword")
+
+        if EMBEDDINGS_ENABLED and self._services:
+            try:
+                services, matrix = await self._service_vectors()
+                top, scores = cosine_top_k(await embedding_service.embed(query), matrix)
+                best, score = int(top[0]), float(scores[0])
+                if score >= MATCH_SIMILARITY:
+                    self.counts["embedding_match"] += 1
+                    return self._result(True, services[best], score, "embedding")
+                if score < REJECT_SIMILARITY:
+                    self.counts["embedding_reject"] += 1
+                    return self._result(False, None, 1.0 - score, "embedding")
+            except Exception as e:
+                logger.warning(f"Intent embedding tier failed, escalating: {e}")
+
+        self.counts["escalated"] += 1
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        queries = self.counts["queries"]
+        return {
+            **self.counts,
+            "local_rate": round(1 - self.counts["escalated"] / queries, 3) if queries else None,
+            "escalation_rate": round(self.counts["escalated"] / queries, 3) if queries else None,
+            "catalog_version": self._version,
+        }
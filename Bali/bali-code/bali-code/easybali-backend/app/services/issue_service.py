@@ -1,4 +1,5 @@
 from app.db.session import db, issue_collection
+from app.services.dashboard_stats import dashboard_stats
 from datetime import datetime
 from typing import Optional, List
 import logging
@@ -42,6 +43,7 @@ async def create_issue(
 
     result = await issue_collection.insert_one(issue_data)
     issue_data["_id"] = str(result.inserted_id)
+    dashboard_stats.touch(issue_data.get("villa_code"))
 
     return issue_data
 
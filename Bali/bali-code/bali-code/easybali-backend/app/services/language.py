@@ -1,6 +1,6 @@
-import hashlib
-import json
-from app.utils.chat_memory import get_conversation_history, trim_history, save_message
+from app.utils.chat_memory import get_conversation_history, save_message
+from app.utils.response_cache import language_lesson_cache
+from app.utils.query_text import normalize_query, is_standalone
 from app.services.openai_client import client
 from fastapi import HTTPException
 from app.settings.config import settings
@@ -8,24 +8,27 @@ from app.settings.config import settings
 
 class ResponseOptimizer:
     def __init__(self):
-        self.cache = {}
+        # Answers to standalone questions are shared by every user (bounded, TTL'd, Mongo-backed)
+        self.cache = language_lesson_cache
         self.request_count = 0
 
-    def _gen_cache_key(self, user_id: str, messages: list) -> str:
-        key_data = f"{user_id}-{json.dumps(messages, sort_keys=True)}"
-        return hashlib.sha256(key_data.encode()).hexdigest()
-
     async def quantum_response(self, user_id: str, prompt: str) -> str:
-        # Get conversation history
-        history = get_conversation_history(user_id)
-        full_context = trim_history(history + [{"role": "user", "content": prompt}])
-        
-        cache_key = self._gen_cache_key(user_id, full_context)
         self.request_count += 1
-        
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        
+        # Only questions that stand on their own ("how do I say thank you in Balinese")
+        # are cached; follow-ups need this user's history and are always generated
+        cache_key = normalize_query(prompt) if is_standalone(prompt) else None
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                save_message(user_id, "user", prompt)
+                save_message(user_id, "assistant", cached)
+                return cached
+            # A cached answer must not depend on who asked, so generate it without
+            # history: standalone questions trade the tutor's continuity for reuse
+            history = []
+        else:
+            history = await get_conversation_history(user_id)
+
         try:
             response = await client.chat.completions.create(
                 model = settings.OPENAI_MODEL_NAME,
@@ -34,7 +37,7 @@ class ResponseOptimizer:
                     "content": f"""🔥ULTRA TUTOR PROFILE🔥
                     Context from previous interactions: {history}
                     You are the world's best Indonesian/Balinese tutor. Rules:
-                    1. Maintain conversation continuity with user {user_id}
+                    1. Maintain conversation continuity with the learner
                     2. Reference previous interactions when relevant
                     3. Layer responses with cultural and linguistic depth"""
                 }, {
@@ -47,7 +50,8 @@ class ResponseOptimizer:
             )
             
             result = response.choices[0].message.content
-            self.cache[cache_key] = result
+            if cache_key:
+                await self.cache.set(cache_key, result)
             
             # Update memory
             save_message(user_id, "user", prompt)
@@ -0,0 +1,292 @@
+import os
+import time
+import struct
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single-process only
+    fcntl = None
+
+import msgpack
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "false": always Pinecone; "true": serve small indexes from the local copy
+LOCAL_INDEX_MODE = os.getenv("RAG_LOCAL_INDEX", "false").lower()
+LOCAL_INDEX_DIR = os.getenv("RAG_LOCAL_INDEX_DIR", os.path.join(tempfile.gettempdir(), "easybali-vectors"))
+# Larger indexes stay on Pinecone
+MAX_LOCAL_VECTORS = int(os.getenv("RAG_LOCAL_MAX_VECTORS", "5000"))
+FETCH_BATCH_SIZE = 100
+# How often a worker checks whether another process rewrote an index file
+RELOAD_CHECK_SECONDS = 5.0
+# Bump when the on-disk layout changes; older files are ignored, never migrated
+FORMAT_VERSION = 1
+_HEADER_LEN = struct.Struct("<Q")
+_ALIGN = 64
+
+
+class LocalVectorIndex:
+    """
+    In-process copy of one Pinecone index with the same query() interface.
+
+    Vectors are a normalized float32 matrix memory-mapped from a single file
+    (msgpack header with ids and metadata, then the raw matrix), so every
+    worker shares the OS page cache instead of holding its own copy. Top-k is
+    a brute-force dot product, which for a few thousand rows takes well under
+    a millisecond. Filters support field equality, `$eq` and `$in`.
+    """
+
+    def __init__(self, name: str, ids: List[str], metadata: List[Dict[str, Any]], matrix: np.ndarray):
+        self.name = name
+        self.ids = ids
+        self.metadata = metadata
+        self.matrix = matrix
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _column(self, field: str) -> np.ndarray:
+        column = self._columns.get(field)
+        if column is None:
+            column = np.empty(len(self.metadata), dtype=object)
+            column[:] = [m.get(field) for m in self.metadata]
+            self._columns[field] = column
+        return column
+
+    def _mask(self, filter_dict: Optional[dict]) -> Optional[np.ndarray]:
+        if not filter_dict:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, cond in filter_dict.items():
+            column = self._column(field)
+            if isinstance(cond, dict):
+                if "$in" in cond:
+                    mask &= np.isin(column, list(cond["$in"]))
+                if "$eq" in cond:
+                    mask &= column == cond["$eq"]
+            else:
+                mask &= column == cond
+        return mask
+
+    def query(self, vector, top_k: int = 3, include_metadata: bool = True, filter: Optional[dict] = None, **kwargs) -> Dict[str, Any]:
+        mask = self._mask(filter)
+        rows = np.arange(len(self.ids)) if mask is None else np.flatnonzero(mask)
+        if len(rows) == 0:
+            return {"matches": []}
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        # Rows are stored normalized, so cosine similarity is one matrix-vector product
+        scores = (self.matrix if mask is None else self.matrix[rows]) @ (query / (norm or 1))
+        k = min(top_k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for i, score in zip(rows[top], scores[top]):
+            match = {"id": self.ids[i], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = self.metadata[i]
+            matches.append(match)
+        return {"matches": matches}
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def save(self, path: str):
+        """Write atomically (temp file + rename) so readers never map a torn file."""
+        header = msgpack.packb({
+            "format": FORMAT_VERSION, "name": self.name, "ids": self.ids, "metadata": self.metadata,
+            "rows": len(self.ids), "dim": int(self.matrix.shape[1]) if self.matrix.size else 0,
+        }, use_bin_type=True, default=str)
+        offset = _HEADER_LEN.size + len(header)
+        padding = (-offset) % _ALIGN
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".vectors-", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER_LEN.pack(len(header)))
+                f.write(header)
+                f.write(b"\0" * padding)
+                f.write(np.ascontiguousarray(self.matrix, dtype=np.float32).tobytes())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LocalVectorIndex"]:
+        with open(path, "rb") as f:
+            (header_len,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+            header = msgpack.unpackb(f.read(header_len), raw=False)
+        if header.get("format") != FORMAT_VERSION:
+            return None
+        offset = _HEADER_LEN.size + header_len
+        offset += (-offset) % _ALIGN
+        rows, dim = header["rows"], header["dim"]
+        if rows == 0:
+            matrix = np.empty((0, dim), dtype=np.float32)
+        else:
+            matrix = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=(rows, dim))
+        return cls(header["name"], header["ids"], header["metadata"], matrix)
+
+    @classmethod
+    def build(cls, name: str, vectors: List[Dict[str, Any]]) -> "LocalVectorIndex":
+        """From Pinecone-style records [{"id", "values", "metadata"}]."""
+        if not vectors:
+            return cls(name, [], [], np.empty((0, 0), dtype=np.float32))
+        matrix = np.array([v["values"] for v in vectors], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return cls(name, [v["id"] for v in vectors], [dict(v.get("metadata") or {}) for v in vectors], matrix)
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [{"id": vid, "values": self.matrix[i], "metadata": self.metadata[i]} for i, vid in enumerate(self.ids)]
+
+
+class LocalVectorStore:
+    """
+    Local copies of the small RAG indexes, kept on disk under LOCAL_INDEX_DIR.
+
+    `sync_from` mirrors a Pinecone index (list ids, fetch in batches) the
+    first time, `apply_writes` keeps it current afterwards; indexes above
+    MAX_LOCAL_VECTORS are not mirrored and keep being served by Pinecone.
+    Both hold an exclusive lock file per index, so writes from different
+    worker processes never overwrite each other. Workers reload a file when
+    its mtime moves.
+    """
+
+    def __init__(self, directory: str = LOCAL_INDEX_DIR):
+        self.directory = directory
+        self._indexes: Dict[str, tuple] = {}  # name -> (mtime, LocalVectorIndex)
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.counts = {"local_queries": 0, "syncs": 0, "too_large": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return LOCAL_INDEX_MODE == "true"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.vectors")
+
+    def get(self, name: str) -> Optional[LocalVectorIndex]:
+        """The local copy of an index, or None when it should be served by Pinecone."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        cached = self._indexes.get(name)
+        if cached is not None and now - self._checked_at.get(name, 0) < RELOAD_CHECK_SECONDS:
+            self.counts["local_queries"] += 1
+            return cached[1]
+        with self._lock:
+            self._checked_at[name] = now
+            try:
+                mtime = os.stat(self.path(name)).st_mtime
+            except OSError:
+                self._indexes.pop(name, None)
+                return None
+            if cached is None or cached[0] != mtime:
+                try:
+                    index = LocalVectorIndex.load(self.path(name))
+                except Exception as e:
+                    logger.warning(f"Local vector index '{name}' unreadable: {e}")
+                    index = None
+                if index is None:
+                    self._indexes.pop(name, None)
+                    return None
+                self._indexes[name] = cached = (mtime, index)
+                logger.info(f"📐 Local vector index '{name}' loaded ({len(index)} vectors)")
+        self.counts["local_queries"] += 1
+        return cached[1]
+
+    def save(self, index: LocalVectorIndex):
+        with self._lock:
+            index.save(self.path(index.name))
+            self._forget(index.name)
+
+    def remove(self, name: str):
+        with self._lock:
+            if os.path.exists(self.path(name)):
+                os.unlink(self.path(name))
+            self._forget(name)
+
+    def _forget(self, name: str):
+        self._indexes.pop(name, None)
+        self._checked_at.pop(name, None)
+
+    @contextmanager
+    def _file_lock(self, name: str):
+        """Exclusive across processes (and threads: each call opens its own descriptor)."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name) + ".lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def apply_writes(self, name: str, upserts: List[Dict[str, Any]] = (), delete_ids: List[str] = ()) -> bool:
+        """
+        Apply writes just sent to Pinecone to the local copy (blocking), so it
+        doesn't wait on Pinecone's eventual consistency. False if there is no copy.
+        """
+        if not os.path.exists(self.path(name)):
+            return False
+        if not upserts and not delete_ids:
+            return True
+        with self._file_lock(name):
+            if not os.path.exists(self.path(name)):
+                return False
+            current = LocalVectorIndex.load(self.path(name))
+            if current is None:
+                return False
+            replaced = set(delete_ids) | {v["id"] for v in upserts}
+            kept = [r for r in current.records() if r["id"] not in replaced]
+            self.save(LocalVectorIndex.build(name, kept + list(upserts)))
+        return True
+
+    def sync_from(self, name: str, remote) -> Optional[int]:
+        """
+        Mirror a Pinecone index to disk (blocking). Returns the vector count,
+        or None when the index is too large to serve locally. Pinecone's
+        listing can lag recent upserts, so callers apply those afterwards.
+        """
+        with self._file_lock(name):
+            return self._sync_locked(name, remote)
+
+    def _sync_locked(self, name: str, remote) -> Optional[int]:
+        ids: List[str] = []
+        for page in remote.list():
+            ids.extend(page)
+            if len(ids) > MAX_LOCAL_VECTORS:
+                self.counts["too_large"] += 1
+                self.remove(name)
+                logger.info(f"Index '{name}' has over {MAX_LOCAL_VECTORS} vectors; serving it from Pinecone")
+                return None
+        vectors = []
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            fetched = remote.fetch(ids=ids[start:start + FETCH_BATCH_SIZE]).vectors
+            vectors.extend({"id": vid, "values": v.values, "metadata": v.metadata} for vid, v in fetched.items())
+        self.save(LocalVectorIndex.build(name, vectors))
+        self.counts["syncs"] += 1
+        logger.info(f"📐 Local vector index '{name}' synced ({len(vectors)} vectors)")
+        return len(vectors)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            **self.counts,
+            "indexes": {name: len(index) for name, (_, index) in self._indexes.items()},
+        }
+
+
+# Global instance
+local_vector_store = LocalVectorStore()
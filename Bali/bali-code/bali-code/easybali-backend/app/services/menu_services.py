@@ -1,8 +1,13 @@
-import pandas as pd
-from app.services.google_sheets import get_workbook
-from app.utils.data_processing import clean_dataframe
-import threading
+from app.services.google_sheets import get_workbook, AsyncSheetsClient
+from app.services.catalog_snapshot import compile_catalog, fill_gaps, get_snapshot, publish_snapshot, copy_items
+from app.services.sheet_versions import sheet_versions, content_hash
+from app.services.catalog_store import load_catalog, save_catalog, touch_catalog
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from typing import Optional
+import multiprocessing
+import asyncio
 
 import os
 import logging
@@ -46,169 +51,344 @@ cache = {
     "price_diff_sp_df": None,
     "language_lesson_df": None,
     "event_calendar_df": None,
+    "villa_faqs_df": None,
+    "local_cuisine_df": None,
 }
 
-# Refresh thread control
-should_stop = False
-refresh_thread = None
+# Refresh task control
+REFRESH_INTERVAL_SECONDS = 300
+CATALOG_STALE_AFTER_SECONDS = 3 * REFRESH_INTERVAL_SECONDS
+refresh_task = None
+catalog_source = None  # "disk" after a warm start, "sheets" once confirmed against Google
+_refresh_lock = asyncio.Lock()
+_sheets_client: Optional[AsyncSheetsClient] = None
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+# Sub-categories that must ALWAYS use their sheet hyperlink URL (never AI text)
+_LINK_ONLY_SUBCATS = {
+    "safety and health tips", "safety & health tips",
+    "medical recommendations", "medical reccomendations", "medical reccomendation",
+    "do's and don'ts of bali", "do's and don't of bali", "dos and don'ts of bali",
+    "dos and don'ts", "do's and don'ts",
+    "local cuisine guide", "local cousine guide",
+}
 
-def load_data_into_cache():
-    """Loads data from Google Sheets into cache with individual sheet resilience."""
-    print(f"Refreshing data at {datetime.now()}...")
+# (worksheet title, cache key, run clean_dataframe) — in load order. Adding a tab
+# here (or to AI_MATERIAL_SHEETS) needs a catalog_store.FORMAT_VERSION bump, or a
+# warm start's stored revision skips the download that would load it
+MAIN_SHEETS = [
+    # Core worksheets
+    ("Menu Structure", "menu_df", True),
+    ("Services Overview", "services_df", True),
+    ("Mark-up", "price_distribution", True),
+    ("Services Providers", "service_providers", True),
+    ("QR Codes", "villas_data", True),
+    ("Services Designs", "design_df", True),
+    ("Menu Design", "main_menu_design", True),
+    # Optional / Extended worksheets
+    ("Archive", "archive_df", True),
+    ("Platform Design", "platform_design_df", True),
+    ("Price Diff", "price_diff_df", True),
+    ("Price Diff SP", "price_diff_sp_df", True),
+    ("AI Data", "ai_data_df", True),
+    # RAG sources (ingested into Pinecone by rag_ingestion when they change)
+    ("Villa FAQs", "villa_faqs_df", False),
+    ("Local Cuisine", "local_cuisine_df", False),
+]
+
+# AI Material spreadsheet (separate Google Sheet)
+AI_MATERIAL_SHEETS = [
+    ("Local Language Lesson", "language_lesson_df", False),
+    ("Event Calendar", "event_calendar_df", False),
+]
+
+
+def _apply_menu_hyperlinks(ms_values, row_data):
+    """
+    Menu Structure needs special handling to extract hyperlink URLs from the Endpoint
+    column (values:batchGet returns display text only). Mutates ms_values.
+    """
+    _ms_headers = ms_values[0]
+    _ep_col = _ms_headers.index("Endpoint") if "Endpoint" in _ms_headers else None
+    _sub_col = _ms_headers.index("Sub-category") if "Sub-category" in _ms_headers else None
+    if _ep_col is None:
+        return
+    for _ri, _rinfo in enumerate(row_data):
+        if _ri == 0:
+            continue  # skip header
+        if _ri >= len(ms_values):
+            break
+        _cells = _rinfo.get("values", [])
+        if _ep_col < len(_cells):
+            _hl = _cells[_ep_col].get("hyperlink")
+            # Check if this row's Sub-category is in the force-link list
+            _subcat_val = ""
+            if _sub_col is not None and _sub_col < len(ms_values[_ri]):
+                _subcat_val = ms_values[_ri][_sub_col].lower().strip()
+            _is_force_link = _subcat_val in _LINK_ONLY_SUBCATS
+            # Only substitute hyperlink for non-AI endpoints,
+            # UNLESS this sub-category is force-link (always use the URL).
+            _display = (
+                ms_values[_ri][_ep_col]
+                if _ep_col < len(ms_values[_ri]) else ""
+            ).lower()
+            _is_ai_endpoint = (
+                _display.startswith("hybrid ai")
+                or _display.startswith("ai automated")
+            )
+            if _hl and (not _is_ai_endpoint or _is_force_link):
+                while len(ms_values[_ri]) <= _ep_col:
+                    ms_values[_ri].append("")
+                ms_values[_ri][_ep_col] = _hl
+
+
+def _get_sheets_client() -> AsyncSheetsClient:
+    global _sheets_client
+    if _sheets_client is None:
+        _sheets_client = AsyncSheetsClient()
+    return _sheets_client
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        # spawn, not fork: the serving process has live Mongo/HTTP threads
+        _parse_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _parse_pool
+
+
+async def _compile_off_loop(changed_tabs, frames, versions):
+    """Run compile_catalog in the parse process; fall back to a thread if the pool is unusable."""
+    global _parse_pool
+    loop = asyncio.get_running_loop()
     try:
-        workbook = get_cached_workbook()
-        
-        # Helper to load a sheet safely
-        def safe_load(sheet_name, cache_key, use_clean=True):
+        return await loop.run_in_executor(_get_parse_pool(), compile_catalog, changed_tabs, frames, versions)
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Catalog parse pool unavailable ({e}); parsing in a thread instead")
+        _parse_pool = None
+        return await asyncio.to_thread(compile_catalog, changed_tabs, frames, versions)
+
+
+async def _fetch_spreadsheet(client, spreadsheet_id, sheets, label, force):
+    """
+    Returns ([(sheet_name, cache_key, values, use_clean)], revision), or (None, revision)
+    when the spreadsheet's Drive revision shows nothing changed since the last load.
+    """
+    revision = await client.get_revision(spreadsheet_id)
+    if not force and sheet_versions.revision_unchanged(spreadsheet_id, revision):
+        logger.info(f"⏭️ {label} unchanged (revision {revision}), skipping download")
+        return None, revision
+
+    titles = await client.get_sheet_titles(spreadsheet_id)
+    wanted = []
+    for sheet_name, cache_key, use_clean in sheets:
+        if sheet_name in titles:
+            wanted.append((sheet_name, cache_key, use_clean))
+        else:
+            logger.warning(f"Sheet '{sheet_name}' not found in {label}.")
+
+    # One values:batchGet for every tab of the spreadsheet
+    values = await client.batch_get_values(spreadsheet_id, [name for name, _, _ in wanted])
+    tabs = []
+    for sheet_name, cache_key, use_clean in wanted:
+        data = fill_gaps(values.get(sheet_name) or [])
+        if not data:
+            logger.warning(f"Sheet '{sheet_name}' is empty.")
+            continue
+        if sheet_name == "Menu Structure":
             try:
-                ws = workbook.worksheet(sheet_name)
-                data = ws.get_all_values()
-                if not data:
-                    logger.warning(f"Sheet '{sheet_name}' is empty.")
-                    return
-                
-                if use_clean:
-                    cache[cache_key] = clean_dataframe(data)
-                else:
-                    df = pd.DataFrame(data[1:], columns=data[0])
-                    cache[cache_key] = df
-                logger.info(f"✅ Loaded sheet: {sheet_name}")
-            except Exception as e:
-                logger.error(f"❌ Failed to load sheet '{sheet_name}': {e}")
-
-        # Core worksheets — Menu Structure needs special handling to extract hyperlink URLs
-        # from the Endpoint column (gspread.get_all_values() returns display text only).
-        try:
-            _ms_ws = workbook.worksheet("Menu Structure")
-            _ms_values = _ms_ws.get_all_values()
-            if _ms_values:
-                _ms_headers = _ms_values[0]
-                _ep_col = _ms_headers.index("Endpoint") if "Endpoint" in _ms_headers else None
-                # Sub-categories that must ALWAYS use their sheet hyperlink URL (never AI text)
-                _LINK_ONLY_SUBCATS = {
-                    "safety and health tips", "safety & health tips",
-                    "medical recommendations", "medical reccomendations", "medical reccomendation",
-                    "do's and don'ts of bali", "do's and don't of bali", "dos and don'ts of bali",
-                    "dos and don'ts", "do's and don'ts",
-                    "local cuisine guide", "local cousine guide",
-                }
-                _sub_col = _ms_headers.index("Sub-category") if "Sub-category" in _ms_headers else None
-                if _ep_col is not None:
-                    try:
-                        _hl_resp = workbook.client.request(
-                            "GET",
-                            f"https://sheets.googleapis.com/v4/spreadsheets/{SHEET_ID}",
-                            params={
-                                "ranges": "Menu Structure",
-                                "includeGridData": "true",
-                                "fields": "sheets.data.rowData.values(hyperlink)",
-                            },
-                        )
-                        _row_data = (
-                            _hl_resp.json()
-                            .get("sheets", [{}])[0]
-                            .get("data", [{}])[0]
-                            .get("rowData", [])
-                        )
-                        for _ri, _rinfo in enumerate(_row_data):
-                            if _ri == 0:
-                                continue  # skip header
-                            _cells = _rinfo.get("values", [])
-                            if _ep_col < len(_cells):
-                                _hl = _cells[_ep_col].get("hyperlink")
-                                # Check if this row's Sub-category is in the force-link list
-                                _subcat_val = ""
-                                if _sub_col is not None and _sub_col < len(_ms_values[_ri]):
-                                    _subcat_val = _ms_values[_ri][_sub_col].lower().strip()
-                                _is_force_link = _subcat_val in _LINK_ONLY_SUBCATS
-                                # Only substitute hyperlink for non-AI endpoints,
-                                # UNLESS this sub-category is force-link (always use the URL).
-                                _display = (
-                                    _ms_values[_ri][_ep_col]
-                                    if _ep_col < len(_ms_values[_ri]) else ""
-                                ).lower()
-                                _is_ai_endpoint = (
-                                    _display.startswith("hybrid ai")
-                                    or _display.startswith("ai automated")
-                                )
-                                if _hl and (not _is_ai_endpoint or _is_force_link):
-                                    while len(_ms_values[_ri]) <= _ep_col:
-                                        _ms_values[_ri].append("")
-                                    _ms_values[_ri][_ep_col] = _hl
-                    except Exception as _hl_err:
-                        logger.warning(f"Could not extract Menu Structure hyperlinks: {_hl_err}")
-                from app.utils.data_processing import clean_dataframe as _cdf
-                cache["menu_df"] = _cdf(_ms_values)
-                logger.info("✅ Loaded sheet: Menu Structure (with hyperlinks)")
-        except Exception as _ms_err:
-            logger.error(f"❌ Failed to load Menu Structure: {_ms_err}")
-            safe_load("Menu Structure", "menu_df")  # fallback
-        safe_load("Services Overview", "services_df")
-        safe_load("Mark-up", "price_distribution")
-        safe_load("Services Providers", "service_providers")
-        safe_load("QR Codes", "villas_data")
-        safe_load("Services Designs", "design_df")
-        safe_load("Menu Design", "main_menu_design")
-        
-        # Optional / Extended worksheets
-        safe_load("Archive", "archive_df")
-        safe_load("Platform Design", "platform_design_df")
-        safe_load("Price Diff", "price_diff_df")
-        safe_load("Price Diff SP", "price_diff_sp_df")
-        safe_load("AI Data", "ai_data_df")
-
-        # AI Material spreadsheet (separate Google Sheet)
+                _apply_menu_hyperlinks(data, await client.get_hyperlinks(spreadsheet_id, sheet_name))
+            except Exception as _hl_err:
+                logger.warning(f"Could not extract Menu Structure hyperlinks: {_hl_err}")
+        tabs.append((sheet_name, cache_key, data, use_clean))
+        logger.info(f"✅ Loaded sheet: {sheet_name}")
+    return tabs, revision
+
+
+async def refresh_catalog(force: bool = False, client: Optional[AsyncSheetsClient] = None):
+    """
+    Refreshes the cache from Google Sheets without blocking the event loop.
+
+    Per spreadsheet: a Drive revision check (skipped entirely if unchanged), one
+    metadata call for tab titles and one values:batchGet for all tabs. Only tabs
+    whose content hash changed are parsed, in a worker process that hands back the
+    finished CatalogSnapshot; the loop just swaps it in. `force` bypasses both
+    change checks. Returns the cache keys that changed.
+    """
+    global catalog_source
+    print(f"Refreshing data at {datetime.now()}...")
+    client = client or _get_sheets_client()
+    async with _refresh_lock:
         try:
-            ai_wb = get_ai_material_workbook()
-            def safe_load_ai(sheet_name, cache_key):
+            raw_tabs = []
+            revisions = {}
+            confirmed = True
+            for spreadsheet_id, sheets, label in (
+                (SHEET_ID, MAIN_SHEETS, "main spreadsheet"),
+                (AI_MATERIAL_SHEET_ID, AI_MATERIAL_SHEETS, "AI Material spreadsheet"),
+            ):
                 try:
-                    ws = ai_wb.worksheet(sheet_name)
-                    data = ws.get_all_values()
-                    if not data:
-                        logger.warning(f"AI Material sheet '{sheet_name}' is empty.")
-                        return
-                    df = pd.DataFrame(data[1:], columns=data[0])
-                    cache[cache_key] = df
-                    logger.info(f"✅ Loaded AI Material sheet: {sheet_name}")
+                    tabs, revision = await _fetch_spreadsheet(client, spreadsheet_id, sheets, label, force)
                 except Exception as e:
-                    logger.error(f"❌ Failed to load AI Material sheet '{sheet_name}': {e}")
-            safe_load_ai("Local Language Lesson", "language_lesson_df")
-            safe_load_ai("Event Calendar", "event_calendar_df")
+                    logger.error(f"❌ Failed to load {label}: {e}")
+                    confirmed = False
+                    continue
+                if tabs is not None:
+                    raw_tabs.extend(tabs)
+                    revisions[spreadsheet_id] = revision
+
+            known_hashes = sheet_versions.hashes()
+            changed_tabs = []
+            for sheet_name, cache_key, values, use_clean in raw_tabs:
+                digest = content_hash(values)
+                if not force and cache.get(cache_key) is not None and known_hashes.get(cache_key) == digest:
+                    continue
+                changed_tabs.append((sheet_name, cache_key, values, use_clean, digest))
+
+            revision_moved = any(
+                not sheet_versions.revision_unchanged(spreadsheet_id, revision)
+                for spreadsheet_id, revision in revisions.items()
+            )
+            if changed_tabs:
+                # A tab that isn't in this batch keeps its last value
+                frames = {key: value for key, value in cache.items() if key != "last_updated"}
+                changes, snapshot = await _compile_off_loop(changed_tabs, frames, sheet_versions.versions())
+                sheet_versions.commit(changes)
+                publish_snapshot(snapshot)
+                cache.update(snapshot.frames)
+                sheet_versions.notify(changes.keys())
+                logger.info(f"Catalog refresh: {len(changes)} tab(s) changed: {sorted(changes)}")
+            else:
+                logger.info("Catalog refresh: no changes")
+            # Only once the snapshot is live: a failed parse must not make the
+            # next refresh skip the download of a revision that never loaded
+            for spreadsheet_id, revision in revisions.items():
+                sheet_versions.mark_revision(spreadsheet_id, revision)
+
+            await _persist_catalog(rewrite=bool(changed_tabs) or revision_moved)
+            if confirmed:
+                catalog_source = "sheets"
+                cache["last_updated"] = datetime.now()
+            return sorted(tab[1] for tab in changed_tabs)
         except Exception as e:
-            logger.error(f"❌ Failed to connect to AI Material spreadsheet: {e}")
+            logger.error(f"Critical error in refresh_catalog: {e}")
+            return []
 
-        cache["last_updated"] = datetime.now()
+
+async def _persist_catalog(rewrite: bool):
+    """Save the published snapshot for warm starts (or just mark it current if unchanged)."""
+    snapshot = get_snapshot()
+    if not snapshot.frames:
+        return
+    try:
+        if rewrite:
+            tabs, revisions = sheet_versions.export_state()
+            await asyncio.to_thread(save_catalog, snapshot, tabs, revisions)
+        else:
+            await asyncio.to_thread(touch_catalog)
     except Exception as e:
-        logger.error(f"Critical error in load_data_into_cache: {e}")
+        logger.warning(f"Could not persist catalog cache: {e}")
+
+
+def warm_start_from_disk() -> bool:
+    """
+    Publish the last persisted catalog so menus are served immediately after a
+    restart; the refresh task then brings it up to date in the background.
+    """
+    global catalog_source
+    if get_snapshot().frames:
+        return False
+    loaded = load_catalog()
+    if loaded is None:
+        return False
+    snapshot, meta = loaded
+    sheet_versions.restore_state(meta["tabs"], meta["revisions"])
+    publish_snapshot(snapshot)
+    cache.update(snapshot.frames)
+    cache["last_updated"] = meta["confirmed_at"]
+    catalog_source = "disk"
+    logger.info(f"⚡ Warm start: catalog {snapshot.version} loaded from disk (as of {meta['confirmed_at']})")
+    return True
+
+
+def get_catalog_status() -> dict:
+    """Catalog freshness for readiness probes."""
+    snapshot = get_snapshot()
+    last_updated = cache.get("last_updated")
+    age = (datetime.now() - last_updated).total_seconds() if last_updated else None
+    return {
+        "loaded": bool(snapshot.frames),
+        "source": catalog_source,
+        "version": snapshot.version,
+        "last_updated": last_updated.isoformat() if last_updated else None,
+        "age_seconds": round(age) if age is not None else None,
+        "stale": age is None or age > CATALOG_STALE_AFTER_SECONDS,
+    }
+
 
-def schedule_data_refresh():
+def load_data_into_cache(force: bool = False):
+    """Blocking wrapper around refresh_catalog() for scripts and one-off tooling."""
+    async def _run():
+        client = AsyncSheetsClient()
+        try:
+            return await refresh_catalog(force, client=client)
+        finally:
+            await client.aclose()
+    return asyncio.run(_run())
+
+
+async def schedule_data_refresh():
     """Runs data refresh at regular intervals."""
-    global should_stop
-    while not should_stop:
-        load_data_into_cache()
-        for _ in range(300):
-            if should_stop:
-                break
-            threading.Event().wait(1)
+    while True:
+        await refresh_catalog()
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
 
 def start_cache_refresh():
-    """Starts the background thread for refreshing data."""
-    global refresh_thread
-    refresh_thread = threading.Thread(target=schedule_data_refresh, daemon=True)
-    refresh_thread.start()
+    """
+    Serves the on-disk catalog right away (if any) and starts the background
+    refresh task, Pinecone index verification and RAG auto-ingestion (call
+    from inside the running event loop).
+    """
+    global refresh_task
+    try:
+        warm_start_from_disk()
+    except Exception as e:
+        logger.warning(f"Warm start from disk failed: {e}")
+    loop = asyncio.get_running_loop()
+    refresh_task = loop.create_task(schedule_data_refresh())
+    try:
+        # Index verification/creation hits the Pinecone control plane; keep it off the loop
+        from app.services.pinconeservice import pinecone_gateway
+        loop.run_in_executor(None, pinecone_gateway.warm_up)
+    except Exception as e:
+        logger.warning(f"Pinecone warm-up not started: {e}")
+    try:
+        from app.services.rag_ingestion import rag_ingestion
+        rag_ingestion.start()
+    except Exception as e:
+        logger.warning(f"RAG auto-ingestion not started: {e}")
 
 def stop_cache_refresh():
-    """Stops the background thread for refreshing data."""
-    global should_stop, refresh_thread
-    should_stop = True
-    if refresh_thread:
-        refresh_thread.join()
-        refresh_thread = None
+    """Stops the refresh task and releases the Sheets HTTP pool and parse worker."""
+    global refresh_task, _sheets_client, _parse_pool
+    if refresh_task:
+        refresh_task.cancel()
+        refresh_task = None
+    if _parse_pool:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+    if _sheets_client:
+        client, _sheets_client = _sheets_client, None
+        try:
+            asyncio.get_running_loop().create_task(client.aclose())
+        except RuntimeError:
+            pass  # no loop left to close on; the process is exiting anyway
 
 async def get_main_menu():
-    if cache["menu_df"] is None:
+    main_menu = get_snapshot().main_menu
+    if main_menu is None:
         raise ValueError("Data not loaded")
-    return cache["menu_df"]['Main Menu'].dropna().unique().tolist()
+    return list(main_menu)
 
 
 async def get_main_menu_design():
@@ -242,88 +422,33 @@ async def get_service_overview():
 
 
 async def get_categories():
-    if cache["design_df"] is None:
+    categories = get_snapshot().categories
+    if categories is None:
         raise ValueError("Data not loaded")
-    categories = cache["design_df"].drop_duplicates(subset=["Category"])[
-        ["Category", "Category Description WA"]
+    return [
+        {
+            "title": category["title"],  # Category name as header
+            "description": category["description"],  # Category description as body
+            "sections": copy_items(category["sections"])  # Sections contain subcategories
+        }
+        for category in categories
     ]
 
-    result = []
-
-    for _, category_row in categories.iterrows():
-        category_name = category_row["Category"]
-        category_description = category_row["Category Description WA"]
-
-        subcategories = cache["design_df"][
-            cache["design_df"]["Category"] == category_name
-        ][["Sub-category", "Sub-category Description WA"]].drop_duplicates()
-
-        section_rows = [
-            {
-                "id": row["Sub-category"].lower().replace(" ", "_"),
-                "service_title": row["Sub-category"],
-                "service_description": row["Sub-category Description WA"]
-            }
-            for _, row in subcategories.iterrows()
-        ]
-        result.append(
-            {
-                "title": category_name,  # Category name as header
-                "description": category_description,  # Category description as body
-                "sections": section_rows  # Sections contain subcategories
-            }
-        )
-
-    return result
-
-
 
 async def get_categories_only():
-    if cache["design_df"] is None:
+    categories = get_snapshot().categories_only
+    if categories is None:
         raise ValueError("Data not loaded")
-    
-    categories = cache["design_df"].drop_duplicates(subset=["Category"])[
-        ["Category", "Category ID", "Category Description WA"]
-    ]
-
-    result = []
-
-    for _, category_row in categories.iterrows():
-        category_id = category_row["Category ID"] 
-        category_name = category_row["Category"]
-        category_description = category_row["Category Description WA"]
-
-        result.append(
-            {
-                "id": category_id,
-                "title": category_name,
-                "description": category_description
-            }
-        )
+    return copy_items(categories)
 
-    return result
 
 async def get_category_sections(category_title: str):
-    if cache["design_df"] is None:
+    sections = get_snapshot().category_sections
+    if sections is None:
         raise ValueError("Data not loaded")
-    if category_title not in cache["design_df"]["Category"].values:
+    if category_title not in sections:
         raise ValueError(f"Category '{category_title}' not found")
-    subcategories = cache["design_df"][
-        cache["design_df"]["Category"] == category_title
-    ][["Sub-category", "Sub-category Description WA"]].drop_duplicates()
-
-    section_rows = []
-
-    for _, row in subcategories.iterrows():
-        section_rows.append(
-            {
-                "id": row["Sub-category"].lower().replace(" ", "_"),
-                "title": row["Sub-category"],
-                "description": row["Sub-category Description WA"]
-            }
-        )
-    result =  section_rows
-    return result
+    return copy_items(sections[category_title])
 
 
 async def get_sub_menu(menu_location: str):
@@ -384,19 +509,12 @@ async def get_restaurants_menu(menu_location: str):
 
 async def get_order_service_sub_menu(main_menu: str):
     if main_menu == "Order Services":
-        if cache["design_df"] is None:
+        order_services_menu = get_snapshot().order_services_menu
+        if order_services_menu is None:
             raise ValueError("Services data not loaded")
 
-        # Build JSON objects from design_df for "Order Services"
-        return [
-            {
-                "category": row["Category"],
-                "description": row["Category Description"],
-                "picture": row["Category Picture"],
-                "button": row["Category Button"]
-            }
-            for _, row in cache["design_df"].drop_duplicates(subset=["Category"]).iterrows()
-        ]
+        # Pre-built from design_df (one entry per Category) when the snapshot was compiled
+        return copy_items(order_services_menu)
     if cache["menu_df"] is None:
         raise ValueError("Menu data not loaded")
     
@@ -425,191 +543,86 @@ async def get_sub_sub_menu(main_menu: str, sub_menu: str):
 
 
 async def get_sub_category(category: str):
-    if cache["design_df"] is None:
+    sub_categories = get_snapshot().sub_categories
+    if sub_categories is None:
         raise ValueError("Services data not loaded")
-    filtered_df = cache["design_df"][cache["design_df"]['Category'] == category]
-    if filtered_df.empty:
+    if category not in sub_categories:
         raise ValueError("Category not found")
-    return [
-        {
-            "subcategory": row["Sub-category"],
-            "description": row["Sub-category Description"],
-            "picture": row["Sub-category Picture"],
-            "button": row["Sub-category Button"]
-        }
-        for _, row in filtered_df.drop_duplicates(subset=["Sub-category"]).iterrows()
-    ]
+    return copy_items(sub_categories[category])
 
 
 async def get_service_items(subcategory: str):
-    if cache["services_df"]is None:
+    service_items = get_snapshot().service_items
+    if service_items is None:
          raise ValueError("Services data not loaded")
-    filtered_df = cache["services_df"][cache["services_df"]['Sub-category'] == subcategory]
-    if filtered_df.empty:
+    if subcategory not in service_items:
         raise ValueError("Category not found")
-    return [
-        {
-            "service_item": row["Service Item"],
-            "description": row["Service Item Description"],
-            "picture": row["Image URL"],
-            "button": row["Final Price (Service Item Button)"],
-            "service_provider_code": row.get("Service Provider Number"), # Assuming this column exists based on common patterns
-        }
-        for _, row in filtered_df.drop_duplicates(subset=["Service Item"]).iterrows()
-    ]
+    return copy_items(service_items[subcategory])
 
 
 async def get_service_base_price(service_name: str) -> str:
-    if cache["services_df"] is None:
+    snapshot = get_snapshot()
+    if snapshot.price_by_service is None:
         raise ValueError("Services data not loaded")
-    
-    df = cache["services_df"]
-    filtered_df = df[df['Service Item'] == service_name]
-    
-    if filtered_df.empty:
-        # Fallback: Normalize all non-alphanumeric characters for maximum matching flexibility
-        import re
-        norm_input = re.sub(r'[^a-z0-9]', '', str(service_name).lower())
-        for idx, row in df.iterrows():
-            item = str(row['Service Item'])
-            norm_item = re.sub(r'[^a-z0-9]', '', item.lower())
-            if norm_input == norm_item or norm_input in norm_item or norm_item in norm_input:
-                filtered_df = df.iloc[[idx]]
-                break
 
-    if filtered_df.empty:
+    # Exact name, then normalized name (non-alphanumerics stripped), then substring match
+    price = snapshot.service_price(service_name)
+    if price is None:
         print(f"Warning: Service '{service_name}' not found in services data")
         return "0"
-        
-    price = filtered_df.iloc[0]["Final Price (Service Item Button)"]
-    if pd.isna(price):
-        return "0"
-    # Strip non-breaking spaces, commas, and non-numeric garbage from Google Sheets
-    import re as _re
-    cleaned = _re.sub(r'[^\d]', '', str(price))
-    return cleaned if cleaned else "0"
+    return price
+
 
 async def get_service_items_for_whatsapp(subcategory_title: str):
-    if cache["services_df"]is None:
+    service_items = get_snapshot().service_items_whatsapp
+    if service_items is None:
          raise ValueError("Services data not loaded")
-    filtered_df = cache["services_df"][cache["services_df"]['Sub-category'] == subcategory_title]
-    if filtered_df.empty:
+    if subcategory_title not in service_items:
         raise ValueError("Category not found")
-    return [
-        {
-            "title": row["Service Item"],
-            "description": row["Service Item Description"],
-            "button": row["Final Price (Service Item Button)"],
-        }
-        for _, row in filtered_df.drop_duplicates(subset=["Service Item"]).iterrows()
-    ]
-
-
+    return copy_items(service_items[subcategory_title])
 
 
 async def get_service_provider_by_whatsapp(whatsapp_number: str):
     try:
-        providers_df = await get_service_providers()
-        clean_whatsapp = whatsapp_number.lstrip('+')
-        matching_provider = providers_df[
-            (providers_df["WhatsApp"] == whatsapp_number) |
-            (providers_df["WhatsApp"] == clean_whatsapp) |
-            (providers_df["WhatsApp"] == f"+{clean_whatsapp}")
-        ]
-        
-        if matching_provider.empty:
-            return None
-        return matching_provider.iloc[0]["Number"]
-        
+        snapshot = get_snapshot()
+        if snapshot.frames.get("service_providers") is None:
+            raise ValueError("Data not loaded")
+        return snapshot.provider_number(whatsapp_number)
+
     except Exception as e:
         print(f"Error retrieving service provider: {e}")
         return None
-    
 
 
 async def get_villa_code_by_name(villa_name: str):
-    if cache["villas_data"] is None or cache["villas_data"].empty:
+    snapshot = get_snapshot()
+    if not snapshot.villa_count:
         logger.warning("Villa data not loaded into cache.")
         return None
-    
+
     try:
-        villas_df = cache["villas_data"]
-        search_input = villa_name.strip().lower()
-        
-        # 1. Search by Number (ID) - Check if input contains the code (robust for 'villa V2')
-        for _, row in villas_df.iterrows():
-            code = str(row.get("Number", "")).strip().lower()
-            if code and (code == search_input or f" {code}" in f" {search_input}"):
-                return str(row["Number"]).strip()
-        
-        # 2. Search by Name - Exact match
-        matching_villa = villas_df[
-            villas_df["Name of Villa"].astype(str).str.strip().str.lower() == search_input
-        ]
-        if not matching_villa.empty:
-            return str(matching_villa.iloc[0]["Number"]).strip()
-
-        # 3. Search by Name - Check if input contains the name (robust for 'Villa Hassan Umalas')
-        for _, row in villas_df.iterrows():
-            name = str(row.get("Name of Villa", "")).strip().lower()
-            if name and name in search_input:
-                return str(row["Number"]).strip()
-
-        # 4. Search by Name - Check if name contains input (Partial match fallback)
-        matching_villa = villas_df[
-            villas_df["Name of Villa"].astype(str).str.contains(villa_name, case=False, na=False)
-        ]
-        if not matching_villa.empty:
-            return str(matching_villa.iloc[0]["Number"]).strip()
-            
-        return None
-    
-    except Exception as e:
-        logger.error(f"Error in get_villa_code_by_name: {e}")
-        return None
-        
+        return snapshot.villa_code_for(villa_name)
     except Exception as e:
         logger.error(f"Error retrieving villa code for '{villa_name}': {e}")
         return None
 
+
 async def get_villa_location_by_code(villa_code: str):
-    if cache["villas_data"] is None:
-        return None
-    
     try:
-        villas_df = cache["villas_data"]
-        matching_villa = villas_df[villas_df["Number"] == villa_code]
-        
-        if matching_villa.empty:
+        villa = get_snapshot().villa_record(villa_code)
+        if villa is None:
             return None
-            
-        return matching_villa.iloc[0].get("Location")
-        
+        return villa.get("Location")
+
     except Exception as e:
         print(f"Error retrieving villa location: {e}")
         return None
+
+
 async def get_villa_info_by_code(villa_code: str):
     """Retrieves full villa metadata by its code."""
-    if cache["villas_data"] is None or cache["villas_data"].empty:
-        return None
     try:
-        df = cache["villas_data"]
-        match = df[df["Number"] == villa_code]
-        if match.empty:
-            return None
-        row = match.iloc[0]
-        return {
-            "name": row.get("Name of Villa"),
-            "location": row.get("Location"),
-            "address": row.get("Address"),
-            "directions": row.get("Directions"),
-            "manager_name": row.get("Manager"),
-            "manager_number": row.get("Manager Number"),
-            "wifi_name": row.get("WiFi Name"),
-            "wifi_password": row.get("WiFi Password"),
-            "house_rules": row.get("Rules"),
-            "map_link": row.get("Map Link")
-        }
+        return get_snapshot().villa_info(villa_code)
     except Exception as e:
         logger.error(f"Error in get_villa_info_by_code: {e}")
         return None
@@ -728,33 +741,5 @@ def get_language_lesson_words() -> list:
 
 
 def get_event_calendar_context() -> str:
-    """Return event calendar data as a plain-text block for AI context injection."""
-    df = cache.get("event_calendar_df")
-    if df is None or df.empty:
-        return "No upcoming event data is currently available."
-    lines = ["Here are the upcoming events in Bali:"]
-    for _, row in df.iterrows():
-        name = str(row.get("Event Name", "")).strip()
-        if not name:
-            continue
-        date = str(row.get("Date", "")).strip()
-        time = str(row.get("Time", "")).strip()
-        location = str(row.get("Location", "")).strip()
-        description = str(row.get("Description", "")).strip()
-        notes = str(row.get("Additional Notes", "")).strip()
-        url = str(row.get("For more details (URL)", row.get("For more details", ""))).strip()
-        line = f"- {name}"
-        if date:
-            line += f" | {date}"
-        if time:
-            line += f" at {time}"
-        if location:
-            line += f" | {location}"
-        if description:
-            line += f"\n  {description}"
-        if notes:
-            line += f"\n  Note: {notes}"
-        if url and url.startswith("http"):
-            line += f"\n  More info: {url}"
-        lines.append(line)
-    return "\n".join(lines)
+    """Return event calendar data as a plain-text block for AI context injection (rendered per catalog version)."""
+    return get_snapshot().event_calendar_context
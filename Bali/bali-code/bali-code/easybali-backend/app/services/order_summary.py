@@ -1,7 +1,9 @@
 from app.db.session import order_collection, db, villa_code_collection
+from app.services.dashboard_stats import dashboard_stats
+from app.services.analytics_service import record_guest_order
 from pymongo import ReturnDocument
 from datetime import datetime
-from app.models.order_summary import Order
+from app.models.order_summary import Order, amount_idr_from_price
 from typing import Dict, Optional
 
 
@@ -64,8 +66,12 @@ import logging
 logger = logging.getLogger(__name__)
 
 async def save_order_to_db(order: dict):
+    if order.get("amount_idr") is None:
+        order["amount_idr"] = amount_idr_from_price(order.get("price"))
     logger.info(f"Booking flow stage: Order {order.get('order_number')} created in MongoDB with status 'pending'")
     await order_collection.insert_one(order)
+    dashboard_stats.touch(order.get("villa_code"))
+    await record_guest_order(order)
 
 
 def format_order_summary(order: dict) -> str:
@@ -163,6 +169,7 @@ async def cancel_order(order_number: str, reason: str = "User cancelled") -> dic
             }},
             return_document=ReturnDocument.AFTER
         )
+        dashboard_stats.touch(order_doc.get("villa_code"))
         logger.info(f"Booking flow stage: Order {order_number} cancelled. Reason: {reason}")
         return {"success": True, "message": f"Order {order_number} has been cancelled."}
     except Exception as e:
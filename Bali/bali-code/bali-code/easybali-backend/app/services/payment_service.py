@@ -11,6 +11,7 @@ from xendit.invoice.model.notification_channel import NotificationChannel
 from xendit.invoice.model.invoice_item import InvoiceItem
 import datetime
 from app.db.session import order_collection
+from app.services.dashboard_stats import dashboard_stats
 from app.models.order_summary import Order
 from app.settings.config import settings
 from app.services.menu_services import get_villa_location_by_code
@@ -296,6 +297,7 @@ async def update_order_with_payment_info(order_number: str, payment_data: dict):
             {"order_number": order_number},
             {"$set": update_data}
         )
+        dashboard_stats.touch()
         return result.modified_count > 0
     except Exception as e:
         print(f"Database update error: {str(e)}")
@@ -414,6 +416,7 @@ async def distribute_order_payments(order_number: str, distribution_data: dict):
                     }
                 }
             )
+            dashboard_stats.touch()
 
             logger.info(f"Payment distribution complete for order {order_number}")
 
@@ -427,4 +430,5 @@ async def distribute_order_payments(order_number: str, distribution_data: dict):
                     "status": "distribution_failed"
                 }
             }
-        )
\ No newline at end of file
+        )
+        dashboard_stats.touch()
\ No newline at end of file
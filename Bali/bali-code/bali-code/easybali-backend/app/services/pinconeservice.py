@@ -1,31 +1,125 @@
 import os
-from typing import Any
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
 from pinecone import Pinecone, ServerlessSpec
 from app.settings.config import settings
 
-def get_index(index_name: str, dimension: int = 1536, metric: str = "cosine") -> Any:
-    """Safely get or create a Pinecone index."""
-    try:
-        pinecone_api_key = settings.pinecone_api_key
-        pinecone_region = settings.pinecone_region
-        pinecone_cloud = settings.pinecone_cloud
-
-        if not pinecone_api_key:
-            print("⚠️ PINECONE_API_KEY not found in settings")
-            return None
-
-        pc = Pinecone(api_key=pinecone_api_key)
-
-        existing_indexes = [idx.name for idx in pc.list_indexes()]
-        if index_name not in existing_indexes:
-            pc.create_index(
-                name=index_name,
-                dimension=dimension,
-                metric=metric,
-                spec=ServerlessSpec(cloud=pinecone_cloud, region=pinecone_region)
-            )
-        
-        return pc.Index(index_name)
-    except Exception as e:
-        print(f"❌ Pinecone Error: {e}")
-        return None
+logger = logging.getLogger(__name__)
+
+# Every index the chatbot reads; verified (and created if missing) once per process
+RAG_INDEXES = ("things-to-do-in-bali", "local-cuisine", "villa-faqs", "event-calender")
+DEFAULT_DIMENSION = 1536
+DEFAULT_METRIC = "cosine"
+# Connections per index handle's HTTP pool (shared by all queries on that index)
+POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+# After a failed lookup, don't hit the control plane again for this long
+RETRY_SECONDS = 30.0
+
+
+class VectorStoreGateway:
+    """
+    Process-wide access to Pinecone indexes.
+
+    The client is created once and every `Index` handle is built with its
+    host already resolved, so a query goes straight to the data plane over
+    the handle's pooled HTTP connections. The control plane (list, describe,
+    create) is used by `ensure_indexes`, which `warm_up` runs once for
+    RAG_INDEXES at startup (in a thread, from start_cache_refresh) and
+    ingest_faqs runs explicitly, and by one describe per index that warm-up
+    did not cover.
+    """
+
+    def __init__(self):
+        self._pc: Optional[Pinecone] = None
+        self._handles: Dict[str, Any] = {}
+        self._unavailable: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._warmed = False
+        self.counts = {"clients_created": 0, "control_plane_calls": 0, "handle_hits": 0, "handles_built": 0}
+
+    def _client(self) -> Optional[Pinecone]:
+        if self._pc is None:
+            if not settings.pinecone_api_key:
+                logger.warning("⚠️ PINECONE_API_KEY not found in settings")
+                return None
+            self._pc = Pinecone(api_key=settings.pinecone_api_key, pool_threads=POOL_THREADS)
+            self.counts["clients_created"] += 1
+        return self._pc
+
+    def _build_handle(self, pc: Pinecone, name: str, host: str):
+        self._handles[name] = pc.Index(name=name, host=host)
+        self._unavailable.pop(name, None)
+        self.counts["handles_built"] += 1
+
+    def ensure_indexes(self, names: Iterable[str] = RAG_INDEXES, dimension: int = DEFAULT_DIMENSION,
+                       metric: str = DEFAULT_METRIC):
+        """Create missing indexes and cache a handle for each (blocking; run at startup)."""
+        with self._lock:
+            pc = self._client()
+            if pc is None:
+                return
+            self.counts["control_plane_calls"] += 1
+            hosts = {idx.name: idx.host for idx in pc.list_indexes()}
+            for name in names:
+                if name not in hosts:
+                    logger.info(f"🌲 Creating Pinecone index '{name}'")
+                    pc.create_index(
+                        name=name,
+                        dimension=dimension,
+                        metric=metric,
+                        spec=ServerlessSpec(cloud=settings.pinecone_cloud, region=settings.pinecone_region)
+                    )
+                    self.counts["control_plane_calls"] += 2
+                    hosts[name] = pc.describe_index(name).host
+                if name not in self._handles:
+                    self._build_handle(pc, name, hosts[name])
+            logger.info(f"🌲 Pinecone handles ready: {sorted(self._handles)}")
+
+    def warm_up(self):
+        """Verify (and create) the RAG indexes once per process; logs instead of raising (blocking)."""
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+            try:
+                self.ensure_indexes()
+            except Exception as e:
+                logger.error(f"❌ Pinecone index verification failed: {e}")
+
+    def get_index(self, index_name: str) -> Any:
+        """Cached handle for an existing index, or None when it can't be reached (blocking on a miss)."""
+        handle = self._handles.get(index_name)
+        if handle is not None:
+            self.counts["handle_hits"] += 1
+            return handle
+        with self._lock:
+            if index_name in self._handles:
+                return self._handles[index_name]
+            failed_at = self._unavailable.get(index_name)
+            if failed_at is not None and time.monotonic() - failed_at < RETRY_SECONDS:
+                return None
+            try:
+                pc = self._client()
+                if pc is None:
+                    return None
+                self.counts["control_plane_calls"] += 1
+                self._build_handle(pc, index_name, pc.describe_index(index_name).host)
+                return self._handles[index_name]
+            except Exception as e:
+                self._unavailable[index_name] = time.monotonic()
+                logger.error(f"❌ Pinecone Error for index '{index_name}': {e}")
+                return None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.counts, "indexes": sorted(self._handles)}
+
+
+# Global instance
+pinecone_gateway = VectorStoreGateway()
+
+
+def get_index(index_name: str) -> Any:
+    """Cached Pinecone index handle (indexes are created by pinecone_gateway.ensure_indexes)."""
+    return pinecone_gateway.get_index(index_name)
@@ -0,0 +1,244 @@
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from app.settings.config import settings
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Tokens available for history + summary + knowledge base + internal DB in one prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKENS", "3000"))
+# The newest messages are packed ahead of any retrieved context
+MIN_RECENT_MESSAGES = 4
+MESSAGE_MAX_TOKENS = 400
+SUMMARY_MAX_TOKENS = 200
+# Uncovered dropped messages needed before spending a summary call on them
+SUMMARY_BATCH_MESSAGES = 4
+SUMMARY_ENABLED = os.getenv("PROMPT_SUMMARY_ENABLED", "false").lower() == "true"
+SUMMARY_MODEL = os.getenv("PROMPT_SUMMARY_MODEL", "gpt-4o-mini")
+# Rough chars-per-token when no local tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when it is installed, else a chars/4 estimate."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoding = None
+        self._resolved = False
+
+    def _get_encoding(self):
+        if not self._resolved:
+            self._resolved = True
+            if TIKTOKEN_AVAILABLE:
+                try:
+                    try:
+                        self._encoding = tiktoken.encoding_for_model(self.model)
+                    except KeyError:
+                        self._encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Clip text to at most max_tokens (keeping the start)."""
+        if self.count(text) <= max_tokens:
+            return text
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]) + "…"
+        return text[:max_tokens * CHARS_PER_TOKEN] + "…"
+
+
+def format_history(messages: List[dict]) -> str:
+    return "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in messages)
+
+
+def _message_key(message: dict) -> str:
+    return hashlib.sha1(f"{message.get('role')}:{message.get('content')}".encode()).hexdigest()
+
+
+class PackedContext:
+    """The parts of a prompt that made it into the token budget."""
+
+    def __init__(self):
+        self.summary = ""
+        self.history: List[dict] = []
+        self.dropped_history: List[dict] = []
+        self.rag_snippets: List[str] = []
+        self.sheet_lines: List[str] = []
+        self.tokens = 0
+
+    @property
+    def history_text(self) -> str:
+        text = format_history(self.history)
+        if self.summary:
+            return f"Summary of earlier conversation: {self.summary}\n{text}"
+        return text
+
+    @property
+    def rag(self) -> str:
+        return "\n\n".join(self.rag_snippets)
+
+    @property
+    def sheet(self) -> str:
+        return "\n".join(self.sheet_lines)
+
+
+class PromptPacker:
+    """
+    Packs conversation history, RAG snippets and internal DB (sheet) context
+    into a fixed token budget by priority:
+
+      1. the rolling summary of older turns (if any)
+      2. the newest MIN_RECENT_MESSAGES messages
+      3. RAG snippets, best match first
+      4. sheet context lines, in section order
+      5. older history, newest first
+
+    Items that do not fit are skipped whole (a snippet or sheet line is never
+    cut mid-way; over-long individual messages are clipped). Older turns that
+    fall out of the budget can be folded into a per-user rolling summary when
+    PROMPT_SUMMARY_ENABLED is set.
+    """
+
+    def __init__(self, model: str = settings.OPENAI_MODEL_NAME):
+        self.counter = TokenCounter(model)
+        # user_id -> in-flight summary update (one per user at a time)
+        self._summarizing: Dict[str, asyncio.Task] = {}
+
+    def pack(self, history: List[dict], rag: str = "", sheet: str = "",
+             summary: Optional[str] = None, budget: int = None) -> PackedContext:
+        packed = PackedContext()
+        remaining = CONTEXT_TOKEN_BUDGET if budget is None else budget
+        count = self.counter.count
+
+        def take(cost: int) -> bool:
+            nonlocal remaining
+            if cost > remaining:
+                return False
+            remaining -= cost
+            return True
+
+        if summary:
+            text = self.counter.truncate(summary, SUMMARY_MAX_TOKENS)
+            if take(count(text)):
+                packed.summary = text
+
+        messages = [
+            {**m, "content": self.counter.truncate(str(m.get("content") or ""), MESSAGE_MAX_TOKENS)}
+            for m in history
+        ]
+        kept: List[dict] = []
+        split = len(messages)
+        # Newest messages first, down to MIN_RECENT_MESSAGES
+        while split > 0 and len(kept) < MIN_RECENT_MESSAGES:
+            m = messages[split - 1]
+            if not take(count(m["content"]) + 2):
+                break
+            kept.insert(0, m)
+            split -= 1
+
+        for snippet in (s.strip() for s in rag.split("\n\n")) if rag else ():
+            if snippet and take(count(snippet)):
+                packed.rag_snippets.append(snippet)
+
+        header = None
+        for line in sheet.splitlines() if sheet else ():
+            if not line.strip():
+                continue
+            if line.startswith("---"):
+                header = line
+                continue
+            cost = count(line) + (count(header) if header else 0)
+            if take(cost):
+                if header:
+                    packed.sheet_lines.append(header)
+                    header = None
+                packed.sheet_lines.append(line)
+
+        # Older turns fill what is left; the first one that doesn't fit ends the run
+        while split > 0:
+            m = messages[split - 1]
+            if not take(count(m["content"]) + 2):
+                break
+            kept.insert(0, m)
+            split -= 1
+
+        packed.history = kept
+        packed.dropped_history = history[:split]
+        packed.tokens = (CONTEXT_TOKEN_BUDGET if budget is None else budget) - remaining
+        return packed
+
+    async def pack_for_user(self, user_id: Optional[str], history: List[dict], rag: str = "",
+                            sheet: str = "", budget: int = None) -> PackedContext:
+        """pack() with the user's rolling summary; schedules a summary update for dropped turns."""
+        summary = None
+        if SUMMARY_ENABLED and user_id:
+            from app.utils.chat_memory import conversation_store
+            summary = await conversation_store.get_summary(user_id)
+        packed = self.pack(history, rag, sheet, (summary or {}).get("text"), budget)
+        if SUMMARY_ENABLED and user_id and packed.dropped_history:
+            self.schedule_summary(user_id, summary, packed.dropped_history)
+        return packed
+
+    # ── Rolling summary ───────────────────────────────────────────────────────
+
+    def schedule_summary(self, user_id: str, summary: Optional[dict], dropped: List[dict]):
+        """Fold dropped turns not yet covered by the summary into it, in the background."""
+        covers = (summary or {}).get("covers")
+        keys = [_message_key(m) for m in dropped]
+        new = dropped[keys.index(covers) + 1:] if covers in keys else dropped
+        if len(new) < min(SUMMARY_BATCH_MESSAGES, len(dropped)) or user_id in self._summarizing:
+            return
+        self._summarizing[user_id] = asyncio.create_task(
+            self._update_summary(user_id, (summary or {}).get("text", ""), new, keys[-1])
+        )
+
+    async def _update_summary(self, user_id: str, previous: str, messages: List[dict], covers: str):
+        try:
+            text = await self._summarize(previous, messages)
+            if text:
+                from app.utils.chat_memory import conversation_store
+                await conversation_store.set_summary(user_id, {"text": text, "covers": covers})
+        except Exception as e:
+            logger.warning(f"Conversation summary update failed for {user_id}: {e}")
+        finally:
+            self._summarizing.pop(user_id, None)
+
+    async def _summarize(self, previous: str, messages: List[dict]) -> str:
+        from app.services.openai_client import client
+        prompt = (
+            "Update the running summary of a guest's conversation with a Bali villa concierge. "
+            "Keep names, dates, bookings, preferences and open questions; drop small talk. "
+            f"Reply with the summary only, under {SUMMARY_MAX_TOKENS} tokens.\n\n"
+            f"CURRENT SUMMARY:\n{previous or '(none)'}\n\nNEW TURNS:\n{format_history(messages)}"
+        )
+        comp = await client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=SUMMARY_MAX_TOKENS,
+        )
+        return (comp.choices[0].message.content or "").strip()
+
+
+# Global instance
+prompt_packer = PromptPacker()
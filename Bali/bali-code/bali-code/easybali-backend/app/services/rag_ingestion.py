@@ -0,0 +1,270 @@
+import os
+import re
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from app.db.session import db
+from app.services.catalog_snapshot import get_snapshot
+from app.services.embedding_service import embedding_service
+from app.services.pinconeservice import get_index
+from app.services.local_vector_index import local_vector_store
+
+logger = logging.getLogger(__name__)
+
+# (worksheet title, catalog cache key, Pinecone index, columns joined into the embedded text)
+RAG_SOURCES = [
+    ("Villa FAQs", "villa_faqs_df", "villa-faqs", ["Villa Code", "Villa Name", "Question", "Answer"]),
+    ("Local Cuisine", "local_cuisine_df", "local-cuisine", ["Category", "Dish Name", "Description", "Warung Recommendation"]),
+    ("Event Calendar", "event_calendar_df", "event-calender",
+     ["Event Name", "Date", "Time", "Location", "Description", "For more details (URL)"]),
+]
+# Sheet FAQs without a villa code apply to every villa (same code admin FAQs use)
+GLOBAL_VILLA = "WEB_VILLA_01"
+UPSERT_BATCH_SIZE = 50
+DELETE_BATCH_SIZE = 500
+FETCH_BATCH_SIZE = 100
+# Ids written by sheet ingestion (row_id); admin FAQs use uuid4 ids
+_ROW_ID = re.compile(r"[0-9a-f]{32}")
+# Embed + upsert batches in flight at once per source
+MAX_PARALLEL_BATCHES = int(os.getenv("RAG_INGEST_PARALLELISM", "4"))
+AUTO_INGEST = os.getenv("RAG_AUTO_INGEST", "true").lower() == "true"
+
+
+def row_text(record: Dict[str, Any], text_columns: List[str]) -> str:
+    parts = []
+    for col in text_columns:
+        val = record.get(col)
+        if val is not None and str(val).strip() and str(val).lower() != "nan":
+            parts.append(f"{col}: {val}")
+    return "\n".join(parts)
+
+
+def row_id(text: str) -> str:
+    """Vector id for a row: the md5 of its text, so an edited row gets a new id."""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class RagIngestionEngine:
+    """
+    Keeps the Pinecone RAG indexes in step with their Google Sheets tabs.
+
+    Each run diffs the tab's row ids (md5 of the row text) against the ids
+    recorded in `rag_ingested_rows`: only new or edited rows are embedded
+    (in batches, through the embedding cache) and upserted, rows that
+    disappeared are deleted, and unchanged rows cost nothing. Upsert and
+    delete batches run concurrently (MAX_PARALLEL_BATCHES) with the blocking
+    SDK calls in threads, and every finished batch is checkpointed in
+    `rag_ingested_rows`, so an interrupted run resumes where it stopped.
+    A source with no checkpoints first adopts what an earlier ingestion left
+    in the index. Vectors written some other way (admin FAQs) are never touched.
+
+    Hooked into the catalog refresh via sheet_versions, so an edited tab is
+    re-ingested on the next refresh; ingest_faqs.py runs the same engine by hand.
+    """
+
+    def __init__(self):
+        self.collection = db["rag_ingested_rows"]
+        self._task: Optional[asyncio.Task] = None
+        self._queued: Set[str] = set()
+        self._subscribed = False
+        self.runs = 0
+        self.totals = {"upserted": 0, "deleted": 0, "unchanged": 0, "failed_batches": 0}
+        self.last_run: Dict[str, Any] = {}
+
+    # ── One source ────────────────────────────────────────────────────────────
+
+    async def _stored_ids(self, index_name: str, source: str) -> Set[str]:
+        cursor = self.collection.find({"index": index_name, "source": source}, {"row_id": 1})
+        return {doc["row_id"] async for doc in cursor}
+
+    async def _adopt_existing(self, index, index_name: str, source: str) -> Set[str]:
+        """
+        First run for a source: checkpoint the vectors an earlier ingestion left
+        in the index (row-id shaped ids whose metadata names this source), so
+        unchanged rows aren't re-embedded and orphans get deleted like any
+        removed row. Vectors written any other way are never adopted.
+        """
+        def scan() -> List[str]:
+            ids = [vid for page in index.list() for vid in page if _ROW_ID.fullmatch(vid)]
+            owned = []
+            for start in range(0, len(ids), FETCH_BATCH_SIZE):
+                fetched = index.fetch(ids=ids[start:start + FETCH_BATCH_SIZE]).vectors
+                owned.extend(vid for vid, v in fetched.items() if (v.metadata or {}).get("source") == source)
+            return owned
+
+        try:
+            owned = await asyncio.to_thread(scan)
+        except Exception as e:
+            logger.warning(f"RAG ingestion: could not scan '{index_name}' for earlier vectors: {e}")
+            return set()
+        if owned:
+            now = datetime.utcnow()
+            await self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": f"{index_name}|{rid}"},
+                    {"$set": {"index": index_name, "source": source, "row_id": rid, "ingested_at": now}},
+                    upsert=True,
+                )
+                for rid in owned
+            ], ordered=False)
+            logger.info(f"🧾 RAG ingestion adopted {len(owned)} existing vectors in {index_name} for {source}")
+        return set(owned)
+
+    async def _upsert_batch(self, index, index_name: str, source: str, rows: List[tuple]):
+        vectors = await embedding_service.embed_many([text for _, text, _ in rows])
+        payload = [
+            {"id": rid, "values": vector.tolist(), "metadata": metadata}
+            for (rid, _, metadata), vector in zip(rows, vectors)
+        ]
+        await asyncio.to_thread(index.upsert, vectors=payload)
+        now = datetime.utcnow()
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": f"{index_name}|{rid}"},
+                {"$set": {"index": index_name, "source": source, "row_id": rid, "ingested_at": now}},
+                upsert=True,
+            )
+            for rid, _, _ in rows
+        ], ordered=False)
+        return payload
+
+    async def _delete_batch(self, index, index_name: str, ids: List[str]):
+        await asyncio.to_thread(index.delete, ids=ids)
+        await self.collection.delete_many({"_id": {"$in": [f"{index_name}|{rid}" for rid in ids]}})
+        return ids
+
+    async def ingest_rows(self, source: str, index_name: str, records: Iterable[Dict[str, Any]],
+                          text_columns: List[str]) -> Dict[str, int]:
+        """Sync one sheet's rows into index_name; returns counts for this run."""
+        desired: Dict[str, tuple] = {}
+        for record in records:
+            text = row_text(record, text_columns)
+            if not text:
+                continue
+            metadata = {"text": text, "source": source}
+            if "Villa Code" in text_columns:
+                metadata["villa_code"] = str(record.get("Villa Code") or "").strip() or GLOBAL_VILLA
+            desired[row_id(text)] = (row_id(text), text, metadata)
+
+        stats = {"upserted": 0, "deleted": 0, "unchanged": 0, "failed_batches": 0}
+        index = await asyncio.to_thread(get_index, index_name)
+        if not index:
+            logger.error(f"❌ RAG ingestion: index '{index_name}' unavailable, skipping {source}")
+            stats["failed_batches"] = 1
+            return stats
+
+        stored = await self._stored_ids(index_name, source)
+        if not stored:
+            stored = await self._adopt_existing(index, index_name, source)
+        new_rows = [row for rid, row in desired.items() if rid not in stored]
+        removed = sorted(stored - desired.keys())
+        stats["unchanged"] = len(desired) - len(new_rows)
+
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_BATCHES)
+        # What actually reached Pinecone, for the local vector index
+        done = {"upserted": [], "deleted": []}
+
+        async def run(kind: str, count: int, job):
+            async with semaphore:
+                try:
+                    done[kind].extend(await job)
+                    stats[kind] += count
+                except Exception as e:
+                    stats["failed_batches"] += 1
+                    logger.error(f"RAG ingestion {kind} batch for {source} failed: {e}")
+
+        jobs = [
+            run("upserted", len(batch), self._upsert_batch(index, index_name, source, batch))
+            for batch in (new_rows[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(new_rows), UPSERT_BATCH_SIZE))
+        ] + [
+            run("deleted", len(batch), self._delete_batch(index, index_name, batch))
+            for batch in (removed[i:i + DELETE_BATCH_SIZE] for i in range(0, len(removed), DELETE_BATCH_SIZE))
+        ]
+        await asyncio.gather(*jobs)
+        await self._refresh_local_copy(index, index_name, done["upserted"], done["deleted"])
+
+        for key, value in stats.items():
+            self.totals[key] += value
+        self.last_run[index_name] = {**stats, "source": source, "finished_at": datetime.utcnow().isoformat()}
+        logger.info(f"🧾 RAG ingestion {source} -> {index_name}: {stats}")
+        return stats
+
+    async def _refresh_local_copy(self, index, index_name: str, upserts: List[dict], delete_ids: List[str]):
+        """Keep the local vector index in step: apply this run's writes, mirroring Pinecone first if there is no copy."""
+        if not local_vector_store.enabled:
+            return
+        try:
+            applied = await asyncio.to_thread(local_vector_store.apply_writes, index_name, upserts, delete_ids)
+            if not applied:
+                # The listing may not include this run's upserts yet (eventual consistency): apply them on top
+                if await asyncio.to_thread(local_vector_store.sync_from, index_name, index) is not None:
+                    await asyncio.to_thread(local_vector_store.apply_writes, index_name, upserts, delete_ids)
+        except Exception as e:
+            logger.warning(f"Local vector index '{index_name}' not refreshed: {e}")
+
+    # ── Catalog refresh hook ──────────────────────────────────────────────────
+
+    async def ingest_from_snapshot(self, cache_keys: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """Ingest the RAG tabs held by the published catalog (all of them when cache_keys is None)."""
+        frames = get_snapshot().frames
+        results = {}
+        for sheet_name, cache_key, index_name, text_columns in RAG_SOURCES:
+            if cache_keys is not None and cache_key not in cache_keys:
+                continue
+            df = frames.get(cache_key)
+            if df is None or df.empty:
+                continue
+            results[index_name] = await self.ingest_rows(sheet_name, index_name, df.to_dict(orient="records"), text_columns)
+        self.runs += 1
+        return results
+
+    def on_sheets_changed(self, changed: Set[str]):
+        """sheet_versions listener: queue the changed RAG tabs for background ingestion."""
+        keys = changed & {cache_key for _, cache_key, _, _ in RAG_SOURCES}
+        if keys:
+            self._queued |= keys
+            self._ensure_running()
+
+    def _ensure_running(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._drain())
+
+    async def _drain(self):
+        # Tabs that change while a run is in progress are picked up by the next pass
+        while self._queued:
+            keys, self._queued = self._queued, set()
+            try:
+                await self.ingest_from_snapshot(keys)
+            except Exception as e:
+                logger.error(f"RAG ingestion run failed: {e}")
+
+    def start(self):
+        """Subscribe to catalog changes and reconcile every RAG tab once (call inside the event loop)."""
+        if not AUTO_INGEST or self._subscribed:
+            return
+        from app.services.sheet_versions import sheet_versions
+        sheet_versions.subscribe(self.on_sheets_changed)
+        self._subscribed = True
+        self.on_sheets_changed({cache_key for _, cache_key, _, _ in RAG_SOURCES})
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            **self.totals,
+            "running": self._task is not None and not self._task.done(),
+            "last_run": self.last_run,
+        }
+
+
+# Global instance
+rag_ingestion = RagIngestionEngine()
@@ -1,30 +1,90 @@
+import os
+import time
+import asyncio
 import logging
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
 from app.services.pinconeservice import get_index
-from app.services.openai_client import client
+from app.services.local_vector_index import local_vector_store
+from app.services.embedding_service import embedding_service
 from app.settings.config import settings
 
 logger = logging.getLogger(__name__)
 
+# The Pinecone SDK is synchronous; queries run on this pool so they never block the event loop
+MAX_QUERY_WORKERS = int(os.getenv("RAG_QUERY_WORKERS", "8"))
+# A slow index is dropped from the answer rather than delaying it
+INDEX_TIMEOUT_SECONDS = float(os.getenv("RAG_INDEX_TIMEOUT", "2.5"))
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500)
+CONTEXT_MAX_CHARS = 8000
+
+
 class RAGService:
-    @staticmethod
-    async def get_rag_context(query: str, chat_type: str = "general", villa_code: str = "WEB_VILLA_01") -> str:
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=MAX_QUERY_WORKERS, thread_name_prefix="rag-query")
+        # index -> {"buckets": [count per LATENCY_BUCKETS_MS bound + overflow], "queries", "timeouts", "errors", "total_ms"}
+        self._latency: Dict[str, Dict[str, Any]] = {}
+
+    # ── Retrieval ─────────────────────────────────────────────────────────────
+
+    def _record(self, index_name: str, elapsed_ms: Optional[float], outcome: str = "ok"):
+        stats = self._latency.setdefault(index_name, {
+            "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1), "queries": 0, "timeouts": 0, "errors": 0, "total_ms": 0.0,
+        })
+        stats["queries"] += 1
+        if outcome != "ok":
+            stats[outcome] += 1
+            return
+        stats["total_ms"] += elapsed_ms
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound), len(LATENCY_BUCKETS_MS))
+        stats["buckets"][bucket] += 1
+
+    def _query_sync(self, index_name: str, vector: List[float], top_k: int, filter_dict: Optional[dict]) -> List[dict]:
+        # Small indexes are served from their local copy when one exists (RAG_LOCAL_INDEX)
+        index = local_vector_store.get(index_name) or get_index(index_name)
+        if not index:
+            return []
+        res = index.query(vector=vector, top_k=top_k, include_metadata=True, filter=filter_dict)
+        return res.get("matches", [])
+
+    async def query_index(self, index_name: str, vector: List[float], top_k: int = 3,
+                          filter_dict: Optional[dict] = None, timeout: float = INDEX_TIMEOUT_SECONDS) -> List[dict]:
+        """Matches from one index, or [] when it fails or exceeds the timeout."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            matches = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self._query_sync, index_name, vector, top_k, filter_dict),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            self._record(index_name, None, "timeouts")
+            logger.warning(f"RAG query on '{index_name}' timed out after {timeout}s")
+            return []
+        except Exception as e:
+            self._record(index_name, None, "errors")
+            logger.error(f"RAG query on '{index_name}' failed: {e}")
+            return []
+        self._record(index_name, (time.perf_counter() - start) * 1000)
+        return matches
+
+    async def get_rag_context(self, query: str, chat_type: str = "general", villa_code: str = "WEB_VILLA_01") -> str:
         """
         Unified RAG retrieval logic for both Web and WhatsApp.
         Intelligently selects the best Pinecone index based on query and chat_type.
+        Indexes are queried concurrently; a failed or slow index only drops its own matches.
         """
         try:
             # 1. Determine index search strategy
             indexes_to_search = []
-            
+
             # Context-based index selection
             if chat_type == "things-to-do-in-bali" or any(kw in query.lower() for kw in ["visit", "see", "explore", "activity", "tour", "adventure"]):
                 indexes_to_search.append(("things-to-do-in-bali", None))
-            
+
             if chat_type == "local-cuisine" or any(kw in query.lower() for kw in ["food", "restaurant", "eat", "dining", "cuisine", "cafe"]):
                 indexes_to_search.append(("local-cuisine", None))
-            
+
             # Always check villa-faqs as it contains critical house rules and localized info.
             # Use $in to match both villa-specific FAQs and globally-injected admin FAQs (WEB_VILLA_01).
             villa_faq_codes = [villa_code]
@@ -41,24 +101,15 @@ class RAGService:
                     seen.add(idx)
 
             # Generate embedding once
-            embed_resp = await client.embeddings.create(input=query, model="text-embedding-ada-002")
-            query_vector = embed_resp.data[0].embedding
-
-            all_context_pieces = []
-            
-            for index_name, filter_dict in unique_indexes:
-                index = get_index(index_name)
-                if not index:
-                    continue
-                
-                res = index.query(
-                    vector=query_vector,
-                    top_k=3,
-                    include_metadata=True,
-                    filter=filter_dict
-                )
-                
-                matches = res.get("matches", [])
+            query_vector = (await embedding_service.embed(query)).tolist()
+
+            results = await asyncio.gather(*[
+                self.query_index(index_name, query_vector, top_k=3, filter_dict=filter_dict)
+                for index_name, filter_dict in unique_indexes
+            ])
+
+            scored_pieces = []
+            for (index_name, _), matches in zip(unique_indexes, results):
                 # Use a lower threshold for villa-faqs (admin-curated Q&A pairs are trusted)
                 threshold = 0.60 if index_name == "villa-faqs" else 0.70
                 for m in matches:
@@ -66,18 +117,37 @@ class RAGService:
                     text = m.get("metadata", {}).get("text", "").strip()
                     if text and score > threshold:
                         source_label = index_name.replace("-", " ").title()
-                        all_context_pieces.append(f"[{source_label}]: {text}")
+                        scored_pieces.append((score, f"[{source_label}]: {text}"))
 
-            if not all_context_pieces:
+            if not scored_pieces:
                 logger.info(f"RAG MISS for query: '{query[:50]}...' across {seen}")
                 return ""
 
+            # Best matches first across all indexes, so the size cap trims the weakest
+            scored_pieces.sort(key=lambda p: p[0], reverse=True)
+            all_context_pieces = list(dict.fromkeys(piece for _, piece in scored_pieces))
             final_context = "\n\n".join(all_context_pieces)
             logger.info(f"RAG HIT: Found {len(all_context_pieces)} pieces for query: '{query[:50]}...'")
-            return final_context[:8000] # Token safety cap
+            return final_context[:CONTEXT_MAX_CHARS] # Token safety cap
 
         except Exception as e:
             logger.error(f"Unified RAG Service Error: {e}")
             return ""
 
+    def metrics(self) -> Dict[str, Any]:
+        """Per-index query latency histogram (bucket upper bounds in ms) plus timeouts and errors."""
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        report = {}
+        for index_name, stats in self._latency.items():
+            completed = stats["queries"] - stats["timeouts"] - stats["errors"]
+            report[index_name] = {
+                "queries": stats["queries"],
+                "timeouts": stats["timeouts"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / completed, 1) if completed else None,
+                "histogram": dict(zip(labels, stats["buckets"])),
+            }
+        return report
+
+
 rag_service = RAGService()
@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.catalog_snapshot import get_snapshot
+from app.services.embedding_service import embedding_service
+from app.utils.query_text import normalize_query, is_standalone
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# Also bounds how long another worker can serve an answer after an FAQ edit
+TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL", "1800"))
+MAX_PARTITIONS = 500
+MAX_ENTRIES_PER_PARTITION = 200
+# Global FAQs are stored under this villa code and shared by every villa
+GLOBAL_VILLA = "WEB_VILLA_01"
+# Chat modes whose answers depend only on the question (no side effects, live rates or itinerary state)
+CACHEABLE_CHAT_TYPES = {"general", "what-to-do", "things-to-do-in-bali", "local-cuisine", "event-calender", "whatsapp"}
+
+
+class SemanticCache:
+    """
+    Reuses concierge answers for questions that mean the same thing.
+
+    Entries are partitioned by (chat_type, villa_code, language, catalog
+    version); inside a partition the normalized question's embedding is
+    compared with cached ones and an answer above SIMILARITY_THRESHOLD is
+    served without RAG or a chat completion. Only standalone questions are
+    cached (no follow-ups that lean on the conversation), entries expire after
+    TTL_SECONDS and FAQ edits drop the affected villa's partitions.
+    """
+
+    def __init__(self):
+        # (chat_type, villa_code, language, version) -> [(vector, answer, expires_at, tokens, query)]
+        self._partitions: "OrderedDict[Tuple[str, str, str, str], List[Tuple[np.ndarray, str, float, int, str]]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def is_cacheable(query: str, chat_type: str) -> bool:
+        return chat_type in CACHEABLE_CHAT_TYPES and is_standalone(query)
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = await embedding_service.embed(text)
+        return vector / np.linalg.norm(vector)
+
+    async def lookup(self, query: str, chat_type: str, villa_code: str, language: str) -> Tuple[Optional[str], Optional[tuple]]:
+        """
+        (cached answer or None, probe). Pass the probe to store() after computing
+        a fresh answer; it is None when the query must not be cached.
+        """
+        if not self.is_cacheable(query, chat_type):
+            self.bypassed += 1
+            return None, None
+        version = get_snapshot().version
+        if version != self._version:
+            # New catalog: every partition keyed on the old version is dead
+            self._partitions.clear()
+            self._version = version
+        key = (chat_type, villa_code or GLOBAL_VILLA, language or "EN", version)
+        normalized = normalize_query(query)
+        try:
+            vector = await self._embed(normalized)
+        except Exception as e:
+            logger.warning(f"Semantic cache embedding failed: {e}")
+            self.bypassed += 1
+            return None, None
+
+        now = time.monotonic()
+        entries = self._partitions.get(key)
+        if entries:
+            entries[:] = [e for e in entries if e[2] > now]
+            if entries:
+                scores = np.stack([e[0] for e in entries]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= SIMILARITY_THRESHOLD:
+                    self._partitions.move_to_end(key)
+                    self.hits += 1
+                    self.tokens_saved += entries[best][3]
+                    logger.info(f"🧠 Semantic cache hit ({scores[best]:.3f}) for '{normalized[:50]}' ~ '{entries[best][4][:50]}'")
+                    return entries[best][1], None
+        self.misses += 1
+        return None, (key, vector, normalized)
+
+    def store(self, probe: Optional[tuple], answer: str, tokens: int = 0):
+        """Cache a freshly generated answer for the query behind probe."""
+        if probe is None or not answer:
+            return
+        key, vector, normalized = probe
+        if key[3] != self._version:
+            return
+        entries = self._partitions.setdefault(key, [])
+        self._partitions.move_to_end(key)
+        entries.append((vector, answer, time.monotonic() + TTL_SECONDS, tokens or 0, normalized))
+        if len(entries) > MAX_ENTRIES_PER_PARTITION:
+            del entries[0]
+        while len(self._partitions) > MAX_PARTITIONS:
+            self._partitions.popitem(last=False)
+
+    def invalidate_villa(self, villa_code: Optional[str] = None):
+        """Drop cached answers for a villa (all villas for None or a global FAQ change)."""
+        if villa_code is None or villa_code == GLOBAL_VILLA:
+            self._partitions.clear()
+            return
+        for key in [k for k in self._partitions if k[1] == villa_code]:
+            del self._partitions[key]
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": sum(len(e) for e in self._partitions.values()),
+            "partitions": len(self._partitions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+# Global instance
+semantic_cache = SemanticCache()
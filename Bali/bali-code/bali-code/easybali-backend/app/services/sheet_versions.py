@@ -0,0 +1,141 @@
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(values: Any) -> str:
+    """Stable digest of a tab's raw cell values (list of rows as returned by the Sheets API)."""
+    payload = json.dumps(values, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SheetVersionRegistry:
+    """
+    Tracks what the cache currently holds for every Google Sheets tab.
+
+    - Per spreadsheet: the last Drive revision seen, so an unchanged spreadsheet
+      is skipped without downloading a single tab.
+    - Per tab (cache key): a content hash and a monotonically increasing version,
+      so only tabs whose values actually changed are re-parsed.
+
+    Dependent caches subscribe() and receive the set of cache keys that changed
+    after each published refresh, letting them invalidate selectively.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revisions: Dict[str, str] = {}
+        self._tabs: Dict[str, Dict[str, Any]] = {}
+        self._listeners: List[Callable[[Set[str]], None]] = []
+
+    # ── Spreadsheet revisions ────────────────────────────────────────────────
+
+    def revision_unchanged(self, spreadsheet_id: str, revision: Optional[str]) -> bool:
+        """True only when a revision is known and matches the last fully-loaded one."""
+        if not revision:
+            return False
+        with self._lock:
+            return self._revisions.get(spreadsheet_id) == revision
+
+    def mark_revision(self, spreadsheet_id: str, revision: Optional[str]):
+        if not revision:
+            return
+        with self._lock:
+            self._revisions[spreadsheet_id] = revision
+
+    # ── Tab versions ─────────────────────────────────────────────────────────
+
+    def commit(self, changes: Dict[str, Dict[str, str]]) -> Dict[str, int]:
+        """Record new content hashes ({cache_key: {"sheet", "hash"}}) and bump their versions."""
+        now = datetime.utcnow()
+        with self._lock:
+            for cache_key, change in changes.items():
+                previous = self._tabs.get(cache_key)
+                self._tabs[cache_key] = {
+                    "sheet": change["sheet"],
+                    "hash": change["hash"],
+                    "version": (previous["version"] + 1) if previous else 1,
+                    "changed_at": now,
+                }
+            return {key: tab["version"] for key, tab in self._tabs.items()}
+
+    def hashes(self) -> Dict[str, str]:
+        with self._lock:
+            return {key: tab["hash"] for key, tab in self._tabs.items()}
+
+    def versions(self) -> Dict[str, int]:
+        with self._lock:
+            return {key: tab["version"] for key, tab in self._tabs.items()}
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        """Per-tab metadata for diagnostics endpoints."""
+        with self._lock:
+            return {
+                key: {
+                    "sheet": tab["sheet"],
+                    "version": tab["version"],
+                    "changed_at": tab["changed_at"].isoformat(),
+                }
+                for key, tab in self._tabs.items()
+            }
+
+    # ── Persistence (see catalog_store) ──────────────────────────────────────
+
+    def export_state(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """({cache_key: {"sheet", "hash", "version"}}, {spreadsheet_id: revision})"""
+        with self._lock:
+            tabs = {
+                key: {"sheet": tab["sheet"], "hash": tab["hash"], "version": tab["version"]}
+                for key, tab in self._tabs.items()
+            }
+            return tabs, dict(self._revisions)
+
+    def restore_state(self, tabs: Dict[str, Dict[str, Any]], revisions: Dict[str, str]):
+        """Seed hashes, versions and revisions from a persisted catalog on warm start."""
+        now = datetime.utcnow()
+        with self._lock:
+            for key, tab in tabs.items():
+                if "hash" not in tab:
+                    continue
+                self._tabs[key] = {
+                    "sheet": tab.get("sheet", key),
+                    "hash": tab["hash"],
+                    "version": tab.get("version", 1),
+                    "changed_at": now,
+                }
+            self._revisions.update(revisions)
+
+    # ── Change notifications ─────────────────────────────────────────────────
+
+    def subscribe(self, callback: Callable[[Set[str]], None]):
+        """Register callback(changed_cache_keys) to run after every refresh that changed data."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def notify(self, changed: Iterable[str]):
+        changed = set(changed)
+        if not changed:
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.error(f"Sheet change listener {callback!r} failed: {e}")
+
+
+def catalog_version(versions: Dict[str, int]) -> str:
+    """Short combined version for everything in the catalog (changes when any tab changes)."""
+    if not versions:
+        return "0"
+    return content_hash(sorted(versions.items()))[:12]
+
+
+# Global instance
+sheet_versions = SheetVersionRegistry()
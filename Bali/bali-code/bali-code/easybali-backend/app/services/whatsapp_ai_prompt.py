@@ -3,6 +3,7 @@ from app.services.pinconeservice import get_index
 from app.utils.chat_memory import get_conversation_history, save_message, trim_history
 from app.services.ai_menu_generator import ai_menu_generator
 from app.services.rag_service import rag_service
+from app.services.semantic_cache import semantic_cache
 from app.settings.config import settings
 from typing import Dict, Any, Optional
 import traceback
@@ -120,12 +121,9 @@ DETECTED INTENT:
 """.strip()
 
         # Get chat history
-        chat_history = get_conversation_history(user_id)
+        chat_history = await get_conversation_history(user_id)
         conversation = trim_history(chat_history + [{"role": "user", "content": query}])
 
-        # Get RAG context
-        context = await rag_service.get_rag_context(query, "general", villa_code)
-
         will_show_menu = bool(intent and isinstance(intent, dict) and intent.get("category"))
         will_decline_service = (
             service_check.get("is_service_request", False) and 
@@ -133,6 +131,26 @@ DETECTED INTENT:
             service_check.get("confidence", 0) > 0.7
         )
 
+        # Plain questions (path 3) can reuse an earlier answer to the same question
+        probe = None
+        if not will_show_menu and not will_decline_service:
+            cached, probe = await semantic_cache.lookup(query, "whatsapp", villa_code, "auto")
+            if cached:
+                save_message(user_id, "user", query)
+                save_message(user_id, "assistant", cached)
+                return {
+                    "text": cached,
+                    "image_url": None,
+                    "should_send_menu": False,
+                    "menu_data": None,
+                    "intent": intent or {},
+                    "requirements": requirements,
+                    "service_check": service_check
+                }
+
+        # Get RAG context
+        context = await rag_service.get_rag_context(query, "general", villa_code)
+
         # ============================================================
         # RESPONSE PATH 1: Show menu (we have this service)
         # ============================================================
@@ -228,7 +246,8 @@ YOUR RESPONSE:"""
         # RESPONSE PATH 3: Natural conversation (not service-related)
         # ============================================================
         else:
-            conversation_context = _format_conversation_history(conversation)
+            # A cached answer must not depend on who asked: build it from the question alone
+            conversation_context = _format_conversation_history(conversation if probe is None else [])
             
             prompt = f"""{EASYBALI_CORE_IDENTITY}
  
@@ -270,6 +289,8 @@ YOUR RESPONSE:"""
         )
         ai_text = completion.choices[0].message.content.strip()
         ai_text = _clean_ai_response(ai_text)
+        usage = getattr(completion, "usage", None)
+        semantic_cache.store(probe, ai_text, getattr(usage, "total_tokens", 0) or 0)
 
         save_message(user_id, "user", query)
         save_message(user_id, "assistant", ai_text)
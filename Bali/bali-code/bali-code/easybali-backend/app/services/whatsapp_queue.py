@@ -1,105 +1,384 @@
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Dict, Any, List, Set
+from collections import deque
+import os
+import time
+import uuid
+import socket
 import asyncio
-import httpx
+import logging
+from pymongo import ReturnDocument
 from app.db.session import db
 from app.settings.config import settings
+from app.services.whatsapp_transport import whatsapp_transport
+from app.services.whatsapp_rate_limit import (
+    whatsapp_rate_limiter, parse_retry_after, throttle_kind,
+    PRIORITY_TRANSACTIONAL, PRIORITY_NORMAL, PRIORITY_BULK,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WORKERS = int(os.getenv("WHATSAPP_QUEUE_WORKERS", "4"))
+LEASE_SECONDS = 60           # a claimed message returns to the queue if its worker dies
+IDLE_POLL_SECONDS = 30       # fallback wakeup when no enqueue/change event arrives
+MAX_BACKOFF_SECONDS = 300
+ORDER_DEFER_SECONDS = 1      # recipient busy in this worker: look again shortly
+MAX_INLINE_WAIT_SECONDS = 2  # longer rate-limit waits hand the message back to the queue
+LATENCY_WINDOW = 500
+
+LANES = {"transactional": PRIORITY_TRANSACTIONAL, "normal": PRIORITY_NORMAL, "bulk": PRIORITY_BULK}
+
+READY_STATUSES = ["pending", "retry_pending"]
+OPEN_STATUSES = ["pending", "retry_pending", "sending"]
+
 
 class WhatsAppQueue:
-    def __init__(self):
+    """
+    Durable outbound WhatsApp queue backed by Mongo.
+
+    Workers claim one message at a time with find_one_and_update (status ->
+    "sending" plus a lease), so any number of workers and replicas can drain
+    the same collection. A recipient's messages go out in created_at order:
+    a message is only sent once nothing older for that recipient is still
+    open; until then it sleeps until the older one is next tried, and is
+    brought forward as soon as that one's worker is done with it. Failed sends are rescheduled with exponential backoff through
+    `next_attempt_at`. Idle workers sleep until enqueue() (or a change stream
+    insert from another replica) wakes them, or the next retry falls due.
+
+    Due messages are claimed by priority lane first (transactional before
+    normal before bulk) and paced by the shared token-bucket rate limiter;
+    429 / rate-limit responses reschedule the message after Retry-After
+    without counting as a failed attempt.
+    """
+
+    def __init__(self, workers: int = QUEUE_WORKERS):
         self.collection = db["whatsapp_message_queue"]
         self.max_retries = 3
-        self.retry_delay = 5  # seconds
+        self.retry_delay = 5  # seconds, doubled per attempt
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._busy_recipients: Set[str] = set()
+        self.rate_limiter = whatsapp_rate_limiter
+        self._send_latency = deque(maxlen=LATENCY_WINDOW)
+        self._queue_latency = deque(maxlen=LATENCY_WINDOW)
+        self._settled_listeners: List[Callable[[Dict[str, Any], str], Awaitable[None]]] = []
 
-    async def enqueue(self, recipient_id: str, payload: Dict[str, Any], message_type: str = "text"):
-        """Add a message to the queue"""
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def notify(self):
+        """Wake idle workers in this process."""
+        self._event().set()
+
+    def on_settled(self, callback: Callable[[Dict[str, Any], str], Awaitable[None]]):
+        """Register `await callback(msg_record, status)` for messages that end "sent" or "failed"."""
+        self._settled_listeners.append(callback)
+
+    async def _settled(self, msg_record: Dict[str, Any], status: str):
+        for callback in self._settled_listeners:
+            try:
+                await callback(msg_record, status)
+            except Exception as e:
+                logger.error(f"WhatsApp queue listener {callback!r} failed: {e}")
+
+    async def enqueue(self, recipient_id: str, payload: Dict[str, Any], message_type: str = "text",
+                      priority: int = PRIORITY_NORMAL, extra: Optional[Dict[str, Any]] = None):
+        """
+        Add a message to the queue (lower priority value = sent first).
+        `extra` fields are stored on the message for listeners, e.g. a broadcast job id.
+        """
+        now = datetime.utcnow()
         message_data = {
             "recipient_id": recipient_id,
             "payload": payload,
             "message_type": message_type,
+            "priority": priority,
             "status": "pending",
             "retry_count": 0,
             "errors": [],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now,
+            **(extra or {}),
         }
         result = await self.collection.insert_one(message_data)
+        self.notify()
         return str(result.inserted_id)
 
-    async def process_queue(self):
-        """Background worker to process pending messages"""
+    # ── Claiming ──────────────────────────────────────────────────────────────
+
+    async def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically lease the next due message (or one whose lease expired)."""
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": {"$in": READY_STATUSES}, "next_attempt_at": {"$lte": now}},
+                    # Rows queued before next_attempt_at existed
+                    {"status": {"$in": READY_STATUSES}, "next_attempt_at": None},
+                    {"status": "sending", "lease_expires_at": {"$lt": now}},
+                ],
+                "recipient_id": {"$nin": list(self._busy_recipients)},
+            },
+            {
+                "$set": {
+                    "status": "sending",
+                    "lease_owner": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                    "updated_at": now,
+                }
+            },
+            sort=[("priority", 1), ("next_attempt_at", 1), ("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _older_open(self, msg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The oldest message to the same recipient that must go out before `msg`, if any."""
+        return await self.collection.find_one({
+            "recipient_id": msg["recipient_id"],
+            "status": {"$in": OPEN_STATUSES},
+            "created_at": {"$lt": msg["created_at"]},
+            "_id": {"$ne": msg["_id"]},
+        }, sort=[("created_at", 1)])
+
+    async def _release(self, msg: Dict[str, Any], delay: float, waiting_on: Any = None):
+        now = datetime.utcnow()
+        update = {
+            "status": "pending" if msg.get("retry_count", 0) == 0 else "retry_pending",
+            "next_attempt_at": now + timedelta(seconds=delay),
+            "updated_at": now,
+        }
+        unset = {"lease_owner": "", "lease_expires_at": ""}
+        if waiting_on is not None:
+            update["waiting_on"] = waiting_on
+        else:
+            unset["waiting_on"] = ""
+        await self.collection.update_one(
+            {"_id": msg["_id"], "lease_owner": self.worker_id},
+            {"$set": update, "$unset": unset},
+        )
+
+    async def _wake_waiting(self, msg: Dict[str, Any]):
+        """Bring forward the messages deferred behind `msg` now that its worker is done with it."""
+        await self.collection.update_many(
+            {"recipient_id": msg["recipient_id"], "status": {"$in": READY_STATUSES}, "waiting_on": msg["_id"]},
+            {"$set": {"next_attempt_at": datetime.utcnow()}, "$unset": {"waiting_on": ""}},
+        )
+
+    async def _seconds_until_due(self) -> float:
+        upcoming = await self.collection.find_one(
+            {"status": {"$in": READY_STATUSES}, "recipient_id": {"$nin": list(self._busy_recipients)}},
+            sort=[("next_attempt_at", 1)],
+            projection={"next_attempt_at": 1},
+        )
+        if not upcoming or not upcoming.get("next_attempt_at"):
+            return IDLE_POLL_SECONDS
+        wait = (upcoming["next_attempt_at"] - datetime.utcnow()).total_seconds()
+        return min(max(wait, 0.05), IDLE_POLL_SECONDS)
+
+    # ── Workers ───────────────────────────────────────────────────────────────
+
+    async def process_one(self) -> bool:
+        """Claim and send a single message. Returns False when nothing was due."""
+        msg = await self.claim_next()
+        if msg is None:
+            return False
+        recipient_id = msg["recipient_id"]
+        if recipient_id in self._busy_recipients:
+            await self._release(msg, ORDER_DEFER_SECONDS)
+            return True
+        older = await self._older_open(msg)
+        if older is not None:
+            # Sleep until the blocking message is next tried (or its lease runs out)
+            # instead of re-claiming every second through a long retry backoff;
+            # its worker brings us forward as soon as it is done with it
+            until = older.get("lease_expires_at") if older["status"] == "sending" else older.get("next_attempt_at")
+            delay = (until - datetime.utcnow()).total_seconds() if until else 0
+            await self._release(msg, max(delay, ORDER_DEFER_SECONDS), waiting_on=older["_id"])
+            return True
+        self._busy_recipients.add(recipient_id)
+        try:
+            while True:
+                delay = self.rate_limiter.reserve(recipient_id, msg.get("priority", PRIORITY_NORMAL))
+                if not delay:
+                    break
+                if delay > MAX_INLINE_WAIT_SECONDS:
+                    await self._release(msg, delay)
+                    return True
+                await asyncio.sleep(delay)
+            await self.send_message_with_retry(msg)
+        finally:
+            self._busy_recipients.discard(recipient_id)
+            # The recipient's next message may now be sendable
+            await self._wake_waiting(msg)
+            self.notify()
+        return True
+
+    async def _worker(self, index: int):
+        wakeup = self._event()
         while True:
             try:
-                # Find pending or failed messages that still have retries
-                messages = self.collection.find({
-                    "status": {"$in": ["pending", "failed"]},
-                    "retry_count": {"$lt": self.max_retries}
-                }).sort("created_at", 1).limit(10)
-
-                async for msg in messages:
-                    await self.send_message_with_retry(msg)
-                
-                await asyncio.sleep(10)  # Check every 10 seconds
+                # Clear before claiming so an enqueue during the claim isn't missed
+                wakeup.clear()
+                if await self.process_one():
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=await self._seconds_until_due())
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"Error in WhatsApp queue processor: {e}")
-                await asyncio.sleep(30)
+                logger.error(f"Error in WhatsApp queue worker {index}: {e}")
+                await asyncio.sleep(5)
+
+    async def _watch_inserts(self):
+        """Wake workers when another replica enqueues (needs a replica set; optional)."""
+        try:
+            async with self.collection.watch([{"$match": {"operationType": "insert"}}]) as stream:
+                async for _ in stream:
+                    self.notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WhatsApp queue change stream unavailable, relying on local wakeups: {e}")
+
+    async def process_queue(self):
+        """Background worker pool that drains the queue until cancelled"""
+        logger.info(f"📬 WhatsApp queue: {self.workers} workers ({self.worker_id})")
+        tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        tasks.append(asyncio.create_task(self._watch_inserts()))
+        # Broadcast jobs fan out through this queue; pick up any interrupted by a restart
+        from app.services.broadcast_service import broadcast_executor
+        tasks.append(asyncio.create_task(broadcast_executor.resume_pending()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # ── Sending ───────────────────────────────────────────────────────────────
+
+    def _backoff_seconds(self, retry_count: int) -> float:
+        return min(self.retry_delay * (2 ** (retry_count - 1)), MAX_BACKOFF_SECONDS)
+
+    async def _throttled(self, msg_record: Dict[str, Any], kind: str, retry_after: float):
+        """Rate-limited by Meta: pause the bucket and retry later without spending an attempt."""
+        self.rate_limiter.backoff(msg_record["recipient_id"], retry_after, pair_only=(kind == "pair"))
+        await self._release(msg_record, retry_after)
+        await self.collection.update_one({"_id": msg_record["_id"]}, {"$inc": {"throttled_count": 1}})
 
     async def send_message_with_retry(self, msg_record: Dict[str, Any]):
         msg_id = msg_record["_id"]
         recipient_id = msg_record["recipient_id"]
         payload = msg_record["payload"]
-        
+
         headers = {
             "Authorization": f"Bearer {settings.access_token}",
             "Content-Type": "application/json",
         }
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            started = time.monotonic()
+            async with whatsapp_transport.session(timeout=30.0) as client:
                 response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
+                self._send_latency.append(time.monotonic() - started)
+                if response.status_code >= 400:
+                    try:
+                        body = response.json()
+                    except Exception:
+                        body = None
+                    kind = throttle_kind(response.status_code, body)
+                    if kind:
+                        await self._throttled(msg_record, kind, parse_retry_after(response.headers.get("Retry-After")))
+                        return
                 response.raise_for_status()
-                
-                # Success
-                await self.collection.update_one(
-                    {"_id": msg_id},
-                    {
-                        "$set": {
-                            "status": "sent",
-                            "sent_at": datetime.utcnow(),
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                )
-                print(f"✅ Message sent from queue to {recipient_id}")
-                
+
+            # Success
+            sent_at = datetime.utcnow()
+            if msg_record.get("created_at"):
+                self._queue_latency.append((sent_at - msg_record["created_at"]).total_seconds())
+            await self.collection.update_one(
+                {"_id": msg_id},
+                {
+                    "$set": {
+                        "status": "sent",
+                        "sent_at": sent_at,
+                        "updated_at": sent_at
+                    },
+                    "$unset": {"lease_owner": "", "lease_expires_at": ""},
+                }
+            )
+            logger.info(f"✅ Message sent from queue to {recipient_id}")
+            await self._settled(msg_record, "sent")
+
         except Exception as e:
             error_msg = str(e)
             retry_count = msg_record["retry_count"] + 1
             status = "failed" if retry_count >= self.max_retries else "retry_pending"
-            
+            now = datetime.utcnow()
+
             await self.collection.update_one(
                 {"_id": msg_id},
                 {
                     "$set": {
                         "status": status,
                         "retry_count": retry_count,
-                        "updated_at": datetime.utcnow()
+                        "next_attempt_at": now + timedelta(seconds=self._backoff_seconds(retry_count)),
+                        "updated_at": now
                     },
+                    "$unset": {"lease_owner": "", "lease_expires_at": ""},
                     "$push": {
                         "errors": {
                             "attempt": retry_count,
                             "error": error_msg,
-                            "timestamp": datetime.utcnow()
+                            "timestamp": now
                         }
                     }
                 }
             )
-            print(f"❌ Failed to send message to {recipient_id} (Attempt {retry_count}): {error_msg}")
+            logger.warning(f"❌ Failed to send message to {recipient_id} (Attempt {retry_count}): {error_msg}")
+            if status == "failed":
+                await self._settled(msg_record, "failed")
+
+    # ── Metrics ───────────────────────────────────────────────────────────────
+
+    async def metrics(self) -> Dict[str, Any]:
+        """Queue depth per lane plus send and end-to-end latency percentiles."""
+        depth = {}
+        for lane, priority in LANES.items():
+            depth[lane] = await self.collection.count_documents(
+                {"status": {"$in": READY_STATUSES}, "priority": priority}
+            )
+        return {
+            "workers": self.workers,
+            "depth": depth,
+            "sending": await self.collection.count_documents({"status": "sending"}),
+            "failed": await self.collection.count_documents({"status": "failed"}),
+            "send_latency_seconds": _percentiles(self._send_latency),
+            "queue_latency_seconds": _percentiles(self._queue_latency),
+            "rate_limiter": self.rate_limiter.metrics(),
+        }
+
+
+def _percentiles(samples) -> Dict[str, Optional[float]]:
+    ordered: List[float] = sorted(samples)
+    if not ordered:
+        return {"p50": None, "p95": None, "max": None}
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1], 3)}
+
 
 # Global instance
 whatsapp_queue = WhatsAppQueue()
 
-async def enqueue_whatsapp_message(recipient_id: str, message_text: str):
+async def enqueue_whatsapp_message(recipient_id: str, message_text: str, priority: int = PRIORITY_NORMAL):
     """Simple helper to enqueue a text message"""
     payload = {
         "messaging_product": "whatsapp",
@@ -108,4 +387,4 @@ async def enqueue_whatsapp_message(recipient_id: str, message_text: str):
         "type": "text",
         "text": {"body": message_text}
     }
-    return await whatsapp_queue.enqueue(recipient_id, payload, message_type="text")
+    return await whatsapp_queue.enqueue(recipient_id, payload, message_type="text", priority=priority)
@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cloud API defaults: ~80 messages/s per business number, and a "pair rate"
+# of roughly one message every 6s to the same user (short bursts tolerated).
+GLOBAL_RATE_PER_SECOND = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "80"))
+GLOBAL_BURST = float(os.getenv("WHATSAPP_RATE_BURST", "80"))
+PAIR_RATE_PER_SECOND = 1 / 6
+PAIR_BURST = 5
+MAX_TRACKED_RECIPIENTS = 10_000
+DEFAULT_THROTTLE_SECONDS = 10.0
+
+# Priority lanes (lower sorts first in the queue)
+PRIORITY_TRANSACTIONAL = 0   # payment confirmations, SP notifications
+PRIORITY_NORMAL = 5          # automations, reminders
+PRIORITY_BULK = 9            # marketing / content broadcasts
+# Share of the global bucket bulk sends may not dip into, kept for transactional traffic
+BULK_RESERVE_FRACTION = 0.25
+
+# Graph API error codes that mean "slow down" rather than "this message is bad"
+THROUGHPUT_ERROR_CODES = {4, 80007, 130429}
+PAIR_RATE_ERROR_CODES = {131056}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second refilled up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1.0, reserve: float = 0.0) -> float:
+        """Seconds until `tokens` can be taken while leaving `reserve` in the bucket."""
+        self._refill()
+        paused = max(0.0, self._paused_until - self._clock())
+        missing = tokens + reserve - self.tokens
+        return max(paused, missing / self.rate if missing > 0 else 0.0)
+
+    def take(self, tokens: float = 1.0):
+        self._refill()
+        self.tokens -= tokens
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (server asked us to back off)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class OutboundRateLimiter:
+    """
+    Paces outbound WhatsApp sends against a global bucket (per business
+    number) and a per-recipient pair bucket. Bulk traffic may not use the
+    last BULK_RESERVE_FRACTION of the global bucket, so transactional
+    messages still go out immediately during a broadcast.
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE_PER_SECOND, burst: float = GLOBAL_BURST,
+                 pair_rate: float = PAIR_RATE_PER_SECOND, pair_burst: float = PAIR_BURST,
+                 clock=time.monotonic):
+        self._clock = clock
+        self.global_bucket = TokenBucket(rate, burst, clock)
+        self.pair_rate = pair_rate
+        self.pair_burst = pair_burst
+        self._pairs: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._stats = {"granted": 0, "throttled": 0, "server_throttled": 0}
+
+    def _pair(self, recipient_id: str) -> TokenBucket:
+        bucket = self._pairs.get(recipient_id)
+        if bucket is None:
+            bucket = TokenBucket(self.pair_rate, self.pair_burst, self._clock)
+            self._pairs[recipient_id] = bucket
+            if len(self._pairs) > MAX_TRACKED_RECIPIENTS:
+                self._pairs.popitem(last=False)
+        else:
+            self._pairs.move_to_end(recipient_id)
+        return bucket
+
+    def reserve(self, recipient_id: str, priority: int = PRIORITY_NORMAL) -> float:
+        """
+        Take a send slot for recipient_id. Returns 0 when the message may go
+        now (tokens consumed) or the number of seconds to wait (nothing taken).
+        """
+        reserve = self.global_bucket.capacity * BULK_RESERVE_FRACTION if priority >= PRIORITY_BULK else 0.0
+        pair = self._pair(recipient_id)
+        delay = max(self.global_bucket.wait_time(reserve=reserve), pair.wait_time())
+        if delay > 0:
+            self._stats["throttled"] += 1
+            return delay
+        self.global_bucket.take()
+        pair.take()
+        self._stats["granted"] += 1
+        return 0.0
+
+    def backoff(self, recipient_id: str, seconds: float, pair_only: bool = False):
+        """Apply a server-requested pause (429 / rate-limit error) to the right bucket."""
+        self._stats["server_throttled"] += 1
+        if pair_only:
+            self._pair(recipient_id).pause(seconds)
+        else:
+            self.global_bucket.pause(seconds)
+        logger.warning(f"⏳ WhatsApp throttled ({'pair' if pair_only else 'global'}), backing off {seconds:.1f}s")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "global_tokens": round(self.global_bucket.tokens, 2),
+            "global_paused_for": round(max(0.0, self.global_bucket._paused_until - self._clock()), 2),
+            "tracked_recipients": len(self._pairs),
+        }
+
+
+def parse_retry_after(value: Optional[str], default: float = DEFAULT_THROTTLE_SECONDS) -> float:
+    """Retry-After as delta-seconds or an HTTP date; falls back to `default`."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return default
+
+
+def throttle_kind(status_code: int, body: Any) -> Optional[str]:
+    """'pair' / 'global' when a Graph API response is a rate-limit signal, else None."""
+    code = None
+    if isinstance(body, dict):
+        code = (body.get("error") or {}).get("code")
+    if code in PAIR_RATE_ERROR_CODES:
+        return "pair"
+    if status_code == 429 or code in THROUGHPUT_ERROR_CODES:
+        return "global"
+    return None
+
+
+# Global instance
+whatsapp_rate_limiter = OutboundRateLimiter()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Tuned for graph.facebook.com: fail fast on connect, generous on read (media / flows)
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+MAX_CONCURRENT_REQUESTS = 32
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0, pool=10.0)
+
+
+class WhatsAppTransport:
+    """
+    Application-scoped HTTP transport for every WhatsApp Graph API call.
+
+    One pooled keep-alive httpx.AsyncClient (HTTP/2 when `h2` is installed) is
+    created lazily on the serving event loop and shared by all senders, so a
+    message reuses an open TLS connection instead of handshaking per send.
+    A semaphore bounds in-flight requests; a per-request trace hook counts
+    whether a pooled connection was reused (hit) or a new one opened (miss).
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.max_concurrency = max_concurrency
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats = {"requests": 0, "pool_hits": 0, "pool_misses": 0, "errors": 0}
+        self._in_flight = 0
+        self._peak_in_flight = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # A client is bound to the loop it was created on (scripts/tests run their own loops)
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                transport=self._transport,
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+                ),
+            )
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            logger.info(f"🔌 WhatsApp transport ready (http2={HTTP2_AVAILABLE}, max_concurrency={self.max_concurrency})")
+        return self._client
+
+    async def request(self, method: str, url: str, timeout: Any = None, **kwargs) -> httpx.Response:
+        client = self._get_client()
+        opened = []
+
+        async def trace(event: str, info: Dict[str, Any]):
+            if event == "connection.connect_tcp.started":
+                opened.append(event)
+
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        extensions = {**kwargs.pop("extensions", {}), "trace": trace}
+
+        async with self._semaphore:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            self._stats["requests"] += 1
+            try:
+                return await client.request(method, url, extensions=extensions, **kwargs)
+            except Exception:
+                self._stats["errors"] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+                self._stats["pool_misses" if opened else "pool_hits"] += 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def session(self, timeout: Any = None):
+        """
+        Drop-in for `async with httpx.AsyncClient(timeout=...) as client:` —
+        yields a handle on the shared pool that is not closed on exit.
+        """
+        yield _Session(self, timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        reused = self._stats["pool_hits"]
+        finished = reused + self._stats["pool_misses"]
+        return {
+            **self._stats,
+            "pool_hit_ratio": round(reused / finished, 3) if finished else None,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "max_concurrency": self.max_concurrency,
+            "http2": HTTP2_AVAILABLE,
+            "open": self._client is not None and not self._client.is_closed,
+        }
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+class _Session:
+    """Per-call view of the shared transport carrying a default timeout."""
+
+    def __init__(self, transport: WhatsAppTransport, timeout: Any):
+        self._transport = transport
+        self._timeout = timeout
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        kwargs.setdefault("timeout", self._timeout)
+        return await self._transport.get(url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        kwargs.setdefault("timeout", self._timeout)
+        return await self._transport.post(url, **kwargs)
+
+
+# Global instance
+whatsapp_transport = WhatsAppTransport()
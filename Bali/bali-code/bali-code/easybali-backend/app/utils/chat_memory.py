@@ -1,26 +1,214 @@
-from typing import List
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.db.session_store import session_collection
+
+logger = logging.getLogger(__name__)
 
-chat_memory = {}
 MAX_HISTORY_LENGTH = 10
+MAX_CACHED_USERS = int(os.getenv("CHAT_MEMORY_MAX_USERS", "5000"))
+# Bounds how stale another worker's view of a conversation can be
+CACHE_TTL_SECONDS = float(os.getenv("CHAT_MEMORY_CACHE_TTL", "120"))
+FLUSH_INTERVAL_SECONDS = 1.0
+FLUSH_BATCH_SIZE = 200
+HISTORY_FIELD = "chat_history"
+SUMMARY_FIELD = "chat_summary"
 
 
-def save_message(user_id: str, role: str, content: str):
+class ConversationStore:
     """
-    Save a message in memory for a specific user.
+    Bounded per-user conversation history.
+
+    Two tiers: an in-process LRU with a TTL (at most MAX_CACHED_USERS users)
+    in front of the `user_sessions` documents managed by SessionManager, where
+    each user's last MAX_HISTORY_LENGTH messages live in a capped array
+    (`$push` + `$slice`) that the collection's TTL index expires with the rest
+    of the session. History therefore survives restarts and is shared across
+    workers.
+
+    `save_message` only updates the LRU and queues the message; a background
+    task writes the queue behind in one bulk_write per FLUSH_INTERVAL_SECONDS,
+    so a chat turn costs no extra Mongo round-trip.
     """
-    if user_id not in chat_memory:
-        chat_memory[user_id] = []
-    chat_memory[user_id].append({"role": role, "content": content})
 
-    if len(chat_memory[user_id]) > MAX_HISTORY_LENGTH:
-        chat_memory[user_id] = chat_memory[user_id][-MAX_HISTORY_LENGTH:]
+    def __init__(self):
+        self.collection = session_collection
+        # user_id -> (loaded_at, messages, rolling summary)
+        self._cache: "OrderedDict[str, Tuple[float, List[dict], Optional[dict]]]" = OrderedDict()
+        self._pending: Dict[str, List[dict]] = {}
+        self._pending_count = 0
+        # user_id -> event set once the flush carrying that user's messages finishes
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self._flushes = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ── In-process tier ───────────────────────────────────────────────────────
+
+    def _cached(self, user_id: str) -> Optional[Tuple[float, List[dict], Optional[dict]]]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > CACHE_TTL_SECONDS:
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return entry
+
+    def _remember(self, user_id: str, messages: List[dict], summary: Optional[dict] = None,
+                  loaded_at: Optional[float] = None):
+        self._cache[user_id] = (loaded_at or time.monotonic(), messages[-MAX_HISTORY_LENGTH:], summary)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > MAX_CACHED_USERS:
+            self._cache.popitem(last=False)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def save_message(self, user_id: str, role: str, content: str):
+        """Append a message to the user's history; persisted write-behind."""
+        message = {"role": role, "content": content}
+        cached = self._cached(user_id)
+        if cached is not None:
+            self._remember(user_id, cached[1] + [message], cached[2], loaded_at=cached[0])
+        # Without a cached copy the next read merges Mongo with the pending queue
+        self._pending.setdefault(user_id, []).append(message)
+        self._pending_count += 1
+        self._ensure_running()
+        if self._wakeup is not None and self._pending_count >= FLUSH_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def _load(self, user_id: str) -> Tuple[float, List[dict], Optional[dict]]:
+        cached = self._cached(user_id)
+        if cached is not None:
+            return cached
+        for _ in range(3):
+            flushing = self._inflight.get(user_id)
+            if flushing is not None:
+                await flushing.wait()
+            flushes = self._flushes
+            doc = await self.collection.find_one({"_id": user_id}, {HISTORY_FIELD: 1, SUMMARY_FIELD: 1}) or {}
+            # A flush that ran during the read may or may not be in doc (its
+            # messages already left _pending), so read again once it has landed
+            if flushes == self._flushes and user_id not in self._inflight:
+                break
+        stored = doc.get(HISTORY_FIELD) or []
+        self._remember(user_id, stored + self._pending.get(user_id, []), doc.get(SUMMARY_FIELD))
+        return self._cache[user_id]
+
+    async def get_history(self, user_id: str) -> List[dict]:
+        """The user's last MAX_HISTORY_LENGTH messages, oldest first."""
+        return list((await self._load(user_id))[1])
+
+    async def get_summary(self, user_id: str) -> Optional[dict]:
+        """The rolling summary of older turns ({"text", "covers"}), if one was written."""
+        return (await self._load(user_id))[2]
+
+    async def set_summary(self, user_id: str, summary: dict):
+        """Store the rolling summary (rare, so written through rather than queued)."""
+        cached = self._cached(user_id)
+        if cached is not None:
+            self._remember(user_id, cached[1], summary, loaded_at=cached[0])
+        await self.collection.update_one(
+            {"_id": user_id},
+            {"$set": {SUMMARY_FIELD: summary, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def list_conversations(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recently active conversations from the shared tier (for the dashboard)."""
+        await self.flush()
+        cursor = self.collection.find(
+            {HISTORY_FIELD: {"$exists": True}}, {HISTORY_FIELD: 1, "updated_at": 1}
+        ).sort("updated_at", -1).limit(limit)
+        return await cursor.to_list(limit)
+
+    # ── Write-behind ──────────────────────────────────────────────────────────
+
+    def _ensure_running(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self.run())
+
+    async def run(self):
+        """Flush queued messages every FLUSH_INTERVAL_SECONDS (sooner when the queue fills)."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Chat memory flush failed: {e}")
+
+    async def flush(self):
+        """Write every queued message to Mongo in one bulk_write."""
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_count = self._pending, {}, 0
+        done = asyncio.Event()
+        for user_id in pending:
+            self._inflight[user_id] = done
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"_id": user_id},
+                {
+                    "$push": {HISTORY_FIELD: {"$each": messages, "$slice": -MAX_HISTORY_LENGTH}},
+                    "$set": {"updated_at": now},
+                },
+                upsert=True,
+            )
+            for user_id, messages in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except Exception:
+            # Put the batch back ahead of anything queued meanwhile and retry next tick
+            for user_id, messages in pending.items():
+                self._pending[user_id] = messages + self._pending.get(user_id, [])
+                self._pending_count += len(messages)
+            raise
+        finally:
+            for user_id in pending:
+                if self._inflight.get(user_id) is done:
+                    del self._inflight[user_id]
+            self._flushes += 1
+            done.set()
+        logger.debug(f"💬 Flushed chat history for {len(ops)} users")
+
+
+# Global instance
+conversation_store = ConversationStore()
+
+
+def save_message(user_id: str, role: str, content: str):
+    """
+    Save a message in a user's conversation history.
+    """
+    conversation_store.save_message(user_id, role, content)
 
 
-def get_conversation_history(user_id: str) -> List[dict]:
+async def get_conversation_history(user_id: str) -> List[dict]:
     """
     Retrieve the conversation history for a user.
     """
-    return chat_memory.get(user_id, [])
+    return await conversation_store.get_history(user_id)
 
 
 def trim_history(messages: List[dict]) -> List[dict]:
@@ -1,9 +1,9 @@
-import httpx
 import logging
 import random
 
 from fastapi import HTTPException
 from app.settings.config import settings
+from app.services.whatsapp_transport import whatsapp_transport
 from app.services.openai_client import client
 from app.utils.chat_memory import get_conversation_history, trim_history, save_message
 
@@ -104,7 +104,7 @@ async def _send_lesson_with_buttons(sender_id: str, body_text: str) -> None:
             },
         },
     }
-    async with httpx.AsyncClient() as http:
+    async with whatsapp_transport.session() as http:
         resp = await http.post(settings.whatsapp_api_url, json=payload, headers=headers)
         resp.raise_for_status()
 
@@ -194,7 +194,7 @@ async def language_no_message(sender_id: str) -> None:
             },
         },
     }
-    async with httpx.AsyncClient() as http:
+    async with whatsapp_transport.session() as http:
         resp = await http.post(settings.whatsapp_api_url, json=payload, headers=headers)
         resp.raise_for_status()
 
@@ -221,7 +221,7 @@ async def language_lesson_response(query: str, user_id: str) -> str:
                     )
 
     # AI fallback — warm, class-style tutor
-    chat_history = get_conversation_history(user_id)
+    chat_history = await get_conversation_history(user_id)
     conversation = trim_history(chat_history + [{"role": "user", "content": query}])
 
     prompt = (
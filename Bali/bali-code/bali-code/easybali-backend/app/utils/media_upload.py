@@ -1,10 +1,11 @@
 import logging
 import uuid
-import httpx
 import boto3
 from botocore.config import Config
 from app.settings.config import settings
+from app.services.whatsapp_transport import whatsapp_transport
 from app.db.session import db
+from app.services.dashboard_stats import dashboard_stats
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -26,7 +27,7 @@ async def download_whatsapp_media(media_id: str):
     headers = {"Authorization": f"Bearer {settings.access_token}"}
     
     logger.info(f"Downloading WhatsApp media info for ID: {media_id}")
-    async with httpx.AsyncClient() as client:
+    async with whatsapp_transport.session() as client:
         res = await client.get(url, headers=headers)
         if res.status_code != 200:
             logger.error(f"Failed to get media URL for {media_id}: {res.text}")
@@ -137,6 +138,7 @@ async def process_whatsapp_issue(sender_id: str, media_id: str, villa_code: str,
             "timestamp": datetime.utcnow()
         }
         await issue_collection.insert_one(issue_data)
+        dashboard_stats.touch(villa_code)
         logger.info(f"Issue for villa {villa_code} reported with {media_type}. Source: whatsapp. URL: {s3_url}")
         return True, s3_url, transcript
     except Exception as e:
@@ -0,0 +1,19 @@
+import re
+
+MIN_QUERY_WORDS = 3
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Words that point back at earlier turns; such questions can't be answered out of context
+_FOLLOW_UP_WORDS = {"it", "that", "this", "these", "those", "them", "they", "there", "he", "she",
+                    "one", "ones", "same", "another", "else", "more", "again", "also", "yes", "no"}
+
+
+def normalize_query(query: str) -> str:
+    """Lower-cased words only, so case, punctuation and spacing don't split cache keys."""
+    return " ".join(_WORD.findall(str(query).lower()))
+
+
+def is_standalone(query: str) -> bool:
+    """True when the question can be answered without the earlier turns."""
+    words = normalize_query(query).split()
+    return len(words) >= MIN_QUERY_WORDS and not _FOLLOW_UP_WORDS.intersection(words)
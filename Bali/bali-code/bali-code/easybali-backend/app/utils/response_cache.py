@@ -0,0 +1,137 @@
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from app.db.session import db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "ai_response_cache"
+TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+class ResponseCache:
+    """
+    Bounded cache for AI answers that depend only on the prompt.
+
+    Two tiers: an in-process LRU capped at MAX_ENTRIES entries and MAX_BYTES
+    of key + answer text, in front of the `ai_response_cache` collection that
+    every worker shares (a TTL index on `expires_at` removes stale documents).
+    Both tiers expire entries after TTL_SECONDS. Keys are the namespace plus a
+    SHA-256 of the normalized prompt, so callers must only pass prompts whose
+    answer does not depend on who asked.
+    """
+
+    def __init__(self, namespace: str, ttl: float = TTL_SECONDS):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.collection = db[COLLECTION_NAME]
+        # key -> (expires_at monotonic, answer, size in bytes)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self.bytes = 0
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def key(self, prompt: str) -> str:
+        return f"{self.namespace}|{hashlib.sha256(prompt.encode()).hexdigest()}"
+
+    # ── In-process tier ───────────────────────────────────────────────────────
+
+    def _drop(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put_local(self, key: str, answer: str, ttl: float):
+        size = len(key) + len(answer.encode())
+        if size > MAX_BYTES:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, answer, size)
+        self.bytes += size
+        while len(self._entries) > MAX_ENTRIES or self.bytes > MAX_BYTES:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    async def get(self, prompt: str) -> Optional[str]:
+        """Cached answer for a normalized prompt, checking this worker first, then Mongo."""
+        key = self.key(prompt)
+        answer = self._get_local(key)
+        if answer is not None:
+            self.local_hits += 1
+            return answer
+        try:
+            doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            doc = None
+        if doc and doc.get("answer"):
+            remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+            self._put_local(key, doc["answer"], min(self.ttl, remaining))
+            self.shared_hits += 1
+            return doc["answer"]
+        self.misses += 1
+        return None
+
+    async def set(self, prompt: str, answer: str):
+        """Store a freshly generated answer in both tiers."""
+        if not answer:
+            return
+        key = self.key(prompt)
+        self._put_local(key, answer, self.ttl)
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "namespace": self.namespace,
+                    "prompt": prompt[:500],
+                    "answer": answer,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": MAX_BYTES,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": round((self.local_hits + self.shared_hits) / lookups, 3) if lookups else None,
+        }
+
+
+# Global instance
+language_lesson_cache = ResponseCache("language_lesson")
@@ -0,0 +1,126 @@
+import time
+import asyncio
+import functools
+import logging
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Scope marker for entries that are not restricted to particular villas
+ALL_VILLAS = "*"
+
+
+def _scope_of(user: Dict[str, Any]) -> Tuple[str, Tuple[str, ...]]:
+    villas = user.get("villa_codes", [ALL_VILLAS])
+    scope = (ALL_VILLAS,) if ALL_VILLAS in villas else tuple(sorted(villas))
+    return user.get("role", ""), scope
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ResultCache:
+    """
+    In-process TTL cache for read-only endpoint results with single-flight
+    coalescing: while one request computes a key, identical concurrent
+    requests await the same result instead of re-running the query.
+
+    Entries remember which villas their data covers, so a write for one
+    villa only drops results that could include that villa.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[float, Tuple[str, ...], Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(self, key: Hashable, ttl: float, compute: Callable, scope: Tuple[str, ...] = (ALL_VILLAS,)):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[2]
+
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # Runs as its own task so a disconnecting first caller doesn't cancel it for the others
+            task = asyncio.create_task(self._compute(key, ttl, compute, scope))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: Hashable, ttl: float, compute: Callable, scope: Tuple[str, ...]):
+        generation = self._generation
+        try:
+            result = await compute()
+            # Endpoints report failures in-band; never cache those. Skip results
+            # computed across an invalidation, they may predate the write.
+            if generation == self._generation and not (isinstance(result, dict) and result.get("success") is False):
+                self._entries[key] = (time.monotonic() + ttl, scope, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate_villa(self, villa_code: Optional[str] = None):
+        """Drop cached results that could include villa_code (everything when None)."""
+        self._generation += 1
+        if villa_code is None:
+            self._entries.clear()
+            return
+        for key in [k for k, (_, scope, _) in self._entries.items()
+                    if ALL_VILLAS in scope or villa_code in scope]:
+            self._entries.pop(key, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+        }
+
+
+# Global instance
+result_cache = ResultCache()
+
+
+def cached(ttl: float = 15.0, villa_scoped: bool = False):
+    """
+    Cache an async endpoint's result for `ttl` seconds, keyed by the endpoint,
+    the caller's role and villa scope (from the injected user dict) and the
+    remaining parameters.
+
+    villa_scoped: the endpoint filters its data to the user's villas, so a
+    write to another villa need not invalidate it.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            scope: Tuple[str, ...] = (ALL_VILLAS,)
+            key_parts = []
+            for param, value in sorted(kwargs.items()):
+                if isinstance(value, dict) and ("villa_codes" in value or "role" in value):
+                    role, villas = _scope_of(value)
+                    key_parts.append((param, role, villas))
+                    if villa_scoped:
+                        scope = villas
+                else:
+                    key_parts.append((param, _freeze(value)))
+            key = (name, _freeze(args), tuple(key_parts))
+            return await result_cache.get_or_compute(key, ttl, lambda: func(*args, **kwargs), scope)
+
+        return wrapper
+    return decorator
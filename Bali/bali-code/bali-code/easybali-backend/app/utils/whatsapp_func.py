@@ -13,8 +13,11 @@ from app.services.invoice_generator import generate_and_upload_invoice
 from app.services.menu_services import get_service_provider_by_whatsapp, get_villa_code_by_name, get_service_base_price, get_villa_info_by_code
 from app.services.order_summary import initiate_chat_session, active_chat_sessions, save_order_to_db, format_order_summary, check_order_confirmation,order_sessions, update_order_confirmation, get_sender_id_by_order, get_order_by_number
 from app.settings.config import settings
+from app.services.whatsapp_transport import whatsapp_transport
+from app.services.whatsapp_queue import enqueue_whatsapp_message, PRIORITY_TRANSACTIONAL
 from app.utils.media_upload import process_whatsapp_passport, process_whatsapp_issue
 from app.db.session import db, order_collection, villa_code_collection, checkin_collection, inquiry_collection, issue_collection, feedback_collection, customer_collection
+from app.services.dashboard_stats import dashboard_stats
 from pymongo import ReturnDocument
 from app.models.order_summary import Order
 from app.services.websocket_managerr import ConnectionManager
@@ -330,7 +333,7 @@ async def _send_nav_buttons(sender_id: str, body: str, buttons: list) -> None:
             },
         },
     }
-    async with httpx.AsyncClient() as _hc:
+    async with whatsapp_transport.session() as _hc:
         resp = await _hc.post(settings.whatsapp_api_url, json=payload, headers=headers)
         resp.raise_for_status()
 
@@ -427,7 +430,7 @@ async def _send_followup_prompt(sender_id: str, title: str, main_menu: str = "")
         },
     }
     try:
-        async with httpx.AsyncClient() as _hc:
+        async with whatsapp_transport.session() as _hc:
             resp = await _hc.post(settings.whatsapp_api_url, json=payload, headers=headers)
             resp.raise_for_status()
     except Exception as _fe:
@@ -481,7 +484,7 @@ async def _send_time_buttons(sender_id: str) -> None:
             },
         },
     }
-    async with httpx.AsyncClient() as _hc:
+    async with whatsapp_transport.session() as _hc:
         await _hc.post(settings.whatsapp_api_url, json=payload, headers=headers)
 
 
@@ -507,7 +510,7 @@ async def _send_persons_buttons(sender_id: str) -> None:
             },
         },
     }
-    async with httpx.AsyncClient() as _hc:
+    async with whatsapp_transport.session() as _hc:
         await _hc.post(settings.whatsapp_api_url, json=payload, headers=headers)
 
 
@@ -547,7 +550,7 @@ async def _send_booking_summary(sender_id: str) -> None:
             },
         },
     }
-    async with httpx.AsyncClient() as _hc:
+    async with whatsapp_transport.session() as _hc:
         await _hc.post(settings.whatsapp_api_url, json=payload, headers=headers)
 
 
@@ -757,7 +760,7 @@ async def send_typing_indicator(phone_number: str, message_id: str):
     }
     
     try:
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
             print(f"✅ Typing indicator sent to {phone_number}")
@@ -816,7 +819,7 @@ async def send_whatsapp_order_to_SP(recipient_number: str, order_summary: dict):
                 }
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
 
@@ -859,7 +862,7 @@ async def send_interactive_message(recipient_id, payment_result):
                 }
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
 
@@ -906,7 +909,7 @@ async def send_confirmation_order_to_SP(recipient_number: str, order_number: str
                 }
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
 
@@ -943,7 +946,7 @@ async def send_whatsapp_interactive_link(recipient_number: str, link: str):
     }
         }
     }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
 
@@ -987,7 +990,7 @@ async def send_whatsapp_card(recipient_id: str, card_data: dict):
             },
         }
 
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
             print(f"✅ WhatsApp API Response: {response.status_code}, {response.text}")
@@ -1029,7 +1032,7 @@ async def send_whatsapp_card_with_link(recipient_id: str, card_data: dict):
             },
         }
 
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
             print(f"✅ WhatsApp API Response: {response.status_code}, {response.text}")
@@ -1087,7 +1090,7 @@ async def send_whatsapp_list_message(recipient_id: str, card_data: dict):
             },
         }
 
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
             print(f"✅ WhatsApp API Response: {response.status_code}, {response.text}")
@@ -1118,7 +1121,7 @@ async def send_whatsapp_subcategory_list_message(recipient_id: str, card_data: d
                 "action": {"button": "Select Option", "sections": sections}
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
     except Exception as e:
         print(f"❌ Error sending Subcategory list: {e}")
@@ -1144,7 +1147,7 @@ async def send_whatsapp_service_list_message(recipient_id: str, card_data: dict,
                 "action": {"button": "Book Now", "sections": sections}
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
     except Exception as e:
         print(f"❌ Error sending Service list: {e}")
@@ -1240,7 +1243,7 @@ async def send_ai_whatsapp_list_message(
             }
         }
 
-        async with httpx.AsyncClient(timeout=50.0) as client:
+        async with whatsapp_transport.session(timeout=50.0) as client:
             response = await client.post(
                 f"{settings.whatsapp_api_url}",
                 json=payload,
@@ -1323,7 +1326,7 @@ async def send_whatsapp_menu_list_message(recipient_id: str, card_data: dict):
             },
         }
 
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
             print(f"✅ WhatsApp API Response: {response.status_code}, {response.text}")
@@ -1387,7 +1390,7 @@ async def send_calendar_flow(recipient_id: str):
             }
         }
 
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(
                 settings.whatsapp_api_url,
                 json=payload,
@@ -1456,7 +1459,7 @@ async def starting_message(recipient_number: str):
                 }
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
 
@@ -1558,6 +1561,7 @@ async def log_guest_inquiry(sender_id: str, villa_code: str, query: str, respons
             "status": "responded"
         }
         await inquiry_collection.insert_one(inquiry_doc)
+        dashboard_stats.touch(villa_code)
         logger.info(f"Logged inquiry from {sender_id} at {villa_code}")
         
         # If it's a support request, notify manager immediately
@@ -1599,6 +1603,7 @@ async def attempt_sp_reassignment(order_num: str):
                 {"order_number": order_num},
                 {"$set": {"status": "pending"}}
             )
+            dashboard_stats.touch(order.get("villa_code"))
             # Notify guest
             if guest_id:
                 await send_whatsapp_message(
@@ -1618,6 +1623,7 @@ async def attempt_sp_reassignment(order_num: str):
                 {"order_number": order_num},
                 {"$set": {"status": "no_providers"}}
             )
+            dashboard_stats.touch(order.get("villa_code"))
             if guest_id:
                 await send_whatsapp_message(
                     guest_id,
@@ -1673,7 +1679,7 @@ async def send_decline_confirmation(recipient_number: str, order_num: str):
                 }
             }
         }
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             response.raise_for_status()
             return response.json()
@@ -1757,7 +1763,7 @@ async def send_invoice_with_download(sender_id: str, download_url: str, order_nu
             "Content-Type": "application/json"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with whatsapp_transport.session(timeout=30.0) as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             
             if response.status_code == 200:
@@ -1817,7 +1823,7 @@ async def send_whatsapp_flow_message(recipient_id: str, order_number: str):
             }
         }
     
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with whatsapp_transport.session(timeout=30.0) as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             
             if response.status_code != 200:
@@ -1883,8 +1889,7 @@ async def send_whatsapp_service_flow_message(recipient_id: str, flow_token: str)
         
         print(f"🔍 DEBUG: Full payload: {json.dumps(payload, indent=2)}")
     
-        import httpx
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with whatsapp_transport.session(timeout=30.0) as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             
             print(f"🔍 DEBUG: WhatsApp API response status: {response.status_code}")
@@ -1947,8 +1952,7 @@ async def send_whatsapp_order_flow_message(recipient_id: str, flow_token: str):
             }
         }
     
-        import httpx
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with whatsapp_transport.session(timeout=30.0) as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             
             print(f"🔍 DEBUG: WhatsApp API response status: {response.status_code}")
@@ -2045,8 +2049,7 @@ async def send_ai_whatsapp_order_flow_message(recipient_id: str, flow_token: str
             }
         }
     
-        import httpx
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with whatsapp_transport.session(timeout=30.0) as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             
             print(f"🔍 DEBUG: WhatsApp API response status: {response.status_code}")
@@ -2122,7 +2125,7 @@ async def send_whatsapp_image_with_caption(recipient_id: str, image_url: str, ca
             }
         }
         
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(
                 settings.whatsapp_api_url, 
                 json=payload, 
@@ -2223,9 +2226,8 @@ async def process_message(sender_id: str, message_payload: dict, message_id:str)
                                 }
                             }
                         }
-                        import httpx as _httpx
                         _headers = {"Authorization": f"Bearer {settings.access_token}", "Content-Type": "application/json"}
-                        async with _httpx.AsyncClient() as _c:
+                        async with whatsapp_transport.session() as _c:
                             await _c.post(settings.whatsapp_api_url, json=_buttons_payload, headers=_headers)
                         return
                     else:
@@ -3318,6 +3320,7 @@ async def process_message(sender_id: str, message_payload: dict, message_id:str)
                         "timestamp": datetime.datetime.now()
                     }
                     await issue_collection.insert_one(issue_data)
+                    dashboard_stats.touch(issue_data.get("villa_code"))
 
                 # Notify Villa Manager
                 rich_profile = await db["villa_profiles"].find_one({"villa_code": user_villa_code})
@@ -3747,7 +3750,7 @@ async def send_whatsapp_message(recipient_id: str, message: str):
             "text": {"body": message},
         }
 
-        async with httpx.AsyncClient() as client:
+        async with whatsapp_transport.session() as client:
             response = await client.post(settings.whatsapp_api_url, json=payload, headers=headers)
             if response.status_code >= 400:
                  logger.error(f"❌ WhatsApp API Error (send_whatsapp_message): Status {response.status_code}, Body: {response.text}")
@@ -3804,7 +3807,7 @@ async def notify_payment_completion(order_data: dict):
             f"Thank you for choosing EASY Bali! 🌴"
         )
         if is_whatsapp:
-            await send_whatsapp_message(sender_id, completion_message)
+            await enqueue_whatsapp_message(sender_id, completion_message, priority=PRIORITY_TRANSACTIONAL)
         elif is_websocket:
             await manager.send_personal_message(
                 message=completion_message,
@@ -3826,7 +3829,7 @@ async def notify_payment_completion(order_data: dict):
                     f"**Amount:** IDR {int(float(price)):,}\n\n"
                     f"Service is scheduled as confirmed! ✅"
                 )
-                await send_whatsapp_message(villa_number, villa_msg)
+                await enqueue_whatsapp_message(villa_number, villa_msg, priority=PRIORITY_TRANSACTIONAL)
         
         # 4. Notify Easy-Bali Admin
         await notify_admin_of_outcome(order_data, "SUCCESS")
@@ -3957,7 +3960,7 @@ async def notify_service_provider(order_data: dict):
 
         # Notify the SP who accepted the order (WhatsApp-originated bookings)
         if service_provider_number and str(service_provider_number).isdigit():
-            await send_whatsapp_message(service_provider_number, provider_message)
+            await enqueue_whatsapp_message(service_provider_number, provider_message, priority=PRIORITY_TRANSACTIONAL)
             logger.info(f"SP post-payment notification sent to {service_provider_number}")
         else:
             # Fallback for website orders — look up by service name
@@ -3965,7 +3968,7 @@ async def notify_service_provider(order_data: dict):
                 sp_numbers = await fetch_whatsapp_numbers(service_name or "")
                 for _num in sp_numbers:
                     try:
-                        await send_whatsapp_message(_num, provider_message)
+                        await enqueue_whatsapp_message(_num, provider_message, priority=PRIORITY_TRANSACTIONAL)
                     except Exception:
                         pass
                 if sp_numbers:
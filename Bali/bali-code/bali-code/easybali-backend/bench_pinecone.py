@@ -0,0 +1,92 @@
+"""
+Per-query latency of the old get_index (new client + list_indexes + host
+lookup on every call), the cached gateway handle, and the local in-process
+vector index. Needs real Pinecone credentials in .env, except with
+--synthetic, which times the local index on random vectors (no network).
+
+    python bench_pinecone.py [rounds]
+    python bench_pinecone.py --synthetic [rows]
+"""
+import sys
+import time
+import tempfile
+import statistics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import numpy as np
+from pinecone import Pinecone
+from app.settings.config import settings
+from app.services.pinconeservice import pinecone_gateway
+from app.services.local_vector_index import LocalVectorIndex, LocalVectorStore
+
+INDEX_NAME = "villa-faqs"
+VECTOR = [0.01] * 1536
+FILTER = {"villa_code": {"$in": ["V1", "WEB_VILLA_01"]}}
+
+
+def legacy_query():
+    pc = Pinecone(api_key=settings.pinecone_api_key)
+    [idx.name for idx in pc.list_indexes()]
+    return pc.Index(INDEX_NAME).query(vector=VECTOR, top_k=3, include_metadata=True)
+
+
+def gateway_query():
+    return pinecone_gateway.get_index(INDEX_NAME).query(vector=VECTOR, top_k=3, include_metadata=True)
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"{label:<10} median {statistics.median(samples):9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def local_index(store: LocalVectorStore, name: str):
+    index = store.get(name)
+    return lambda: index.query(vector=VECTOR, top_k=3, include_metadata=True, filter=FILTER)
+
+
+def synthetic(rows: int):
+    rng = np.random.default_rng(0)
+    vectors = [
+        {"id": str(i), "values": rng.normal(size=1536).tolist(),
+         "metadata": {"text": f"row {i}", "villa_code": ("V1", "V2", "WEB_VILLA_01")[i % 3]}}
+        for i in range(rows)
+    ]
+    store = LocalVectorStore(tempfile.mkdtemp(prefix="bench-vectors-"))
+    store.save(LocalVectorIndex.build(INDEX_NAME, vectors))
+    import app.services.local_vector_index as lvi
+    lvi.LOCAL_INDEX_MODE = "true"
+    report("local", timed(local_index(store, INDEX_NAME), 1000))
+
+
+if __name__ == "__main__":
+    if "--synthetic" in sys.argv:
+        args = [a for a in sys.argv[1:] if a != "--synthetic"]
+        synthetic(int(args[0]) if args else 500)
+        sys.exit(0)
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pinecone_gateway.ensure_indexes([INDEX_NAME])
+    gateway_query()  # warm the connection pool
+    legacy = timed(legacy_query, rounds)
+    gateway = timed(gateway_query, rounds)
+    report("legacy", legacy)
+    report("gateway", gateway)
+    print(f"saved per query: {statistics.median(legacy) - statistics.median(gateway):.1f} ms (median)")
+
+    import app.services.local_vector_index as lvi
+    lvi.LOCAL_INDEX_MODE = "true"
+    store = LocalVectorStore(tempfile.mkdtemp(prefix="bench-vectors-"))
+    if store.sync_from(INDEX_NAME, pinecone_gateway.get_index(INDEX_NAME)) is not None:
+        report("local", timed(local_index(store, INDEX_NAME), rounds))
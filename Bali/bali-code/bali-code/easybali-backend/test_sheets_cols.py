@@ -1,5 +1,5 @@
 import asyncio
-from app.services.menu_services import get_cached_workbook, clean_dataframe
+from app.services.menu_services import get_cached_workbook
 import pandas as pd
 
 def main():
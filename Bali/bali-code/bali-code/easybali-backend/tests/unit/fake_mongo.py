@@ -0,0 +1,166 @@
+"""
+In-memory stand-in for the Motor collection API used by the unit tests.
+
+Supports only the query/update operators the services under test use:
+equality (None also matches a missing field), $in, $nin, $ne, $lt, $lte,
+$gt, $gte, $exists, $or; updates with $set, $unset, $inc, $push ($each/$slice) and $setOnInsert (upsert); replacements.
+"""
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+
+def matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$exists" and (key in doc) != bool(arg):
+                    return False
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$lt" and (value is None or not value < arg):
+                    return False
+                if op == "$lte" and (value is None or not value <= arg):
+                    return False
+                if op == "$gt" and (value is None or not value > arg):
+                    return False
+                if op == "$gte" and (value is None or not value >= arg):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def apply_update(doc, update):
+    doc.update(update.get("$set", {}))
+    for field in update.get("$unset", {}):
+        doc.pop(field, None)
+    for field, value in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + value
+    for field, value in update.get("$push", {}).items():
+        if isinstance(value, dict) and "$each" in value:
+            doc.setdefault(field, []).extend(value["$each"])
+            if "$slice" in value:
+                doc[field] = doc[field][value["$slice"]:] if value["$slice"] < 0 else doc[field][:value["$slice"]]
+        else:
+            doc.setdefault(field, []).append(value)
+
+
+def sort_docs(docs, sort):
+    for field, direction in reversed(sort or []):
+        docs.sort(key=lambda d: (d.get(field) is not None, d.get(field) or 0), reverse=direction < 0)
+    return docs
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def batch_size(self, n):
+        return self
+
+    def sort(self, field, direction=1):
+        sort_docs(self._docs, [(field, direction)] if isinstance(field, str) else field)
+        return self
+
+    def limit(self, n):
+        self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(d) for d in self._docs[:length]]
+
+    def __aiter__(self):
+        self._iter = iter(list(self._docs))
+        return self
+
+    async def __anext__(self):
+        try:
+            return dict(next(self._iter))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Result:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = [{"_id": ObjectId(), **d} for d in (docs or [])]
+
+    def _find(self, query, sort=None):
+        return sort_docs([d for d in self.docs if matches(d, query or {})], sort)
+
+    async def insert_one(self, doc):
+        doc = dict(doc)
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(doc)
+        return _Result(inserted_id=doc["_id"])
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self._find(query))
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        found = self._find(query, sort)
+        return dict(found[0]) if found else None
+
+    async def find_one_and_update(self, query, update, sort=None, return_document=None, upsert=False):
+        found = self._find(query, sort)
+        if not found:
+            return None
+        before = dict(found[0])
+        apply_update(found[0], update)
+        return dict(found[0]) if return_document else before
+
+    async def update_one(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            apply_update(found[0], update)
+            return _Result(matched_count=1, upserted_id=None)
+        if upsert:
+            doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            doc.update(update.get("$setOnInsert", {}))
+            apply_update(doc, update)
+            inserted = await self.insert_one(doc)
+            return _Result(matched_count=0, upserted_id=inserted.inserted_id)
+        return _Result(matched_count=0, upserted_id=None)
+
+    async def update_many(self, query, update):
+        found = self._find(query)
+        for doc in found:
+            apply_update(doc, update)
+        return _Result(matched_count=len(found), modified_count=len(found))
+
+    async def replace_one(self, query, replacement, upsert=False):
+        found = self._find(query)
+        if found:
+            found[0].clear()
+            found[0].update({"_id": query.get("_id"), **replacement})
+        elif upsert:
+            await self.insert_one({**query, **replacement})
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            if isinstance(op, ReplaceOne):
+                await self.replace_one(op._filter, op._doc, upsert=op._upsert)
+            else:
+                await self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+    async def count_documents(self, query):
+        return len(self._find(query))
+
+    def by_status(self, status):
+        return [d for d in self.docs if d.get("status") == status]
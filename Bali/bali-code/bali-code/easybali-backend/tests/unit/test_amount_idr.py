@@ -0,0 +1,95 @@
+"""
+UNIT TESTS: Typed Order Amounts (amount_idr)
+
+Verifies formatted price strings become integer IDR amounts, every Order gets
+amount_idr on creation, and the backfill streams orders in batches, is
+resumable from its checkpoint and never rewrites an order twice.
+"""
+import pytest
+from unittest.mock import patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.models.order_summary import Order, amount_idr_from_price
+from app.db import backfill_amount_idr as backfill
+from tests.unit.fake_mongo import FakeCollection
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+class TestAmountParsing:
+    """TC-U-200 through TC-U-202, TC-U-205: price → amount_idr."""
+
+    def test_formatted_strings(self):
+        """TC-U-200: Thousands separators, currency prefixes and numbers all parse to int IDR."""
+        assert amount_idr_from_price("1,500,000") == 1500000
+        assert amount_idr_from_price("IDR 500 000") == 500000
+        assert amount_idr_from_price(750000.0) == 750000
+        assert amount_idr_from_price("Contact us") is None
+        assert amount_idr_from_price(None) is None
+
+    def test_decimal_prices_are_not_inflated(self):
+        """TC-U-205: Fractional prices keep their magnitude in either separator convention."""
+        assert amount_idr_from_price("150000.50") == 150000
+        assert amount_idr_from_price("1,500.00") == 1500
+        assert amount_idr_from_price("Rp 1.500.000,00") == 1500000
+        assert amount_idr_from_price("IDR 250.000") == 250000
+        assert amount_idr_from_price("99,9") == 100
+
+    def test_order_model_fills_amount(self):
+        """TC-U-201: An Order built from a formatted price carries the typed amount."""
+        order = Order(sender_id="62811", order_number="EB-1", service_name="Massage", price="1,200,000")
+        assert order.amount_idr == 1200000
+        assert order.model_dump()["amount_idr"] == 1200000
+
+    def test_web_orders_prefer_final_price(self):
+        """TC-U-202: Legacy web orders use the numeric final_price (unit price × persons)."""
+        assert backfill.order_amount_idr({"price": "250 000", "final_price": 500000.0}) == 500000
+        assert backfill.order_amount_idr({"price": "250 000"}) == 250000
+
+
+class TestBackfill:
+    """TC-U-203 through TC-U-204: streaming, resumable migration."""
+
+    @pytest.mark.asyncio
+    async def test_backfill_sets_missing_amounts_in_batches(self):
+        """TC-U-203: Only orders without amount_idr are written; unparseable prices become None."""
+        db = FakeDB()
+        db["orders-summary"] = FakeCollection([
+            {"price": "100,000"}, {"price": "200,000"}, {"price": "n/a"},
+            {"price": "999", "amount_idr": 5},
+        ])
+        assert await backfill.backfill_amount_idr(db, batch_size=2) == 3
+        amounts = [d["amount_idr"] for d in db["orders-summary"].docs]
+        assert amounts == [100000, 200000, None, 5]
+        assert "completed_at" in db["migrations"].docs[0]
+        assert await backfill.backfill_amount_idr(db) == 0
+
+    @pytest.mark.asyncio
+    async def test_backfill_resumes_after_checkpoint(self):
+        """TC-U-204: A run interrupted after one batch continues from the checkpointed _id."""
+        db = FakeDB()
+        db["orders-summary"] = FakeCollection([{"price": str(n)} for n in range(1, 6)])
+        orders = db["orders-summary"]
+        real_bulk = orders.bulk_write
+        calls = 0
+
+        async def crash_on_second(ops, ordered=True):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise RuntimeError("connection reset")
+            await real_bulk(ops, ordered)
+
+        with patch.object(orders, "bulk_write", side_effect=crash_on_second):
+            with pytest.raises(RuntimeError):
+                await backfill.backfill_amount_idr(db, batch_size=2)
+        checkpoint = db["migrations"].docs[0]["last_id"]
+        assert checkpoint == orders.docs[1]["_id"]
+
+        assert await backfill.backfill_amount_idr(db, batch_size=2) == 3
+        assert [d["amount_idr"] for d in orders.docs] == [1, 2, 3, 4, 5]
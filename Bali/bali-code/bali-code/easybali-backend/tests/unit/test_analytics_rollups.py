@@ -0,0 +1,119 @@
+"""
+UNIT TESTS: Time-Bucketed Analytics Rollups
+
+Verifies the HyperLogLog guest sketch, that recomputing a day range replaces
+its buckets (dropping emptied ones) and that dashboard figures are folded from
+bucket documents with unique guests merged across days.
+"""
+import time
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import analytics_rollups as ar
+from app.services.analytics_rollups import AnalyticsRollups, hll_sketch, hll_merge, hll_count
+from tests.unit.fake_mongo import FakeCollection, FakeCursor
+
+
+def _rollups(groups=()):
+    rollups = AnalyticsRollups()
+    rollups.collection = FakeCollection()
+    rollups.orders = MagicMock(aggregate=MagicMock(return_value=FakeCursor(list(groups))))
+    rollups._ready = True
+    return rollups
+
+
+def _group(day, villa, service, guests, bookings=1, completed=1, revenue=100000):
+    return {
+        "_id": {"day": day, "villa": villa, "service": service},
+        "bookings": bookings, "completed": completed, "revenue": revenue,
+        "amount_sum": revenue, "amount_count": bookings, "guests": guests,
+        "last_booking": datetime.strptime(day, "%Y-%m-%d"),
+    }
+
+
+class TestGuestSketch:
+    """TC-U-210 through TC-U-211: HyperLogLog estimates and merges."""
+
+    def test_estimate_is_close(self):
+        """TC-U-210: Small and large cardinalities are estimated within a few percent."""
+        assert hll_count(hll_sketch(["a", "b", "c", "a"])) == 3
+        estimate = hll_count(hll_sketch(str(n) for n in range(20000)))
+        assert abs(estimate - 20000) / 20000 < 0.08
+
+    def test_merge_counts_overlap_once(self):
+        """TC-U-211: The same guests on two days are not double counted after a merge."""
+        day1 = hll_sketch(f"g{n}" for n in range(300))
+        day2 = hll_sketch(f"g{n}" for n in range(200, 500))
+        assert abs(hll_count(hll_merge([day1, day2])) - 500) < 25
+
+
+class TestRollups:
+    """TC-U-212 through TC-U-215: bucket rebuilds, folded queries and background maintenance."""
+
+    @pytest.mark.asyncio
+    async def test_recompute_replaces_buckets_in_range(self):
+        """TC-U-212: Rebuilding a day writes one bucket per villa/service and drops emptied ones."""
+        rollups = _rollups([_group("2025-03-02", "V1", "Massage", ["a", "b"])])
+        rollups.collection.docs = [
+            {"_id": "2025-03-02|V1|Yoga", "day": "2025-03-02", "bookings": 4},
+            {"_id": "2025-03-01|V1|Yoga", "day": "2025-03-01", "bookings": 2},
+        ]
+        await rollups.recompute("2025-03-02", "2025-03-02")
+        ids = sorted(d["_id"] for d in rollups.collection.docs)
+        assert ids == ["2025-03-01|V1|Yoga", "2025-03-02|V1|Massage"]
+        bucket = next(d for d in rollups.collection.docs if d["_id"] == "2025-03-02|V1|Massage")
+        assert bucket["bookings"] == 1 and hll_count(bucket["guests"]) == 2
+        match = rollups.orders.aggregate.call_args.args[0][0]["$match"]["created_at"]
+        assert match["$gte"] == datetime(2025, 3, 2) and match["$lt"] == datetime(2025, 3, 3)
+
+    @pytest.mark.asyncio
+    async def test_villa_performance_folds_days(self):
+        """TC-U-213: Bookings and revenue add up across days; guests seen twice count once."""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+        rollups = _rollups([
+            _group(yesterday, "V1", "Massage", ["a", "b"], bookings=2, completed=1, revenue=300000),
+            _group(today, "V1", "Yoga", ["b", "c"], bookings=2, completed=2, revenue=200000),
+            _group(today, "V2", "Yoga", ["d"], bookings=1, completed=0, revenue=0),
+        ])
+        await rollups.recompute()
+        v1, v2 = await rollups.get_villa_performance(days=7)
+        assert v1["villa_code"] == "V1"
+        assert (v1["total_bookings"], v1["completed_bookings"], v1["total_revenue"]) == (4, 3, 500000)
+        assert v1["unique_guest_count"] == 3
+        assert v1["completion_rate"] == 75.0
+        assert v2["completion_rate"] == 0 and v2["avg_booking_value"] == 0
+
+    @pytest.mark.asyncio
+    async def test_services_and_daily_revenue(self):
+        """TC-U-214: Service and daily revenue views come from the same buckets."""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        rollups = _rollups([
+            _group(today, "V1", "Yoga", ["a"], bookings=2, completed=1, revenue=100000),
+            _group(today, "V2", "Yoga", ["b"], bookings=1, completed=1, revenue=200000),
+        ])
+        await rollups.recompute()
+        (yoga,) = await rollups.get_service_analytics(days=7)
+        assert (yoga["total_bookings"], yoga["total_revenue"], yoga["avg_price"]) == (3, 300000, 100000.0)
+        (point,) = await rollups.get_daily_revenue(days=7)
+        assert point == {"date": today, "revenue": 300000, "bookings": 2, "avg_booking_value": 150000.0}
+
+    @pytest.mark.asyncio
+    async def test_reconcile_runs_under_steady_writes(self):
+        """TC-U-215: Orders arriving faster than the refresh interval don't starve the periodic reconcile."""
+        rollups = _rollups()
+        rollups.recompute = AsyncMock()
+        reconcile = AsyncMock(side_effect=lambda: setattr(rollups, "_maintained_at", time.monotonic()))
+        with patch.object(ar, "ROLLING_REFRESH_SECONDS", 0.05), patch.object(ar, "RECOMPUTE_DEBOUNCE_SECONDS", 0), \
+                patch.object(rollups, "_reconcile_if_due", reconcile):
+            rollups._ensure_running()
+            for _ in range(30):
+                rollups.touch(datetime.utcnow())
+                await asyncio.sleep(0.01)
+            rollups._task.cancel()
+        assert rollups.recompute.await_count > 0
+        assert 2 <= reconcile.await_count <= 10
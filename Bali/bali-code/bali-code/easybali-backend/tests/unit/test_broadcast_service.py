@@ -0,0 +1,113 @@
+"""
+UNIT TESTS: Background Broadcast Jobs
+
+Verifies that a content broadcast is recorded as a job, recipients are
+streamed and deduplicated, fan-out goes through the outbound queue on the bulk
+lane, delivery results roll up into per-recipient status and job progress,
+and an interrupted job resumes without sending twice.
+"""
+import pytest
+from datetime import datetime, timedelta
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import broadcast_service
+from app.services.broadcast_service import BroadcastExecutor
+from app.services.whatsapp_rate_limit import PRIORITY_BULK
+from tests.unit.fake_mongo import FakeCollection
+from tests.unit.test_whatsapp_queue import _queue
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    queue = _queue()
+    content = FakeCollection()
+    monkeypatch.setattr(broadcast_service, "content_collection", content)
+    ex = BroadcastExecutor(concurrency=3)
+    ex.jobs = FakeCollection()
+    ex.recipients = FakeCollection()
+    ex.contacts = FakeCollection([
+        {"sender_id": "6201", "villa_code": "V1"},
+        {"sender_id": "6202", "villa_code": "V1"},
+        {"sender_id": "6201", "villa_code": "V1"},   # same guest scanned twice
+        {"sender_id": "6203", "villa_code": "V2"},
+        {"sender_id": None, "villa_code": "V2"},
+    ])
+    ex.queue = queue
+    return ex
+
+
+async def _create(ex, **kwargs):
+    content = await broadcast_service.content_collection.insert_one({"title": "Hi", "body": "Hello"})
+    job_id = await ex.create_job(content_id=str(content.inserted_id), message_body="Hello", **kwargs)
+    await ex._running[job_id]
+    return job_id
+
+
+class TestBroadcastJobs:
+    """TC-U-160 through TC-U-164: resolve, fan-out, progress and resume."""
+
+    @pytest.mark.asyncio
+    async def test_job_resolves_and_dedupes_recipients(self, executor):
+        """TC-U-160: Recipients are streamed, deduplicated and empty ids skipped."""
+        job_id = await _create(executor, target="all")
+        progress = await executor.get_progress(job_id)
+        assert progress["status"] == "sending"
+        assert progress["total_recipients"] == 3
+        assert progress["queued"] == 3
+        assert sorted(d["recipient_id"] for d in executor.recipients.docs) == ["6201", "6202", "6203"]
+
+    @pytest.mark.asyncio
+    async def test_fan_out_uses_bulk_lane(self, executor):
+        """TC-U-161: Every recipient gets one queued message on the bulk lane tagged with the job."""
+        job_id = await _create(executor, target="villa", villa_code="V1")
+        queued = executor.queue.collection.docs
+        assert sorted(d["recipient_id"] for d in queued) == ["6201", "6202"]
+        assert all(d["priority"] == PRIORITY_BULK for d in queued)
+        assert all(str(d["broadcast_job_id"]) == job_id for d in queued)
+
+    @pytest.mark.asyncio
+    async def test_delivery_results_complete_job(self, executor):
+        """TC-U-162: Sent/failed results update recipients, progress and the content send history."""
+        job_id = await _create(executor, target="custom", recipients=["6201", "6202"])
+        first, second = executor.queue.collection.docs
+        await executor.queue._settled(first, "sent")
+        mid = await executor.get_progress(job_id)
+        assert mid["status"] == "sending" and mid["percent"] == 50.0
+        await executor.queue._settled(second, "failed")
+
+        done = await executor.get_progress(job_id)
+        assert done["status"] == "completed"
+        assert (done["sent"], done["failed"], done["remaining"]) == (1, 1, 0)
+        assert {d["recipient_id"]: d["status"] for d in executor.recipients.docs} == {"6201": "sent", "6202": "failed"}
+        history = broadcast_service.content_collection.docs[0]["send_history"]
+        assert history[0]["recipient_count"] == 1 and history[0]["job_id"] == job_id
+
+    @pytest.mark.asyncio
+    async def test_resume_does_not_double_send(self, executor):
+        """TC-U-163: A job interrupted mid-enqueue resumes and queues each recipient once."""
+        job_id = await _create(executor, target="custom", recipients=["6201", "6202", "6203"])
+        # Simulate a crash: one recipient was enqueued but not marked, one never started
+        queued = executor.queue.collection.docs
+        executor.queue.collection.docs = queued[:1]
+        recs = {d["recipient_id"]: d for d in executor.recipients.docs}
+        recs[queued[0]["recipient_id"]]["status"] = "enqueuing"
+        for rid in ("6202", "6203"):
+            recs[rid]["status"] = "pending"
+        job = executor.jobs.docs[0]
+        job.pop("fanned_out_at")
+        job["lease_expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+
+        executor.start(job_id)
+        await executor._running[job_id]
+        assert sorted(d["recipient_id"] for d in executor.queue.collection.docs) == ["6201", "6202", "6203"]
+        assert all(d["status"] == "queued" for d in executor.recipients.docs)
+
+    @pytest.mark.asyncio
+    async def test_job_with_no_recipients_completes(self, executor):
+        """TC-U-164: A target that resolves to nobody finishes immediately."""
+        job_id = await _create(executor, target="villa", villa_code="V9")
+        progress = await executor.get_progress(job_id)
+        assert progress["status"] == "completed"
+        assert progress["total_recipients"] == 0
+        assert executor.queue.collection.docs == []
@@ -0,0 +1,240 @@
+"""
+UNIT TESTS: Catalog Snapshot Indexes
+
+Verifies that the pre-indexed CatalogSnapshot answers the menu_services getters
+exactly like the old DataFrame scans did (first row wins, fuzzy price fallback,
+villa code/name resolution order, provider WhatsApp normalisation).
+"""
+import pytest
+import pandas as pd
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import catalog_snapshot
+from app.services.catalog_snapshot import CatalogSnapshot, publish_snapshot
+
+
+SERVICES = pd.DataFrame([
+    {"Service Item": "Balinese Massage - 60min", "Service Item Description": "Relax",
+     "Sub-category": "Massage", "Final Price (Service Item Button)": "IDR 350,000",
+     "Image URL": "https://img/1", "Service Providers": "SP1"},
+    {"Service Item": "Balinese Massage - 60min", "Service Item Description": "Duplicate",
+     "Sub-category": "Massage", "Final Price (Service Item Button)": "999",
+     "Image URL": "https://img/dup", "Service Providers": "SP2"},
+    {"Service Item": "Airport Transfer", "Service Item Description": "Pickup",
+     "Sub-category": "Transportation", "Final Price (Service Item Button)": "250\xa0000",
+     "Image URL": "https://img/2", "Service Providers": "SP3"},
+])
+
+DESIGN = pd.DataFrame([
+    {"Category": "Wellness", "Category ID": "cat_wellness", "Category Description WA": "Spa",
+     "Category Description": "Spa web", "Category Picture": "p", "Category Button": "b",
+     "Sub-category": "Massage", "Sub-category Description WA": "Massage WA",
+     "Sub-category Description": "Massage web", "Sub-category Picture": "sp",
+     "Sub-category Button": "sb"},
+    {"Category": "Wellness", "Category ID": "cat_wellness", "Category Description WA": "Spa",
+     "Category Description": "Spa web", "Category Picture": "p", "Category Button": "b",
+     "Sub-category": "Yoga", "Sub-category Description WA": "Yoga WA",
+     "Sub-category Description": "Yoga web", "Sub-category Picture": "yp",
+     "Sub-category Button": "yb"},
+])
+
+VILLAS = pd.DataFrame([
+    {"Number": "V1", "Name of Villa": "Villa Hassan Umalas", "Location": "Umalas"},
+    {"Number": "V12", "Name of Villa": "Villa Kayu", "Location": "Canggu"},
+])
+
+PROVIDERS = pd.DataFrame([
+    {"Number": "SP1", "WhatsApp": "+6281111111"},
+    {"Number": "SP2", "WhatsApp": "6282222222"},
+])
+
+
+@pytest.fixture(autouse=True)
+def published():
+    previous = catalog_snapshot.get_snapshot()
+    publish_snapshot(CatalogSnapshot({
+        "services_df": SERVICES,
+        "design_df": DESIGN,
+        "villas_data": VILLAS,
+        "service_providers": PROVIDERS,
+    }))
+    yield
+    publish_snapshot(previous)
+
+
+class TestServiceIndexes:
+    """TC-U-80 through TC-U-84: service item and price lookups."""
+
+    @pytest.mark.asyncio
+    async def test_service_items_deduplicated_first_wins(self):
+        """TC-U-80: Duplicate service rows collapse to the first occurrence."""
+        from app.services.menu_services import get_service_items
+        items = await get_service_items("Massage")
+        assert len(items) == 1
+        assert items[0]["description"] == "Relax"
+
+    @pytest.mark.asyncio
+    async def test_unknown_subcategory_raises(self):
+        """TC-U-81: Unknown sub-category keeps raising 'Category not found'."""
+        from app.services.menu_services import get_service_items_for_whatsapp
+        with pytest.raises(ValueError, match="Category not found"):
+            await get_service_items_for_whatsapp("Nope")
+
+    @pytest.mark.asyncio
+    async def test_returned_items_are_copies(self):
+        """TC-U-82: Mutating a returned item never alters the shared snapshot."""
+        from app.services.menu_services import get_service_items
+        items = await get_service_items("Massage")
+        items[0]["button"] = "mutated"
+        again = await get_service_items("Massage")
+        assert again[0]["button"] == "IDR 350,000"
+
+    @pytest.mark.asyncio
+    async def test_base_price_exact_and_fuzzy(self):
+        """TC-U-83: Price resolves by exact name, normalized name and substring."""
+        from app.services.menu_services import get_service_base_price
+        assert await get_service_base_price("Balinese Massage - 60min") == "350000"
+        assert await get_service_base_price("balinese massage 60MIN") == "350000"
+        assert await get_service_base_price("Airport Transfer (one way)") == "250000"
+
+    @pytest.mark.asyncio
+    async def test_base_price_missing_returns_zero(self):
+        """TC-U-84: Unknown service returns '0'."""
+        from app.services.menu_services import get_service_base_price
+        assert await get_service_base_price("Helicopter Tour") == "0"
+
+
+class TestDesignIndexes:
+    """TC-U-85 through TC-U-87: category / sub-category lookups."""
+
+    @pytest.mark.asyncio
+    async def test_categories_with_sections(self):
+        """TC-U-85: get_categories groups sub-categories under each category."""
+        from app.services.menu_services import get_categories
+        categories = await get_categories()
+        assert [c["title"] for c in categories] == ["Wellness"]
+        assert [s["id"] for s in categories[0]["sections"]] == ["massage", "yoga"]
+
+    @pytest.mark.asyncio
+    async def test_sub_category(self):
+        """TC-U-86: get_sub_category returns the web sub-category cards."""
+        from app.services.menu_services import get_sub_category
+        subs = await get_sub_category("Wellness")
+        assert [s["subcategory"] for s in subs] == ["Massage", "Yoga"]
+
+    @pytest.mark.asyncio
+    async def test_category_sections_unknown_raises(self):
+        """TC-U-87: Unknown category title raises ValueError."""
+        from app.services.menu_services import get_category_sections
+        with pytest.raises(ValueError):
+            await get_category_sections("Missing")
+
+
+class TestVillaAndProviderIndexes:
+    """TC-U-88 through TC-U-92: villa and provider resolution."""
+
+    @pytest.mark.asyncio
+    async def test_villa_code_exact_code_beats_prefix(self):
+        """TC-U-88: 'V12' resolves to V12, not to V1 as a prefix match."""
+        from app.services.menu_services import get_villa_code_by_name
+        assert await get_villa_code_by_name("V12") == "V12"
+
+    @pytest.mark.asyncio
+    async def test_villa_code_from_sentence(self):
+        """TC-U-89: Code embedded in text ('villa v1') is found."""
+        from app.services.menu_services import get_villa_code_by_name
+        assert await get_villa_code_by_name("villa v1") == "V1"
+
+    @pytest.mark.asyncio
+    async def test_villa_code_by_name_variants(self):
+        """TC-U-90: Exact, contained and partial villa names resolve."""
+        from app.services.menu_services import get_villa_code_by_name
+        assert await get_villa_code_by_name("Villa Kayu") == "V12"
+        assert await get_villa_code_by_name("I'm at Villa Hassan Umalas now") == "V1"
+        assert await get_villa_code_by_name("kayu") == "V12"
+        assert await get_villa_code_by_name("Nowhere") is None
+
+    @pytest.mark.asyncio
+    async def test_villa_location_and_info(self):
+        """TC-U-91: Location and info dicts come from the code index."""
+        from app.services.menu_services import get_villa_location_by_code, get_villa_info_by_code
+        assert await get_villa_location_by_code("V12") == "Canggu"
+        info = await get_villa_info_by_code("V1")
+        assert info["name"] == "Villa Hassan Umalas"
+        assert info["wifi_name"] is None
+        assert await get_villa_info_by_code("V99") is None
+
+    @pytest.mark.asyncio
+    async def test_provider_whatsapp_plus_prefix_agnostic(self):
+        """TC-U-92: Provider lookup ignores a leading '+' on either side."""
+        from app.services.menu_services import get_service_provider_by_whatsapp
+        assert await get_service_provider_by_whatsapp("6281111111") == "SP1"
+        assert await get_service_provider_by_whatsapp("+6282222222") == "SP2"
+        assert await get_service_provider_by_whatsapp("000") is None
+
+
+class TestSnapshotImmutability:
+    """TC-U-93: The published snapshot cannot be modified in place."""
+
+    def test_snapshot_attributes_are_read_only(self):
+        snap = catalog_snapshot.get_snapshot()
+        with pytest.raises(AttributeError):
+            snap.service_items = {}
+        with pytest.raises(TypeError):
+            snap.price_by_service["x"] = "1"
+
+
+AI_DATA = pd.DataFrame([
+    {"Service Item": "Balinese Massage", "Service Item Description": "60 min in-villa",
+     "Price (Service Item Button)": "IDR 350,000"},
+    {"Service Item": "Airport Transfer", "Service Item Description": "Pickup",
+     "Price (Service Item Button)": "IDR 250,000"},
+])
+
+ARCHIVE = pd.DataFrame([
+    {"Item": "Scooter Rental", "Area": "Canggu", "Note": None},
+    {"Item": "Surf Lesson", "Area": "Uluwatu", "Note": " "},
+])
+
+EVENTS = pd.DataFrame([
+    {"Event Name": "Kecak Fire Dance", "Date": "Daily", "Time": "18:00", "Location": "Uluwatu",
+     "Description": "Sunset dance", "Additional Notes": "", "For more details (URL)": "https://x"},
+])
+
+
+class TestAIContextBlocks:
+    """TC-U-250 through TC-U-253: internal DB context rendered per snapshot and selected per query."""
+
+    def make(self):
+        return CatalogSnapshot({"ai_data_df": AI_DATA, "archive_df": ARCHIVE, "event_calendar_df": EVENTS})
+
+    def test_blocks_rendered_at_build(self):
+        """TC-U-250: Blocks are built with the snapshot; empty cells are skipped."""
+        snap = self.make()
+        text = snap.ai_context()
+        assert "--- ACTIVE SERVICES ---\n- Balinese Massage: 60 min in-villa Price: IDR 350,000" in text
+        assert "Item:Scooter Rental | Area:Canggu\n" in text
+        assert "Note:" not in text
+
+    def test_query_filters_secondary_sections(self):
+        """TC-U-251: A matching query keeps only matching archive rows and puts matching services first."""
+        snap = self.make()
+        text = snap.ai_context(catalog_snapshot.context_terms("surf in uluwatu and a transfer"))
+        services = text.split("\n\n")[0].splitlines()
+        assert services[1].startswith("- Airport Transfer")
+        assert "Surf Lesson" in text and "Scooter Rental" not in text
+
+    def test_unmatched_query_sends_everything(self):
+        """TC-U-252: With no matching row the full blocks are sent (previous behaviour)."""
+        snap = self.make()
+        assert snap.ai_context(catalog_snapshot.context_terms("hello there")) == snap.ai_context()
+
+    def test_event_calendar_block(self):
+        """TC-U-253: The event calendar text is rendered once and served from the published snapshot."""
+        from app.services.menu_services import get_event_calendar_context
+        publish_snapshot(self.make())
+        text = get_event_calendar_context()
+        assert text.startswith("Here are the upcoming events in Bali:")
+        assert "- Kecak Fire Dance | Daily at 18:00 | Uluwatu\n  Sunset dance\n  More info: https://x" in text
+        assert CatalogSnapshot({}).event_calendar_context == "No upcoming event data is currently available."
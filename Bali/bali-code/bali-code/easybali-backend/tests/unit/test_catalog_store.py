@@ -0,0 +1,114 @@
+"""
+UNIT TESTS: Persistent On-Disk Catalog Cache
+
+Verifies that the last good catalog round-trips through the msgpack file with
+its per-tab hashes, versions and spreadsheet revisions, that unusable files are
+ignored, and that a warm start serves the stored catalog (reported as stale once
+it ages past the threshold) until the first successful Sheets refresh.
+"""
+import os
+import time
+import pytest
+import pandas as pd
+from datetime import datetime, timedelta
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import menu_services, catalog_snapshot, catalog_store
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.sheet_versions import SheetVersionRegistry
+
+VILLAS = pd.DataFrame([{"Number": "V1", "Name of Villa": "Villa One"}])
+TABS = {"villas_data": {"sheet": "QR Codes", "hash": "abc", "version": 3}}
+REVISIONS = {"sheet-1": "42"}
+
+
+@pytest.fixture
+def store_path(monkeypatch, tmp_path):
+    path = str(tmp_path / "catalog.msgpack")
+    monkeypatch.setattr(catalog_store, "CATALOG_CACHE_PATH", path)
+    return path
+
+
+@pytest.fixture
+def empty_catalog(monkeypatch, store_path):
+    registry = SheetVersionRegistry()
+    previous_snapshot = catalog_snapshot.get_snapshot()
+    catalog_snapshot.publish_snapshot(CatalogSnapshot({}))
+    monkeypatch.setattr(menu_services, "sheet_versions", registry)
+    monkeypatch.setattr(menu_services, "cache", {key: None for key in menu_services.cache})
+    monkeypatch.setattr(menu_services, "catalog_source", None)
+    yield registry
+    catalog_snapshot.publish_snapshot(previous_snapshot)
+
+
+class TestCatalogFile:
+    """TC-U-120 through TC-U-123: save/load of the msgpack catalog file."""
+
+    def test_round_trip(self, store_path):
+        """TC-U-120: Frames, versions, hashes and revisions survive save → load."""
+        snap = CatalogSnapshot({"villas_data": VILLAS}, {"villas_data": 3})
+        catalog_store.save_catalog(snap, TABS, REVISIONS)
+        restored, meta = catalog_store.load_catalog()
+        assert restored.frames["villas_data"].equals(VILLAS)
+        assert restored.version == snap.version
+        assert restored.villa_code_for("villa one") == "V1"
+        assert meta["tabs"] == TABS
+        assert meta["revisions"] == REVISIONS
+
+    def test_missing_or_corrupt_file_is_ignored(self, store_path):
+        """TC-U-121: No file or garbage bytes → None, never an exception."""
+        assert catalog_store.load_catalog() is None
+        with open(store_path, "wb") as f:
+            f.write(b"\xc1not msgpack")
+        assert catalog_store.load_catalog() is None
+
+    def test_other_format_is_ignored(self, store_path, monkeypatch):
+        """TC-U-122: Files written with another format version are not trusted."""
+        catalog_store.save_catalog(CatalogSnapshot({"villas_data": VILLAS}), TABS, REVISIONS)
+        monkeypatch.setattr(catalog_store, "FORMAT_VERSION", catalog_store.FORMAT_VERSION + 1)
+        assert catalog_store.load_catalog() is None
+
+    def test_touch_advances_confirmed_at(self, store_path):
+        """TC-U-123: Touching an unchanged catalog moves its confirmed-at time forward."""
+        catalog_store.save_catalog(CatalogSnapshot({"villas_data": VILLAS}), TABS, REVISIONS)
+        old = time.time() - 3600
+        os.utime(store_path, (old, old))
+        _, before = catalog_store.load_catalog()
+        catalog_store.touch_catalog()
+        _, after = catalog_store.load_catalog()
+        assert after["confirmed_at"] >= before["confirmed_at"]
+        assert after["confirmed_at"] > datetime.now() - timedelta(minutes=1)
+
+
+class TestWarmStart:
+    """TC-U-124 through TC-U-126: warm start from disk and catalog status."""
+
+    def test_warm_start_publishes_stored_catalog(self, empty_catalog):
+        """TC-U-124: Stored catalog is served immediately with its versions and revisions."""
+        registry = empty_catalog
+        catalog_store.save_catalog(CatalogSnapshot({"villas_data": VILLAS}, {"villas_data": 3}), TABS, REVISIONS)
+        assert menu_services.warm_start_from_disk() is True
+        assert catalog_snapshot.get_snapshot().villa_code_for("Villa One") == "V1"
+        assert registry.versions() == {"villas_data": 3}
+        assert registry.revision_unchanged("sheet-1", "42")
+        assert menu_services.get_catalog_status()["source"] == "disk"
+
+    def test_warm_start_never_replaces_live_catalog(self, empty_catalog):
+        """TC-U-125: An already-loaded catalog is left alone; no file → nothing published."""
+        assert menu_services.warm_start_from_disk() is False
+        catalog_snapshot.publish_snapshot(CatalogSnapshot({"villas_data": VILLAS}))
+        catalog_store.save_catalog(CatalogSnapshot({}), {}, {})
+        assert menu_services.warm_start_from_disk() is False
+
+    def test_status_reports_staleness(self, empty_catalog):
+        """TC-U-126: Catalog is stale when empty or older than the threshold."""
+        assert menu_services.get_catalog_status()["stale"] is True
+        catalog_snapshot.publish_snapshot(CatalogSnapshot({"villas_data": VILLAS}))
+        menu_services.cache["last_updated"] = datetime.now()
+        status = menu_services.get_catalog_status()
+        assert status["loaded"] is True and status["stale"] is False
+        menu_services.cache["last_updated"] = datetime.now() - timedelta(
+            seconds=menu_services.CATALOG_STALE_AFTER_SECONDS + 1
+        )
+        assert menu_services.get_catalog_status()["stale"] is True
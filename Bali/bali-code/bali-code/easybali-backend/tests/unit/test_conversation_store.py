@@ -0,0 +1,100 @@
+"""
+UNIT TESTS: Conversation Store
+
+Verifies chat history is bounded in memory and in Mongo, written behind in
+one bulk_write, and reloaded from the shared tier after a restart.
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.utils import chat_memory as cm
+from tests.unit.fake_mongo import FakeCollection
+
+
+def make_store(docs=None):
+    store = cm.ConversationStore()
+    store.collection = FakeCollection(docs)
+    return store
+
+
+class TestConversationStore:
+    """TC-U-230 through TC-U-235: write-behind, capping, reload and LRU bounds."""
+
+    @pytest.mark.asyncio
+    async def test_writes_are_batched(self):
+        """TC-U-230: Many save_message calls become one bulk_write on flush."""
+        store = make_store()
+        store.collection.bulk_write = AsyncMock()
+        for n in range(4):
+            store.save_message(f"u{n}", "user", "hi")
+            store.save_message(f"u{n}", "assistant", "hello")
+        store.collection.bulk_write.assert_not_called()
+        await store.flush()
+        store.collection.bulk_write.assert_awaited_once()
+        assert len(store.collection.bulk_write.call_args.args[0]) == 4
+
+    @pytest.mark.asyncio
+    async def test_persisted_history_is_capped(self):
+        """TC-U-231: The Mongo array keeps only the last MAX_HISTORY_LENGTH messages."""
+        store = make_store()
+        for n in range(cm.MAX_HISTORY_LENGTH + 5):
+            store.save_message("u1", "user", f"m{n}")
+            if n % 4 == 0:
+                await store.flush()
+        await store.flush()
+        doc = await store.collection.find_one({"_id": "u1"})
+        assert len(doc["chat_history"]) == cm.MAX_HISTORY_LENGTH
+        assert doc["chat_history"][-1]["content"] == f"m{cm.MAX_HISTORY_LENGTH + 4}"
+        assert "updated_at" in doc
+
+    @pytest.mark.asyncio
+    async def test_reload_after_restart_merges_pending(self):
+        """TC-U-232: A cold store reads Mongo and appends messages not yet flushed."""
+        store = make_store([{"_id": "u1", "chat_history": [{"role": "user", "content": "old"}]}])
+        store.save_message("u1", "assistant", "new")
+        history = await store.get_history("u1")
+        assert [m["content"] for m in history] == ["old", "new"]
+
+    @pytest.mark.asyncio
+    async def test_cached_history_skips_mongo(self):
+        """TC-U-233: Once loaded, reads and appends are served from the in-process tier."""
+        store = make_store()
+        await store.get_history("u1")
+        store.collection.find_one = AsyncMock()
+        store.save_message("u1", "user", "hi")
+        assert await store.get_history("u1") == [{"role": "user", "content": "hi"}]
+        store.collection.find_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_lru_is_bounded(self):
+        """TC-U-234: The in-process tier evicts least recently used users."""
+        store = make_store()
+        with patch.object(cm, "MAX_CACHED_USERS", 2):
+            for user in ("a", "b", "c"):
+                await store.get_history(user)
+        assert list(store._cache) == ["b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_load_during_flush_sees_in_flight_messages(self):
+        """TC-U-235: A cold read racing a flush neither loses nor duplicates the batch being written."""
+        store = make_store([{"_id": "u1", "chat_history": [{"role": "user", "content": "old"}]}])
+        store.save_message("u1", "assistant", "new")
+        release = asyncio.Event()
+        real_bulk_write = store.collection.bulk_write
+
+        async def slow_bulk_write(ops, ordered=True):
+            await release.wait()
+            await real_bulk_write(ops, ordered)
+
+        store.collection.bulk_write = slow_bulk_write
+        flush = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)
+        load = asyncio.create_task(store.get_history("u1"))
+        await asyncio.sleep(0.01)
+        assert not load.done()
+        release.set()
+        await flush
+        assert [m["content"] for m in await load] == ["old", "new"]
@@ -0,0 +1,58 @@
+"""
+UNIT TESTS: Dashboard Customer List Rollup
+
+Verifies the customer list is served by a single aggregation (no per-customer
+queries) and that joined counts, latest rating and the passport-name fallback
+are shaped into the same rows the dashboard expects.
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock, AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.routes import dashboard_routes as dr
+
+
+class TestCustomerRollup:
+    """TC-U-170 through TC-U-172: one round-trip, row shaping and fallbacks."""
+
+    @pytest.mark.asyncio
+    async def test_single_aggregation_per_page(self):
+        """TC-U-170: A page of customers costs one aggregate call regardless of size."""
+        rows = [{"customer_id": f"EB-C-{n:05d}", "phone": f"62811{n:04d}"} for n in range(50)]
+        cursor = MagicMock(to_list=AsyncMock(return_value=rows))
+        customers = MagicMock(aggregate=MagicMock(return_value=cursor))
+        orders = MagicMock(count_documents=AsyncMock())
+        with patch.object(dr, "customer_collection", customers), patch.object(dr, "order_collection", orders):
+            result = await dr.get_customers(user={"villa_codes": ["V1"]}, search=None, villa_code=None, limit=50)
+        assert result["total"] == 50
+        customers.aggregate.assert_called_once()
+        orders.count_documents.assert_not_called()
+        pipeline = customers.aggregate.call_args.args[0]
+        assert pipeline[0] == {"$match": {"villa_code": {"$in": ["V1"]}}}
+        assert pipeline[2] == {"$limit": 50}
+
+    def test_row_uses_joined_counts(self):
+        """TC-U-171: Order/issue counts and the latest rating come from the $lookup arrays."""
+        row = dr._customer_row({
+            "customer_id": "EB-C-00001", "phone": "628111234", "name": "Ayu", "villa_code": "V1",
+            "order_counts": [{"total": 4, "paid": 3}],
+            "issue_counts": [{"total": 1}],
+            "latest_feedback": [{"rating": 5}],
+            "last_active": datetime(2025, 1, 2, 3, 4, 5),
+        })
+        assert (row["total_bookings"], row["paid_bookings"], row["open_issues"]) == (4, 3, 1)
+        assert row["last_rating"] == 5
+        assert row["last_active"] == "2025-01-02T03:04:05"
+
+    def test_row_defaults_and_passport_name(self):
+        """TC-U-172: Empty joins give zero counts; a missing name falls back to passport then phone."""
+        row = dr._customer_row({
+            "customer_id": "EB-C-00002", "phone": "628119876",
+            "order_counts": [], "issue_counts": [], "latest_feedback": [],
+            "latest_passport": [{"guest_name": "John Smith"}],
+        })
+        assert (row["total_bookings"], row["paid_bookings"], row["open_issues"], row["last_rating"]) == (0, 0, 0, None)
+        assert row["name"] == "John Smith"
+        assert dr._customer_row({"phone": "628119876"})["name"] == "Guest ...9876"
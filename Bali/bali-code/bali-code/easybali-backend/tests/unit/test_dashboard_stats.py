@@ -0,0 +1,117 @@
+"""
+UNIT TESTS: Materialized Dashboard Stats
+
+Verifies the per-villa rollup: rows are combined for multi-villa users, reads
+are served from a short TTL cache, touched villas are recomputed in the
+background, and villas that lost all their documents drop back to zero.
+"""
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import dashboard_stats as ds
+from app.services.dashboard_stats import DashboardStats
+
+
+def _row(villa, **counters):
+    row = DashboardStats._empty_row(villa)
+    row.update(counters)
+    return row
+
+
+def _stats(docs=()):
+    stats = DashboardStats()
+    cursor = MagicMock(to_list=AsyncMock(return_value=list(docs)))
+    stats.collection = MagicMock(find=MagicMock(return_value=cursor), bulk_write=AsyncMock(), delete_many=AsyncMock())
+    return stats
+
+
+class TestDashboardStats:
+    """TC-U-180 through TC-U-186: combine, cache, recompute, touch and periodic reconcile."""
+
+    def test_combine_sums_villas_and_merges_recent(self):
+        """TC-U-180: Counters add up and the newest recent items across villas win."""
+        a = _row("V1", bookings=3, revenue=100, open_issues=1,
+                 recent_orders=[{"id": "a", "time": datetime(2025, 1, 1)}])
+        b = _row("V2", bookings=2, revenue=50, pending_inquiries=4,
+                 recent_orders=[{"id": "b", "time": datetime(2025, 1, 3)}, {"id": "c", "time": None}])
+        combined = DashboardStats.combine([a, b])
+        assert (combined["bookings"], combined["revenue"], combined["open_issues"], combined["pending_inquiries"]) == (5, 150, 1, 4)
+        assert [o["id"] for o in combined["recent_orders"]] == ["b", "a", "c"]
+
+    @pytest.mark.asyncio
+    async def test_reads_are_cached_per_villa_set(self):
+        """TC-U-181: Repeated loads within the TTL are one rollup read; order of villas doesn't matter."""
+        stats = _stats([_row("V1", bookings=3)])
+        stats._reconciled = True
+        first = await stats.get(["V1", "V2"])
+        again = await stats.get(["V2", "V1"])
+        assert first is again and first["bookings"] == 3
+        stats.collection.find.assert_called_once_with({"_id": {"$in": ["V1", "V2"]}})
+
+    @pytest.mark.asyncio
+    async def test_recompute_zeroes_emptied_villa_and_clears_cache(self):
+        """TC-U-182: A touched villa with no remaining documents is written back as zeros."""
+        stats = _stats()
+        stats._cache[("V1",)] = (0, {})
+        with patch.object(stats, "_aggregate", new=AsyncMock(return_value={"V1": _row("V1", bookings=1)})):
+            await stats.recompute({"V1", "V2"})
+        ops = stats.collection.bulk_write.call_args.args[0]
+        written = {op._filter["_id"]: op._doc for op in ops}
+        assert written["V1"]["bookings"] == 1
+        assert written["V2"]["bookings"] == 0
+        stats.collection.delete_many.assert_not_called()
+        assert stats._cache == {}
+
+    @pytest.mark.asyncio
+    async def test_full_recompute_drops_unknown_villas(self):
+        """TC-U-183: A full reconcile removes rollup rows for villas that no longer exist."""
+        stats = _stats()
+        with patch.object(stats, "_aggregate", new=AsyncMock(return_value={"V1": _row("V1")})):
+            await stats.recompute()
+        stats.collection.delete_many.assert_awaited_once_with({"_id": {"$nin": ["V1"]}})
+        assert stats._reconciled
+
+    @pytest.mark.asyncio
+    async def test_touch_recomputes_touched_villas_in_background(self, monkeypatch):
+        """TC-U-184: Writes only mark villas dirty; the background task recomputes them together."""
+        monkeypatch.setattr(ds, "RECOMPUTE_DEBOUNCE_SECONDS", 0)
+        stats = _stats()
+        recompute = AsyncMock()
+        with patch.object(stats, "recompute", new=recompute):
+            stats.touch("V1")
+            stats.touch("V2")
+            for _ in range(50):
+                if recompute.await_count:
+                    break
+                await asyncio.sleep(0.01)
+            stats._task.cancel()
+        recompute.assert_awaited_once_with({"V1", "V2"})
+
+    def test_combine_counts_multi_villa_guests_once(self):
+        """TC-U-185: A guest with orders in two villas is one active guest across both."""
+        a = _row("V1", active_guests=2, guest_ids=["6281", "6282"])
+        b = _row("V2", active_guests=2, guest_ids=["6282", "6283"])
+        assert DashboardStats.combine([a, b])["active_guests"] == 3
+        legacy = _row("V3", active_guests=4)
+        del legacy["guest_ids"]
+        assert DashboardStats.combine([a, legacy])["active_guests"] == 6
+
+    @pytest.mark.asyncio
+    async def test_reconcile_runs_under_steady_writes(self, monkeypatch):
+        """TC-U-186: Touches arriving faster than the reconcile interval don't starve the full recompute."""
+        monkeypatch.setattr(ds, "RECOMPUTE_DEBOUNCE_SECONDS", 0)
+        monkeypatch.setattr(ds, "RECONCILE_INTERVAL_SECONDS", 0.05)
+        stats = _stats()
+        recompute = AsyncMock()
+        with patch.object(stats, "recompute", new=recompute):
+            for _ in range(30):
+                stats.touch("V1")
+                await asyncio.sleep(0.01)
+            stats._task.cancel()
+        full = [c for c in recompute.await_args_list if c.args == (None,)]
+        assert 2 <= len(full) <= 10
+        assert any(c.args == ({"V1"},) for c in recompute.await_args_list)
@@ -0,0 +1,99 @@
+"""
+UNIT TESTS: Embedding Service
+
+Verifies identical text is only embedded once (per worker and across workers
+via the shared Mongo tier), that misses are batched into few API calls, and
+that the NumPy top-k similarity matches a brute-force ranking, and that shared
+vectors carry a sliding expiry so one-off queries don't accumulate.
+"""
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import embedding_service as es
+from tests.unit.fake_mongo import FakeCollection
+
+
+def fake_create():
+    """embeddings.create returning a distinct 3-d vector per input text."""
+    async def create(input, model):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t)), float(sum(map(ord, t)) % 97), 1.0])
+                                     for t in input])
+    return AsyncMock(side_effect=create)
+
+
+def make_service(collection=None):
+    service = es.EmbeddingService()
+    service.collection = collection if collection is not None else FakeCollection()
+    return service
+
+
+class TestEmbeddingService:
+    """TC-U-310 through TC-U-314: content-hash caching, shared tier, batching, top-k and expiry."""
+
+    @pytest.mark.asyncio
+    async def test_identical_text_embedded_once(self):
+        """TC-U-310: Repeated text is served from the local tier; vectors keep input order."""
+        service = make_service()
+        create = fake_create()
+        with patch.object(es.client.embeddings, "create", create):
+            first = await service.embed("what time is breakfast")
+            again = await service.embed("what time is breakfast")
+            pair = await service.embed_many(["pool hours", "what time is breakfast"])
+        assert np.array_equal(first, again) and np.array_equal(pair[1], first)
+        assert create.await_count == 2
+        assert (service.local_hits, service.embedded) == (2, 2)
+
+    @pytest.mark.asyncio
+    async def test_shared_tier_used_by_other_workers(self):
+        """TC-U-311: A second worker loads stored vectors from Mongo instead of calling the API."""
+        shared = FakeCollection()
+        create = fake_create()
+        with patch.object(es.client.embeddings, "create", create):
+            stored = await make_service(shared).embed_many(["a", "bb"])
+            other = make_service(shared)
+            loaded = await other.embed_many(["a", "bb"])
+        create.assert_awaited_once()
+        assert all(np.array_equal(x, y) for x, y in zip(stored, loaded))
+        assert other.metrics()["shared_hits"] == 2 and other.api_calls == 0
+
+    @pytest.mark.asyncio
+    async def test_misses_are_batched_and_deduplicated(self):
+        """TC-U-312: 250 rows (with duplicates) cost ceil(unique / BATCH_SIZE) API calls."""
+        service = make_service()
+        create = fake_create()
+        texts = [f"row {n}" for n in range(200)] + [f"row {n}" for n in range(50)]
+        with patch.object(es, "BATCH_SIZE", 100), patch.object(es.client.embeddings, "create", create):
+            vectors = await service.embed_many(texts)
+        assert len(vectors) == 250 and create.await_count == 2
+        assert max(len(c.kwargs["input"]) for c in create.call_args_list) == 100
+        assert np.array_equal(vectors[0], vectors[200])
+
+    def test_cosine_top_k_matches_brute_force(self):
+        """TC-U-313: Vectorized top-k agrees with a per-row cosine loop, best first."""
+        rng = np.random.default_rng(7)
+        matrix = rng.normal(size=(200, 16)).astype(np.float32)
+        query = rng.normal(size=16).astype(np.float32)
+        top, scores = es.cosine_top_k(query, matrix, k=5)
+        brute = [float(row @ query / (np.linalg.norm(row) * np.linalg.norm(query))) for row in matrix]
+        assert list(top) == sorted(range(200), key=lambda i: -brute[i])[:5]
+        assert np.allclose(scores, [brute[i] for i in top], atol=1e-5)
+        assert len(es.cosine_top_k(query, np.empty((0, 16), dtype=np.float32), k=3)[0]) == 0
+
+    @pytest.mark.asyncio
+    async def test_shared_vectors_expire_unless_reused(self):
+        """TC-U-314: Stored vectors get expires_at; a hit past half-life pushes it forward, a fresh one is left alone."""
+        shared = FakeCollection()
+        with patch.object(es.client.embeddings, "create", fake_create()):
+            await make_service(shared).embed_many(["hot query", "fresh query"])
+        hot, fresh = shared.docs
+        assert hot["expires_at"] - datetime.utcnow() > es.SHARED_TTL - timedelta(minutes=1)
+        hot["expires_at"] = datetime.utcnow() + timedelta(days=1)
+        fresh_expiry = fresh["expires_at"]
+        await make_service(shared).embed_many(["hot query", "fresh query"])
+        assert hot["expires_at"] - datetime.utcnow() > es.SHARED_TTL - timedelta(minutes=1)
+        assert fresh["expires_at"] == fresh_expiry
@@ -0,0 +1,138 @@
+"""
+UNIT TESTS: Local Intent Engine
+
+Verifies small talk and explicit service mentions are decided without an LLM
+call, that loose keywords and negated mentions are not, that embedding
+similarity accepts/rejects only clear cases, and that ambiguous queries
+escalate to the existing OpenAI matcher.
+"""
+import pytest
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import intent_engine as ie
+from app.services import embedding_service as es
+from app.services.catalog_snapshot import CatalogSnapshot
+from tests.unit.fake_mongo import FakeCollection
+
+CATEGORIES = {
+    "massage": {"category": "Health & Wellness", "subcategory": "Massage", "keywords": ["massage", "spa", "aromatherapy"]},
+    "scooter": {"category": "Transportation", "subcategory": "Scooter Rental", "keywords": ["scooter", "scoopy", "nmax"]},
+}
+
+SNAPSHOT = CatalogSnapshot({
+    "main_menu_design": pd.DataFrame([{"Menu Location": "Services", "Title": "Dining"}]),
+    "design_df": pd.DataFrame([{"Category": "Dining", "Sub-category": "Private Chef"}]),
+    "services_df": pd.DataFrame([
+        {"Service Item": "Balinese BBQ Night - 4 pax", "Sub-category": "Private Chef"},
+    ]),
+}, versions={"design_df": 1})
+
+
+def embeddings(vectors):
+    """Fake embeddings.create: the service batch -> service vectors, a single query -> next query vector."""
+    queue = list(vectors["queries"])
+
+    async def create(input, model):
+        rows = vectors["services"] if len(input) > 1 else [queue.pop(0)]
+        return SimpleNamespace(data=[SimpleNamespace(embedding=v) for v in rows])
+    return AsyncMock(side_effect=create)
+
+
+@pytest.fixture
+def engine():
+    embedder = es.EmbeddingService()
+    embedder.collection = FakeCollection()
+    with patch.object(ie, "get_snapshot", return_value=SNAPSHOT), patch.object(ie, "embedding_service", embedder):
+        yield ie.IntentEngine(CATEGORIES)
+
+
+class TestIntentEngine:
+    """TC-U-260 through TC-U-266: local tiers, escalation and metrics."""
+
+    @pytest.mark.asyncio
+    async def test_small_talk_is_local(self, engine):
+        """TC-U-260: Greetings and thanks never reach the embedding or LLM tiers."""
+        create = AsyncMock()
+        with patch.object(es.client.embeddings, "create", create):
+            for text in ("Hi!", "thank you", "OK thanks"):
+                result = await engine.classify(text)
+                assert result["is_service_request"] is False and result["source"] == "small_talk"
+        create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_keyword_trie_matches_catalog_names(self, engine):
+        """TC-U-261: Sub-category names and item names resolve to the offered service."""
+        assert (await engine.classify("need a scooter rental for 2 days"))["matched_service"] == "Scooter Rental"
+        assert (await engine.classify("book a private chef tonight"))["matched_service"] == "Private Chef"
+        result = await engine.classify("we'd love the balinese bbq night")
+        assert result["matched_service"] == "Private Chef" and result["we_offer_it"] is True
+
+    def test_offered_services_follow_catalog_version(self, engine):
+        """TC-U-262: Catalog sub-categories come first, then the core list; rebuilt per snapshot version."""
+        assert [s["name"] for s in engine.offered_services()] == ["Private Chef", "Massage", "Scooter Rental"]
+        with patch.object(ie, "get_snapshot", return_value=CatalogSnapshot({})):
+            assert [s["name"] for s in engine.offered_services()] == ["Massage", "Scooter Rental"]
+
+    @pytest.mark.asyncio
+    async def test_embedding_tier_accepts_and_rejects_clear_cases(self, engine):
+        """TC-U-263: Near service vectors match, far ones are rejected, the middle escalates."""
+        services = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+        queries = [[0.99, 0.05, 0], [0.1, 0.1, -1], [0.8, 0.6, 0]]
+        with patch.object(es.client.embeddings, "create", embeddings({"services": services, "queries": queries})):
+            match = await engine.classify("someone to cook for us")
+            reject = await engine.classify("what is the weather like")
+            middle = await engine.classify("something relaxing for dinner")
+        assert match["matched_service"] == "Private Chef" and match["source"] == "embedding"
+        assert reject["is_service_request"] is False
+        assert middle is None
+
+    @pytest.mark.asyncio
+    async def test_ambiguous_query_escalates_to_llm(self):
+        """TC-U-264: intelligent_service_check only calls the chat completion for escalated queries."""
+        from app.services import ai_menu_generator as amg
+        completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+            content='{"is_service_request": true, "we_offer_it": true, "matched_service": "Massage"}'))])
+        create = AsyncMock(return_value=completion)
+        gen = amg.AIMenuGenerator()
+        with patch.object(ie, "get_snapshot", return_value=SNAPSHOT), \
+                patch.object(amg.client.chat.completions, "create", create), \
+                patch.object(gen.intent_engine, "classify", AsyncMock(side_effect=[None, {"source": "keyword"}])):
+            escalated = await gen.intelligent_service_check("something to loosen my back")
+            local = await gen.intelligent_service_check("massage please")
+        assert escalated["source"] == "llm" and escalated["matched_service"] == "Massage"
+        assert local == {"source": "keyword"}
+        create.assert_awaited_once()
+        assert "- Private Chef (Dining)" in create.call_args.kwargs["messages"][1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_metrics_report_escalation_rate(self, engine):
+        """TC-U-265: Metrics count each tier and the share of escalated queries."""
+        with patch.object(ie, "EMBEDDINGS_ENABLED", False):
+            await engine.classify("hello")
+            await engine.classify("massage at 5pm")
+            await engine.classify("is the pool heated")
+        metrics = engine.metrics()
+        assert (metrics["small_talk"], metrics["keyword"], metrics["escalated"]) == (1, 1, 1)
+        assert metrics["escalation_rate"] == pytest.approx(0.333)
+
+    @pytest.mark.asyncio
+    async def test_loose_keywords_and_negations_are_not_bookings(self):
+        """TC-U-266: With the real categories, generic words and "don't need X" escalate instead of booking."""
+        from app.services.ai_menu_generator import AIMenuGenerator
+        engine = ie.IntentEngine(AIMenuGenerator().service_categories)
+        with patch.object(ie, "get_snapshot", return_value=CatalogSnapshot({})), patch.object(ie, "EMBEDDINGS_ENABLED", False):
+            for text in (
+                "best balinese dinner spots in canggu",
+                "what time is my flight",
+                "is there a car park near the villa",
+                "can you recommend a birthday restaurant",
+                "I do not need a massage thanks",
+                "don't book a driver",
+            ):
+                assert await engine.classify(text) is None, text
+            assert (await engine.classify("book a massage at 5pm"))["matched_service"] == "Massage"
+            assert (await engine.classify("book a tour with driver to ubud"))["matched_service"] == "Tour with Driver"
@@ -207,7 +207,7 @@ class TestSheetLookup:
         with patch.object(ll, "_get_words", return_value=[SAMPLE_WORD]):
             with patch.object(ll.client.chat.completions, "create", new=AsyncMock(return_value=mock_completion)):
                 with patch("app.utils.language_lesson_whatsapp_fucntions.save_message"):
-                    with patch("app.utils.language_lesson_whatsapp_fucntions.get_conversation_history", return_value=[]):
+                    with patch("app.utils.language_lesson_whatsapp_fucntions.get_conversation_history", new=AsyncMock(return_value=[])):
                         with patch("app.utils.language_lesson_whatsapp_fucntions.trim_history", side_effect=lambda x: x):
                             result = await ll.language_lesson_response("how do you say goodbye?", "user_test")
         assert result == "AI response here"
@@ -221,7 +221,7 @@ class TestSheetLookup:
         with patch.object(ll, "_get_words", return_value=[]):
             with patch.object(ll.client.chat.completions, "create", new=AsyncMock(return_value=mock_completion)):
                 with patch("app.utils.language_lesson_whatsapp_fucntions.save_message"):
-                    with patch("app.utils.language_lesson_whatsapp_fucntions.get_conversation_history", return_value=[]):
+                    with patch("app.utils.language_lesson_whatsapp_fucntions.get_conversation_history", new=AsyncMock(return_value=[])):
                         with patch("app.utils.language_lesson_whatsapp_fucntions.trim_history", side_effect=lambda x: x):
                             result = await ll.language_lesson_response("selamat pagi", "user_test")
         assert result == "AI fallback"
@@ -235,7 +235,7 @@ class TestSheetLookup:
         with patch.object(ll, "_get_words", return_value=[NAN_WORD]):
             with patch.object(ll.client.chat.completions, "create", new=AsyncMock(return_value=mock_completion)):
                 with patch("app.utils.language_lesson_whatsapp_fucntions.save_message"):
-                    with patch("app.utils.language_lesson_whatsapp_fucntions.get_conversation_history", return_value=[]):
+                    with patch("app.utils.language_lesson_whatsapp_fucntions.get_conversation_history", new=AsyncMock(return_value=[])):
                         with patch("app.utils.language_lesson_whatsapp_fucntions.trim_history", side_effect=lambda x: x):
                             result = await ll.language_lesson_response("nan", "user_test")
         # nan should NOT trigger a sheet match — should go to AI
@@ -416,11 +416,7 @@ class TestStartingMessageEmptyCache:
             return resp
 
         with patch.object(ll, "_get_words", return_value=[SAMPLE_WORD, MINIMAL_WORD]):
-            import httpx
-            with patch.object(httpx.AsyncClient, "__aenter__") as mock_ctx:
-                mock_http = AsyncMock()
-                mock_http.post = AsyncMock(side_effect=capture_post)
-                mock_ctx.return_value = mock_http
+            with patch.object(ll.whatsapp_transport, "post", new=AsyncMock(side_effect=capture_post)):
                 await ll.language_starting_message("62999")
 
         assert len(sent_payloads) == 1
@@ -0,0 +1,129 @@
+"""
+UNIT TESTS: Local Vector Index
+
+Verifies the in-process index answers queries like a Pinecone handle (top-k
+cosine with villa_code filters) from a memory-mapped file, that RAGService
+uses it without touching Pinecone, and that it is mirrored from Pinecone and
+kept current by write-through updates.
+"""
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys, os, threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import local_vector_index as lvi
+from app.services import rag_service as rs
+
+RNG = np.random.default_rng(3)
+VECTORS = [
+    {"id": f"faq-{i}", "values": RNG.normal(size=8).tolist(),
+     "metadata": {"text": f"FAQ {i}", "villa_code": ("V1", "V2", "WEB_VILLA_01")[i % 3]}}
+    for i in range(30)
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with patch.object(lvi, "LOCAL_INDEX_MODE", "true"):
+        yield lvi.LocalVectorStore(str(tmp_path))
+
+
+class FakeRemote:
+    def __init__(self, vectors):
+        self.vectors = {v["id"]: v for v in vectors}
+
+    def list(self):
+        ids = list(self.vectors)
+        for start in range(0, len(ids), 10):
+            yield ids[start:start + 10]
+
+    def fetch(self, ids):
+        return SimpleNamespace(vectors={i: SimpleNamespace(values=self.vectors[i]["values"], metadata=self.vectors[i]["metadata"])
+                                        for i in ids})
+
+
+class TestLocalVectorIndex:
+    """TC-U-330 through TC-U-336: query semantics, persistence, RAG routing, mirroring and write-through."""
+
+    def test_query_matches_brute_force_with_filters(self, store):
+        """TC-U-330: Top-k cosine (best first) over the rows the villa_code filter allows."""
+        store.save(lvi.LocalVectorIndex.build("villa-faqs", VECTORS))
+        index = store.get("villa-faqs")
+        assert isinstance(index.matrix, np.memmap)
+        query = RNG.normal(size=8)
+        allowed = [v for v in VECTORS if v["metadata"]["villa_code"] in ("V1", "WEB_VILLA_01")]
+        cos = lambda v: float(np.dot(v["values"], query) / (np.linalg.norm(v["values"]) * np.linalg.norm(query)))
+        expected = sorted(allowed, key=cos, reverse=True)[:3]
+        res = index.query(vector=query.tolist(), top_k=3, include_metadata=True,
+                          filter={"villa_code": {"$in": ["V1", "WEB_VILLA_01"]}})
+        assert [m["id"] for m in res["matches"]] == [v["id"] for v in expected]
+        assert res["matches"][0]["score"] == pytest.approx(cos(expected[0]), abs=1e-5)
+        assert all(m["metadata"]["villa_code"] == "V2" for m in index.query(query, 5, filter={"villa_code": "V2"})["matches"])
+
+    def test_disabled_or_missing_falls_back_to_pinecone(self, store):
+        """TC-U-331: No local copy (or the feature off) means get() returns None."""
+        assert store.get("local-cuisine") is None
+        store.save(lvi.LocalVectorIndex.build("local-cuisine", VECTORS))
+        with patch.object(lvi, "LOCAL_INDEX_MODE", "false"):
+            assert store.get("local-cuisine") is None
+        assert len(store.get("local-cuisine")) == 30
+
+    @pytest.mark.asyncio
+    async def test_rag_service_queries_locally_without_network(self, store):
+        """TC-U-332: RAGService serves a mirrored index locally and never asks for a Pinecone handle."""
+        store.save(lvi.LocalVectorIndex.build("villa-faqs", VECTORS))
+        get_index = MagicMock()
+        with patch.object(rs, "local_vector_store", store), patch.object(rs, "get_index", get_index), \
+                patch.object(rs.embedding_service, "embed", AsyncMock(return_value=np.array(VECTORS[0]["values"], dtype=np.float32))):
+            context = await rs.RAGService().get_rag_context("breakfast time?", "general", "V1")
+        get_index.assert_not_called()
+        assert context.startswith("[Villa Faqs]: FAQ 0")
+
+    def test_sync_mirrors_remote_and_skips_large_indexes(self, store):
+        """TC-U-333: sync_from copies every vector; over MAX_LOCAL_VECTORS it leaves the index on Pinecone."""
+        assert store.sync_from("event-calender", FakeRemote(VECTORS)) == 30
+        assert sorted(store.get("event-calender").ids) == sorted(v["id"] for v in VECTORS)
+        with patch.object(lvi, "MAX_LOCAL_VECTORS", 10):
+            assert store.sync_from("event-calender", FakeRemote(VECTORS)) is None
+        assert store.get("event-calender") is None
+
+    def test_write_through_updates_and_reloads(self, store):
+        """TC-U-334: Upserts replace by id, deletes drop rows, and readers pick up the new file."""
+        store.save(lvi.LocalVectorIndex.build("villa-faqs", VECTORS[:5]))
+        assert len(store.get("villa-faqs")) == 5
+        new = {"id": "faq-1", "values": [1.0] + [0.0] * 7, "metadata": {"text": "edited", "villa_code": "V1"}}
+        assert store.apply_writes("villa-faqs", [new], ["faq-2"])
+        index = store.get("villa-faqs")
+        assert sorted(index.ids) == ["faq-0", "faq-1", "faq-3", "faq-4"]
+        assert index.query([1.0] + [0.0] * 7, 1)["matches"][0]["metadata"]["text"] == "edited"
+        assert store.apply_writes("missing-index", [new]) is False
+
+    def test_concurrent_writers_do_not_lose_updates(self, store, tmp_path):
+        """TC-U-335: Writers in separate stores (as in separate workers) each keep their upsert."""
+        store.save(lvi.LocalVectorIndex.build("villa-faqs", VECTORS[:5]))
+        stores = [store, lvi.LocalVectorStore(str(tmp_path))]
+        real_load = lvi.LocalVectorIndex.load
+
+        def slow_load(path):
+            index = real_load(path)
+            threading.Event().wait(0.02)  # widen the load→save window
+            return index
+
+        writers = [threading.Thread(target=stores[i % 2].apply_writes, args=("villa-faqs", [VECTORS[5 + i]]))
+                   for i in range(6)]
+        with patch.object(lvi.LocalVectorIndex, "load", staticmethod(slow_load)):
+            for t in writers:
+                t.start()
+            for t in writers:
+                t.join()
+        assert sorted(store.get("villa-faqs").ids) == sorted(v["id"] for v in VECTORS[:11])
+
+    @pytest.mark.asyncio
+    async def test_first_mirror_applies_writes_missing_from_listing(self, store):
+        """TC-U-336: When Pinecone's listing lags, the run's own upserts still land in the first local copy."""
+        from app.services import rag_ingestion as ri
+        with patch.object(ri, "local_vector_store", store):
+            await ri.RagIngestionEngine()._refresh_local_copy(FakeRemote(VECTORS[:10]), "villa-faqs", VECTORS[10:12], ["faq-0"])
+        assert sorted(store.get("villa-faqs").ids) == sorted(v["id"] for v in VECTORS[1:12])
@@ -0,0 +1,94 @@
+"""
+UNIT TESTS: Pinecone Gateway
+
+Verifies the Pinecone client is built once, index handles are cached with
+their host resolved, and the control plane is only used by the startup
+warm-up (or once for an index warm-up did not cover), never lazily on a query.
+"""
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import pinconeservice as ps
+
+
+class FakePinecone:
+    instances = 0
+
+    def __init__(self, api_key=None, pool_threads=1):
+        FakePinecone.instances += 1
+        self.existing = {"villa-faqs": "villa-faqs-abc.svc.pinecone.io", "local-cuisine": "cuisine-abc.svc.pinecone.io",
+                         "archive": "archive-abc.svc.pinecone.io"}
+        self.list_indexes = MagicMock(side_effect=lambda: [SimpleNamespace(name=n, host=h) for n, h in self.existing.items()])
+        self.describe_index = MagicMock(side_effect=self._describe)
+        self.create_index = MagicMock(side_effect=lambda name, **kw: self.existing.__setitem__(name, f"{name}-new.svc.pinecone.io"))
+        self.Index = MagicMock(side_effect=lambda name, host: SimpleNamespace(name=name, host=host))
+
+    def _describe(self, name):
+        if name not in self.existing:
+            raise Exception(f"index {name} not found")
+        return SimpleNamespace(host=self.existing[name])
+
+
+@pytest.fixture
+def gateway():
+    FakePinecone.instances = 0
+    with patch.object(ps, "Pinecone", FakePinecone), patch.object(ps, "ServerlessSpec", MagicMock()):
+        yield ps.VectorStoreGateway()
+
+
+class TestPineconeGateway:
+    """TC-U-290 through TC-U-294: one client, cached handles, one-time control plane."""
+
+    def test_startup_creates_missing_and_caches_hosts(self, gateway):
+        """TC-U-290: ensure_indexes lists once, creates only missing indexes and builds host-resolved handles."""
+        gateway.ensure_indexes(["villa-faqs", "local-cuisine", "event-calender"])
+        pc = gateway._pc
+        pc.list_indexes.assert_called_once()
+        assert [c.kwargs["name"] for c in pc.create_index.call_args_list] == ["event-calender"]
+        handle = gateway.get_index("villa-faqs")
+        assert handle.host == "villa-faqs-abc.svc.pinecone.io"
+
+    def test_queries_reuse_handles_without_control_plane(self, gateway):
+        """TC-U-291: Repeated get_index calls never build a new client or hit list/describe."""
+        gateway.ensure_indexes(["villa-faqs", "local-cuisine"])
+        calls = gateway.counts["control_plane_calls"]
+        handles = {id(gateway.get_index("villa-faqs")) for _ in range(50)}
+        assert len(handles) == 1
+        assert FakePinecone.instances == 1
+        assert gateway.counts["control_plane_calls"] == calls
+        assert gateway.counts["handle_hits"] == 50
+
+    def test_startup_warm_up_runs_once_and_queries_never_list(self, gateway):
+        """TC-U-292: warm_up verifies every RAG index once; a lookup before it describes one index, never lists or creates."""
+        assert gateway.get_index("local-cuisine").host == "cuisine-abc.svc.pinecone.io"
+        gateway._pc.list_indexes.assert_not_called()
+        gateway._pc.create_index.assert_not_called()
+        gateway.warm_up()
+        gateway.warm_up()
+        for name in ps.RAG_INDEXES:
+            assert gateway.get_index(name) is not None
+        gateway._pc.list_indexes.assert_called_once()
+        assert gateway.counts["handle_hits"] == len(ps.RAG_INDEXES)
+        broken = ps.VectorStoreGateway()
+        broken._pc = MagicMock(list_indexes=MagicMock(side_effect=RuntimeError("503")))
+        broken.warm_up()  # logged, not raised: startup carries on
+        broken._pc.list_indexes.assert_called_once()
+
+    def test_uncovered_index_resolved_once_and_never_created(self, gateway):
+        """TC-U-293: A non-RAG index is described once; a missing one is not created."""
+        assert gateway.get_index("archive").host == "archive-abc.svc.pinecone.io"
+        gateway.get_index("archive")
+        assert gateway._pc.describe_index.call_count == 1
+        assert gateway.get_index("no-such-index") is None
+        assert gateway.get_index("no-such-index") is None  # backed off, no second lookup
+        assert gateway._pc.describe_index.call_count == 2
+        gateway._pc.create_index.assert_not_called()
+
+    def test_missing_api_key_returns_none(self, gateway):
+        """TC-U-294: Without credentials callers get None rather than an exception."""
+        with patch.object(ps.settings, "pinecone_api_key", ""):
+            assert gateway.get_index("villa-faqs") is None
+        assert FakePinecone.instances == 0
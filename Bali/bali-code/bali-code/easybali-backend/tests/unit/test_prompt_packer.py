@@ -0,0 +1,86 @@
+"""
+UNIT TESTS: Prompt Packer
+
+Verifies history, RAG snippets and sheet context are packed into the token
+budget by priority, and that dropped turns feed the rolling summary once.
+"""
+import pytest
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import prompt_packer as pp
+from app.utils import chat_memory as cm
+from tests.unit.fake_mongo import FakeCollection
+
+
+def msg(role, n, size=40):
+    return {"role": role, "content": f"{role}{n} " + "x" * size}
+
+
+HISTORY = [msg("user" if n % 2 == 0 else "assistant", n) for n in range(10)]
+
+
+class TestPromptPacker:
+    """TC-U-240 through TC-U-244: budget, priority order, clipping and the rolling summary."""
+
+    def test_everything_fits_in_large_budget(self):
+        """TC-U-240: With room to spare nothing is dropped and order is preserved."""
+        packed = pp.PromptPacker().pack(HISTORY, rag="a\n\nb", sheet="--- S ---\nl1\nl2", budget=10_000)
+        assert packed.history == HISTORY
+        assert packed.rag_snippets == ["a", "b"]
+        assert packed.sheet == "--- S ---\nl1\nl2"
+        assert packed.dropped_history == []
+
+    def test_stays_within_budget_and_keeps_recent_turns(self):
+        """TC-U-241: A tight budget keeps the newest turns and drops the oldest."""
+        packer = pp.PromptPacker()
+        rag = "\n\n".join(f"snippet {n} " + "y" * 200 for n in range(10))
+        sheet = "--- ACTIVE SERVICES ---\n" + "\n".join(f"- item {n}: " + "z" * 100 for n in range(50))
+        packed = packer.pack(HISTORY, rag=rag, sheet=sheet, budget=300)
+        used = (sum(packer.counter.count(m["content"]) + 2 for m in packed.history)
+                + sum(packer.counter.count(s) for s in packed.rag_snippets)
+                + sum(packer.counter.count(line) for line in packed.sheet_lines))
+        assert used == packed.tokens <= 300
+        assert packed.history == HISTORY[-len(packed.history):]
+        assert len(packed.history) >= pp.MIN_RECENT_MESSAGES
+        assert packed.dropped_history == HISTORY[:len(HISTORY) - len(packed.history)]
+
+    def test_rag_outranks_sheet_and_sheet_headers_follow_lines(self):
+        """TC-U-242: RAG snippets are packed before sheet lines; empty sections lose their header."""
+        packer = pp.PromptPacker()
+        rag = "r" * 400  # ~100 tokens
+        sheet = "--- A ---\n" + "s" * 400 + "\n--- B ---\nshort"
+        packed = packer.pack([], rag=rag, sheet=sheet, budget=110)
+        assert packed.rag_snippets == [rag]
+        assert packed.sheet_lines == ["--- B ---", "short"]
+
+    def test_long_messages_are_clipped(self):
+        """TC-U-243: A single huge message is clipped rather than evicting the conversation."""
+        packer = pp.PromptPacker()
+        huge = {"role": "user", "content": "w" * 20_000}
+        packed = packer.pack([huge], budget=1000)
+        assert len(packed.history) == 1
+        assert packer.counter.count(packed.history[0]["content"]) <= pp.MESSAGE_MAX_TOKENS + 1
+
+    @pytest.mark.asyncio
+    async def test_rolling_summary_covers_dropped_turns_once(self):
+        """TC-U-244: Dropped turns are summarised once and the summary is packed first."""
+        store = cm.ConversationStore()
+        store.collection = FakeCollection()
+        packer = pp.PromptPacker()
+        summarize = AsyncMock(return_value="Guest wants a sunset dinner on Friday.")
+        with patch.object(pp, "SUMMARY_ENABLED", True), patch.object(cm, "conversation_store", store), \
+                patch.object(packer, "_summarize", summarize):
+            first = await packer.pack_for_user("u1", HISTORY, budget=80)
+            assert len(first.dropped_history) >= pp.SUMMARY_BATCH_MESSAGES
+            await packer._summarizing["u1"]
+            summarize.assert_awaited_once()
+            summarize.reset_mock()
+
+            # The summary now takes room, pushing one more turn out: too few uncovered turns to re-summarise
+            packed = await packer.pack_for_user("u1", HISTORY, budget=80)
+        assert len(packed.dropped_history) < len(first.dropped_history) + pp.SUMMARY_BATCH_MESSAGES
+        assert "u1" not in packer._summarizing
+        assert packed.summary == "Guest wants a sunset dinner on Friday."
+        assert packed.history_text.startswith("Summary of earlier conversation:")
@@ -0,0 +1,167 @@
+"""
+UNIT TESTS: Incremental RAG Ingestion
+
+Verifies sheet rows are diffed against the checkpointed row ids so only new
+or edited rows are embedded and upserted, removed rows are deleted, batches
+run with bounded parallelism, interrupted runs resume, catalog refreshes
+trigger ingestion of the changed tabs, and vectors left by an earlier
+ingestion are adopted on the first run.
+"""
+import time
+import threading
+import pytest
+import numpy as np
+import pandas as pd
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import rag_ingestion as ri
+from app.services.catalog_snapshot import CatalogSnapshot
+from tests.unit.fake_mongo import FakeCollection
+
+COLUMNS = ["Villa Code", "Villa Name", "Question", "Answer"]
+
+
+def faqs(n, villa="V1"):
+    return [{"Villa Code": villa, "Villa Name": "Sunset", "Question": f"Q{i}?", "Answer": f"A{i}"} for i in range(n)]
+
+
+class FakeIndex:
+    def __init__(self, fail_on_call=None, delay=0.0):
+        self.vectors = {}
+        self.upsert_calls = 0
+        self.fail_on_call, self.delay = fail_on_call, delay
+        self.active = self.max_active = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._lock:
+            self.upsert_calls += 1
+            call = self.upsert_calls
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if call == self.fail_on_call:
+                raise RuntimeError("pinecone 503")
+            self.vectors.update({v["id"]: v for v in vectors})
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def delete(self, ids):
+        for rid in ids:
+            self.vectors.pop(rid, None)
+
+    def list(self):
+        yield list(self.vectors)
+
+    def fetch(self, ids):
+        return SimpleNamespace(vectors={
+            i: SimpleNamespace(values=self.vectors[i].get("values"), metadata=self.vectors[i].get("metadata"))
+            for i in ids if i in self.vectors
+        })
+
+
+def embed_many():
+    return AsyncMock(side_effect=lambda texts: [np.ones(3, dtype=np.float32) for _ in texts])
+
+
+@pytest.fixture
+def engine():
+    e = ri.RagIngestionEngine()
+    e.collection = FakeCollection()
+    with patch.object(ri.embedding_service, "embed_many", embed_many()):
+        yield e
+
+
+class TestRagIngestion:
+    """TC-U-320 through TC-U-325: diffing, edits, resumability, parallelism, the refresh hook and adoption."""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_rows_are_not_reembedded(self, engine):
+        """TC-U-320: A second run over the same rows embeds and upserts nothing."""
+        index = FakeIndex()
+        with patch.object(ri, "get_index", return_value=index):
+            first = await engine.ingest_rows("Villa FAQs", "villa-faqs", faqs(120), COLUMNS)
+            second = await engine.ingest_rows("Villa FAQs", "villa-faqs", faqs(120), COLUMNS)
+        assert first["upserted"] == 120 and index.upsert_calls == 3
+        assert second == {"upserted": 0, "deleted": 0, "unchanged": 120, "failed_batches": 0}
+        assert ri.embedding_service.embed_many.await_count == 3
+        assert len(engine.collection.docs) == 120
+
+    @pytest.mark.asyncio
+    async def test_edited_row_replaced_and_foreign_vectors_kept(self, engine):
+        """TC-U-321: Editing one FAQ upserts one vector and deletes the old one; admin FAQs stay."""
+        index = FakeIndex()
+        index.vectors["admin-uuid"] = {"id": "admin-uuid"}
+        rows = faqs(5)
+        with patch.object(ri, "get_index", return_value=index):
+            await engine.ingest_rows("Villa FAQs", "villa-faqs", rows, COLUMNS)
+            old_id = ri.row_id(ri.row_text(rows[2], COLUMNS))
+            rows[2] = {**rows[2], "Answer": "Updated"}
+            stats = await engine.ingest_rows("Villa FAQs", "villa-faqs", rows, COLUMNS)
+        assert (stats["upserted"], stats["deleted"], stats["unchanged"]) == (1, 1, 4)
+        assert old_id not in index.vectors and "admin-uuid" in index.vectors
+        assert len(index.vectors) == 6
+
+    @pytest.mark.asyncio
+    async def test_interrupted_run_resumes_from_checkpoint(self, engine):
+        """TC-U-322: After a failed batch only the rows that were not checkpointed are redone."""
+        with patch.object(ri, "MAX_PARALLEL_BATCHES", 1), \
+                patch.object(ri, "get_index", return_value=FakeIndex(fail_on_call=2)):
+            first = await engine.ingest_rows("Villa FAQs", "villa-faqs", faqs(100), COLUMNS)
+        assert (first["upserted"], first["failed_batches"]) == (50, 1)
+        index = FakeIndex()
+        with patch.object(ri, "get_index", return_value=index):
+            resumed = await engine.ingest_rows("Villa FAQs", "villa-faqs", faqs(100), COLUMNS)
+        assert (resumed["upserted"], resumed["unchanged"]) == (50, 50)
+        assert len(engine.collection.docs) == 100
+
+    @pytest.mark.asyncio
+    async def test_batches_run_in_parallel_up_to_the_limit(self, engine):
+        """TC-U-323: Upsert batches overlap, but never more than MAX_PARALLEL_BATCHES at once."""
+        index = FakeIndex(delay=0.05)
+        with patch.object(ri, "MAX_PARALLEL_BATCHES", 3), patch.object(ri, "get_index", return_value=index):
+            await engine.ingest_rows("Villa FAQs", "villa-faqs", faqs(400), COLUMNS)
+        assert index.upsert_calls == 8
+        assert 1 < index.max_active <= 3
+
+    @pytest.mark.asyncio
+    async def test_refresh_hook_ingests_changed_rag_tabs(self, engine):
+        """TC-U-324: A catalog change to a RAG tab triggers ingestion; blank villa codes become global."""
+        index = FakeIndex()
+        snapshot = CatalogSnapshot({"villa_faqs_df": pd.DataFrame(faqs(2) + faqs(1, villa=""))})
+        with patch.object(ri, "get_snapshot", return_value=snapshot), patch.object(ri, "get_index", return_value=index):
+            engine.on_sheets_changed({"services_df"})
+            assert engine._task is None
+            engine.on_sheets_changed({"villa_faqs_df", "services_df"})
+            await engine._task
+        assert engine.runs == 1 and len(index.vectors) == 3
+        assert sorted(v["metadata"]["villa_code"] for v in index.vectors.values()) == ["V1", "V1", "WEB_VILLA_01"]
+        assert engine.metrics()["last_run"]["villa-faqs"]["upserted"] == 3
+
+    @pytest.mark.asyncio
+    async def test_first_run_adopts_earlier_ingestion(self, engine):
+        """TC-U-325: Vectors from the old script are diffed: current rows kept, orphans deleted, others untouched."""
+        rows = faqs(3)
+        kept = ri.row_id(ri.row_text(rows[0], COLUMNS))
+        orphan, foreign = "a" * 32, "b" * 32
+        index = FakeIndex()
+        index.vectors = {
+            kept: {"id": kept, "metadata": {"source": "Villa FAQs"}},
+            orphan: {"id": orphan, "metadata": {"source": "Villa FAQs"}},
+            foreign: {"id": foreign, "metadata": {"source": "Local Cuisine"}},
+            "0b7c-admin-uuid": {"id": "0b7c-admin-uuid", "metadata": {"source": "Villa FAQs"}},
+        }
+        with patch.object(ri, "get_index", return_value=index):
+            stats = await engine.ingest_rows("Villa FAQs", "villa-faqs", rows, COLUMNS)
+        assert (stats["upserted"], stats["deleted"], stats["unchanged"]) == (2, 1, 1)
+        assert orphan not in index.vectors and {kept, foreign, "0b7c-admin-uuid"} <= set(index.vectors)
+        assert len(engine.collection.docs) == 3
+
+        _, _, _, columns = next(src for src in ri.RAG_SOURCES if src[2] == "event-calender")
+        event = {"Event Name": "Nyepi", "For more details (URL)": "https://example.com/nyepi"}
+        assert "https://example.com/nyepi" in ri.row_text(event, columns)
@@ -0,0 +1,101 @@
+"""
+UNIT TESTS: Parallel RAG Retrieval
+
+Verifies the Pinecone indexes are queried concurrently off the event loop,
+that a slow or failing index only drops its own matches, that matches are
+merged by score, and that per-index latency is recorded.
+"""
+import time
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import rag_service as rs
+
+
+class FakeIndex:
+    def __init__(self, matches, delay=0.0, error=None):
+        self.matches, self.delay, self.error = matches, delay, error
+        self.filters = []
+
+    def query(self, vector, top_k, include_metadata, filter=None):
+        self.filters.append(filter)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"matches": self.matches}
+
+
+def match(text, score):
+    return {"score": score, "metadata": {"text": text}}
+
+
+def embeddings():
+    return AsyncMock(return_value=np.array([0.1, 0.2], dtype=np.float32))
+
+
+@pytest.fixture
+def service():
+    return rs.RAGService()
+
+
+class TestRAGService:
+    """TC-U-300 through TC-U-303: fan-out, timeouts, re-ranking and latency metrics."""
+
+    @pytest.mark.asyncio
+    async def test_indexes_are_queried_concurrently(self, service):
+        """TC-U-300: Three 0.2s index queries complete in about the time of one."""
+        indexes = {name: FakeIndex([match(name, 0.9)], delay=0.2)
+                   for name in ("things-to-do-in-bali", "local-cuisine", "villa-faqs")}
+        with patch.object(rs, "get_index", side_effect=indexes.get), \
+                patch.object(rs.embedding_service, "embed", embeddings()):
+            start = time.perf_counter()
+            context = await service.get_rag_context("food tour to visit", "general", "V1")
+            elapsed = time.perf_counter() - start
+        assert elapsed < 0.45
+        assert all(name in context for name in indexes)
+        assert indexes["villa-faqs"].filters == [{"villa_code": {"$in": ["V1", "WEB_VILLA_01"]}}]
+
+    @pytest.mark.asyncio
+    async def test_slow_or_failing_index_returns_partial_results(self, service):
+        """TC-U-301: A timed-out or erroring index is skipped; the others still answer."""
+        indexes = {
+            "things-to-do-in-bali": FakeIndex([match("slow", 0.95)], delay=0.5),
+            "local-cuisine": FakeIndex([], error=RuntimeError("boom")),
+            "villa-faqs": FakeIndex([match("Check-out is 11am", 0.8)]),
+        }
+        with patch.object(rs, "get_index", side_effect=indexes.get):
+            results = [await service.query_index(n, [0.1], timeout=0.1) for n in indexes]
+        assert results[0] == [] and results[1] == []
+        assert results[2][0]["metadata"]["text"] == "Check-out is 11am"
+        metrics = service.metrics()
+        assert metrics["things-to-do-in-bali"]["timeouts"] == 1
+        assert metrics["local-cuisine"]["errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_matches_merged_and_ranked_by_score(self, service):
+        """TC-U-302: Pieces from all indexes are ordered by score, thresholded and de-duplicated."""
+        indexes = {
+            "local-cuisine": FakeIndex([match("Babi guling", 0.75), match("weak", 0.65)]),
+            "villa-faqs": FakeIndex([match("Breakfast 7-10am", 0.92), match("Pool rules", 0.62), match("Breakfast 7-10am", 0.92)]),
+        }
+        with patch.object(rs, "get_index", side_effect=indexes.get), \
+                patch.object(rs.embedding_service, "embed", embeddings()):
+            context = await service.get_rag_context("where to eat", "general", "WEB_VILLA_01")
+        assert context.split("\n\n") == [
+            "[Villa Faqs]: Breakfast 7-10am",
+            "[Local Cuisine]: Babi guling",
+            "[Villa Faqs]: Pool rules",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_latency_histogram_per_index(self, service):
+        """TC-U-303: Completed queries land in the matching latency bucket."""
+        with patch.object(rs, "get_index", return_value=FakeIndex([], delay=0.06)):
+            await service.query_index("villa-faqs", [0.1])
+            await service.query_index("villa-faqs", [0.1])
+        stats = service.metrics()["villa-faqs"]
+        assert stats["queries"] == 2 and stats["histogram"]["<=100ms"] == 2
+        assert 60 <= stats["avg_ms"] < 100
@@ -0,0 +1,98 @@
+"""
+UNIT TESTS: Language Lesson Response Cache
+
+Verifies answers are keyed on the normalized prompt (not the user), that the
+in-process tier is bounded by entries and bytes with TTL expiry, and that a
+second worker is served from the shared Mongo tier.
+"""
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.utils import response_cache as rc
+from app.services import language
+from tests.unit.fake_mongo import FakeCollection
+
+
+def make_cache(collection=None):
+    cache = rc.ResponseCache("test")
+    cache.collection = collection or FakeCollection()
+    return cache
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class TestResponseCache:
+    """TC-U-280 through TC-U-284: keying, bounds, TTL, shared tier and metrics."""
+
+    @pytest.mark.asyncio
+    async def test_standalone_prompt_shared_across_users(self):
+        """TC-U-280: The same question from two users costs one completion."""
+        optimizer = language.ResponseOptimizer()
+        optimizer.cache = make_cache()
+        create = AsyncMock(return_value=completion("Suksma = thank you."))
+        with patch.object(language.client.chat.completions, "create", create), \
+                patch.object(language, "get_conversation_history", AsyncMock(return_value=[])), \
+                patch.object(language, "save_message"):
+            first = await optimizer.quantum_response("u1", "How do I say thank you in Balinese?")
+            second = await optimizer.quantum_response("u2", "how do i say THANK YOU in balinese")
+        assert first == second == "Suksma = thank you."
+        create.assert_awaited_once()
+        assert optimizer.cache.metrics()["local_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_follow_ups_are_not_cached(self):
+        """TC-U-281: Questions that lean on history are always generated and never stored."""
+        optimizer = language.ResponseOptimizer()
+        optimizer.cache = make_cache()
+        create = AsyncMock(return_value=completion("answer"))
+        history = AsyncMock(return_value=[{"role": "user", "content": "suksma"}])
+        with patch.object(language.client.chat.completions, "create", create), \
+                patch.object(language, "get_conversation_history", history), \
+                patch.object(language, "save_message"):
+            await optimizer.quantum_response("u1", "how do I pronounce it")
+            await optimizer.quantum_response("u1", "how do I pronounce it")
+        assert create.await_count == 2
+        history.assert_awaited()
+        assert optimizer.cache.metrics()["entries"] == 0 and optimizer.cache.collection.docs == []
+
+    @pytest.mark.asyncio
+    async def test_bounded_by_entries_and_bytes(self):
+        """TC-U-282: The LRU evicts the oldest entries when either limit is exceeded."""
+        cache = make_cache()
+        with patch.object(rc, "MAX_ENTRIES", 3), patch.object(rc, "MAX_BYTES", 10_000):
+            for n in range(5):
+                await cache.set(f"prompt {n}", "a" * 100)
+            assert cache.metrics()["entries"] == 3 and cache.evictions == 2
+            await cache.set("big", "b" * 9_900)
+        metrics = cache.metrics()
+        assert metrics["bytes"] <= 10_000 and metrics["entries"] == 1
+        assert metrics["evictions"] == 5
+
+    @pytest.mark.asyncio
+    async def test_ttl_expires_both_tiers(self):
+        """TC-U-283: Expired entries are dropped locally and ignored in Mongo."""
+        cache = make_cache()
+        cache.ttl = 60
+        await cache.set("hello in indonesian", "Halo")
+        with patch.object(rc.time, "monotonic", return_value=rc.time.monotonic() + 61):
+            cache.collection.docs[0]["expires_at"] = rc.datetime.utcnow() - rc.timedelta(seconds=1)
+            assert await cache.get("hello in indonesian") is None
+        assert cache.expired == 1 and cache.bytes == 0
+
+    @pytest.mark.asyncio
+    async def test_shared_tier_serves_other_workers(self):
+        """TC-U-284: A second worker hits Mongo once, then its own LRU."""
+        shared = FakeCollection()
+        await make_cache(shared).set("good morning in balinese", "Rahajeng semeng")
+        other = make_cache(shared)
+        assert await other.get("good morning in balinese") == "Rahajeng semeng"
+        assert await other.get("good morning in balinese") == "Rahajeng semeng"
+        assert await other.get("good night in balinese") is None
+        metrics = other.metrics()
+        assert (metrics["shared_hits"], metrics["local_hits"], metrics["misses"]) == (1, 1, 1)
+        assert metrics["hit_rate"] == pytest.approx(0.667)
@@ -0,0 +1,104 @@
+"""
+UNIT TESTS: Endpoint Result Cache
+
+Verifies TTL caching keyed by endpoint/scope/params, single-flight coalescing
+of concurrent identical requests, villa-aware invalidation from write paths
+and hit-rate metrics.
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.utils import result_cache as rc
+from app.utils.result_cache import ResultCache, cached
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    with patch.object(rc, "result_cache", ResultCache()) as cache:
+        yield cache
+
+
+def _endpoint(villa_scoped=False, delay=0.0, name="endpoint"):
+    calls = []
+
+    async def endpoint(user=None, days=30):
+        calls.append(days)
+        await asyncio.sleep(delay)
+        return {"success": True, "days": days, "n": len(calls)}
+
+    # Cache keys include the endpoint's qualified name
+    endpoint.__qualname__ = name
+    return cached(ttl=60, villa_scoped=villa_scoped)(endpoint), calls
+
+
+class TestResultCache:
+    """TC-U-220 through TC-U-224: caching, coalescing, invalidation and metrics."""
+
+    @pytest.mark.asyncio
+    async def test_repeat_requests_hit_cache(self):
+        """TC-U-220: The same params reuse the result; different params or scopes don't."""
+        endpoint, calls = _endpoint()
+        admin = {"role": "admin", "villa_codes": ["*"]}
+        await endpoint(user=admin, days=30)
+        await endpoint(user=admin, days=30)
+        await endpoint(user=admin, days=7)
+        await endpoint(user={"role": "staff", "villa_codes": ["V1"]}, days=30)
+        assert calls == [30, 7, 30]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_coalesce(self, fresh_cache):
+        """TC-U-221: N concurrent identical requests run the query once."""
+        endpoint, calls = _endpoint(delay=0.02)
+        user = {"role": "staff", "villa_codes": ["V1"]}
+        results = await asyncio.gather(*(endpoint(user=user, days=30) for _ in range(10)))
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+        assert fresh_cache.metrics()["coalesced"] == 9
+
+    @pytest.mark.asyncio
+    async def test_villa_write_invalidates_only_overlapping_scopes(self, fresh_cache):
+        """TC-U-222: A write to V2 drops V2-scoped and global entries but keeps V1-scoped ones."""
+        scoped, scoped_calls = _endpoint(villa_scoped=True, name="scoped")
+        unscoped, global_calls = _endpoint(name="unscoped")
+        v1 = {"role": "staff", "villa_codes": ["V1"]}
+        v2 = {"role": "staff", "villa_codes": ["V2"]}
+        for _ in range(2):
+            await scoped(user=v1)
+            await scoped(user=v2)
+            await unscoped(user=v1)
+            fresh_cache.invalidate_villa("V2")
+        assert len(scoped_calls) == 3  # V1 once, V2 twice
+        assert len(global_calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_failures_are_not_cached(self):
+        """TC-U-223: In-band failures and exceptions are recomputed on the next request."""
+        attempts = []
+
+        @cached(ttl=60)
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                return {"success": False, "error": "db down"}
+            if len(attempts) == 2:
+                raise RuntimeError("boom")
+            return {"success": True}
+
+        assert (await flaky())["success"] is False
+        with pytest.raises(RuntimeError):
+            await flaky()
+        assert (await flaky())["success"] is True
+        assert (await flaky())["success"] is True
+        assert len(attempts) == 3
+
+    @pytest.mark.asyncio
+    async def test_metrics_report_hit_rate(self, fresh_cache):
+        """TC-U-224: Hits, misses and the hit rate are exposed."""
+        endpoint, _ = _endpoint()
+        for _ in range(4):
+            await endpoint(days=1)
+        metrics = fresh_cache.metrics()
+        assert (metrics["hits"], metrics["misses"], metrics["hit_rate"]) == (3, 1, 0.75)
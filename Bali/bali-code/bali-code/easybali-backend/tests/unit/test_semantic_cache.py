@@ -0,0 +1,141 @@
+"""
+UNIT TESTS: Semantic Response Cache
+
+Verifies near-duplicate standalone questions reuse an answer within the same
+(chat type, villa, language, catalog version) partition, that follow-ups and
+side-effect chat modes bypass the cache, and that FAQ edits invalidate it.
+"""
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import semantic_cache as sc
+from app.services.catalog_snapshot import CatalogSnapshot
+
+VECTORS = {
+    "what time is check out": [1.0, 0.0, 0.0],
+    "what time is checkout": [0.99, 0.05, 0.0],
+    "best beach clubs in canggu": [0.0, 1.0, 0.0],
+}
+
+
+def fake_embed(text):
+    v = np.array(VECTORS[text], dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+HISTORY = [{"role": "user", "content": "I'm Alice in villa 3 until 12 May"},
+           {"role": "assistant", "content": "Welcome Alice! Your massage is booked for 4pm."}]
+
+
+def fake_completion(text="Check-out is at 11am."):
+    return AsyncMock(return_value=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                                                  usage=SimpleNamespace(total_tokens=500)))
+
+
+@pytest.fixture
+def cache():
+    c = sc.SemanticCache()
+    with patch.object(c, "_embed", AsyncMock(side_effect=fake_embed)), \
+            patch.object(sc, "get_snapshot", return_value=CatalogSnapshot({}, versions={"ai_data_df": 1})):
+        yield c
+
+
+class TestSemanticCache:
+    """TC-U-270 through TC-U-276: reuse, partitioning, bypass, invalidation, metrics and history-free answers."""
+
+    @pytest.mark.asyncio
+    async def test_similar_question_reuses_answer(self, cache):
+        """TC-U-270: A paraphrase above the threshold is served from the cache."""
+        answer, probe = await cache.lookup("What time is check-out?", "general", "V1", "EN")
+        assert answer is None and probe is not None
+        cache.store(probe, "Check-out is at 11am.", tokens=900)
+        answer, probe = await cache.lookup("what time is checkout", "general", "V1", "EN")
+        assert answer == "Check-out is at 11am." and probe is None
+        miss, _ = await cache.lookup("best beach clubs in Canggu", "general", "V1", "EN")
+        assert miss is None
+
+    @pytest.mark.asyncio
+    async def test_partitioned_by_villa_language_and_catalog(self, cache):
+        """TC-U-271: Another villa, language or catalog version never sees the answer."""
+        _, probe = await cache.lookup("what time is check out", "general", "V1", "EN")
+        cache.store(probe, "11am at V1", tokens=10)
+        assert (await cache.lookup("what time is check out", "general", "V2", "EN"))[0] is None
+        assert (await cache.lookup("what time is check out", "general", "V1", "ID"))[0] is None
+        with patch.object(sc, "get_snapshot", return_value=CatalogSnapshot({}, versions={"ai_data_df": 2})):
+            assert (await cache.lookup("what time is check out", "general", "V1", "EN"))[0] is None
+
+    @pytest.mark.asyncio
+    async def test_follow_ups_and_side_effect_modes_bypass(self, cache):
+        """TC-U-272: Short follow-ups and non-cacheable chat types never embed or cache."""
+        assert await cache.lookup("how much is it", "general", "V1", "EN") == (None, None)
+        assert await cache.lookup("ok", "general", "V1", "EN") == (None, None)
+        assert await cache.lookup("what time is check out", "maintenance-issue", "V1", "EN") == (None, None)
+        cache._embed.assert_not_called()
+        assert cache.bypassed == 3
+
+    @pytest.mark.asyncio
+    async def test_faq_edit_invalidates_villa(self, cache):
+        """TC-U-273: A villa FAQ edit drops that villa only; a global FAQ edit drops everything."""
+        for villa in ("V1", "V2"):
+            _, probe = await cache.lookup("what time is check out", "general", villa, "EN")
+            cache.store(probe, f"answer {villa}", tokens=1)
+        cache.invalidate_villa("V1")
+        assert (await cache.lookup("what time is check out", "general", "V1", "EN"))[0] is None
+        assert (await cache.lookup("what time is check out", "general", "V2", "EN"))[0] == "answer V2"
+        cache.invalidate_villa(sc.GLOBAL_VILLA)
+        assert cache.metrics()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_metrics_and_ttl(self, cache):
+        """TC-U-274: Hits report saved tokens; expired entries are not served."""
+        _, probe = await cache.lookup("what time is check out", "general", "V1", "EN")
+        cache.store(probe, "11am", tokens=750)
+        await cache.lookup("what time is checkout", "general", "V1", "EN")
+        metrics = cache.metrics()
+        assert (metrics["hits"], metrics["misses"], metrics["tokens_saved"]) == (1, 1, 750)
+        assert metrics["hit_rate"] == 0.5
+        with patch.object(sc.time, "monotonic", return_value=sc.time.monotonic() + sc.TTL_SECONDS + 1):
+            assert (await cache.lookup("what time is checkout", "general", "V1", "EN"))[0] is None
+
+    @pytest.mark.asyncio
+    async def test_web_answer_cached_without_guest_history(self, cache):
+        """TC-U-275: The web concierge builds a cacheable answer from the question alone, not the guest's history."""
+        from app.services import ai_prompt as ap
+        create = fake_completion()
+        with patch.object(ap, "semantic_cache", cache), \
+                patch.object(ap, "get_conversation_history", AsyncMock(return_value=HISTORY)), \
+                patch.object(ap, "save_message"), \
+                patch.object(ap.ai_menu_generator, "intelligent_service_check", AsyncMock(return_value={})), \
+                patch.object(ap.ConciergeAI, "get_sheet_context", return_value=""), \
+                patch.object(ap.ConciergeAI, "get_rag_context", AsyncMock(return_value="")), \
+                patch("app.services.menu_services.get_villa_info_by_code", AsyncMock(return_value=None)), \
+                patch.object(ap.client.chat.completions, "create", create):
+            result = await ap.ConciergeAI().process_query("What time is check-out?", "guest-1", "general", "EN", "V1")
+            prompt = create.call_args.kwargs["messages"][0]["content"]
+            assert "Alice" not in prompt and "12 May" not in prompt
+            assert (await cache.lookup("what time is checkout", "general", "V1", "EN"))[0] == result["response"]
+
+            # A follow-up is not cached, so it keeps the guest's history
+            await ap.ConciergeAI().process_query("is it late?", "guest-1", "general", "EN", "V1")
+            assert "Alice" in create.call_args.kwargs["messages"][0]["content"]
+
+    @pytest.mark.asyncio
+    async def test_whatsapp_answer_cached_without_guest_history(self, cache):
+        """TC-U-276: WhatsApp path 3 builds a cacheable answer from the question alone."""
+        from app.services import whatsapp_ai_prompt as wa
+        create = fake_completion()
+        with patch.object(wa, "semantic_cache", cache), \
+                patch.object(wa, "get_conversation_history", AsyncMock(return_value=HISTORY)), \
+                patch.object(wa, "save_message"), \
+                patch.object(wa.ai_menu_generator, "intelligent_service_check", AsyncMock(return_value={})), \
+                patch.object(wa.ai_menu_generator, "extract_requirements", MagicMock(return_value={})), \
+                patch.object(wa.rag_service, "get_rag_context", AsyncMock(return_value="")), \
+                patch("app.services.menu_services.get_villa_info_by_code", AsyncMock(return_value=None)), \
+                patch.object(wa.client.chat.completions, "create", create):
+            result = await wa.whatsapp_response("What time is check-out?", "628111", "V1")
+        prompt = create.call_args.kwargs["messages"][0]["content"]
+        assert "Alice" not in prompt and "12 May" not in prompt
+        assert (await cache.lookup("what time is checkout", "whatsapp", "V1", "auto"))[0] == result["text"]
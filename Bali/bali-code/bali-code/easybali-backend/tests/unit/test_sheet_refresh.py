@@ -0,0 +1,188 @@
+"""
+UNIT TESTS: Change-Detecting, Async Google Sheets Refresh
+
+Verifies that refresh_catalog fetches each spreadsheet with a single batchGet,
+skips unchanged spreadsheets (Drive revision), re-parses only tabs whose content
+changed, bumps per-tab versions and notifies subscribers with the changed keys.
+Parsing runs in the catalog process pool and the snapshot survives pickling.
+"""
+import pickle
+import pytest
+import pandas as pd
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import menu_services, catalog_snapshot, catalog_store
+from app.services.catalog_snapshot import CatalogSnapshot, fill_gaps
+from app.services.sheet_versions import SheetVersionRegistry, content_hash, catalog_version
+
+
+class FakeSheetsClient:
+    """Stands in for AsyncSheetsClient: tabs per spreadsheet plus call counters."""
+
+    def __init__(self, spreadsheets, revisions):
+        self.spreadsheets = spreadsheets
+        self.revisions = revisions
+        self.batch_calls = []
+        self.hyperlink_rows = []
+
+    async def get_revision(self, sheet_id):
+        return self.revisions.get(sheet_id)
+
+    async def get_sheet_titles(self, sheet_id):
+        return set(self.spreadsheets[sheet_id])
+
+    async def batch_get_values(self, sheet_id, sheet_names):
+        self.batch_calls.append((sheet_id, list(sheet_names)))
+        tabs = self.spreadsheets[sheet_id]
+        return {name: [list(row) for row in tabs[name]] for name in sheet_names}
+
+    async def get_hyperlinks(self, sheet_id, sheet_name):
+        return self.hyperlink_rows
+
+
+@pytest.fixture
+def sheets(monkeypatch, tmp_path):
+    main_id, ai_id = menu_services.SHEET_ID, menu_services.AI_MATERIAL_SHEET_ID
+    client = FakeSheetsClient(
+        {
+            main_id: {
+                "Services Overview": [["Service Item", "Sub-category"], ["Massage", "Wellness"]],
+                "QR Codes": [["Number", "Name of Villa"], ["V1", "Villa One"]],
+            },
+            ai_id: {"Event Calendar": [["Event Name"], ["Nyepi"]]},
+        },
+        {main_id: "1", ai_id: "7"},
+    )
+    registry = SheetVersionRegistry()
+    previous_snapshot = catalog_snapshot.get_snapshot()
+    monkeypatch.setattr(menu_services, "sheet_versions", registry)
+    monkeypatch.setattr(menu_services, "cache", {key: None for key in menu_services.cache})
+    monkeypatch.setattr(catalog_store, "CATALOG_CACHE_PATH", str(tmp_path / "catalog.msgpack"))
+    monkeypatch.setattr(menu_services, "catalog_source", None)
+    yield client, registry
+    catalog_snapshot.publish_snapshot(previous_snapshot)
+
+
+class TestChangeDetection:
+    """TC-U-100 through TC-U-106, TC-U-111: incremental refresh behaviour."""
+
+    @pytest.mark.asyncio
+    async def test_first_load_one_batch_per_spreadsheet(self, sheets):
+        """TC-U-100: Initial load fetches each spreadsheet in one batchGet, all tabs at version 1."""
+        client, registry = sheets
+        changed = await menu_services.refresh_catalog(client=client)
+        assert changed == ["event_calendar_df", "services_df", "villas_data"]
+        assert len(client.batch_calls) == 2
+        assert registry.versions() == {"services_df": 1, "villas_data": 1, "event_calendar_df": 1}
+        assert catalog_snapshot.get_snapshot().villa_code_for("villa one") == "V1"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_revision_skips_download(self, sheets):
+        """TC-U-101: Same Drive revision → nothing fetched, snapshot untouched."""
+        client, registry = sheets
+        await menu_services.refresh_catalog(client=client)
+        snapshot = catalog_snapshot.get_snapshot()
+        assert await menu_services.refresh_catalog(client=client) == []
+        assert len(client.batch_calls) == 2
+        assert catalog_snapshot.get_snapshot() is snapshot
+
+    @pytest.mark.asyncio
+    async def test_new_revision_reparses_only_changed_tab(self, sheets):
+        """TC-U-102: Revision bump with one edited tab re-parses just that tab."""
+        client, registry = sheets
+        await menu_services.refresh_catalog(client=client)
+        villas_before = menu_services.cache["villas_data"]
+        client.revisions[menu_services.SHEET_ID] = "2"
+        client.spreadsheets[menu_services.SHEET_ID]["Services Overview"].append(["Yoga", "Wellness"])
+
+        assert await menu_services.refresh_catalog(client=client) == ["services_df"]
+        assert registry.versions()["services_df"] == 2
+        assert registry.versions()["villas_data"] == 1
+        assert catalog_snapshot.get_snapshot().versions["services_df"] == 2
+        assert menu_services.cache["villas_data"].equals(villas_before)
+        assert len(menu_services.cache["services_df"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_unknown_revision_falls_back_to_hashing(self, sheets):
+        """TC-U-103: Without Drive metadata tabs are fetched but unchanged ones aren't re-parsed."""
+        client, registry = sheets
+        client.revisions.clear()
+        await menu_services.refresh_catalog(client=client)
+        assert await menu_services.refresh_catalog(client=client) == []
+        assert len(client.batch_calls) == 4
+
+    @pytest.mark.asyncio
+    async def test_force_reloads_everything(self, sheets):
+        """TC-U-104: force=True ignores revision and hashes."""
+        client, registry = sheets
+        await menu_services.refresh_catalog(client=client)
+        changed = await menu_services.refresh_catalog(force=True, client=client)
+        assert changed == ["event_calendar_df", "services_df", "villas_data"]
+        assert registry.versions()["services_df"] == 2
+
+    @pytest.mark.asyncio
+    async def test_subscribers_receive_changed_keys(self, sheets):
+        """TC-U-105: Listeners are told exactly which cache keys changed."""
+        client, registry = sheets
+        seen = []
+        registry.subscribe(seen.append)
+        await menu_services.refresh_catalog(client=client)
+        client.revisions[menu_services.AI_MATERIAL_SHEET_ID] = "8"
+        client.spreadsheets[menu_services.AI_MATERIAL_SHEET_ID]["Event Calendar"].append(["Galungan"])
+        await menu_services.refresh_catalog(client=client)
+        assert seen[-1] == {"event_calendar_df"}
+
+    @pytest.mark.asyncio
+    async def test_failed_parse_does_not_record_revision(self, sheets):
+        """TC-U-111: A revision whose parse failed is downloaded again on the next refresh."""
+        client, registry = sheets
+        with patch.object(menu_services, "_compile_off_loop", AsyncMock(side_effect=RuntimeError("parse worker killed"))):
+            assert await menu_services.refresh_catalog(client=client) == []
+        assert not registry.revision_unchanged(menu_services.SHEET_ID, "1")
+        assert await menu_services.refresh_catalog(client=client) == ["event_calendar_df", "services_df", "villas_data"]
+        assert registry.revision_unchanged(menu_services.SHEET_ID, "1")
+
+    @pytest.mark.asyncio
+    async def test_menu_structure_hyperlinks_applied(self, sheets):
+        """TC-U-106: Endpoint display text is replaced by the cell hyperlink."""
+        client, registry = sheets
+        client.spreadsheets[menu_services.SHEET_ID]["Menu Structure"] = [
+            ["Main Menu", "Sub-category", "Endpoint"],
+            ["Bali Handbook", "Etiquette", "Open guide"],
+        ]
+        client.hyperlink_rows = [{}, {"values": [{}, {}, {"hyperlink": "https://guide"}]}]
+        await menu_services.refresh_catalog(client=client)
+        assert menu_services.cache["menu_df"].iloc[0]["Endpoint"] == "https://guide"
+
+
+class TestVersionHelpers:
+    """TC-U-107 through TC-U-110: hashing, padding, pickling and combined versions."""
+
+    def test_content_hash_is_stable_and_sensitive(self):
+        """TC-U-107: Equal values hash equally; any cell edit changes the hash."""
+        rows = [["a", "b"], ["1", "2"]]
+        assert content_hash(rows) == content_hash([["a", "b"], ["1", "2"]])
+        assert content_hash(rows) != content_hash([["a", "b"], ["1", "3"]])
+
+    def test_catalog_version_changes_with_any_tab(self):
+        """TC-U-108: Combined catalog version moves when a single tab version moves."""
+        assert catalog_version({}) == "0"
+        assert catalog_version({"a": 1, "b": 1}) != catalog_version({"a": 1, "b": 2})
+
+    def test_fill_gaps_pads_ragged_rows(self):
+        """TC-U-109: batchGet drops trailing blanks; rows are padded like gspread does."""
+        assert fill_gaps([["a", "b", "c"], ["1"]]) == [["a", "b", "c"], ["1", "", ""]]
+
+    def test_snapshot_round_trips_through_pickle(self):
+        """TC-U-110: Snapshots cross the process boundary with indexes intact and read-only."""
+        snap = CatalogSnapshot(
+            {"villas_data": pd.DataFrame([{"Number": "V1", "Name of Villa": "Villa One"}])},
+            {"villas_data": 3},
+        )
+        restored = pickle.loads(pickle.dumps(snap))
+        assert restored.villa_code_for("Villa One") == "V1"
+        assert restored.version == snap.version
+        with pytest.raises(TypeError):
+            restored.villa_by_code["V2"] = {}
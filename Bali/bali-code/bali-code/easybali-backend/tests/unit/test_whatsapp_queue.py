@@ -0,0 +1,163 @@
+"""
+UNIT TESTS: Event-Driven WhatsApp Outbound Queue
+
+Verifies atomic claim-and-lease, per-recipient ordering, exponential backoff
+through next_attempt_at, expired-lease recovery and that a worker pool drains
+a burst concurrently after being woken by enqueue().
+"""
+import asyncio
+import pytest
+import httpx
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import whatsapp_queue as wq
+from app.services.whatsapp_queue import WhatsAppQueue
+from app.services.whatsapp_rate_limit import OutboundRateLimiter
+from tests.unit.fake_mongo import FakeCollection
+
+
+def _queue(workers=1):
+    queue = WhatsAppQueue(workers=workers)
+    queue.collection = FakeCollection()
+    queue.rate_limiter = OutboundRateLimiter()
+    return queue
+
+
+class TestClaiming:
+    """TC-U-140 through TC-U-143: lease, ordering and backoff."""
+
+    @pytest.mark.asyncio
+    async def test_claim_leases_message(self):
+        """TC-U-140: A claimed message is 'sending' with an owner and cannot be claimed twice."""
+        queue = _queue()
+        await queue.enqueue("62811", {"text": "hi"})
+        msg = await queue.claim_next()
+        assert msg["status"] == "sending"
+        assert msg["lease_owner"] == queue.worker_id
+        assert msg["lease_expires_at"] > datetime.utcnow()
+        assert await queue.claim_next() is None
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_reclaimed(self):
+        """TC-U-141: A message whose worker died is picked up again after the lease expires."""
+        queue = _queue()
+        await queue.enqueue("62811", {"text": "hi"})
+        msg = await queue.claim_next()
+        queue.collection.docs[0]["lease_expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+        again = await queue.claim_next()
+        assert again["_id"] == msg["_id"]
+
+    @pytest.mark.asyncio
+    async def test_newer_message_waits_for_older(self):
+        """TC-U-142: A recipient's second message is deferred until the first is next tried, not re-polled every second."""
+        queue = _queue()
+        await queue.enqueue("62811", {"text": "first"})
+        await queue.enqueue("62811", {"text": "second"})
+        first, second = queue.collection.docs
+        first.update(status="retry_pending", next_attempt_at=datetime.utcnow() + timedelta(seconds=60))
+        with patch.object(queue, "send_message_with_retry", new=AsyncMock()) as send:
+            assert await queue.process_one() is True
+        send.assert_not_called()
+        assert second["status"] == "pending"
+        assert second["waiting_on"] == first["_id"]
+        assert (second["next_attempt_at"] - first["next_attempt_at"]).total_seconds() == pytest.approx(0, abs=1)
+
+    @pytest.mark.asyncio
+    async def test_failure_schedules_exponential_backoff(self):
+        """TC-U-143: Each failed attempt doubles the delay; after max_retries it is 'failed'."""
+        queue = _queue()
+        await queue.enqueue("62811", {"text": "hi"})
+        failing = AsyncMock(side_effect=RuntimeError("graph down"))
+        delays = []
+        with patch.object(wq.whatsapp_transport, "post", new=failing):
+            for _ in range(queue.max_retries):
+                doc = queue.collection.docs[0]
+                doc["next_attempt_at"] = datetime.utcnow() - timedelta(seconds=1)
+                before = datetime.utcnow()
+                await queue.process_one()
+                delays.append((doc["next_attempt_at"] - before).total_seconds())
+        doc = queue.collection.docs[0]
+        assert doc["status"] == "failed"
+        assert doc["retry_count"] == queue.max_retries
+        assert len(doc["errors"]) == queue.max_retries
+        assert delays[0] == pytest.approx(5, abs=1)
+        assert delays[1] == pytest.approx(10, abs=1)
+
+
+class TestWorkerPool:
+    """TC-U-144 through TC-U-146: concurrent draining, enqueue wakeups and in-order handoff."""
+
+    @pytest.mark.asyncio
+    async def test_pool_sends_in_parallel_and_keeps_recipient_order(self):
+        """TC-U-144: Workers overlap across recipients; each recipient's messages stay ordered."""
+        queue = _queue(workers=4)
+        sent, active, peak = [], 0, 0
+
+        async def fake_post(url, json=None, **kwargs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            sent.append((json["to"], json["text"]))
+            return httpx.Response(200, json={}, request=httpx.Request("POST", url))
+
+        with patch.object(wq.whatsapp_transport, "post", new=AsyncMock(side_effect=fake_post)):
+            task = asyncio.create_task(queue.process_queue())
+            await asyncio.sleep(0)
+            for n in range(3):
+                for recipient in ("a", "b", "c", "d"):
+                    await queue.enqueue(recipient, {"to": recipient, "text": n})
+            for _ in range(300):
+                if len(queue.collection.by_status("sent")) == 12:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        assert len(queue.collection.by_status("sent")) == 12
+        assert peak > 1
+        for recipient in ("a", "b", "c", "d"):
+            assert [text for to, text in sent if to == recipient] == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_enqueue_wakes_idle_worker(self):
+        """TC-U-145: An idle worker sends a new message without waiting for the poll interval."""
+        queue = _queue(workers=1)
+        send = AsyncMock()
+        with patch.object(queue, "send_message_with_retry", new=send):
+            task = asyncio.create_task(queue.process_queue())
+            await asyncio.sleep(0.05)
+            await queue.enqueue("62811", {"text": "hi"})
+            for _ in range(50):
+                if send.await_count:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+        assert send.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_finished_message_wakes_deferred_successor(self):
+        """TC-U-146: Once the blocking message is done with, the message deferred behind it is due at once."""
+        queue = _queue()
+        await queue.enqueue("62811", {"text": "first"})
+        await queue.enqueue("62811", {"text": "second"})
+        first, second = queue.collection.docs
+        first["status"] = "sending"
+        first["lease_expires_at"] = datetime.utcnow() + timedelta(seconds=wq.LEASE_SECONDS)
+        await queue.process_one()
+        assert second["next_attempt_at"] > datetime.utcnow() + timedelta(seconds=wq.LEASE_SECONDS - 5)
+
+        first.update(status="pending", lease_expires_at=None, next_attempt_at=datetime.utcnow())
+
+        async def sent(msg):
+            await queue.collection.update_one({"_id": msg["_id"]}, {"$set": {"status": "sent"}})
+
+        mark_sent = AsyncMock(side_effect=sent)
+        with patch.object(queue, "send_message_with_retry", new=mark_sent):
+            await queue.process_one()
+            assert second["next_attempt_at"] <= datetime.utcnow() and "waiting_on" not in second
+            await queue.process_one()
+        assert [c.args[0]["payload"]["text"] for c in mark_sent.await_args_list] == ["first", "second"]
@@ -0,0 +1,133 @@
+"""
+UNIT TESTS: Rate-Limit-Aware WhatsApp Sending
+
+Verifies the token buckets (global + per-recipient pair), the bulk-lane reserve
+that keeps headroom for transactional messages, Retry-After/429 parsing, and
+that the queue claims by priority lane and reschedules throttled sends without
+spending a retry attempt.
+"""
+import pytest
+import httpx
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services import whatsapp_queue as wq
+from app.services.whatsapp_rate_limit import (
+    TokenBucket, OutboundRateLimiter, parse_retry_after, throttle_kind,
+    PRIORITY_TRANSACTIONAL, PRIORITY_NORMAL, PRIORITY_BULK,
+)
+from tests.unit.test_whatsapp_queue import _queue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBuckets:
+    """TC-U-150 through TC-U-153: bucket arithmetic and lanes."""
+
+    def test_bucket_refills_at_rate(self):
+        """TC-U-150: An empty bucket needs 1/rate seconds per token and refills over time."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        bucket.take(); bucket.take()
+        assert bucket.wait_time() == pytest.approx(0.5)
+        clock.now += 0.5
+        assert bucket.wait_time() == 0
+
+    def test_pair_limit_is_per_recipient(self):
+        """TC-U-151: A chatty recipient is paced without slowing anyone else."""
+        limiter = OutboundRateLimiter(rate=100, burst=100, pair_rate=1, pair_burst=2, clock=FakeClock())
+        assert limiter.reserve("a") == 0
+        assert limiter.reserve("a") == 0
+        assert limiter.reserve("a") == pytest.approx(1.0)
+        assert limiter.reserve("b") == 0
+
+    def test_bulk_lane_leaves_reserve_for_transactional(self):
+        """TC-U-152: Bulk stops at the reserve; transactional still gets a slot immediately."""
+        limiter = OutboundRateLimiter(rate=1, burst=4, pair_rate=100, pair_burst=100, clock=FakeClock())
+        granted = [limiter.reserve(f"guest{i}", PRIORITY_BULK) for i in range(4)]
+        assert granted[:3] == [0, 0, 0] and granted[3] > 0
+        assert limiter.reserve("sp", PRIORITY_TRANSACTIONAL) == 0
+
+    def test_server_backoff_pauses_bucket(self):
+        """TC-U-153: A global 429 blocks everyone for Retry-After; a pair error only that recipient."""
+        clock = FakeClock()
+        limiter = OutboundRateLimiter(rate=100, burst=100, clock=clock)
+        limiter.backoff("a", 5, pair_only=True)
+        assert limiter.reserve("a") >= 5
+        assert limiter.reserve("b") == 0
+        limiter.backoff("a", 3)
+        assert limiter.reserve("b") >= 3
+        clock.now += 3
+        assert limiter.reserve("b") == 0
+
+
+class TestThrottleSignals:
+    """TC-U-154 through TC-U-155: recognising rate-limit responses."""
+
+    def test_parse_retry_after(self):
+        """TC-U-154: Seconds, HTTP dates and garbage are all handled."""
+        assert parse_retry_after("7") == 7
+        assert parse_retry_after(None, default=3) == 3
+        assert parse_retry_after("soon", default=4) == 4
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+    def test_throttle_kind(self):
+        """TC-U-155: 429 / throughput codes are global; 131056 is the pair limit."""
+        assert throttle_kind(429, None) == "global"
+        assert throttle_kind(400, {"error": {"code": 130429}}) == "global"
+        assert throttle_kind(400, {"error": {"code": 131056}}) == "pair"
+        assert throttle_kind(400, {"error": {"code": 100}}) is None
+
+
+class TestQueueLanes:
+    """TC-U-156 through TC-U-158: priority claims, 429 rescheduling and metrics."""
+
+    @pytest.mark.asyncio
+    async def test_transactional_claimed_before_bulk(self):
+        """TC-U-156: A payment confirmation enqueued after a broadcast is claimed first."""
+        queue = _queue()
+        await queue.enqueue("a", {"n": 1}, priority=PRIORITY_BULK)
+        await queue.enqueue("b", {"n": 2}, priority=PRIORITY_TRANSACTIONAL)
+        claimed = await queue.claim_next()
+        assert claimed["recipient_id"] == "b"
+
+    @pytest.mark.asyncio
+    async def test_429_reschedules_without_spending_attempt(self):
+        """TC-U-157: A 429 pushes next_attempt_at by Retry-After and keeps retry_count at 0."""
+        queue = _queue()
+        await queue.enqueue("a", {"to": "a"})
+        throttled = httpx.Response(
+            429, headers={"Retry-After": "30"}, json={"error": {"code": 130429}},
+            request=httpx.Request("POST", "https://graph.test"),
+        )
+        with patch.object(wq.whatsapp_transport, "post", new=AsyncMock(return_value=throttled)):
+            await queue.process_one()
+        doc = queue.collection.docs[0]
+        assert doc["status"] == "pending"
+        assert doc["retry_count"] == 0
+        assert doc["throttled_count"] == 1
+        assert doc["next_attempt_at"] > datetime.utcnow() + timedelta(seconds=25)
+        assert queue.rate_limiter.metrics()["server_throttled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_report_depth_per_lane(self):
+        """TC-U-158: Metrics count due messages per lane and record send latency."""
+        queue = _queue()
+        await queue.enqueue("a", {"to": "a"}, priority=PRIORITY_BULK)
+        await queue.enqueue("b", {"to": "b"}, priority=PRIORITY_BULK)
+        await queue.enqueue("c", {"to": "c"}, priority=PRIORITY_NORMAL)
+        ok = httpx.Response(200, json={}, request=httpx.Request("POST", "https://graph.test"))
+        with patch.object(wq.whatsapp_transport, "post", new=AsyncMock(return_value=ok)):
+            await queue.process_one()
+        metrics = await queue.metrics()
+        assert metrics["depth"] == {"transactional": 0, "normal": 0, "bulk": 2}
+        assert metrics["send_latency_seconds"]["p50"] is not None
+        assert metrics["queue_latency_seconds"]["max"] is not None
@@ -0,0 +1,112 @@
+"""
+UNIT TESTS: Shared WhatsApp Transport
+
+Verifies that every call goes through one pooled client, that keep-alive
+connections are reused (pool hits) rather than re-opened (pool misses), that
+concurrency is bounded and that per-call timeouts are passed through.
+"""
+import asyncio
+import pytest
+import httpx
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from app.services.whatsapp_transport import WhatsAppTransport
+
+
+async def _keepalive_server():
+    """Minimal HTTP/1.1 server that keeps connections open; returns (server, url, accepted)."""
+    accepted = []
+
+    async def handle(reader, writer):
+        accepted.append(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                if length:
+                    await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/messages", accepted
+
+
+class TestWhatsAppTransport:
+    """TC-U-130 through TC-U-133: pooling, metrics, concurrency and timeouts."""
+
+    @pytest.mark.asyncio
+    async def test_connection_reused_across_sends(self):
+        """TC-U-130: Sequential sends share one TCP connection → 1 miss then hits."""
+        server, url, accepted = await _keepalive_server()
+        transport = WhatsAppTransport()
+        try:
+            for _ in range(3):
+                async with transport.session() as client:
+                    resp = await client.post(url, json={"to": "62811"})
+                    assert resp.status_code == 200
+            metrics = transport.metrics()
+            assert len(accepted) == 1
+            assert metrics["requests"] == 3
+            assert metrics["pool_misses"] == 1 and metrics["pool_hits"] == 2
+            assert metrics["open"] is True
+        finally:
+            await transport.aclose()
+            server.close()
+            await server.wait_closed()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """TC-U-131: No more than max_concurrency requests are in flight at once."""
+        active, peak = 0, 0
+
+        async def handler(request):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return httpx.Response(200)
+
+        transport = WhatsAppTransport(max_concurrency=2, transport=httpx.MockTransport(handler))
+        await asyncio.gather(*(transport.post("https://graph.test/messages") for _ in range(6)))
+        assert peak == 2
+        assert transport.metrics()["peak_in_flight"] == 2
+        await transport.aclose()
+
+    @pytest.mark.asyncio
+    async def test_session_timeout_passed_through(self):
+        """TC-U-132: The session's timeout applies to each request it sends."""
+        seen = []
+
+        def handler(request):
+            seen.append(request.extensions["timeout"])
+            return httpx.Response(200)
+
+        transport = WhatsAppTransport(transport=httpx.MockTransport(handler))
+        async with transport.session(timeout=7.0) as client:
+            await client.post("https://graph.test/messages")
+        await transport.post("https://graph.test/messages")
+        assert seen[0]["read"] == 7.0
+        assert seen[1]["connect"] == 5.0
+        await transport.aclose()
+
+    @pytest.mark.asyncio
+    async def test_errors_counted(self):
+        """TC-U-133: Transport errors are counted and re-raised to the sender."""
+        def handler(request):
+            raise httpx.ConnectError("down")
+
+        transport = WhatsAppTransport(transport=httpx.MockTransport(handler))
+        with pytest.raises(httpx.ConnectError):
+            await transport.post("https://graph.test/messages")
+        assert transport.metrics()["errors"] == 1
+        assert transport.metrics()["in_flight"] == 0
+        await transport.aclose()